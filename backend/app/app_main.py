@@ -46,6 +46,27 @@ async def lifespan(app: FastAPI):
     except Exception as e:
         logger.error(f"定时任务调度器启动失败: {e}")
 
+    # 预启动网页正文提取进程池
+    try:
+        from service.html_extractor import start_html_extractor
+        start_html_extractor()
+    except Exception as e:
+        logger.error(f"正文提取进程池启动失败: {e}")
+
+    # 后台预加载 Milvus 集合，首次检索不再等待 load
+    try:
+        from service.milvus_service import start_collection_preload
+        start_collection_preload()
+    except Exception as e:
+        logger.error(f"Milvus 集合预加载失败: {e}")
+
+    # 启用本地检索时在后台构建倒排索引
+    try:
+        from service.local_search_index import start_local_search_index
+        start_local_search_index()
+    except Exception as e:
+        logger.error(f"本地检索索引构建失败: {e}")
+
     yield
 
     # 关闭时执行
@@ -57,6 +78,41 @@ async def lifespan(app: FastAPI):
     except Exception as e:
         logger.error(f"定时任务调度器关闭失败: {e}")
 
+    # 关闭共享的搜索连接池
+    try:
+        from service.search_provider import close_search_providers
+        await close_search_providers()
+    except Exception as e:
+        logger.error(f"搜索连接池关闭失败: {e}")
+
+    # 关闭网页抓取连接池
+    try:
+        from service.page_fetcher import close_page_fetcher
+        await close_page_fetcher()
+    except Exception as e:
+        logger.error(f"网页抓取连接池关闭失败: {e}")
+
+    # 关闭向量化服务的共享客户端
+    try:
+        from service.embedding_service import close_embedding_services
+        await close_embedding_services()
+    except Exception as e:
+        logger.error(f"向量化服务关闭失败: {e}")
+
+    # 关闭重排序连接池
+    try:
+        from service.reranker import close_reranker
+        await close_reranker()
+    except Exception as e:
+        logger.error(f"重排序连接池关闭失败: {e}")
+
+    # 关闭正文提取进程池
+    try:
+        from service.html_extractor import shutdown_html_extractor
+        shutdown_html_extractor()
+    except Exception as e:
+        logger.error(f"正文提取进程池关闭失败: {e}")
+
 
 app = FastAPI(
     title="行业信息助手 API",
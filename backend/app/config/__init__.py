@@ -6,6 +6,14 @@ from .llm_config import (
     AgentModelConfig,
     AgentsConfig,
     ResearchConfig,
+    SearchConfig,
+    PageFetchConfig,
+    EmbeddingConfig,
+    RerankConfig,
+    MilvusConfig,
+    VectorStoreConfig,
+    HybridSearchConfig,
+    SchedulerConfig,
     get_config,
     reload_config,
     get_agent_model,
@@ -18,6 +26,14 @@ __all__ = [
     "AgentModelConfig",
     "AgentsConfig",
     "ResearchConfig",
+    "SearchConfig",
+    "PageFetchConfig",
+    "EmbeddingConfig",
+    "RerankConfig",
+    "MilvusConfig",
+    "VectorStoreConfig",
+    "HybridSearchConfig",
+    "SchedulerConfig",
     "get_config",
     "reload_config",
     "get_agent_model",
@@ -17,7 +17,7 @@ LLM 和 Agent 配置文件
 
 import os
 from dataclasses import dataclass, field
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, List
 
 
 @dataclass
@@ -99,6 +99,275 @@ class ResearchConfig:
     # 质量评分阈值（1-10分制，低于此分数需要修订）
     quality_threshold: float = 6.0
 
+    # 重复查询抑制：词集 Jaccard 阈值、向量余弦阈值，及是否启用向量复核
+    query_dedup_threshold: float = 0.8
+    query_dedup_embedding_threshold: float = 0.92
+    query_dedup_embedding: bool = field(default_factory=lambda: os.getenv("QUERY_DEDUP_EMBEDDING", "true").lower() == "true")
+
+    # 事实去重：shingle Jaccard 阈值，及是否对临界候选启用向量确认（每批额外一次 embedding 调用）
+    # 调整语序的改写 Jaccard 常低于阈值（约 0.5~0.6），默认启用向量确认以捕获此类重复
+    fact_dedup_threshold: float = 0.65
+    fact_dedup_embedding: bool = field(default_factory=lambda: os.getenv("FACT_DEDUP_EMBEDDING", "true").lower() == "true")
+
+    # 信源可信度：自定义信源表（JSON，新增或覆盖内置条目），及调用 LLM 前丢弃结果的最低可信度（0 表示不过滤）
+    source_credibility_file: str = field(default_factory=lambda: os.getenv("SOURCE_CREDIBILITY_FILE", ""))
+    min_source_credibility: float = field(default_factory=lambda: float(os.getenv("MIN_SOURCE_CREDIBILITY", "0")))
+
+
+def _parse_weights(raw: str) -> Dict[str, float]:
+    """解析 "alice=2,bob=0.5" 格式的用户权重"""
+    weights = {}
+    for item in raw.split(","):
+        if "=" in item:
+            name, value = item.split("=", 1)
+            try:
+                weights[name.strip()] = float(value)
+            except ValueError:
+                continue
+    return weights
+
+
+@dataclass
+class SearchConfig:
+    """网络搜索服务配置"""
+    # 搜索服务提供方：bocha，或 local（仅本地全文检索，无网络请求，用于测试与基准测试）
+    provider: str = field(default_factory=lambda: os.getenv("SEARCH_PROVIDER", "bocha"))
+
+    # Bocha Web Search 接口地址
+    bocha_api_url: str = field(default_factory=lambda: os.getenv(
+        "BOCHA_API_URL",
+        "https://api.bochaai.com/v1/web-search"
+    ))
+
+    # 单次请求超时（秒）
+    timeout: float = field(default_factory=lambda: float(os.getenv("SEARCH_TIMEOUT", "20")))
+
+    # 限流：每秒请求数与突发容量
+    rate_limit: float = field(default_factory=lambda: float(os.getenv("SEARCH_RATE_LIMIT", "10")))
+    rate_burst: int = field(default_factory=lambda: int(os.getenv("SEARCH_RATE_BURST", "20")))
+
+    # 连接池大小
+    max_connections: int = 20
+
+    # 是否启用 HTTP/2（需安装 h2）
+    http2: bool = field(default_factory=lambda: os.getenv("SEARCH_HTTP2", "true").lower() == "true")
+
+    # 搜索结果缓存：进程内 LRU 容量，及是否启用 Redis 共享层
+    cache_max_entries: int = field(default_factory=lambda: int(os.getenv("SEARCH_CACHE_MAX_ENTRIES", "2048")))
+    cache_redis: bool = field(default_factory=lambda: os.getenv("SEARCH_CACHE_REDIS", "true").lower() == "true")
+
+    # 本地全文检索（资讯 / 招投标 / 页面缓存）：off 仅网络，first 本地结果足够时不调用网络，blend 合并两者
+    local_mode: str = field(default_factory=lambda: os.getenv("SEARCH_LOCAL_MODE", "off").lower())
+
+    # first 模式下跳过网络搜索所需的最少本地结果数
+    local_min_results: int = field(default_factory=lambda: int(os.getenv("SEARCH_LOCAL_MIN_RESULTS", "3")))
+
+    # 本地结果至少覆盖的查询词比例
+    local_min_coverage: float = 0.5
+
+    # 从数据库加载最近多少天的资讯与招投标
+    local_lookback_days: int = field(default_factory=lambda: int(os.getenv("SEARCH_LOCAL_LOOKBACK_DAYS", "365")))
+
+
+@dataclass
+class PageFetchConfig:
+    """网页抓取与页面缓存配置（DeepScout 深度阅读）"""
+    # 页面缓存目录（内容寻址，原始 HTML 与提取后的正文）
+    cache_dir: str = field(default_factory=lambda: os.getenv("PAGE_CACHE_DIR", "/tmp/page_cache"))
+
+    # 缓存有效期（秒），过期后发起条件请求（ETag / Last-Modified）
+    cache_ttl: int = field(default_factory=lambda: int(os.getenv("PAGE_CACHE_TTL", str(3 * 24 * 3600))))
+
+    # 缓存清理：超过 3 倍 TTL 未使用的文件删除，总大小超过上限（MB，0 不限）时从最久未使用的开始删除；
+    # 写入时按间隔（秒）在后台触发
+    cache_max_mb: int = field(default_factory=lambda: int(os.getenv("PAGE_CACHE_MAX_MB", "1024")))
+    cache_prune_interval: int = field(default_factory=lambda: int(os.getenv("PAGE_CACHE_PRUNE_INTERVAL", "3600")))
+
+    # 单个页面最大下载字节数（解压后），超出部分截断
+    max_bytes: int = field(default_factory=lambda: int(os.getenv("PAGE_FETCH_MAX_BYTES", str(3 * 1024 * 1024))))
+
+    # 单个域名最大并发请求数
+    per_host_concurrency: int = field(default_factory=lambda: int(os.getenv("PAGE_FETCH_PER_HOST", "2")))
+
+    # 连接池大小与请求超时（秒）
+    max_connections: int = 40
+    timeout: float = 15.0
+
+    user_agent: str = "Mozilla/5.0 (compatible; DeepResearchBot/2.0)"
+
+    # 正文提取进程池大小（0 表示在线程中提取）、单文档超时（秒）、解析前 HTML 最大字符数
+    extract_workers: int = field(default_factory=lambda: int(os.getenv(
+        "HTML_EXTRACT_WORKERS", str(min(4, os.cpu_count() or 1))
+    )))
+    extract_timeout: float = field(default_factory=lambda: float(os.getenv("HTML_EXTRACT_TIMEOUT", "10")))
+    max_html_chars: int = 2_000_000
+
+
+@dataclass
+class EmbeddingConfig:
+    """向量化服务配置（微批合并与向量缓存）"""
+    # 单批最大文本数（DashScope text-embedding 接口限制为 10）
+    max_batch_size: int = 10
+
+    # 凑批等待时间（毫秒），批次满时立即发出
+    batch_wait_ms: float = field(default_factory=lambda: float(os.getenv("EMBEDDING_BATCH_WAIT_MS", "5")))
+
+    # 同时在途的批次数
+    max_concurrency: int = field(default_factory=lambda: int(os.getenv("EMBEDDING_MAX_CONCURRENCY", "4")))
+
+    # 单次请求超时（秒）
+    timeout: float = field(default_factory=lambda: float(os.getenv("EMBEDDING_TIMEOUT", "30")))
+
+    # 向量缓存第二级：redis（跨 worker 共享）/ disk（本地 SQLite）/ memory（仅进程内）/ off（不缓存）
+    cache_backend: str = field(default_factory=lambda: os.getenv("EMBEDDING_CACHE", "redis").lower())
+
+    # 进程内 LRU 容量（float16 存储，1024 维约 2KB/条）
+    cache_max_entries: int = field(default_factory=lambda: int(os.getenv("EMBEDDING_CACHE_MAX_ENTRIES", "20000")))
+
+    # 第二级缓存有效期（秒）与 disk 后端目录
+    cache_ttl: int = field(default_factory=lambda: int(os.getenv("EMBEDDING_CACHE_TTL", str(30 * 24 * 3600))))
+    cache_dir: str = field(default_factory=lambda: os.getenv("EMBEDDING_CACHE_DIR", "/tmp/embedding_cache"))
+
+
+@dataclass
+class RerankConfig:
+    """重排序服务配置"""
+    # DashScope 重排模型与接口地址
+    model: str = field(default_factory=lambda: os.getenv("RERANK_MODEL", "gte-rerank"))
+    api_url: str = field(default_factory=lambda: os.getenv(
+        "RERANK_API_URL",
+        "https://dashscope.aliyuncs.com/api/v1/services/rerank/text-rerank/text-rerank"
+    ))
+
+    # 远程重排的延迟预算（毫秒），超出后改用本地打分
+    budget_ms: float = field(default_factory=lambda: float(os.getenv("RERANK_BUDGET_MS", "1500")))
+
+    # 请求超时（秒）：超出预算的请求在后台继续完成并写入缓存
+    timeout: float = 10.0
+
+    # 本地打分方式：lexical（候选集内 BM25）/ embedding（向量余弦相似度，失败时退回 lexical）
+    fallback: str = field(default_factory=lambda: os.getenv("RERANK_FALLBACK", "lexical").lower())
+
+    # 单次请求最多文档数（超出时分批并发）与分数缓存容量
+    max_documents: int = 100
+    cache_max_entries: int = field(default_factory=lambda: int(os.getenv("RERANK_CACHE_MAX_ENTRIES", "20000")))
+
+
+@dataclass
+class MilvusConfig:
+    """Milvus 向量库配置"""
+    # 应用启动时预加载的集合（逗号分隔，不存在的集合会被跳过）
+    preload_collections: List[str] = field(default_factory=lambda: [
+        name.strip() for name in os.getenv(
+            "MILVUS_PRELOAD_COLLECTIONS", "knowledge_base,long_term_memories,policy_documents"
+        ).split(",") if name.strip()
+    ])
+
+    # 索引 profile：auto（按集合行数选择）/ flat / ivf_flat / hnsw / ivf_sq8 / ivf_pq
+    index_profile: str = field(default_factory=lambda: os.getenv("MILVUS_INDEX_PROFILE", "auto").lower())
+
+    # 按集合指定 profile，格式 "knowledge_base:hnsw,policy_documents:ivf_sq8"
+    index_profiles: Dict[str, str] = field(default_factory=lambda: {
+        name.strip(): profile.strip().lower()
+        for name, _, profile in (
+            item.partition(":") for item in os.getenv("MILVUS_INDEX_PROFILES", "").split(",")
+        ) if name.strip() and profile.strip()
+    })
+
+    # 检索参数覆盖：HNSW 的 ef、IVF 类索引的 nprobe（0 表示按索引自动推导）
+    hnsw_ef: int = field(default_factory=lambda: int(os.getenv("MILVUS_HNSW_EF", "0")))
+    ivf_nprobe: int = field(default_factory=lambda: int(os.getenv("MILVUS_IVF_NPROBE", "0")))
+
+    # 新建集合时将 kb_id / user_id 声明为分区键，检索按租户裁剪分区；分区数（创建后不可修改）
+    partition_key: bool = field(default_factory=lambda: os.getenv("MILVUS_PARTITION_KEY", "true").lower() == "true")
+    num_partitions: int = field(default_factory=lambda: int(os.getenv("MILVUS_NUM_PARTITIONS", "64")))
+
+    # 批量写入：单次 insert 的最大行数与大小（MB）
+    bulk_insert_rows: int = field(default_factory=lambda: int(os.getenv("MILVUS_BULK_INSERT_ROWS", "1000")))
+    bulk_insert_mb: float = field(default_factory=lambda: float(os.getenv("MILVUS_BULK_INSERT_MB", "16")))
+
+    # 批量写入：定时 flush 间隔（秒），0 表示只在任务结束时 flush 一次
+    bulk_flush_interval: float = field(default_factory=lambda: float(os.getenv("MILVUS_BULK_FLUSH_INTERVAL", "0")))
+
+    # 批量写入：每次送去向量化的文本条数（与上一批的 insert 并行）
+    bulk_embed_batch: int = field(default_factory=lambda: int(os.getenv("MILVUS_BULK_EMBED_BATCH", "200")))
+
+
+@dataclass
+class VectorStoreConfig:
+    """知识库向量存储后端配置"""
+    # 后端：milvus（默认）/ embedded（进程内 numpy 存储，适合小型部署与测试，无需 Milvus）
+    backend: str = field(default_factory=lambda: os.getenv("VECTOR_STORE_BACKEND", "milvus").lower())
+
+    # embedded 后端的数据目录（每个集合一个子目录）
+    path: str = field(default_factory=lambda: os.getenv("VECTOR_STORE_PATH", "data/vector_store"))
+
+    # embedded 后端的向量存储精度：float32 / float16（内存与磁盘减半，相似度误差约 1e-3，检索时需转换精度、延迟更高）
+    dtype: str = field(default_factory=lambda: os.getenv("VECTOR_STORE_DTYPE", "float32").lower())
+
+    # 已删除行占比超过该值时压缩集合文件
+    compact_ratio: float = field(default_factory=lambda: float(os.getenv("VECTOR_STORE_COMPACT_RATIO", "0.3")))
+
+
+@dataclass
+class HybridSearchConfig:
+    """混合检索配置（稀疏 BM25 + 稠密向量）"""
+    # 融合方式：rrf（倒数排名融合）/ weighted（分数归一化后加权求和）
+    fusion: str = field(default_factory=lambda: os.getenv("HYBRID_FUSION", "rrf").lower())
+
+    # 稠密与稀疏结果的权重
+    dense_weight: float = field(default_factory=lambda: float(os.getenv("HYBRID_DENSE_WEIGHT", "1.0")))
+    sparse_weight: float = field(default_factory=lambda: float(os.getenv("HYBRID_SPARSE_WEIGHT", "1.0")))
+
+    # RRF 平滑常数（越大排名靠后的结果权重衰减越慢）
+    rrf_k: int = field(default_factory=lambda: int(os.getenv("HYBRID_RRF_K", "60")))
+
+    # 每一路召回的候选数（至少为 top_n）
+    candidates: int = field(default_factory=lambda: int(os.getenv("HYBRID_CANDIDATES", "50")))
+
+    # 稀疏索引：文档至少包含的查询词比例、每篇文档参与索引的最大字符数
+    sparse_min_coverage: float = field(default_factory=lambda: float(os.getenv("HYBRID_SPARSE_MIN_COVERAGE", "0.3")))
+    sparse_max_doc_chars: int = field(default_factory=lambda: int(os.getenv("HYBRID_SPARSE_MAX_CHARS", "20000")))
+
+    # 稀疏索引与集合行数的核对间隔（秒），发现其他进程写入时后台重建；0 表示不核对
+    sparse_refresh_seconds: float = field(default_factory=lambda: float(os.getenv("HYBRID_SPARSE_REFRESH_SECONDS", "300")))
+
+
+@dataclass
+class SchedulerConfig:
+    """研究任务调度配置（并发限制与公平排队）"""
+    # 全局最大并发研究任务数
+    max_concurrent: int = field(default_factory=lambda: int(os.getenv("RESEARCH_MAX_CONCURRENT", "4")))
+
+    # 单用户最大并发研究任务数
+    max_concurrent_per_user: int = field(default_factory=lambda: int(os.getenv("RESEARCH_MAX_CONCURRENT_PER_USER", "1")))
+
+    # 全局排队上限（超过则直接拒绝）
+    max_queue_size: int = field(default_factory=lambda: int(os.getenv("RESEARCH_MAX_QUEUE", "20")))
+
+    # 单用户排队上限
+    max_queue_per_user: int = field(default_factory=lambda: int(os.getenv("RESEARCH_MAX_QUEUE_PER_USER", "3")))
+
+    # 排队超时（秒），超时后放弃
+    queue_timeout: float = field(default_factory=lambda: float(os.getenv("RESEARCH_QUEUE_TIMEOUT", "600")))
+
+    # 运行中任务的最长占用时间（秒），超过后视为泄漏并回收槽位
+    max_run_seconds: float = field(default_factory=lambda: float(os.getenv("RESEARCH_MAX_RUN_SECONDS", "7200")))
+
+    # 排队状态推送间隔（秒）
+    queue_heartbeat: float = 5.0
+
+    # 单个任务预估耗时初始值（秒），运行后按实际耗时滑动更新
+    estimated_job_seconds: float = 180.0
+
+    # 用户权重（加权公平排队），未配置的用户权重为 1
+    user_weights: Dict[str, float] = field(default_factory=lambda: _parse_weights(os.getenv("RESEARCH_USER_WEIGHTS", "")))
+
+    # 可信反向代理（IP 或 CIDR，逗号分隔）：只有来自这些地址的请求才使用 X-Forwarded-For 识别匿名用户
+    trusted_proxies: List[str] = field(default_factory=lambda: [
+        item.strip() for item in os.getenv("RESEARCH_TRUSTED_PROXIES", "").split(",") if item.strip()
+    ])
+
 
 @dataclass
 class LLMConfig:
@@ -126,6 +395,30 @@ class LLMConfig:
     # 研究流程配置
     research: ResearchConfig = field(default_factory=ResearchConfig)
 
+    # 网络搜索配置
+    search: SearchConfig = field(default_factory=SearchConfig)
+
+    # 网页抓取配置
+    fetch: PageFetchConfig = field(default_factory=PageFetchConfig)
+
+    # 向量化服务配置
+    embedding: EmbeddingConfig = field(default_factory=EmbeddingConfig)
+
+    # 重排序配置
+    rerank: RerankConfig = field(default_factory=RerankConfig)
+
+    # Milvus 配置
+    milvus: MilvusConfig = field(default_factory=MilvusConfig)
+
+    # 知识库向量存储后端配置
+    vector_store: VectorStoreConfig = field(default_factory=VectorStoreConfig)
+
+    # 混合检索配置
+    hybrid: HybridSearchConfig = field(default_factory=HybridSearchConfig)
+
+    # 任务调度配置
+    scheduler: SchedulerConfig = field(default_factory=SchedulerConfig)
+
     def get_agent_config(self, agent_name: str) -> AgentModelConfig:
         """获取指定 Agent 的配置"""
         agent_configs = {
@@ -159,6 +452,20 @@ class LLMConfig:
                 "max_charts": self.research.max_charts,
                 "enable_code_execution": self.research.enable_code_execution,
                 "quality_threshold": self.research.quality_threshold,
+            },
+            "search": {
+                "provider": self.search.provider,
+                "bocha_api_url": self.search.bocha_api_url,
+                "timeout": self.search.timeout,
+                "rate_limit": self.search.rate_limit,
+                "rate_burst": self.search.rate_burst,
+            },
+            "scheduler": {
+                "max_concurrent": self.scheduler.max_concurrent,
+                "max_concurrent_per_user": self.scheduler.max_concurrent_per_user,
+                "max_queue_size": self.scheduler.max_queue_size,
+                "max_queue_per_user": self.scheduler.max_queue_per_user,
+                "queue_timeout": self.scheduler.queue_timeout,
             }
         }
 
@@ -19,11 +19,26 @@ redis_pool = redis.ConnectionPool(
 )
 
 
+# 二进制值连接池（不解码响应，用于向量等紧凑二进制数据）
+binary_redis_pool = redis.ConnectionPool(
+    host=REDIS_HOST,
+    port=REDIS_PORT,
+    password=REDIS_PASSWORD,
+    decode_responses=False,
+    max_connections=20
+)
+
+
 def get_redis_client() -> redis.Redis:
     """获取 Redis 客户端"""
     return redis.Redis(connection_pool=redis_pool)
 
 
+def get_binary_redis_client() -> redis.Redis:
+    """获取二进制 Redis 客户端（get 返回 bytes）"""
+    return redis.Redis(connection_pool=binary_redis_pool)
+
+
 class RedisCache:
     """Redis 缓存工具类"""
 
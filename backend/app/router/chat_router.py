@@ -100,7 +100,7 @@ async def chat_completion(
 
             # 合并文档并重排
             all_docs = knowledge_docs + web_docs
-            reranked_docs = chat_service.rerank_documents(
+            reranked_docs = await chat_service.arerank_documents(
                 question=request.question,
                 documents=all_docs
             )
@@ -182,7 +182,7 @@ async def chat_completion_v2(
 
             # 合并文档并重排
             all_docs = policy_docs + web_docs
-            reranked_docs = chat_service.rerank_documents(
+            reranked_docs = await chat_service.arerank_documents(
                 question=request.question,
                 documents=all_docs
             )
@@ -276,7 +276,7 @@ async def chat_completion_with_attachments(
 
             # 合并文档并重排
             all_docs = policy_docs + web_docs
-            reranked_docs = chat_service.rerank_documents(
+            reranked_docs = await chat_service.arerank_documents(
                 question=request.question,
                 documents=all_docs
             )
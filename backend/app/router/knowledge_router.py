@@ -415,7 +415,7 @@ async def get_document_chunks(
     db: Session = Depends(get_db),
 ):
     """获取文档的所有切片"""
-    from service.milvus_service import get_milvus_service
+    from service.vector_store import get_vector_store
 
     try:
         kb_uuid = UUID(kb_id)
@@ -456,16 +456,15 @@ async def get_document_chunks(
             detail="文档尚未处理完成"
         )
 
-    # 从 Milvus 获取切片
+    # 从向量存储获取切片
     collection_name = f"kb_{kb.name}".lower().replace(" ", "_")
     print(f"[get_document_chunks] 查询切片: collection={collection_name}, filename={doc.filename}")
 
     try:
-        milvus = get_milvus_service()
-        chunks = milvus.get_chunks_by_filename(collection_name, doc.filename)
+        chunks = get_vector_store().get_chunks_by_filename(collection_name, doc.filename)
         print(f"[get_document_chunks] 找到 {len(chunks)} 个切片")
     except Exception as e:
-        print(f"[get_document_chunks] Milvus 查询失败: {e}")
+        print(f"[get_document_chunks] 向量存储查询失败: {e}")
         # 返回空结果而不是报错
         chunks = []
 
@@ -1,17 +1,29 @@
 
-from typing import Dict, Any, Optional, Literal
-from fastapi import APIRouter, Depends, HTTPException, Query
-from fastapi.responses import StreamingResponse
+from typing import Dict, Any, List, Optional, Literal
+import uuid
+import weakref
+import ipaddress
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from fastapi.responses import StreamingResponse, Response
 from pydantic import BaseModel
-from starlette.status import HTTP_200_OK, HTTP_400_BAD_REQUEST, HTTP_500_INTERNAL_SERVER_ERROR
+from starlette.status import HTTP_200_OK, HTTP_400_BAD_REQUEST, HTTP_429_TOO_MANY_REQUESTS, HTTP_500_INTERNAL_SERVER_ERROR
 import logging
 
 from service import ResearchService, ServiceConfig
 from service.dr_g import serialize_event  # 导入序列化函数
 from core.redis_client import cache  # 导入 Redis 缓存
+from router.auth_router import get_current_user
+from models.user import User
+from service.research_scheduler import get_research_scheduler, SchedulerRejected
+from config.llm_config import get_config
+from service.search_cache import get_search_cache
+from service.search_provider import get_search_provider
+from service.embedding_service import get_embedding_stats
+from service.reranker import get_reranker
 
 # V2 导入
 from service.deep_research_v2.service import DeepResearchV2Service
+from service.deep_research_v2.event_encoder import get_asset_store, negotiate_encoding, compress_stream
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger("ResearchRouter")
@@ -33,6 +45,7 @@ class ResearchRequest(BaseModel):
     search_local: Optional[bool] = None  # 是否搜索本地知识库 (兼容旧版)
     search_modes: Optional[list] = None  # 搜索模式: ['web', 'local'] (新版)
     version: Optional[Literal["v1", "v2"]] = "v2"  # 版本选择 (v2: 多智能体架构，推荐)
+    compact: Optional[bool] = False  # 紧凑事件编码 (仅 v2: 合并、增量、图片外置、按 Accept-Encoding 压缩)
 
     class Config:
         json_schema_extra = {
@@ -75,10 +88,101 @@ def get_research_service_v2():
     # 直接创建服务，配置从 llm_config.py 读取
     return DeepResearchV2Service()
 
+
+def _is_trusted_proxy(host: str, proxies: List[str]) -> bool:
+    try:
+        address = ipaddress.ip_address(host)
+    except ValueError:
+        return False
+    for proxy in proxies:
+        try:
+            if address in ipaddress.ip_network(proxy, strict=False):
+                return True
+        except ValueError:
+            continue
+    return False
+
+
+def get_scheduler_user_key(http_request: Request, current_user: Optional[User]) -> str:
+    """
+    调度用的用户标识：登录用户使用用户名，匿名用户使用客户端 IP
+
+    X-Forwarded-For 可由客户端任意伪造，只在连接来自 RESEARCH_TRUSTED_PROXIES 时采用：
+    从右向左跳过可信代理，取第一个不可信的地址
+    """
+    if current_user is not None:
+        return current_user.username
+    host = http_request.client.host if http_request.client else "unknown"
+    proxies = get_config().scheduler.trusted_proxies
+    forwarded = http_request.headers.get("x-forwarded-for")
+    if forwarded and proxies and _is_trusted_proxy(host, proxies):
+        hops = [hop.strip() for hop in forwarded.split(",") if hop.strip()]
+        for hop in reversed(hops):
+            host = hop
+            if not _is_trusted_proxy(hop, proxies):
+                break
+    return f"ip:{host}"
+
+
+def admit_research(user_key: str, session_id: Optional[str]):
+    """申请研究任务执行槽位，排队已满时返回 429"""
+    try:
+        return get_research_scheduler().admit(user_key, session_id=session_id)
+    except SchedulerRejected as e:
+        logger.warning(f"Research rejected for {user_key}: {e.reason}")
+        raise HTTPException(
+            status_code=HTTP_429_TOO_MANY_REQUESTS,
+            detail=e.reason,
+            headers={"Retry-After": str(e.retry_after)}
+        )
+
+
+def v2_stream_response(http_request: Request, frames, compact: bool) -> StreamingResponse:
+    """构造 V2 SSE 响应，紧凑模式下按 Accept-Encoding 压缩"""
+    headers = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    encoding = negotiate_encoding(http_request.headers.get("accept-encoding")) if compact else None
+    if encoding:
+        headers["Content-Encoding"] = encoding
+        headers["Vary"] = "Accept-Encoding"
+    return StreamingResponse(
+        compress_stream(frames, encoding),
+        media_type="text/event-stream",
+        headers=headers
+    )
+
+
+def run_scheduled(ticket, events):
+    """
+    排队等待槽位后执行研究的响应流，结束时释放槽位
+
+    凭证在返回响应前已申请；客户端在响应体开始迭代前断开时生成器不会进入 finally，
+    由生成器被回收时的回调释放槽位（release 可重复调用）。
+    """
+    stream = _run_scheduled(ticket, events)
+    weakref.finalize(stream, get_research_scheduler().release, ticket)
+    return stream
+
+
+async def _run_scheduled(ticket, events):
+    scheduler = get_research_scheduler()
+    try:
+        async for status in scheduler.wait_for_slot(ticket):
+            yield f"data: {serialize_event(status)}\n\n"
+        async for event in events:
+            yield event
+    except SchedulerRejected as e:
+        error_event = serialize_event({"type": "error", "content": e.reason, "retry_after": e.retry_after})
+        yield f"data: {error_event}\n\n"
+        yield "data: [DONE]\n\n"
+    finally:
+        scheduler.release(ticket)
+
 @router.post("/stream", status_code=HTTP_200_OK)
 async def stream_research(
     request: ResearchRequest,
-    services: Dict[str, Any] = Depends(get_research_service)
+    http_request: Request,
+    services: Dict[str, Any] = Depends(get_research_service),
+    current_user: Optional[User] = Depends(get_current_user)
 ):
     """
     深度研究接口 - 流式输出
@@ -101,16 +205,20 @@ async def stream_research(
         search_web = request.get_search_web()
         search_local = request.get_search_local()
         logger.info(f"Using DeepResearch V2 for query: {request.query[:50]}... (session_id: {request.session_id}, search_web={search_web}, search_local={search_local})")
+        session_id = request.session_id or str(uuid.uuid4())
+        # 先创建服务再申请槽位，创建失败时不会占用槽位
         service_v2 = get_research_service_v2()
+        ticket = admit_research(get_scheduler_user_key(http_request, current_user), session_id)
 
         async def generate_sse_v2():
             try:
                 async for event in service_v2.research(
                     query=request.query,
-                    session_id=request.session_id,
+                    session_id=session_id,
                     kb_name=request.kb_name,
                     search_web=search_web,
-                    search_local=search_local
+                    search_local=search_local,
+                    compact=bool(request.compact)
                 ):
                     yield event
             except Exception as e:
@@ -118,10 +226,7 @@ async def stream_research(
                 error_event = serialize_event({"type": "error", "content": str(e)})
                 yield f"data: {error_event}\n\n"
 
-        return StreamingResponse(
-            generate_sse_v2(),
-            media_type="text/event-stream"
-        )
+        return v2_stream_response(http_request, run_scheduled(ticket, generate_sse_v2()), bool(request.compact))
 
     # V1 原有逻辑
     research_service = services["research_service"]
@@ -149,13 +254,16 @@ async def stream_research(
 
 @router.get("/stream", status_code=HTTP_200_OK)
 async def stream_research_get(
+    http_request: Request,
     query: str = Query(..., description="研究问题", example="中国安责险的市场现状和未来发展趋势是什么？"),
     max_iterations: int = Query(3, description="最大迭代次数", ge=1, le=5),
     kb_name: Optional[str] = Query(None, description="本地知识库名称"),
     search_web: bool = Query(True, description="是否搜索网络"),
     search_local: bool = Query(True, description="是否搜索本地知识库"),
     version: str = Query("v1", description="版本: v1 或 v2"),
-    services: Dict[str, Any] = Depends(get_research_service)
+    compact: bool = Query(False, description="紧凑事件编码（仅 v2）"),
+    services: Dict[str, Any] = Depends(get_research_service),
+    current_user: Optional[User] = Depends(get_current_user)
 ):
     """
     深度研究接口 - GET方式流式输出
@@ -178,13 +286,18 @@ async def stream_research_get(
     # 根据版本选择服务
     if version == "v2":
         logger.info(f"Using DeepResearch V2 (GET) for query: {query[:50]}...")
+        session_id = str(uuid.uuid4())
+        # 先创建服务再申请槽位，创建失败时不会占用槽位
         service_v2 = get_research_service_v2()
+        ticket = admit_research(get_scheduler_user_key(http_request, current_user), session_id)
 
         async def generate_sse_v2():
             try:
                 async for event in service_v2.research(
                     query=query,
-                    kb_name=kb_name
+                    session_id=session_id,
+                    kb_name=kb_name,
+                    compact=compact
                 ):
                     yield event
             except Exception as e:
@@ -192,10 +305,7 @@ async def stream_research_get(
                 error_event = serialize_event({"type": "error", "content": str(e)})
                 yield f"data: {error_event}\n\n"
 
-        return StreamingResponse(
-            generate_sse_v2(),
-            media_type="text/event-stream"
-        )
+        return v2_stream_response(http_request, run_scheduled(ticket, generate_sse_v2()), compact)
 
     # V1 原有逻辑
     research_service = services["research_service"]
@@ -323,6 +433,8 @@ async def cancel_research(session_id: str):
         # 设置取消标志到 Redis，有效期 5 分钟
         cancel_key = f"{CANCEL_KEY_PREFIX}{session_id}"
         cache.set(cancel_key, {"cancelled": True}, expire=300)
+        # 若任务仍在排队，直接移出队列
+        get_research_scheduler().cancel_session(session_id)
         logger.info(f"Research cancelled for session: {session_id}")
         return {"success": True, "message": "Research cancellation requested"}
     except Exception as e:
@@ -356,6 +468,65 @@ def clear_cancel_flag(session_id: str):
     cache.delete(cancel_key)
 
 
+@router.get("/assets/{asset_id}", status_code=HTTP_200_OK)
+async def get_research_asset(asset_id: str):
+    """
+    获取紧凑模式下外置的二进制资源（如图表图片）
+
+    Args:
+        asset_id: 资源ID（内容哈希）
+
+    Returns:
+        资源内容
+    """
+    asset = get_asset_store().get(asset_id)
+    if asset is None:
+        raise HTTPException(status_code=404, detail="Asset not found or expired")
+    data, mime = asset
+    return Response(
+        content=data,
+        media_type=mime,
+        headers={"Cache-Control": "public, max-age=3600, immutable"}
+    )
+
+
+@router.get("/scheduler/stats", status_code=HTTP_200_OK)
+async def get_scheduler_stats():
+    """
+    获取研究任务调度指标
+
+    Returns:
+        运行中/排队中任务数、等待时长分位数、各用户占用情况等
+    """
+    return {"success": True, "stats": get_research_scheduler().get_stats()}
+
+
+@router.get("/cache/stats", status_code=HTTP_200_OK)
+async def get_search_cache_stats():
+    """
+    获取搜索缓存与搜索提供方指标
+
+    Returns:
+        本地/Redis 命中数、未命中数、返回旧结果次数、命中率，以及提供方请求统计
+    """
+    return {
+        "success": True,
+        "cache": get_search_cache().get_stats(),
+        "provider": get_search_provider().get_stats()
+    }
+
+
+@router.get("/embedding/stats", status_code=HTTP_200_OK)
+async def get_embedding_cache_stats():
+    """
+    获取向量化服务、向量缓存与重排序指标
+
+    Returns:
+        批次数、平均批大小、失败数，向量缓存各级命中数与命中率，重排序的缓存命中、超时与本地打分次数
+    """
+    return {"success": True, **get_embedding_stats(), "rerank": get_reranker().get_stats()}
+
+
 # ============ 检查点 API ============
 
 @router.get("/checkpoint/{session_id}", status_code=HTTP_200_OK)
@@ -458,7 +629,11 @@ async def delete_checkpoint(session_id: str):
 
 
 @router.post("/resume/{session_id}", status_code=HTTP_200_OK)
-async def resume_research(session_id: str):
+async def resume_research(
+    session_id: str,
+    http_request: Request,
+    current_user: Optional[User] = Depends(get_current_user)
+):
     """
     恢复研究任务（从检查点）
 
@@ -486,7 +661,9 @@ async def resume_research(session_id: str):
             )
 
         # 使用 V2 服务恢复
+        # 先创建服务再申请槽位，创建失败时不会占用槽位
         service_v2 = get_research_service_v2()
+        ticket = admit_research(get_scheduler_user_key(http_request, current_user), session_id)
 
         async def generate_sse():
             try:
@@ -502,7 +679,7 @@ async def resume_research(session_id: str):
                 yield f"data: {error_event}\n\n"
 
         return StreamingResponse(
-            generate_sse(),
+            run_scheduled(ticket, generate_sse()),
             media_type="text/event-stream"
         )
 
@@ -0,0 +1,276 @@
+"""
+DeepResearch V2.0 基准测试
+
+基于录制/回放工具（service/deep_research_v2/replay.py）离线复现一次完整研究流程，
+输出各阶段耗时、事件数量、峰值内存以及关键路径构成（LLM / 搜索 / Milvus / Embedding / 本地编排）。
+
+使用方法：
+    # 1. 录制（需要真实的 API Key，同时输出本次真实运行的基准数据）
+    python -m scripts.benchmark_deep_research_v2 record --query "新能源汽车行业分析" --fixture fixtures/ev.json.gz
+
+    # 2. 回放（无网络，外部调用耗时为 0，测量纯编排开销）
+    python -m scripts.benchmark_deep_research_v2 replay --fixture fixtures/ev.json.gz --runs 3
+
+    # 3. 回放并注入延迟（模拟上游耗时，评估并发优化效果）
+    python -m scripts.benchmark_deep_research_v2 replay --fixture fixtures/ev.json.gz \
+        --latency "llm=recorded;search=uniform:200,800;milvus=fixed:20" --seed 42 --json report.json
+"""
+
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+import logging
+import statistics
+import tracemalloc
+import uuid
+from collections import Counter
+from typing import Dict, Any, List, Optional
+
+# 确保能导入项目模块
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+logger = logging.getLogger("Benchmark")
+
+
+class RunTracker:
+    """记录一次运行中的事件与阶段边界"""
+
+    def __init__(self, session):
+        self.session = session
+        self.event_counts: Counter = Counter()
+        self.event_bytes = 0
+        self.phases: List[Dict[str, Any]] = []
+        self.first_event_at: Optional[float] = None
+        self.errors: List[str] = []
+
+    def on_event(self, event: Dict[str, Any]) -> None:
+        now = self.session.now()
+        if self.first_event_at is None:
+            self.first_event_at = now
+
+        event_type = event.get("type", "unknown")
+        self.event_counts[event_type] += 1
+        self.event_bytes += len(json.dumps(event, ensure_ascii=False, default=str))
+
+        if event_type == "phase":
+            if self.phases:
+                self.phases[-1]["end"] = now
+            self.phases.append({"phase": event.get("phase", ""), "start": now, "end": None})
+        elif event_type == "error":
+            self.errors.append(str(event.get("content", "")))
+
+    def close(self, end: float) -> None:
+        if self.phases and self.phases[-1]["end"] is None:
+            self.phases[-1]["end"] = end
+
+
+async def _run_pipeline(meta: Dict[str, Any], tracker: RunTracker, offline: bool) -> None:
+    from service.deep_research_v2.graph import DeepResearchGraph
+
+    if offline:
+        # 回放时不依赖真实密钥，只需满足客户端构造
+        graph = DeepResearchGraph(
+            llm_api_key="replay", llm_base_url="http://replay.invalid/v1",
+            search_api_key="replay", max_iterations=meta.get("max_iterations")
+        )
+    else:
+        graph = DeepResearchGraph(max_iterations=meta.get("max_iterations"))
+    graph.checkpoint_service = None
+
+    async for event in graph.run(
+        meta["query"],
+        meta.get("session_id") or f"bench_{uuid.uuid4().hex[:8]}",
+        search_web=meta.get("search_web", True),
+        search_local=meta.get("search_local", False)
+    ):
+        tracker.on_event(event)
+
+
+def _run_once(session, meta: Dict[str, Any], offline: bool) -> Dict[str, Any]:
+    from service.deep_research_v2.replay import critical_path_breakdown
+
+    tracker = RunTracker(session)
+    tracemalloc.start()
+    with session:
+        start = session.now()
+        asyncio.run(_run_pipeline(meta, tracker, offline))
+        end = session.now()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    tracker.close(end)
+
+    phases = []
+    for p in tracker.phases:
+        phases.append({
+            "phase": p["phase"],
+            "wall_ms": round((p["end"] - p["start"]) * 1000, 1),
+            "critical_path_ms": critical_path_breakdown(session.spans, p["start"], p["end"]),
+        })
+
+    return {
+        "wall_ms": round((end - start) * 1000, 1),
+        "time_to_first_event_ms": round(((tracker.first_event_at or end) - start) * 1000, 1),
+        "peak_memory_mb": round(peak / 1024 / 1024, 2),
+        "events_total": sum(tracker.event_counts.values()),
+        "event_bytes": tracker.event_bytes,
+        "event_counts": dict(tracker.event_counts.most_common()),
+        "phases": phases,
+        "critical_path_ms": critical_path_breakdown(session.spans, start, end),
+        "calls": session.summary(),
+        "errors": tracker.errors,
+    }
+
+
+def _aggregate(runs: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """多次运行取中位数"""
+    walls = [r["wall_ms"] for r in runs]
+    phase_walls: Dict[str, List[float]] = {}
+    for r in runs:
+        for p in r["phases"]:
+            phase_walls.setdefault(p["phase"], []).append(p["wall_ms"])
+    return {
+        "runs": len(runs),
+        "wall_ms_median": round(statistics.median(walls), 1),
+        "wall_ms_min": min(walls),
+        "wall_ms_max": max(walls),
+        "peak_memory_mb_max": max(r["peak_memory_mb"] for r in runs),
+        "phase_wall_ms_median": {
+            phase: round(statistics.median(values), 1) for phase, values in phase_walls.items()
+        },
+    }
+
+
+def _print_report(run: Dict[str, Any], title: str) -> None:
+    print("\n" + "=" * 60)
+    print(title)
+    print("=" * 60)
+    print(f"总耗时: {run['wall_ms']:.1f} ms   首事件: {run['time_to_first_event_ms']:.1f} ms   "
+          f"峰值内存: {run['peak_memory_mb']:.2f} MB")
+    print(f"事件数: {run['events_total']}   事件字节: {run['event_bytes']}")
+
+    print("\n[阶段耗时]")
+    for p in run["phases"]:
+        path = ", ".join(f"{k}={v:.0f}" for k, v in p["critical_path_ms"].items())
+        print(f"  {p['phase']:<16} {p['wall_ms']:>10.1f} ms   ({path})")
+
+    print("\n[关键路径构成]")
+    total = run["wall_ms"] or 1.0
+    for kind, ms in sorted(run["critical_path_ms"].items(), key=lambda x: -x[1]):
+        print(f"  {kind:<16} {ms:>10.1f} ms  {ms / total * 100:5.1f}%")
+
+    print("\n[外部调用]")
+    for kind, s in run["calls"].items():
+        print(f"  {kind:<16} count={s['count']:<5} misses={s['misses']:<4} "
+              f"errors={s['errors']:<4} avg={s['avg_ms']:.1f} ms")
+
+    print("\n[事件类型 Top 10]")
+    for event_type, count in list(run["event_counts"].items())[:10]:
+        print(f"  {event_type:<24} {count}")
+
+    if run["errors"]:
+        print(f"\n[错误] {len(run['errors'])} 个: {run['errors'][:3]}")
+
+
+def cmd_record(args) -> int:
+    from service.deep_research_v2.replay import ReplaySession
+
+    meta = {
+        "query": args.query,
+        "search_web": not args.no_web,
+        "search_local": args.local,
+        "max_iterations": args.max_iterations,
+    }
+    fixture_dir = os.path.dirname(os.path.abspath(args.fixture))
+    os.makedirs(fixture_dir, exist_ok=True)
+
+    session = ReplaySession.record(args.fixture, meta=meta)
+    run = _run_once(session, meta, offline=False)
+    _print_report(run, f"录制运行: {args.query}")
+    print(f"\nFixture 已保存: {args.fixture} {session.fixture.count()}")
+    return _finish(run, [run], args)
+
+
+def cmd_replay(args) -> int:
+    from service.deep_research_v2.replay import ReplaySession, LatencyModel
+
+    runs = []
+    for i in range(args.runs):
+        latency = LatencyModel.parse(args.latency, seed=args.seed + i)
+        session = ReplaySession.replay(args.fixture, latency=latency, strict=args.strict)
+        meta = dict(session.meta)
+        if args.max_iterations:
+            meta["max_iterations"] = args.max_iterations
+        run = _run_once(session, meta, offline=True)
+        runs.append(run)
+        _print_report(run, f"回放运行 {i + 1}/{args.runs}: {meta.get('query', '')}")
+
+    if len(runs) > 1:
+        summary = _aggregate(runs)
+        print("\n" + "=" * 60)
+        print(f"汇总（{summary['runs']} 次，中位数）")
+        print("=" * 60)
+        print(f"总耗时: {summary['wall_ms_median']:.1f} ms "
+              f"(min {summary['wall_ms_min']:.1f}, max {summary['wall_ms_max']:.1f})")
+        for phase, ms in summary["phase_wall_ms_median"].items():
+            print(f"  {phase:<16} {ms:>10.1f} ms")
+    return _finish(runs[-1], runs, args)
+
+
+def _finish(last: Dict[str, Any], runs: List[Dict[str, Any]], args) -> int:
+    if args.json:
+        report = {
+            "mode": args.command,
+            "latency": getattr(args, "latency", None),
+            "summary": _aggregate(runs),
+            "runs": runs,
+            "generated_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        }
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"\n报告已写入: {args.json}")
+
+    misses = sum(s["misses"] for s in last["calls"].values())
+    if args.fail_on_error and (last["errors"] or misses):
+        return 1
+    return 0
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="DeepResearch V2.0 录制/回放基准测试")
+    parser.add_argument("--log-level", default="WARNING", help="日志级别（默认 WARNING）")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    def add_common(p):
+        p.add_argument("--fixture", required=True, help="fixture 文件路径（.json 或 .json.gz）")
+        p.add_argument("--max-iterations", type=int, default=None, help="最大审核迭代次数")
+        p.add_argument("--json", default=None, help="将报告写入 JSON 文件")
+        p.add_argument("--fail-on-error", action="store_true", help="出现错误事件或回放未命中时返回非零")
+
+    p_record = sub.add_parser("record", help="真实运行并录制外部调用")
+    add_common(p_record)
+    p_record.add_argument("--query", required=True, help="研究问题")
+    p_record.add_argument("--no-web", action="store_true", help="禁用网络搜索")
+    p_record.add_argument("--local", action="store_true", help="启用本地知识库搜索")
+    p_record.set_defaults(func=cmd_record)
+
+    p_replay = sub.add_parser("replay", help="离线回放并测量")
+    add_common(p_replay)
+    p_replay.add_argument("--latency", default="", help="延迟规格，如 'llm=recorded;search=uniform:200,800'")
+    p_replay.add_argument("--seed", type=int, default=0, help="延迟采样随机种子")
+    p_replay.add_argument("--runs", type=int, default=1, help="重复运行次数")
+    p_replay.add_argument("--strict", action="store_true", help="回放未命中时直接报错")
+    p_replay.set_defaults(func=cmd_replay)
+
+    args = parser.parse_args(argv)
+    logging.basicConfig(
+        level=getattr(logging, args.log_level.upper(), logging.WARNING),
+        format='%(asctime)s [%(levelname)s] %(name)s: %(message)s'
+    )
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,171 @@
+"""
+网页正文提取基准测试
+
+对一批保存的网页（.html / .htm，或页面缓存中的 .gz 内容）分别用
+“当前线程直接提取”与“进程池提取”（service/html_extractor.py）跑一遍，
+输出吞吐量（文档/秒、每核文档/秒）与单文档耗时分位数。
+
+使用方法：
+    # 使用保存的网页目录
+    python -m scripts.benchmark_html_extraction --corpus data/pages --workers 1,2,4
+
+    # 直接使用深度阅读积累的页面缓存（PAGE_CACHE_DIR/blobs）
+    python -m scripts.benchmark_html_extraction --corpus /tmp/page_cache/blobs --limit 200 --json report.json
+"""
+
+import os
+import sys
+import gzip
+import json
+import time
+import asyncio
+import argparse
+import logging
+import statistics
+from typing import Any, Dict, List, Optional
+
+# 确保能导入项目模块
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from service.html_extractor import HtmlExtractor, extract_text
+
+logger = logging.getLogger("ExtractionBenchmark")
+
+
+def load_corpus(path: str, limit: Optional[int] = None) -> List[str]:
+    """读取目录下的 .html / .htm / .gz 文件"""
+    documents = []
+    for root, _, files in os.walk(path):
+        for name in sorted(files):
+            file_path = os.path.join(root, name)
+            try:
+                if name.endswith(".gz"):
+                    with open(file_path, "rb") as f:
+                        text = gzip.decompress(f.read()).decode("utf-8", errors="replace")
+                elif name.endswith((".html", ".htm")):
+                    with open(file_path, "r", encoding="utf-8", errors="replace") as f:
+                        text = f.read()
+                else:
+                    continue
+            except (OSError, ValueError) as e:
+                logger.warning(f"Skip {file_path}: {e}")
+                continue
+            # 页面缓存中也包含提取后的正文，只保留 HTML
+            if "<" in text[:2000]:
+                documents.append(text)
+            if limit and len(documents) >= limit:
+                return documents
+    return documents
+
+
+def _percentile(values: List[float], q: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+def _summary(mode: str, workers: int, elapsed: float, latencies: List[float], count: int) -> Dict[str, Any]:
+    throughput = count / elapsed if elapsed else 0.0
+    return {
+        "mode": mode,
+        "workers": workers,
+        "documents": count,
+        "elapsed_s": round(elapsed, 3),
+        "docs_per_s": round(throughput, 2),
+        "docs_per_s_per_core": round(throughput / max(1, workers), 2),
+        "p50_ms": round(_percentile(latencies, 0.5) * 1000, 1),
+        "p95_ms": round(_percentile(latencies, 0.95) * 1000, 1),
+        "mean_ms": round(statistics.mean(latencies) * 1000, 1) if latencies else 0.0,
+    }
+
+
+def bench_inline(documents: List[str]) -> Dict[str, Any]:
+    """基线：当前线程逐个提取（即原先在事件循环中执行的方式）"""
+    latencies = []
+    start = time.perf_counter()
+    for html in documents:
+        t0 = time.perf_counter()
+        extract_text(html)
+        latencies.append(time.perf_counter() - t0)
+    return _summary("inline", 1, time.perf_counter() - start, latencies, len(documents))
+
+
+async def bench_pool(documents: List[str], workers: int, timeout: float) -> Dict[str, Any]:
+    """进程池并发提取，同时测量事件循环的最大阻塞时间"""
+    extractor = HtmlExtractor(workers=workers, timeout=timeout)
+    # 预热进程池，不计入耗时
+    await asyncio.gather(*(extractor.extract(documents[0]) for _ in range(workers)))
+
+    latencies: List[float] = []
+    loop_lag = [0.0]
+    done = asyncio.Event()
+
+    async def probe():
+        while not done.is_set():
+            t0 = time.perf_counter()
+            await asyncio.sleep(0.01)
+            loop_lag[0] = max(loop_lag[0], time.perf_counter() - t0 - 0.01)
+
+    async def one(html: str):
+        t0 = time.perf_counter()
+        await extractor.extract(html)
+        latencies.append(time.perf_counter() - t0)
+
+    probe_task = asyncio.create_task(probe())
+    start = time.perf_counter()
+    await asyncio.gather(*(one(html) for html in documents))
+    elapsed = time.perf_counter() - start
+    done.set()
+    await probe_task
+    extractor.shutdown()
+
+    result = _summary("process_pool", workers, elapsed, latencies, len(documents))
+    result["max_loop_lag_ms"] = round(loop_lag[0] * 1000, 1)
+    result["timeouts"] = extractor.stats["timeouts"]
+    result["clipped"] = extractor.stats["clipped"]
+    return result
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="网页正文提取基准测试")
+    parser.add_argument("--corpus", required=True, help="网页目录（.html/.htm/.gz）")
+    parser.add_argument("--workers", default="1,2,4", help="进程池大小，逗号分隔（默认 1,2,4）")
+    parser.add_argument("--limit", type=int, default=None, help="最多读取的文档数")
+    parser.add_argument("--timeout", type=float, default=10.0, help="单文档超时（秒）")
+    parser.add_argument("--json", dest="json_path", default=None, help="将结果写入 JSON 文件")
+    parser.add_argument("--log-level", default="WARNING", help="日志级别（默认 WARNING）")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=args.log_level.upper(), format="%(asctime)s [%(levelname)s] %(message)s")
+
+    documents = load_corpus(args.corpus, args.limit)
+    if not documents:
+        print(f"No HTML documents found in {args.corpus}")
+        return 1
+
+    total_mb = sum(len(d) for d in documents) / 1024 / 1024
+    print(f"Corpus: {len(documents)} documents, {total_mb:.1f} MB, cpu_count={os.cpu_count()}")
+
+    results = [bench_inline(documents)]
+    for workers in [int(w) for w in args.workers.split(",") if w.strip()]:
+        results.append(asyncio.run(bench_pool(documents, workers, args.timeout)))
+
+    header = f"{'mode':<14}{'workers':>8}{'docs/s':>10}{'docs/s/core':>13}{'p50 ms':>10}{'p95 ms':>10}{'loop lag ms':>13}"
+    print(header)
+    print("-" * len(header))
+    for r in results:
+        print(
+            f"{r['mode']:<14}{r['workers']:>8}{r['docs_per_s']:>10}{r['docs_per_s_per_core']:>13}"
+            f"{r['p50_ms']:>10}{r['p95_ms']:>10}{r.get('max_loop_lag_ms', '-'):>13}"
+        )
+
+    if args.json_path:
+        with open(args.json_path, "w", encoding="utf-8") as f:
+            json.dump({"documents": len(documents), "corpus_mb": round(total_mb, 2), "results": results}, f, indent=2)
+        print(f"Report written to {args.json_path}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
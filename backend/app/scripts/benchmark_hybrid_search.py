@@ -0,0 +1,198 @@
+"""
+混合检索基准测试
+
+在真实的政策文档集合上对比纯向量、纯关键词（BM25）与混合检索（RRF / 加权融合、不同权重）：
+- 召回率 recall@k 与 MRR
+- 单次查询耗时分位数（p50 / p95）
+
+查询集：
+- --queries：JSONL，每行 {"query": "...", "relevant": ["文档ID", ...]}
+- 未指定时从集合中抽样生成已知条目查询：正文含文号（如"安监总局令第16号"）的文档以文号为查询，
+  其余以标题为查询，目标文档即为相关文档
+
+稠密检索的查询向量在计时前预热（走向量缓存），各方法的耗时只反映检索与融合本身。
+
+使用方法：
+    # 抽样 200 篇文档生成查询
+    python -m scripts.benchmark_hybrid_search --sample 200
+
+    # 使用标注查询集，比较多组权重（稠密:稀疏）
+    python -m scripts.benchmark_hybrid_search --queries data/policy_queries.jsonl --weights 1:1,1:2,2:1 --json report.json
+"""
+
+import os
+import re
+import sys
+import json
+import time
+import random
+import argparse
+import logging
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+# 确保能导入项目模块
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from service.embedding_service import generate_embedding
+from service.policy_search_service import PolicySearchService
+
+logger = logging.getLogger("HybridSearchBenchmark")
+
+# 文号：安监总局令第16号、国办发〔2023〕12号、财税[2019]13号
+_DOC_NUMBER_PATTERN = re.compile(
+    r"[一-鿿]{2,12}令第[0-9一二三四五六七八九十百]+号"
+    r"|[一-鿿]{2,12}[〔\[［(（]\d{4}[〕\]］)）]\d+号"
+)
+
+
+def load_queries(path: str) -> List[Dict[str, Any]]:
+    queries = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            item = json.loads(line)
+            if item.get("query") and item.get("relevant"):
+                queries.append({"query": item["query"], "relevant": [str(r) for r in item["relevant"]], "type": item.get("type", "labeled")})
+    return queries
+
+
+def sample_queries(service: PolicySearchService, size: int, seed: int) -> List[Dict[str, Any]]:
+    """从稀疏索引中抽样文档，生成已知条目查询"""
+    ids = service.sparse_index.ids()
+    rng = random.Random(seed)
+    rng.shuffle(ids)
+    queries = []
+    for doc_id in ids:
+        row = service.sparse_index.get_row(doc_id) or {}
+        match = _DOC_NUMBER_PATTERN.search(f"{row.get('title', '')} {row.get('content', '')[:2000]}")
+        if match:
+            queries.append({"query": match.group(0), "relevant": [doc_id], "type": "doc_number"})
+        elif row.get("title"):
+            queries.append({"query": row["title"], "relevant": [doc_id], "type": "title"})
+        if len(queries) >= size:
+            break
+    return queries
+
+
+def percentile(values: List[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def evaluate(
+    name: str,
+    run: Callable[[str, int], Dict[str, Any]],
+    queries: List[Dict[str, Any]],
+    ks: List[int]
+) -> Dict[str, Any]:
+    """对一种检索方式计算 recall@k、MRR 与耗时分位数"""
+    max_k = max(ks)
+    recalls = {k: 0.0 for k in ks}
+    reciprocal_ranks = 0.0
+    latencies = []
+    failures = 0
+    by_type: Dict[str, List[float]] = {}
+
+    for item in queries:
+        start = time.perf_counter()
+        response = run(item["query"], max_k)
+        latencies.append((time.perf_counter() - start) * 1000)
+        if not response.get("success"):
+            failures += 1
+            continue
+        ranked = [str(r.get("id")) for r in response.get("results", [])]
+        relevant = set(item["relevant"])
+        for k in ks:
+            recalls[k] += len(relevant & set(ranked[:k])) / len(relevant)
+        rank = next((i for i, doc_id in enumerate(ranked, start=1) if doc_id in relevant), None)
+        reciprocal_ranks += 1 / rank if rank else 0.0
+        by_type.setdefault(item["type"], []).append(1.0 if rank and rank <= max_k else 0.0)
+
+    n = len(queries) or 1
+    return {
+        "method": name,
+        **{f"recall@{k}": round(recalls[k] / n, 3) for k in ks},
+        f"mrr@{max_k}": round(reciprocal_ranks / n, 3),
+        "p50_ms": round(percentile(latencies, 50), 1),
+        "p95_ms": round(percentile(latencies, 95), 1),
+        "failures": failures,
+        "hit_rate_by_type": {t: round(sum(v) / len(v), 3) for t, v in by_type.items()},
+    }
+
+
+def parse_weights(spec: str) -> List[Tuple[float, float]]:
+    pairs = []
+    for part in spec.split(","):
+        dense, sparse = part.split(":")
+        pairs.append((float(dense), float(sparse)))
+    return pairs
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="混合检索基准测试")
+    parser.add_argument("--collection", default="policy_documents", help="集合名称")
+    parser.add_argument("--queries", default=None, help="标注查询集（JSONL：query / relevant）")
+    parser.add_argument("--sample", type=int, default=200, help="未指定查询集时抽样生成的查询数")
+    parser.add_argument("--seed", type=int, default=42, help="抽样随机种子")
+    parser.add_argument("--k", default="1,3,10", help="recall@k 的 k 值（逗号分隔）")
+    parser.add_argument("--fusion", default="rrf,weighted", help="融合方式（逗号分隔）")
+    parser.add_argument("--weights", default="1:1", help="混合检索权重 稠密:稀疏（逗号分隔多组）")
+    parser.add_argument("--json", default=None, help="结果写入 JSON 文件")
+    parser.add_argument("--log-level", default="WARNING", help="日志级别（默认 WARNING）")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=args.log_level.upper(), format="%(asctime)s [%(levelname)s] %(message)s")
+
+    service = PolicySearchService(collection_name=args.collection)
+    print(f"Building sparse index for {args.collection}...")
+    if not service.build_sparse_index(wait=True):
+        print(f"Sparse index unavailable: {service.sparse_index.state}")
+        return 1
+    print(json.dumps(service.sparse_index.get_stats(), ensure_ascii=False))
+
+    queries = load_queries(args.queries) if args.queries else sample_queries(service, args.sample, args.seed)
+    if not queries:
+        print("No queries to evaluate")
+        return 1
+    ks = sorted({int(k) for k in args.k.split(",")})
+    print(f"Evaluating {len(queries)} queries")
+
+    # 预热查询向量缓存
+    for i in range(0, len(queries), 50):
+        generate_embedding([item["query"] for item in queries[i:i + 50]])
+
+    runs: List[Tuple[str, Callable[[str, int], Dict[str, Any]]]] = [
+        ("vector", service.vector_search),
+        ("keyword", service.keyword_search),
+    ]
+    for fusion in [f.strip() for f in args.fusion.split(",") if f.strip()]:
+        for dense_weight, sparse_weight in parse_weights(args.weights):
+            runs.append((
+                f"hybrid-{fusion} {dense_weight:g}:{sparse_weight:g}",
+                lambda q, n, f=fusion, dw=dense_weight, sw=sparse_weight: service.hybrid_search(
+                    q, n, fusion=f, dense_weight=dw, sparse_weight=sw
+                )
+            ))
+
+    report = [evaluate(name, run, queries, ks) for name, run in runs]
+
+    headers = ["method", *[f"recall@{k}" for k in ks], f"mrr@{max(ks)}", "p50_ms", "p95_ms", "failures"]
+    widths = [max(len(h), *(len(str(row[h])) for row in report)) for h in headers]
+    print("  ".join(h.ljust(w) for h, w in zip(headers, widths)))
+    for row in report:
+        print("  ".join(str(row[h]).ljust(w) for h, w in zip(headers, widths)))
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"collection": args.collection, "queries": len(queries), "results": report}, f, ensure_ascii=False, indent=2)
+        print(f"Report written to {args.json}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,104 @@
+"""
+政策文档批量导入
+
+读取 JSONL 语料（每行一个文档：title / website / entry_url / detail_url / date / content，可选 id 与 vector），
+经 service/milvus_bulk_writer.py 分批向量化、分批 upsert，导入结束时只 flush 一次：
+- 缺少 id 时按 detail_url（或 title + content）生成稳定的 MD5，按主键 upsert，重复导入不会产生重复行
+- 已有 vector 字段的行不再调用向量化接口
+- 定期打印进度与 rows/sec
+
+使用方法：
+    # 导入政策语料
+    python -m scripts.load_policy_corpus --file data/policies.jsonl
+
+    # 导入到其他集合，每批 2000 行，每 60 秒 flush 一次
+    python -m scripts.load_policy_corpus --file data/policies.jsonl --collection policy_documents_v2 \\
+        --batch-rows 2000 --flush-interval 60
+"""
+
+import os
+import sys
+import json
+import time
+import hashlib
+import argparse
+import logging
+from typing import Any, Dict, Iterator, List, Optional
+
+# 确保能导入项目模块
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from service.policy_search_service import PolicySearchService
+
+logger = logging.getLogger("PolicyCorpusLoader")
+
+
+def document_id(doc: Dict[str, Any]) -> str:
+    """稳定的文档 ID（重复导入同一文档时主键不变，upsert 覆盖旧行）"""
+    key = doc.get("detail_url") or f"{doc.get('title', '')}\n{doc.get('content', '')}"
+    return hashlib.md5(key.encode("utf-8")).hexdigest()
+
+
+def read_corpus(path: str, limit: Optional[int] = None) -> Iterator[Dict[str, Any]]:
+    """逐行读取 JSONL，跳过无法解析或没有正文的行"""
+    count = 0
+    with open(path, "r", encoding="utf-8") as f:
+        for line_no, line in enumerate(f, start=1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                doc = json.loads(line)
+            except ValueError:
+                logger.warning(f"Skipping malformed line {line_no}")
+                continue
+            if not isinstance(doc, dict) or not doc.get("content"):
+                continue
+            doc = {key: value if key == "vector" else str(value) for key, value in doc.items() if value is not None}
+            doc.setdefault("id", document_id(doc))
+            yield doc
+            count += 1
+            if limit and count >= limit:
+                return
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="政策文档批量导入 Milvus")
+    parser.add_argument("--file", required=True, help="JSONL 语料文件")
+    parser.add_argument("--collection", default="policy_documents", help="集合名称")
+    parser.add_argument("--limit", type=int, default=None, help="最多导入的文档数")
+    parser.add_argument("--batch-rows", type=int, default=None, help="单次 insert 最大行数（默认 MILVUS_BULK_INSERT_ROWS）")
+    parser.add_argument("--embed-batch", type=int, default=None, help="每次向量化的文档数（默认 MILVUS_BULK_EMBED_BATCH）")
+    parser.add_argument("--flush-interval", type=float, default=None, help="定时 flush 间隔（秒，默认只在结束时 flush）")
+    parser.add_argument("--progress", type=int, default=1000, help="每导入多少条打印一次进度")
+    parser.add_argument("--log-level", default="WARNING", help="日志级别（默认 WARNING）")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=args.log_level.upper(), format="%(asctime)s [%(levelname)s] %(message)s")
+
+    service = PolicySearchService(collection_name=args.collection)
+    writer = service.bulk_writer(
+        max_rows=args.batch_rows,
+        embed_batch=args.embed_batch,
+        flush_interval=args.flush_interval
+    )
+
+    start = time.perf_counter()
+    read = 0
+    with writer:
+        for doc in read_corpus(args.file, args.limit):
+            writer.add(service.policy_row(doc))
+            read += 1
+            if read % args.progress == 0:
+                stats = writer.get_stats()
+                print(f"Read {read}, inserted {stats['rows']}, failed {stats['failed']}, {stats['rows_per_sec']} rows/sec")
+
+    stats = writer.get_stats()
+    print(f"Loaded {stats['rows']} of {read} documents into {args.collection} "
+          f"in {time.perf_counter() - start:.1f}s ({stats['rows_per_sec']} rows/sec)")
+    print(json.dumps(stats, indent=2))
+    return 0 if not stats["failed"] else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
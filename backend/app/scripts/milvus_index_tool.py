@@ -0,0 +1,452 @@
+"""
+Milvus 索引工具
+
+子命令：
+- show：列出集合的行数、当前索引与 auto 推荐的 profile
+- benchmark：离线评估各 profile 在真实数据上的召回率与延迟
+  从集合中抽取向量写入临时集合（_idxbench_<profile>），按 profile 建索引后逐条检索，
+  与 numpy 暴力检索的结果对比得到 recall@k，并统计 p50 / p99 延迟与建索引耗时；
+  --ef / --nprobe 可扫描检索参数，结束后删除临时集合（--keep 保留）
+- reindex：按 profile 重建集合索引
+  swap（默认）：新建同结构集合并建好索引、复制数据、加载后通过两次 rename 换入，旧集合改名保留
+  （--drop-old 删除）。inplace：release -> drop_index -> create_index -> load，
+  期间该集合不可检索
+- migrate-partition-key：将已有集合迁移为分区键布局（knowledge_base 按 kb_id、long_term_memories 按 user_id），
+  按原结构新建集合并将 --field 声明为分区键，复制数据、沿用原索引（或 --profile 指定）后同样以 rename 换入
+
+swap 与 migrate-partition-key 不会阻止其他进程写入：复制前后各 flush 并以 count(*) 统计一次源集合，
+期间有写入或删除时放弃换入（保留临时集合）；最后一次统计到 rename 之间的写入仍会丢失，
+因此执行前请停止导入任务与后端写入（上传文档、load_policy_corpus 等）。
+
+使用方法：
+    python -m scripts.milvus_index_tool show
+    python -m scripts.milvus_index_tool benchmark --collection knowledge_base --profiles flat,hnsw,ivf_sq8,ivf_pq --ef 32,64,128
+    python -m scripts.milvus_index_tool benchmark --collection knowledge_base --query-file data/queries.txt --k 10
+    python -m scripts.milvus_index_tool reindex --collection knowledge_base --profile auto --yes
+    python -m scripts.milvus_index_tool migrate-partition-key --collection knowledge_base --field kb_id --yes
+    python -m scripts.milvus_index_tool migrate-partition-key --collection long_term_memories --field user_id --yes
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import logging
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+# 确保能导入项目模块
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from pymilvus import Collection, CollectionSchema, DataType, FieldSchema, utility
+
+from config.llm_config import get_config
+from service.milvus_service import get_milvus_service
+from service.milvus_index import (
+    INDEX_PROFILES,
+    METRIC_TYPE,
+    IndexProfile,
+    auto_profile_name,
+    describe_index,
+    resolve_profile,
+    search_params_for_index,
+)
+from service.milvus_partition import partition_key_field
+
+logger = logging.getLogger("MilvusIndexTool")
+
+BENCH_PREFIX = "_idxbench_"
+
+
+def percentile(values: List[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def wait_for_index(collection: Collection) -> float:
+    start = time.perf_counter()
+    utility.wait_for_index_building_complete(collection.name, index_name="")
+    return time.perf_counter() - start
+
+
+# ---------- show ----------
+
+def cmd_show(args) -> int:
+    names = [args.collection] if args.collection else sorted(
+        n for n in utility.list_collections() if not n.startswith(BENCH_PREFIX)
+    )
+    rows = []
+    for name in names:
+        collection = Collection(name)
+        index_type, build_params = describe_index(collection)
+        rows.append({
+            "collection": name,
+            "rows": collection.num_entities,
+            "index": index_type or "-",
+            "params": json.dumps(build_params, ensure_ascii=False),
+            "configured": resolve_profile(name, collection.num_entities).name,
+            "auto": auto_profile_name(collection.num_entities),
+            "partition_key": partition_key_field(collection) or "-",
+        })
+    headers = ["collection", "rows", "index", "params", "configured", "auto", "partition_key"]
+    widths = [max(len(h), *(len(str(row[h])) for row in rows)) if rows else len(h) for h in headers]
+    print("  ".join(h.ljust(w) for h, w in zip(headers, widths)))
+    for row in rows:
+        print("  ".join(str(row[h]).ljust(w) for h, w in zip(headers, widths)))
+    return 0
+
+
+# ---------- benchmark ----------
+
+def load_vectors(collection_name: str, limit: int, batch_size: int = 2000) -> np.ndarray:
+    """从集合读取至多 limit 条向量"""
+    collection = Collection(collection_name)
+    primary = collection.schema.primary_field.name
+    iterator = collection.query_iterator(batch_size=batch_size, limit=limit, expr="", output_fields=[primary, "vector"])
+    vectors = []
+    try:
+        while True:
+            rows = iterator.next()
+            if not rows:
+                break
+            vectors.extend(row["vector"] for row in rows)
+    finally:
+        iterator.close()
+    return np.asarray(vectors, dtype=np.float32)
+
+
+def normalize(matrix: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    return matrix / np.maximum(norms, 1e-12)
+
+
+def brute_force(base: np.ndarray, queries: np.ndarray, k: int) -> np.ndarray:
+    """余弦相似度暴力检索，返回每个查询的 top-k 行号"""
+    scores = normalize(queries) @ normalize(base).T
+    top = np.argpartition(-scores, kth=min(k, scores.shape[1] - 1), axis=1)[:, :k]
+    order = np.take_along_axis(scores, top, axis=1).argsort(axis=1)[:, ::-1]
+    return np.take_along_axis(top, order, axis=1)
+
+
+def build_bench_collection(profile: IndexProfile, base: np.ndarray, chunk: int = 5000) -> Tuple[Collection, Dict[str, Any], float]:
+    """写入临时集合并按 profile 建索引，返回 (集合, 构建参数, 建索引耗时)"""
+    name = f"{BENCH_PREFIX}{profile.name}"
+    if utility.has_collection(name):
+        utility.drop_collection(name)
+    schema = CollectionSchema([
+        FieldSchema(name="row", dtype=DataType.INT64, is_primary=True),
+        FieldSchema(name="vector", dtype=DataType.FLOAT_VECTOR, dim=base.shape[1]),
+    ], description=f"Index benchmark: {profile.name}")
+    collection = Collection(name, schema=schema)
+    for i in range(0, len(base), chunk):
+        collection.insert([list(range(i, min(i + chunk, len(base)))), base[i:i + chunk].tolist()])
+    collection.flush()
+
+    index_params = profile.index_params(len(base))
+    start = time.perf_counter()
+    collection.create_index(field_name="vector", index_params=index_params)
+    wait_for_index(collection)
+    build_seconds = time.perf_counter() - start
+    collection.load()
+    return collection, index_params["params"], build_seconds
+
+
+def run_queries(collection: Collection, queries: np.ndarray, k: int, param: Dict[str, Any]) -> Tuple[List[List[int]], List[float]]:
+    results, latencies = [], []
+    # 预热
+    collection.search(data=queries[:1].tolist(), anns_field="vector", param=param, limit=k)
+    for vector in queries:
+        start = time.perf_counter()
+        hits = collection.search(data=[vector.tolist()], anns_field="vector", param=param, limit=k)
+        latencies.append((time.perf_counter() - start) * 1000)
+        results.append([hit.id for hit in hits[0]])
+    return results, latencies
+
+
+def parse_sweep(spec: Optional[str]) -> List[int]:
+    return [int(v) for v in spec.split(",") if v.strip()] if spec else []
+
+
+def cmd_benchmark(args) -> int:
+    print(f"Loading up to {args.limit} vectors from {args.collection}...")
+    vectors = load_vectors(args.collection, args.limit)
+    if len(vectors) == 0:
+        print("No vectors loaded")
+        return 1
+
+    rng = np.random.default_rng(args.seed)
+    if args.query_file:
+        from service.embedding_service import generate_embedding
+        with open(args.query_file, "r", encoding="utf-8") as f:
+            texts = [line.strip() for line in f if line.strip()][:args.queries]
+        embedded = [v for v in (generate_embedding(texts) or []) if v]
+        queries = np.asarray(embedded, dtype=np.float32)
+        base = vectors
+    else:
+        # 从数据中留出查询向量（不放入被检索的集合，避免自身命中抬高召回）
+        picked = rng.choice(len(vectors), size=min(args.queries, len(vectors) // 10 or 1), replace=False)
+        mask = np.ones(len(vectors), dtype=bool)
+        mask[picked] = False
+        queries, base = vectors[picked], vectors[mask]
+    if len(queries) == 0:
+        print("No query vectors")
+        return 1
+
+    k = args.k
+    print(f"Base {len(base)} x {base.shape[1]}, {len(queries)} queries, computing brute-force top-{k}...")
+    truth = brute_force(base, queries, k)
+
+    report = []
+    for name in [p.strip() for p in args.profiles.split(",") if p.strip()]:
+        profile = INDEX_PROFILES[name]
+        print(f"Building {profile.name} ({profile.index_type})...")
+        collection, build_params, build_seconds = build_bench_collection(profile, base)
+        try:
+            if profile.index_type == "HNSW":
+                sweeps = [{"ef": ef} for ef in parse_sweep(args.ef)] or [None]
+            elif profile.index_type.startswith("IVF"):
+                sweeps = [{"nprobe": n} for n in parse_sweep(args.nprobe)] or [None]
+            else:
+                sweeps = [None]
+            for overrides in sweeps:
+                param = search_params_for_index(profile.index_type, build_params, k, overrides)
+                results, latencies = run_queries(collection, queries, k, param)
+                recall = float(np.mean([len(set(r) & set(t.tolist())) / k for r, t in zip(results, truth)]))
+                row = {
+                    "profile": profile.name,
+                    "build": json.dumps(build_params),
+                    "search": json.dumps(param["params"]),
+                    f"recall@{k}": round(recall, 4),
+                    "p50_ms": round(percentile(latencies, 50), 2),
+                    "p99_ms": round(percentile(latencies, 99), 2),
+                    "build_s": round(build_seconds, 1),
+                }
+                report.append(row)
+                print(f"  {row}")
+        finally:
+            if not args.keep:
+                collection.release()
+                utility.drop_collection(collection.name)
+
+    headers = ["profile", "build", "search", f"recall@{k}", "p50_ms", "p99_ms", "build_s"]
+    widths = [max(len(h), *(len(str(row[h])) for row in report)) for h in headers]
+    print("  ".join(h.ljust(w) for h, w in zip(headers, widths)))
+    for row in report:
+        print("  ".join(str(row[h]).ljust(w) for h, w in zip(headers, widths)))
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"collection": args.collection, "base": len(base), "queries": len(queries), "results": report}, f, indent=2)
+        print(f"Report written to {args.json}")
+    return 0
+
+
+# ---------- reindex ----------
+
+def copy_rows(source: Collection, target: Collection, batch_size: int = 1000) -> int:
+    """按批复制全部行（含向量）"""
+    fields = [f.name for f in source.schema.fields if not (f.is_primary and f.auto_id)]
+    iterator = source.query_iterator(batch_size=batch_size, expr="", output_fields=fields)
+    copied = 0
+    try:
+        while True:
+            rows = iterator.next()
+            if not rows:
+                break
+            target.insert([[row[name] for row in rows] for name in fields])
+            copied += len(rows)
+            print(f"Copied {copied} rows", end="\r")
+    finally:
+        iterator.close()
+    print()
+    return copied
+
+
+def count_rows(collection: Collection) -> int:
+    """flush 后以 count(*) 统计行数（不含已删除行；num_entities 会计入软删除、遗漏未 flush 的写入）"""
+    collection.flush()
+    collection.load()
+    result = collection.query(expr="", output_fields=["count(*)"], consistency_level="Strong")
+    return int(result[0]["count(*)"])
+
+
+def cmd_reindex(args) -> int:
+    name = args.collection
+    if not utility.has_collection(name):
+        print(f"Collection {name} does not exist")
+        return 1
+    source = Collection(name)
+    rows = source.num_entities
+    profile = resolve_profile(name, rows, args.profile)
+    index_params = profile.index_params(rows)
+    current = describe_index(source)
+    print(f"{name}: {rows} rows, current index {current[0]} {current[1]} -> {profile.name} {index_params['params']}")
+    if not args.yes:
+        print("Dry run, pass --yes to rebuild")
+        return 0
+
+    start = time.perf_counter()
+    if args.mode == "inplace":
+        source.release()
+        source.drop_index()
+        source.create_index(field_name="vector", index_params=index_params)
+        wait_for_index(source)
+        source.load()
+    elif not rebuild_and_swap(source, source.schema, index_params, "reindex", args.drop_old):
+        return 1
+    print(f"Reindexed {name} as {profile.name} in {time.perf_counter() - start:.1f}s")
+    return 0
+
+
+def rebuild_and_swap(
+    source: Collection,
+    schema: CollectionSchema,
+    index_params: Dict[str, Any],
+    label: str,
+    drop_old: bool,
+    **collection_kwargs
+) -> bool:
+    """
+    按 schema 新建临时集合、复制数据、建索引并加载，行数一致后通过两次 rename 换入
+
+    旧集合改名为 <name>__old_<时间戳> 保留（drop_old 时删除）；
+    复制期间源集合有写入 / 删除、或复制后行数不一致时保留临时集合并返回 False
+    """
+    name = source.name
+    rows = count_rows(source)
+    suffix = time.strftime("%Y%m%d%H%M%S")
+    staging = f"{name}__{label}_{suffix}"
+    target = Collection(staging, schema=schema, **collection_kwargs)
+    copied = copy_rows(source, target)
+    target.create_index(field_name="vector", index_params=index_params)
+    wait_for_index(target)
+    copied_rows = count_rows(target)
+    if copied_rows != rows:
+        print(f"Row count mismatch ({copied_rows} != {rows}), keeping {staging} for inspection")
+        return False
+    current_rows = count_rows(source)
+    if current_rows != rows:
+        print(f"{name} changed during the copy ({rows} -> {current_rows} rows), stop writers and retry; keeping {staging}")
+        return False
+    backup = f"{name}__old_{suffix}"
+    utility.rename_collection(name, backup)
+    utility.rename_collection(staging, name)
+    print(f"Swapped in {copied} rows, previous collection kept as {backup}")
+    if drop_old:
+        Collection(backup).release()
+        utility.drop_collection(backup)
+        print(f"Dropped {backup}")
+    return True
+
+
+# ---------- migrate-partition-key ----------
+
+def partition_key_schema(schema: CollectionSchema, key: str) -> CollectionSchema:
+    """复制集合结构，将 key 字段声明为分区键（其余字段不变）"""
+    fields = []
+    for field in schema.fields:
+        fields.append(FieldSchema(
+            name=field.name,
+            dtype=field.dtype,
+            description=field.description,
+            is_primary=field.is_primary,
+            auto_id=field.auto_id,
+            is_partition_key=field.name == key,
+            **field.params
+        ))
+    return CollectionSchema(fields, description=schema.description)
+
+
+def cmd_migrate_partition_key(args) -> int:
+    name = args.collection
+    if not utility.has_collection(name):
+        print(f"Collection {name} does not exist")
+        return 1
+    source = Collection(name)
+    current_key = partition_key_field(source)
+    if current_key == args.field:
+        print(f"{name} already uses {args.field} as partition key")
+        return 0
+    field = next((f for f in source.schema.fields if f.name == args.field), None)
+    if field is None or field.dtype not in (DataType.VARCHAR, DataType.INT64):
+        print(f"{name} has no VARCHAR/INT64 field {args.field}")
+        return 1
+
+    rows = source.num_entities
+    index_type, build_params = describe_index(source)
+    if args.profile or not index_type:
+        index_params = resolve_profile(name, rows, args.profile).index_params(rows)
+    else:
+        index_params = {"metric_type": METRIC_TYPE, "index_type": index_type, "params": build_params}
+    print(
+        f"{name}: {rows} rows, partition key {current_key or '-'} -> {args.field} "
+        f"({args.num_partitions} partitions), index {index_params['index_type']} {index_params['params']}"
+    )
+    if not args.yes:
+        print("Dry run, pass --yes to migrate")
+        return 0
+
+    start = time.perf_counter()
+    schema = partition_key_schema(source.schema, args.field)
+    if not rebuild_and_swap(source, schema, index_params, "pkey", args.drop_old, num_partitions=args.num_partitions):
+        return 1
+    print(f"Migrated {name} to partition key {args.field} in {time.perf_counter() - start:.1f}s")
+    return 0
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Milvus 索引工具")
+    parser.add_argument("--log-level", default="WARNING", help="日志级别（默认 WARNING）")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    show = sub.add_parser("show", help="列出集合索引")
+    show.add_argument("--collection", default=None)
+
+    bench = sub.add_parser("benchmark", help="离线评估各 profile 的召回率与延迟")
+    bench.add_argument("--collection", required=True, help="数据来源集合")
+    bench.add_argument("--profiles", default=",".join(INDEX_PROFILES), help="参与评估的 profile（逗号分隔）")
+    bench.add_argument("--limit", type=int, default=100000, help="最多读取的向量数")
+    bench.add_argument("--queries", type=int, default=200, help="查询数")
+    bench.add_argument("--query-file", default=None, help="查询文本文件（每行一条，经向量化后作为查询）")
+    bench.add_argument("--k", type=int, default=10, help="recall@k 的 k")
+    bench.add_argument("--ef", default=None, help="HNSW ef 扫描值（逗号分隔）")
+    bench.add_argument("--nprobe", default=None, help="IVF nprobe 扫描值（逗号分隔）")
+    bench.add_argument("--seed", type=int, default=42)
+    bench.add_argument("--keep", action="store_true", help="保留临时集合")
+    bench.add_argument("--json", default=None, help="结果写入 JSON 文件")
+
+    reindex = sub.add_parser("reindex", help="按 profile 重建集合索引")
+    reindex.add_argument("--collection", required=True)
+    reindex.add_argument("--profile", default=None, help="profile 名称或 auto（默认按配置）")
+    reindex.add_argument("--mode", choices=["swap", "inplace"], default="swap")
+    reindex.add_argument("--drop-old", action="store_true", help="swap 完成后删除旧集合")
+    reindex.add_argument("--yes", action="store_true", help="确认执行（否则只打印计划）")
+
+    migrate = sub.add_parser("migrate-partition-key", help="将集合迁移为分区键布局")
+    migrate.add_argument("--collection", required=True)
+    migrate.add_argument("--field", required=True, help="作为分区键的字段（kb_id / user_id）")
+    migrate.add_argument("--num-partitions", type=int, default=get_config().milvus.num_partitions, help="分区数")
+    migrate.add_argument("--profile", default=None, help="新集合的索引 profile（默认沿用当前索引）")
+    migrate.add_argument("--drop-old", action="store_true", help="迁移完成后删除旧集合")
+    migrate.add_argument("--yes", action="store_true", help="确认执行（否则只打印计划）")
+
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=args.log_level.upper(), format="%(asctime)s [%(levelname)s] %(message)s")
+
+    get_milvus_service()  # 建立连接
+    commands = {
+        "show": cmd_show,
+        "benchmark": cmd_benchmark,
+        "reindex": cmd_reindex,
+        "migrate-partition-key": cmd_migrate_partition_key,
+    }
+    return commands[args.command](args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
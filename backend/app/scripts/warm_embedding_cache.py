@@ -0,0 +1,164 @@
+"""
+向量缓存预热
+
+批量写入 service/embedding_cache.py 的向量缓存，使重新上传的文档、常见问题等首次请求即可命中：
+- --file：文本文件（每行一条，或 JSONL 中的 content / summary / text / query 字段），
+  已缓存的文本跳过，其余经 EmbeddingService 批量向量化后写入缓存
+- --milvus：从 Milvus 集合读取已入库的 (content, vector)，直接写入缓存，不调用向量化接口
+
+使用方法：
+    # 预热常见问题
+    python -m scripts.warm_embedding_cache --file data/faq.txt
+
+    # 复用知识库中已有的切片向量
+    python -m scripts.warm_embedding_cache --milvus knowledge_base --limit 50000
+"""
+
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+import logging
+from typing import List, Optional
+
+# 确保能导入项目模块
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from service.embedding_cache import EmbeddingCache, get_embedding_cache
+from service.embedding_service import close_embedding_services, get_embedding_service
+
+logger = logging.getLogger("EmbeddingCacheWarmup")
+
+_TEXT_FIELDS = ("content", "summary", "text", "query")
+
+
+def load_texts(path: str, limit: Optional[int] = None) -> List[str]:
+    texts = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            if line.startswith("{"):
+                try:
+                    item = json.loads(line)
+                except ValueError:
+                    continue
+                line = next((item[field] for field in _TEXT_FIELDS if item.get(field)), "")
+            if line:
+                texts.append(line)
+            if limit and len(texts) >= limit:
+                break
+    # 去重并保持顺序
+    return list(dict.fromkeys(texts))
+
+
+async def warm_from_texts(cache: EmbeddingCache, texts: List[str], model_name: str, dimensions: int, chunk: int) -> int:
+    """向量化未缓存的文本并写入缓存，返回新写入条数"""
+    keys = [cache.make_key(model_name, dimensions, text) for text in texts]
+    cached = cache.get_many(keys)
+    missing = [text for text, key in zip(texts, keys) if key not in cached]
+    print(f"{len(texts) - len(missing)} of {len(texts)} texts already cached")
+    if not missing:
+        return 0
+
+    service = get_embedding_service(model_name=model_name, dimensions=dimensions)
+    if service is None:
+        print("DASHSCOPE_API_KEY is not set")
+        return 0
+
+    written = 0
+    for i in range(0, len(missing), chunk):
+        batch = missing[i:i + chunk]
+        vectors = await service.embed_many(batch)
+        # 服务的回写在后台进行，这里同步写入，确保脚本退出前落盘
+        items = {cache.make_key(model_name, dimensions, text): v for text, v in zip(batch, vectors) if v}
+        cache.put_many(items)
+        written += len(items)
+        print(f"Embedded {min(i + chunk, len(missing))}/{len(missing)}")
+    return written
+
+
+def warm_from_milvus(cache: EmbeddingCache, collection_name: str, model_name: str, dimensions: int,
+                     limit: Optional[int], chunk: int) -> int:
+    """读取 Milvus 集合中已有的切片向量写入缓存"""
+    from service.milvus_service import get_milvus_service
+    from pymilvus import Collection, utility
+
+    get_milvus_service()  # 建立连接
+    if not utility.has_collection(collection_name):
+        print(f"Collection {collection_name} does not exist")
+        return 0
+
+    collection = Collection(collection_name)
+    collection.load()
+    iterator = collection.query_iterator(
+        batch_size=chunk,
+        limit=limit if limit else -1,
+        expr="",
+        output_fields=["content", "vector"]
+    )
+
+    written = 0
+    try:
+        while True:
+            rows = iterator.next()
+            if not rows:
+                break
+            items = {}
+            for row in rows:
+                vector = row.get("vector")
+                if row.get("content") and vector is not None and len(vector) == dimensions:
+                    items[cache.make_key(model_name, dimensions, row["content"])] = vector
+            cache.put_many(items)
+            written += len(items)
+            print(f"Cached {written} vectors from {collection_name}")
+    finally:
+        iterator.close()
+    return written
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="向量缓存预热")
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--file", default=None, help="文本文件（每行一条或 JSONL）")
+    source.add_argument("--milvus", default=None, help="Milvus 集合名称（复用已入库的向量）")
+    parser.add_argument("--model", default="text-embedding-v4", help="向量模型（需与线上调用一致）")
+    parser.add_argument("--dimensions", type=int, default=1024, help="向量维度")
+    parser.add_argument("--limit", type=int, default=None, help="最多处理的条数")
+    parser.add_argument("--chunk", type=int, default=200, help="每批处理的条数")
+    parser.add_argument("--log-level", default="WARNING", help="日志级别（默认 WARNING）")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=args.log_level.upper(), format="%(asctime)s [%(levelname)s] %(message)s")
+
+    cache = get_embedding_cache()
+    if cache is None:
+        print("Embedding cache is disabled (EMBEDDING_CACHE=off)")
+        return 1
+    if cache.get_stats()["backend"] == "memory":
+        print("Warning: EMBEDDING_CACHE=memory, warmed vectors only live in this process")
+
+    start = time.perf_counter()
+    if args.file:
+        texts = load_texts(args.file, args.limit)
+
+        async def run():
+            try:
+                return await warm_from_texts(cache, texts, args.model, args.dimensions, args.chunk)
+            finally:
+                await close_embedding_services()
+
+        written = asyncio.run(run())
+    else:
+        written = warm_from_milvus(cache, args.milvus, args.model, args.dimensions, args.limit, args.chunk)
+
+    print(f"Wrote {written} vectors in {time.perf_counter() - start:.1f}s")
+    print(json.dumps(cache.get_stats(), indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
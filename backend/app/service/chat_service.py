@@ -4,16 +4,13 @@ import os
 from typing import List, Dict, Any, Optional, Generator
 import uuid
 from openai import OpenAI
-import numpy as np
-from llama_index.core.data_structs import Node
-from llama_index.core.schema import NodeWithScore
-from llama_index.postprocessor.dashscope_rerank import DashScopeRerank
 import tiktoken
 
 from .document_service import DocumentService
 from .web_search_service import WebSearchService
 from .session_service import SessionService
 from .memory_service import get_memory_service
+from .reranker import get_reranker
 
 
 class ChatService:
@@ -136,40 +133,30 @@ class ChatService:
     
     def rerank_similarity(self, query: str, documents: List[Dict[str, Any]]) -> List[float]:
         """
-        使用DashScope重排对文档进行相似度评分
+        使用DashScope重排对文档进行相似度评分（共享连接池与分数缓存，超出延迟预算时改用本地打分）
         
         Args:
             query: 用户查询
             documents: 要评分的文档列表
             
         Returns:
-            文档相似度分数列表
+            文档相似度分数列表（与 documents 顺序一致）
         """
         try:
-            api_key = os.getenv("DASHSCOPE_API_KEY", self.openai_api_key)
-            
-            # 从文档中提取文本
-            texts = [doc["content"] for doc in documents]
-            
-            # 创建节点列表
-            nodes = [NodeWithScore(node=Node(text=text), score=1.0) for text in texts]
-            
-            # 初始化 DashScopeRerank
-            dashscope_rerank = DashScopeRerank(top_n=len(texts), api_key=api_key)
-            
-            # 执行重排序
-            results = dashscope_rerank.postprocess_nodes(nodes, query_str=query)
-            
-            # 提取分数
-            scores = [res.score for res in results]
-            scores = np.array(scores)
-            
-            return scores
+            return get_reranker().rerank_sync(query, [doc["content"] for doc in documents])
         except Exception as e:
             print(f"Error in rerank_similarity: {str(e)}")
             # 出错时返回原始权重
             return [doc.get("weight", 1.0) for doc in documents]
     
+    async def arerank_similarity(self, query: str, documents: List[Dict[str, Any]]) -> List[float]:
+        """rerank_similarity 的异步版本（不阻塞事件循环）"""
+        try:
+            return await get_reranker().rerank(query, [doc["content"] for doc in documents])
+        except Exception as e:
+            print(f"Error in rerank_similarity: {str(e)}")
+            return [doc.get("weight", 1.0) for doc in documents]
+    
     def rerank_documents(self, question: str, documents: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
         """
         使用DashScope重排对文档进行重排序，并确保不超过token数量限制。
@@ -183,11 +170,17 @@ class ChatService:
         """
         if not documents:
             return []
-        
+        return self._select_documents(documents, self.rerank_similarity(question, documents))
+    
+    async def arerank_documents(self, question: str, documents: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """rerank_documents 的异步版本（不阻塞事件循环）"""
+        if not documents:
+            return []
+        return self._select_documents(documents, await self.arerank_similarity(question, documents))
+    
+    def _select_documents(self, documents: List[Dict[str, Any]], similarity_scores: List[float]) -> List[Dict[str, Any]]:
+        """按相关度排序，并截断到 token 限制与 10 篇以内"""
         try:
-            # 使用DashScope重排进行重排序
-            similarity_scores = self.rerank_similarity(question, documents)
-            
             # 更新文档的权重和content_with_weight字段
             for i, score in enumerate(similarity_scores):
                 if i < len(documents):  # 防止索引越界
@@ -0,0 +1,312 @@
+"""
+语义去重索引
+
+用于事实、搜索摘要、资讯等短文本的近似重复检测（DeepScout、ResearchService、资讯采集共用）：
+1. 候选生成 - 字符 n-gram（shingle）MinHash + LSH 分桶，插入与查询均为摊还 O(1)
+2. 精确复核 - 候选与新文本计算 shingle Jaccard 相似度，超过阈值判为重复
+3. 数字守卫 - 双方都含数字且互不包含时不判为重复（同模板、不同数据的事实）
+4. 向量确认 - Jaccard 处于临界区间的候选，可选用 embedding 余弦相似度确认（捕获改写）
+
+使用方式：
+```python
+from service.dedup_index import DedupIndex
+
+index = DedupIndex()
+results = index.check_many(["2024年市场规模达到120亿元", "2024年市场规模达到了120亿元"])
+# results == [None, 0]  -> 第二条与第一条（key=0）重复（Jaccard 0.81）
+
+# 调整语序的改写字面相似度较低（"市场规模在2024年达到了120亿元" 与第一条的 Jaccard 为 0.58），
+# 只做 shingle 比较时不判为重复；传入 embed_fn 后由向量相似度确认
+index = DedupIndex(embed_fn=generate_embedding)
+```
+"""
+
+import re
+import math
+import zlib
+import logging
+import unicodedata
+from typing import Any, Callable, Dict, FrozenSet, Hashable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+logger = logging.getLogger("DedupIndex")
+
+_MERSENNE_PRIME = np.uint64(4294967311)  # 大于 2^32 的素数
+_MAX_HASH = np.uint64(0xFFFFFFFF)
+_NON_WORD_PATTERN = re.compile(r"[\W_]+")
+_NUMBER_PATTERN = re.compile(r"\d+(?:\.\d+)?")
+
+
+def normalize_for_shingles(text: str) -> str:
+    """全角转半角、小写、去掉标点与空白"""
+    text = unicodedata.normalize("NFKC", text or "").lower()
+    return _NON_WORD_PATTERN.sub("", text)
+
+
+def shingle_hashes(text: str, size: int = 2) -> FrozenSet[int]:
+    """字符 n-gram 的 32 位哈希集合"""
+    text = normalize_for_shingles(text)
+    if not text:
+        return frozenset()
+    if len(text) <= size:
+        return frozenset([zlib.crc32(text.encode("utf-8"))])
+    return frozenset(zlib.crc32(text[i:i + size].encode("utf-8")) for i in range(len(text) - size + 1))
+
+
+def extract_numbers(text: str) -> FrozenSet[str]:
+    """提取数字（去掉末尾多余的 0，使 "12.50" 与 "12.5" 一致）"""
+    numbers = set()
+    for n in _NUMBER_PATTERN.findall(unicodedata.normalize("NFKC", text or "")):
+        numbers.add(n.rstrip("0").rstrip(".") if "." in n else n)
+    return frozenset(numbers)
+
+
+def _jaccard(a: FrozenSet, b: FrozenSet) -> float:
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+def _cosine(a: Sequence[float], b: Sequence[float]) -> float:
+    a = np.asarray(a, dtype=np.float32)
+    b = np.asarray(b, dtype=np.float32)
+    norm = float(np.linalg.norm(a) * np.linalg.norm(b))
+    return float(a @ b) / norm if norm else 0.0
+
+
+class _Doc:
+    __slots__ = ("text", "shingles", "numbers", "band_keys")
+
+    def __init__(self, text: str, shingles: FrozenSet[int], numbers: FrozenSet[str], band_keys: List[bytes]):
+        self.text = text
+        self.shingles = shingles
+        self.numbers = numbers
+        self.band_keys = band_keys
+
+
+class DedupIndex:
+    """MinHash LSH 去重索引"""
+
+    def __init__(
+        self,
+        threshold: float = 0.65,
+        verify_threshold: float = 0.3,
+        embedding_threshold: float = 0.9,
+        num_perm: int = 64,
+        bands: Optional[int] = None,
+        shingle_size: int = 2,
+        embed_fn: Optional[Callable[[List[str]], Optional[List[Optional[List[float]]]]]] = None,
+        seed: int = 1
+    ):
+        """
+        Args:
+            threshold: shingle Jaccard 相似度阈值，达到即判为重复
+            verify_threshold: 启用向量确认时，Jaccard 达到该值的候选才计算向量
+            embedding_threshold: 向量余弦相似度阈值
+            num_perm: MinHash 排列数
+            bands: LSH 分桶数（每桶 num_perm // bands 行；行数越少召回越高、候选越多），
+                默认按阈值自动选择：在阈值处成为候选的概率不低于 95% 的前提下行数最多
+            shingle_size: 字符 n-gram 长度（中文二元组对改写语序更稳健）
+            embed_fn: 批量向量化函数，为 None 时只做 shingle 比较
+            seed: MinHash 随机种子（固定以保证结果可复现）
+        """
+        if bands is None:
+            # 启用向量确认时，临界区间的下界也需要足够的候选召回
+            lower = verify_threshold if embed_fn is not None else threshold
+            bands = choose_bands(num_perm, lower)
+        if num_perm % bands:
+            raise ValueError("num_perm must be divisible by bands")
+        self.threshold = threshold
+        self.verify_threshold = verify_threshold
+        self.embedding_threshold = embedding_threshold
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.shingle_size = shingle_size
+        self.embed_fn = embed_fn
+
+        rng = np.random.RandomState(seed)
+        self._a = rng.randint(1, 2 ** 32 - 1, size=num_perm, dtype=np.uint64)
+        self._b = rng.randint(0, 2 ** 32 - 1, size=num_perm, dtype=np.uint64)
+
+        self._docs: Dict[Hashable, _Doc] = {}
+        self._buckets: List[Dict[bytes, List[Hashable]]] = [{} for _ in range(bands)]
+        self._vectors: Dict[Hashable, Optional[List[float]]] = {}
+        self._next_key = 0
+        self.stats = {"checked": 0, "duplicates": 0, "embedding_confirmed": 0}
+
+    def __len__(self) -> int:
+        return len(self._docs)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._docs
+
+    # ---------- MinHash / LSH ----------
+
+    def _signature(self, shingles: FrozenSet[int]) -> np.ndarray:
+        values = np.fromiter(shingles, dtype=np.uint64, count=len(shingles))
+        # (a * x + b) mod p，各排列取最小值；a, x < 2^32，乘积不会溢出 uint64
+        hashed = (np.outer(self._a, values) + self._b[:, None]) % _MERSENNE_PRIME
+        return (hashed & _MAX_HASH).min(axis=1)
+
+    def _band_keys(self, shingles: FrozenSet[int]) -> List[bytes]:
+        if not shingles:
+            return []
+        signature = self._signature(shingles)
+        return [signature[i * self.rows:(i + 1) * self.rows].tobytes() for i in range(self.bands)]
+
+    def _candidates(self, band_keys: List[bytes]) -> List[Hashable]:
+        seen = {}
+        for band, key in enumerate(band_keys):
+            for doc_key in self._buckets[band].get(key, ()):
+                seen[doc_key] = None
+        return list(seen)
+
+    # ---------- 增删查 ----------
+
+    def _make_doc(self, text: str) -> _Doc:
+        shingles = shingle_hashes(text, self.shingle_size)
+        return _Doc(text, shingles, extract_numbers(text), self._band_keys(shingles))
+
+    def _insert(self, key: Hashable, doc: _Doc) -> None:
+        self._docs[key] = doc
+        for band, band_key in enumerate(doc.band_keys):
+            self._buckets[band].setdefault(band_key, []).append(key)
+
+    def remove(self, key: Hashable) -> None:
+        doc = self._docs.pop(key, None)
+        if doc is None:
+            return
+        for band, band_key in enumerate(doc.band_keys):
+            bucket = self._buckets[band].get(band_key)
+            if bucket and key in bucket:
+                bucket.remove(key)
+                if not bucket:
+                    del self._buckets[band][band_key]
+        self._vectors.pop(key, None)
+
+    def add(self, text: str, key: Optional[Hashable] = None) -> Hashable:
+        """直接登记文本（不检查重复），返回键"""
+        key = self._new_key() if key is None else key
+        self._insert(key, self._make_doc(text))
+        return key
+
+    def _new_key(self) -> int:
+        while self._next_key in self._docs:
+            self._next_key += 1
+        key = self._next_key
+        self._next_key += 1
+        return key
+
+    def _best_match(self, doc: _Doc) -> Tuple[Optional[Hashable], float, List[Tuple[Hashable, float]]]:
+        """返回 (最相似的键, Jaccard, 临界区间内的候选列表)"""
+        best, best_score = None, 0.0
+        borderline = []
+        for key in self._candidates(doc.band_keys):
+            other = self._docs[key]
+            # 数字守卫：双方都有数字且互不包含（如年份或数值不同），视为不同事实
+            if doc.numbers and other.numbers and not (doc.numbers <= other.numbers or other.numbers <= doc.numbers):
+                continue
+            score = _jaccard(doc.shingles, other.shingles)
+            if score > best_score:
+                best, best_score = key, score
+            if self.verify_threshold <= score < self.threshold:
+                borderline.append((key, score))
+        return best, best_score, borderline
+
+    def query(self, text: str) -> Optional[Tuple[Hashable, float]]:
+        """查询最相似的已登记文本（仅 shingle 比较），未达阈值返回 None"""
+        best, score, _ = self._best_match(self._make_doc(text))
+        if best is not None and score >= self.threshold:
+            return best, score
+        return None
+
+    def check(self, text: str, key: Optional[Hashable] = None) -> Optional[Hashable]:
+        """检查单条文本：重复时返回已登记文本的键，否则登记并返回 None"""
+        return self.check_many([text], None if key is None else [key])[0]
+
+    def check_many(self, texts: List[str], keys: Optional[List[Hashable]] = None) -> List[Optional[Hashable]]:
+        """
+        批量检查并登记（按顺序，后面的文本也会与前面新登记的比较）
+
+        Args:
+            texts: 待检查的文本
+            keys: 对应的键（默认自动分配整数键）
+
+        Returns:
+            与 texts 等长的列表：重复时为已登记文本的键，否则为 None（该文本已被登记）
+        """
+        results: List[Optional[Hashable]] = [None] * len(texts)
+        pending: List[Tuple[int, Hashable, List[Tuple[Hashable, float]]]] = []
+
+        # 第一轮：MinHash 候选 + Jaccard 复核
+        for i, text in enumerate(texts):
+            self.stats["checked"] += 1
+            doc = self._make_doc(text)
+            best, score, borderline = self._best_match(doc)
+            if best is not None and score >= self.threshold:
+                results[i] = best
+                self.stats["duplicates"] += 1
+                continue
+            key = keys[i] if keys is not None else self._new_key()
+            self._insert(key, doc)
+            if self.embed_fn is not None and borderline:
+                pending.append((i, key, borderline))
+
+        if not pending:
+            return results
+
+        # 第二轮：临界候选用向量确认（一次批量向量化）
+        needed = {key for _, key, _ in pending}
+        needed.update(other for _, _, borderline in pending for other, _ in borderline)
+        self._embed([k for k in needed if k in self._docs])
+
+        for i, key, borderline in pending:
+            vector = self._vectors.get(key)
+            if vector is None:
+                continue
+            for other, _ in sorted(borderline, key=lambda item: -item[1]):
+                other_vector = self._vectors.get(other)
+                if other in self._docs and other_vector is not None and _cosine(vector, other_vector) >= self.embedding_threshold:
+                    self.remove(key)
+                    results[i] = other
+                    self.stats["duplicates"] += 1
+                    self.stats["embedding_confirmed"] += 1
+                    break
+        return results
+
+    def _embed(self, keys: List[Hashable]) -> None:
+        missing = [k for k in keys if k not in self._vectors]
+        if not missing:
+            return
+        try:
+            vectors = self.embed_fn([self._docs[k].text for k in missing]) or []
+        except Exception as e:
+            logger.warning(f"Embedding confirmation failed, using shingle similarity only: {e}")
+            vectors = []
+        for i, key in enumerate(missing):
+            self._vectors[key] = vectors[i] if i < len(vectors) else None
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {**self.stats, "size": len(self._docs)}
+
+
+def estimate_candidate_probability(jaccard: float, bands: int = 32, rows: int = 2) -> float:
+    """LSH 中相似度为 jaccard 的两段文本成为候选的概率（用于调参）"""
+    return 1 - math.pow(1 - math.pow(jaccard, rows), bands)
+
+
+def choose_bands(num_perm: int, jaccard: float, min_probability: float = 0.95) -> int:
+    """
+    选择分桶数：相似度为 jaccard 时成为候选的概率不低于 min_probability，且每桶行数尽量多
+
+    行数越多，低相似度文本落入同一桶的概率越低，需要精确复核的候选越少。
+    """
+    best = num_perm
+    for rows in range(1, num_perm + 1):
+        if num_perm % rows:
+            continue
+        bands = num_perm // rows
+        if estimate_candidate_probability(jaccard, bands, rows) >= min_probability:
+            best = bands
+    return best
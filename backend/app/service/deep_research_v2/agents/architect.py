@@ -9,14 +9,59 @@ DeepResearch V2.0 - 总架构师 Agent (ChiefArchitect)
 4. 进度监控 - 根据研究进展动态调整大纲
 """
 
+import re
+import json
 import uuid
-from typing import Dict, Any, List
+from typing import Dict, Any, List, Callable
 from datetime import datetime
 
 from .base import BaseAgent
 from ..state import ResearchState, ResearchPhase
 
 
+class StreamingOutlineParser:
+    """
+    流式大纲增量解析器
+
+    逐段接收 LLM 输出的扁平 JSON（sec_N_title / sec_N_desc / sec_N_query），
+    每当某个章节的标题和搜索词都已完整输出时立即回调，不必等待整个 JSON 结束。
+    """
+
+    FIELD_PATTERN = re.compile(r'"sec_(\d+)_(title|desc|query)"\s*:\s*"((?:[^"\\]|\\.)*)"')
+
+    def __init__(self, on_section: Callable[[Dict[str, Any]], None]):
+        self.on_section = on_section
+        self._buffer = ""
+        self._pos = 0
+        self._fields: Dict[int, Dict[str, str]] = {}
+        self._emitted: set = set()
+
+    def feed(self, delta: str) -> None:
+        self._buffer += delta
+        for match in self.FIELD_PATTERN.finditer(self._buffer, self._pos):
+            self._pos = match.end()
+            index, field_name, raw_value = int(match.group(1)), match.group(2), match.group(3)
+            try:
+                value = json.loads(f'"{raw_value}"')
+            except json.JSONDecodeError:
+                value = raw_value
+            fields = self._fields.setdefault(index, {})
+            fields[field_name] = value
+
+            if index not in self._emitted and fields.get("title") and fields.get("query"):
+                self._emitted.add(index)
+                self.on_section({
+                    "id": f"sec_{index}",
+                    "title": fields["title"],
+                    "description": fields.get("desc", ""),
+                    "search_queries": [fields["query"]]
+                })
+
+    @property
+    def sections_emitted(self) -> int:
+        return len(self._emitted)
+
+
 class ChiefArchitect(BaseAgent):
     """
     总架构师 - 研究规划的大脑
@@ -104,6 +149,15 @@ class ChiefArchitect(BaseAgent):
             llm_base_url=llm_base_url,
             model=model
         )
+        # 投机搜索执行者（通常是 DeepScout），需提供 prefetch_section / discard_prefetch
+        self.speculative_searcher = None
+
+    def _on_section_streamed(self, state: ResearchState, section: Dict[str, Any]) -> None:
+        """流式解析出完整章节后，立即投机发起该章节的搜索"""
+        if not self.speculative_searcher or not state.get("search_web", True):
+            return
+        self.logger.info(f"Section streamed: {section['id']} {section['title']}, dispatching speculative search")
+        self.speculative_searcher.prefetch_section(section)
 
     def _convert_flat_to_outline(self, flat_result: Dict) -> Dict:
         """将扁平JSON格式转换为标准outline格式"""
@@ -193,13 +247,25 @@ class ChiefArchitect(BaseAgent):
         max_retries = 2
 
         for attempt in range(max_retries + 1):
-            response = await self.call_llm(
-                system_prompt="你是一位专业的行业研究规划师。请严格按照要求的JSON格式输出，不要添加任何额外内容。",
-                user_prompt=prompt,
-                json_mode=True,
-                temperature=0.3,
-                max_tokens=16000  # 拉满到最大值
-            )
+            if attempt == 0:
+                # 首次使用流式输出，边生成边解析章节并投机发起搜索
+                parser = StreamingOutlineParser(lambda section: self._on_section_streamed(state, section))
+                response = await self.call_llm_stream(
+                    system_prompt="你是一位专业的行业研究规划师。请严格按照要求的JSON格式输出，不要添加任何额外内容。",
+                    user_prompt=prompt,
+                    json_mode=True,
+                    temperature=0.3,
+                    max_tokens=16000,  # 拉满到最大值
+                    on_delta=parser.feed
+                )
+            else:
+                response = await self.call_llm(
+                    system_prompt="你是一位专业的行业研究规划师。请严格按照要求的JSON格式输出，不要添加任何额外内容。",
+                    user_prompt=prompt,
+                    json_mode=True,
+                    temperature=0.3,
+                    max_tokens=16000  # 拉满到最大值
+                )
 
             # Debug: 记录原始响应
             self.logger.info(f"Raw LLM response length: {len(response)} (attempt {attempt + 1})")
@@ -239,6 +305,8 @@ class ChiefArchitect(BaseAgent):
         if not result:
             state["errors"].append("Failed to generate research plan after retries")
             self.logger.error(f"Raw LLM response: {response[:800]}")
+            if self.speculative_searcher:
+                self.speculative_searcher.discard_prefetch([])
             return state
 
         # Debug: log outline count
@@ -283,6 +351,10 @@ class ChiefArchitect(BaseAgent):
         state["outline"] = processed_outline
         self.logger.info(f"Processed outline: {len(processed_outline)} sections")
 
+        # 丢弃最终大纲中已不存在的投机搜索
+        if self.speculative_searcher:
+            self.speculative_searcher.discard_prefetch(processed_outline)
+
         # 发送大纲事件
         self.add_message(state, "outline", {
             "understanding": result.get("understanding", {}),
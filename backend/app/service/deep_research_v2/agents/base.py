@@ -10,11 +10,12 @@ import logging
 import asyncio
 import time
 from abc import ABC, abstractmethod
-from typing import Dict, Any, Optional, List, Union
+from typing import Dict, Any, Optional, List, Union, Callable
 from datetime import datetime
 from openai import OpenAI
 
 from ..state import ResearchState, AgentLog
+from ..event_encoder import should_log_event
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s [%(levelname)s] %(name)s: %(message)s')
 
@@ -106,6 +107,96 @@ class BaseAgent(ABC):
             self.logger.error(f"LLM call failed: {e}")
             raise
 
+    async def call_llm_stream(
+        self,
+        system_prompt: str,
+        user_prompt: str,
+        json_mode: bool = True,
+        temperature: float = 0.3,
+        max_tokens: int = 16000,
+        on_delta: Optional[Callable[[str], None]] = None
+    ) -> str:
+        """
+        流式调用 LLM
+
+        在后台线程中消费流式响应，每收到一段增量文本就在事件循环中回调 on_delta，
+        便于调用方边生成边解析。返回完整响应文本。
+
+        Args:
+            system_prompt: 系统提示
+            user_prompt: 用户提示
+            json_mode: 是否强制JSON输出
+            temperature: 温度参数
+            max_tokens: 最大token数
+            on_delta: 增量文本回调
+
+        Returns:
+            LLM 完整响应文本
+        """
+        start_time = time.time()
+        loop = asyncio.get_running_loop()
+        queue: asyncio.Queue = asyncio.Queue()
+        end_marker = object()
+
+        kwargs = {
+            "model": self.model,
+            "messages": [
+                {"role": "system", "content": system_prompt},
+                {"role": "user", "content": user_prompt}
+            ],
+            "temperature": temperature,
+            "max_tokens": max_tokens,
+            "stream": True
+        }
+        if json_mode:
+            kwargs["response_format"] = {"type": "json_object"}
+
+        def produce():
+            try:
+                stream = self.client.chat.completions.create(**kwargs)
+                for chunk in stream:
+                    if not chunk.choices:
+                        continue
+                    delta = chunk.choices[0].delta.content
+                    if delta:
+                        loop.call_soon_threadsafe(queue.put_nowait, delta)
+            except Exception as e:
+                loop.call_soon_threadsafe(queue.put_nowait, e)
+                return
+            loop.call_soon_threadsafe(queue.put_nowait, end_marker)
+
+        producer = asyncio.create_task(asyncio.to_thread(produce))
+        parts: List[str] = []
+        first_token_ms = None
+
+        try:
+            while True:
+                item = await queue.get()
+                if item is end_marker:
+                    break
+                if isinstance(item, Exception):
+                    raise item
+                if first_token_ms is None:
+                    first_token_ms = int((time.time() - start_time) * 1000)
+                parts.append(item)
+                if on_delta:
+                    try:
+                        on_delta(item)
+                    except Exception as e:
+                        self.logger.warning(f"on_delta callback error: {e}")
+            await producer
+        except Exception as e:
+            self.logger.error(f"LLM stream call failed: {e}")
+            raise
+
+        content = "".join(parts)
+        duration = int((time.time() - start_time) * 1000)
+        self.logger.info(
+            f"LLM stream completed in {duration}ms (first token {first_token_ms}ms), "
+            f"response length: {len(content)}"
+        )
+        return content
+
     def parse_json_response(self, response: str) -> Dict[str, Any]:
         """安全解析JSON响应，处理markdown代码块和格式问题"""
         import re
@@ -253,7 +344,8 @@ class BaseAgent(ABC):
         if "_message_queue" in state and state["_message_queue"] is not None:
             try:
                 state["_message_queue"].put_nowait(message)
-                self.logger.info(f"[SSE] Queued event: {event_type} (queue size: {state['_message_queue'].qsize()})")
+                if should_log_event(len(state["messages"])):
+                    self.logger.debug(f"[SSE] Queued event #{len(state['messages'])}: {event_type} (queue size: {state['_message_queue'].qsize()})")
             except Exception as e:
                 self.logger.warning(f"Failed to push message to queue: {e}")
         else:
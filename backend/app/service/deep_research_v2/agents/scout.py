@@ -12,38 +12,46 @@ DeepResearch V2.0 - 深度侦探 Agent (DeepScout)
 import uuid
 import asyncio
 import hashlib
-import requests
-from typing import Dict, Any, List, Optional
+import itertools
+import threading
+from typing import Dict, Any, List, Optional, Tuple
 from datetime import datetime
 
 from .base import BaseAgent
 from ..state import ResearchState, ResearchPhase
 
-# 网页文本提取库（可选依赖）
+# 共享网络搜索提供方
 try:
-    import trafilatura
-    TRAFILATURA_AVAILABLE = True
+    from service.search_provider import get_search_provider
+    from service.search_cache import get_search_cache
+    from service.query_normalizer import QueryDeduplicator
+    from service.dedup_index import DedupIndex
+    from service.source_credibility import get_source_credibility
+    from service.page_fetcher import get_page_fetcher
+    from service.html_extractor import extract_text, extract_text_async
+    from config.llm_config import get_config
 except ImportError:
-    TRAFILATURA_AVAILABLE = False
-
-try:
-    from bs4 import BeautifulSoup
-    BS4_AVAILABLE = True
-except ImportError:
-    BS4_AVAILABLE = False
-
-# 本地知识库搜索依赖
+    from app.service.search_provider import get_search_provider
+    from app.service.search_cache import get_search_cache
+    from app.service.query_normalizer import QueryDeduplicator
+    from app.service.dedup_index import DedupIndex
+    from app.service.source_credibility import get_source_credibility
+    from app.service.page_fetcher import get_page_fetcher
+    from app.service.html_extractor import extract_text, extract_text_async
+    from app.config.llm_config import get_config
+
+# 本地知识库搜索依赖（向量存储后端见 VECTOR_STORE_BACKEND）
 try:
-    from service.milvus_service import MilvusService
-    from service.embedding_service import generate_embedding
-    MILVUS_AVAILABLE = True
+    from service.vector_store import get_vector_store
+    from service.embedding_service import generate_embedding, generate_embedding_async
+    LOCAL_SEARCH_AVAILABLE = True
 except ImportError:
     try:
-        from app.service.milvus_service import MilvusService
-        from app.service.embedding_service import generate_embedding
-        MILVUS_AVAILABLE = True
+        from app.service.vector_store import get_vector_store
+        from app.service.embedding_service import generate_embedding, generate_embedding_async
+        LOCAL_SEARCH_AVAILABLE = True
     except ImportError:
-        MILVUS_AVAILABLE = False
+        LOCAL_SEARCH_AVAILABLE = False
 
 
 class DeepScout(BaseAgent):
@@ -85,8 +93,6 @@ class DeepScout(BaseAgent):
             "content": "提取的事实陈述（要具体、可验证）",
             "source_name": "来源名称",
             "source_url": "来源URL",
-            "source_type": "official/academic/news/report/self_media",
-            "credibility_score": 0.0-1.0,
             "data_points": [
                 {{"name": "指标名", "value": "数值", "unit": "单位", "year": 2024}}
             ],
@@ -114,13 +120,7 @@ class DeepScout(BaseAgent):
 }}
 ```
 
-## 评分标准
-- 官方来源（政府、央企）: 0.9-1.0
-- 学术来源（论文、研究机构）: 0.8-0.95
-- 权威媒体（央媒、财经媒体）: 0.7-0.85
-- 行业报告（券商、咨询）: 0.7-0.9
-- 一般新闻: 0.5-0.7
-- 自媒体: 0.2-0.5
+每条结果的来源类型与可信度已预先评定（见"来源"一行），同一事实有多个来源时优先采用可信度高的来源。
 
 请开始分析："""
 
@@ -164,6 +164,15 @@ URL: {url}
 }}
 ```"""
 
+    # 每轮并行研究的最大章节数
+    MAX_SECTIONS_PER_PASS = 3
+
+    # 投机搜索每个查询的结果条数（正式搜索请求更多条数时不复用投机结果）
+    PREFETCH_COUNT = 10
+
+    # 单个章节内并发执行的搜索数（查询 × 来源）
+    MAX_CONCURRENT_QUERIES = 4
+
     def __init__(
         self,
         llm_api_key: str,
@@ -179,17 +188,26 @@ URL: {url}
             model=model
         )
         self.search_api_key = search_api_key
-        self.search_cache: Dict[str, List] = {}
-        self.fact_fingerprints: Dict[str, str] = {}  # 事实指纹用于去重
-
-        # 初始化本地知识库搜索服务
-        self.milvus_service = None
-        if MILVUS_AVAILABLE:
+        self.search_provider = get_search_provider(search_api_key)
+        self.search_cache = get_search_cache()
+        self._prefetch_tasks: Dict[str, asyncio.Task] = {}  # 投机搜索任务（规划阶段发起）
+        self._prefetched_sections: List[str] = []
+        self._fact_index: Optional[DedupIndex] = None  # 事实去重索引（单次研究范围）
+        self._fact_index_session: Optional[str] = None
+        self._fact_sources: Dict[int, str] = {}  # 索引键 -> 来源 URL
+        self._fact_keys = itertools.count()
+        self._fact_lock = threading.Lock()  # 多个章节并行时串行化索引更新
+        self._query_dedup: Optional[QueryDeduplicator] = None  # 重复查询抑制（单次研究范围）
+        self._query_dedup_session: Optional[str] = None
+
+        # 初始化本地知识库搜索（Milvus 或进程内 embedded 存储）
+        self.vector_store = None
+        if LOCAL_SEARCH_AVAILABLE:
             try:
-                self.milvus_service = MilvusService()
-                self.logger.info("Milvus service initialized for local knowledge base search")
+                self.vector_store = get_vector_store()
+                self.logger.info(f"{type(self.vector_store).__name__} initialized for local knowledge base search")
             except Exception as e:
-                self.logger.warning(f"Failed to initialize Milvus service: {e}")
+                self.logger.warning(f"Failed to initialize vector store: {e}")
 
     async def process(self, state: ResearchState) -> ResearchState:
         """处理入口"""
@@ -248,9 +266,14 @@ URL: {url}
             "content": f"开始{'、'.join(search_mode_desc)}，共 {len(pending_sections)} 个章节待研究..."
         })
 
+        # 派发前合并各章节的重复查询，并取消已不需要的投机搜索
+        sections_this_pass = pending_sections[:self.MAX_SECTIONS_PER_PASS]  # 每次最多处理3个章节
+        if await self._dedup_section_queries(state, sections_this_pass):
+            self.discard_prefetch(state["outline"])
+
         # 并行研究多个章节
         tasks = []
-        for section in pending_sections[:3]:  # 每次最多处理3个章节
+        for section in sections_this_pass:
             tasks.append(self._research_section(state, section))
 
         await asyncio.gather(*tasks)
@@ -278,9 +301,10 @@ URL: {url}
 
         这个方法在 Critic 发现需要补充信息时被调用
         """
-        pending_queries = state.get("pending_search_queries", [])
+        pending_queries = await self._dedup_queries(state, state.get("pending_search_queries", []))
 
         if not pending_queries:
+            state["pending_search_queries"] = []
             self.logger.info("No pending search queries for supplementary research")
             state["phase"] = ResearchPhase.WRITING.value
             return state
@@ -325,11 +349,13 @@ URL: {url}
 
                 if analysis:
                     # 添加新事实
-                    for fact in analysis.get("extracted_facts", []):
+                    extracted_facts = analysis.get("extracted_facts", [])
+                    duplicates = await self._find_duplicate_facts(state, extracted_facts)
+                    for fact, is_duplicate in zip(extracted_facts, duplicates):
                         content = fact.get("content", "")
                         source_url = fact.get("source_url", "")
 
-                        if not self._is_duplicate_fact(content, source_url):
+                        if not is_duplicate:
                             fact_entry = {
                                 "id": f"fact_{uuid.uuid4().hex[:8]}",
                                 "content": content,
@@ -467,8 +493,8 @@ URL: {url}
     ) -> Optional[Dict]:
         """分析补充搜索结果"""
         results_text = []
-        for r in results[:8]:
-            results_text.append(f"标题: {r.get('title', 'N/A')}\n来源: {r.get('site_name', 'N/A')}\n内容: {r.get('summary', '')[:300]}")
+        for r in self._prepare_results(results)[:8]:
+            results_text.append(f"标题: {r.get('title', 'N/A')}\nURL: {r.get('url', '')}\n来源: {self._format_source(r)}\n内容: {r.get('summary', '')[:300]}")
 
         prompt = f"""你是一位专业的研究分析师，正在补充搜索以解决审核发现的信息缺失问题。
 
@@ -492,8 +518,6 @@ URL: {url}
             "content": "提取的事实陈述",
             "source_name": "来源名称",
             "source_url": "来源URL",
-            "source_type": "official/academic/news/report",
-            "credibility_score": 0.0-1.0,
             "data_points": [
                 {{"name": "指标名", "value": "数值", "unit": "单位"}}
             ]
@@ -510,7 +534,7 @@ URL: {url}
             temperature=0.2
         )
 
-        return self.parse_json_response(response)
+        return self._apply_source_credibility(self.parse_json_response(response))
 
     def _emit_search_results_event(self, state: ResearchState) -> None:
         """发送搜索结果事件供前端展示"""
@@ -531,6 +555,114 @@ URL: {url}
                 "results": search_results_for_ui
             })
 
+    def _get_query_dedup(self, state: ResearchState) -> QueryDeduplicator:
+        """获取本次研究的查询去重器（恢复研究时用已派发的查询重建）"""
+        session_id = state.get("session_id")
+        if self._query_dedup is None or self._query_dedup_session != session_id:
+            config = get_config().research
+            embed_fn = None
+            if LOCAL_SEARCH_AVAILABLE and config.query_dedup_embedding:
+                embed_fn = lambda texts: generate_embedding(texts)
+            self._query_dedup = QueryDeduplicator(
+                token_threshold=config.query_dedup_threshold,
+                embedding_threshold=config.query_dedup_embedding_threshold,
+                embed_fn=embed_fn
+            )
+            self._query_dedup.seed(state.get("executed_queries", []))
+            self._query_dedup_session = session_id
+        return self._query_dedup
+
+    async def _dedup_queries(self, state: ResearchState, queries: List[str]) -> List[str]:
+        """
+        抑制与已派发查询近似重复的查询
+
+        Returns:
+            需要实际派发的查询；被抑制的数量计入 run_stats["queries_suppressed"]
+        """
+        if not queries:
+            return []
+        dedup = self._get_query_dedup(state)
+        # 向量复核需要调用 embedding 接口，放入线程池执行
+        kept, suppressed = await asyncio.to_thread(dedup.filter, queries)
+
+        state.setdefault("executed_queries", []).extend(kept)
+        if suppressed:
+            run_stats = state.setdefault("run_stats", {})
+            run_stats["queries_suppressed"] = run_stats.get("queries_suppressed", 0) + len(suppressed)
+            for query, duplicate_of in suppressed:
+                self.logger.info(f"Suppressed duplicate query '{query}' (same as '{duplicate_of}')")
+        return kept
+
+    async def _dedup_section_queries(self, state: ResearchState, sections: List[Dict]) -> int:
+        """
+        合并本轮各章节的重复查询（章节顺序即优先级）
+
+        每个章节至少保留一条查询，以保证章节分析有输入（重复查询会命中共享缓存）。
+
+        Returns:
+            被抑制的查询数量
+        """
+        suppressed_total = 0
+        run_stats = state.setdefault("run_stats", {})
+        for section in sections:
+            queries = section.get("search_queries")
+            if not queries:
+                continue
+            before = run_stats.get("queries_suppressed", 0)
+            kept = await self._dedup_queries(state, queries)
+            if not kept:
+                # 兜底保留的查询会实际派发：登记为已派发，并从抑制数中扣除（仅当确实计入过）
+                kept = queries[:1]
+                state.setdefault("executed_queries", []).extend(kept)
+                if run_stats.get("queries_suppressed", 0) > before:
+                    run_stats["queries_suppressed"] -= 1
+            suppressed_total += run_stats.get("queries_suppressed", 0) - before
+            section["search_queries"] = kept
+        return suppressed_total
+
+    def _emit_search_progress(
+        self,
+        state: ResearchState,
+        section_title: str,
+        query: str,
+        source: str,
+        results: List[Dict],
+        total_so_far: int,
+        progress: str
+    ) -> None:
+        """单个查询完成后立即发送进度与结果（让用户看到进度）"""
+        self.add_message(state, "search_progress", {
+            "agent": self.name,
+            "query": query,
+            "results_count": len(results),
+            "total_so_far": total_so_far,
+            "section": section_title,
+            "progress": progress,
+            "search_type": source
+        })
+
+        is_local = source == "local"
+        results_for_ui = []
+        for r in results[:5]:  # 每次最多显示5条
+            item = {
+                "id": f"{'lr' if is_local else 'sr'}_{uuid.uuid4().hex[:6]}",
+                "title": r.get("title", "")[:80],
+                "source": "本地知识库" if is_local else r.get("site_name", "未知来源"),
+                "url": r.get("url", ""),
+                "snippet": r.get("summary", "") or r.get("snippet", ""),
+                "date": "" if is_local else r.get("date", ""),
+                "isLocal": is_local
+            }
+            if is_local:
+                item["score"] = r.get("score", 0)
+            results_for_ui.append(item)
+
+        self.add_message(state, "search_results", {
+            "results": results_for_ui,
+            "isIncremental": True,
+            "searchType": source
+        })
+
     async def _research_section(self, state: ResearchState, section: Dict) -> None:
         """研究单个章节"""
         section_id = section["id"]
@@ -552,80 +684,44 @@ URL: {url}
             "search_local": search_local
         })
 
-        # 逐个执行搜索，每完成一个就发送事件（提升用户体验）
-        all_results = []
-        for i, query in enumerate(search_queries):
-            # 网络搜索
-            if search_web:
-                results = await self._execute_search(query)
-                all_results.extend(results)
+        # 网络查询逐条并发，本地查询合并为一次批量检索，按完成顺序推送进度
+        sources = (["web"] if search_web else []) + (["local"] if search_local else [])
+        jobs = [(query, source) for query in search_queries for source in sources]
+        semaphore = asyncio.Semaphore(self.MAX_CONCURRENT_QUERIES)
 
-                # 搜索完成后立即发送原始结果（让用户看到进度）
+        async def run_web_job(slot: int, query: str):
+            async with semaphore:
+                results = await self._execute_search(query)
+            return [(slot, query, "web", results)]
+
+        async def run_local_job(local_jobs: List[Tuple[int, str]]):
+            async with semaphore:
+                batches = await self._execute_local_search_many([q for _, q in local_jobs])
+            return [(slot, query, "local", results) for (slot, query), results in zip(local_jobs, batches)]
+
+        tasks = [run_web_job(slot, q) for slot, (q, src) in enumerate(jobs) if src == "web"]
+        local_jobs = [(slot, q) for slot, (q, src) in enumerate(jobs) if src == "local"]
+        if local_jobs:
+            tasks.append(run_local_job(local_jobs))
+
+        slots: List[List[Dict]] = [[] for _ in jobs]
+        total_so_far = 0
+        completed = 0
+        for future in asyncio.as_completed(tasks):
+            try:
+                finished = await future
+            except Exception as e:
+                self.logger.error(f"Search task failed in section '{section_title}': {e}")
+                continue
+            for slot, query, source, results in finished:
+                completed += 1
+                slots[slot] = results
+                total_so_far += len(results)
                 if results:
-                    self.add_message(state, "search_progress", {
-                        "agent": self.name,
-                        "query": query,
-                        "results_count": len(results),
-                        "total_so_far": len(all_results),
-                        "section": section_title,
-                        "progress": f"{i + 1}/{len(search_queries)}",
-                        "search_type": "web"
-                    })
-
-                    # 立即发送搜索结果供前端展示
-                    search_results_for_ui = [
-                        {
-                            "id": f"sr_{uuid.uuid4().hex[:6]}",
-                            "title": r.get("title", "")[:80],
-                            "source": r.get("site_name", "未知来源"),
-                            "url": r.get("url", ""),
-                            "snippet": r.get("summary", "") or r.get("snippet", ""),
-                            "date": r.get("date", ""),
-                            "isLocal": False
-                        }
-                        for r in results[:5]  # 每次最多显示5条
-                    ]
-                    self.add_message(state, "search_results", {
-                        "results": search_results_for_ui,
-                        "isIncremental": True,
-                        "searchType": "web"
-                    })
-
-            # 本地知识库搜索
-            if search_local:
-                local_results = await self._execute_local_search(query)
-                all_results.extend(local_results)
+                    self._emit_search_progress(state, section_title, query, source, results, total_so_far, f"{completed}/{len(jobs)}")
 
-                if local_results:
-                    self.add_message(state, "search_progress", {
-                        "agent": self.name,
-                        "query": query,
-                        "results_count": len(local_results),
-                        "total_so_far": len(all_results),
-                        "section": section_title,
-                        "progress": f"{i + 1}/{len(search_queries)}",
-                        "search_type": "local"
-                    })
-
-                    # 发送本地搜索结果
-                    local_results_for_ui = [
-                        {
-                            "id": f"lr_{uuid.uuid4().hex[:6]}",
-                            "title": r.get("title", "")[:80],
-                            "source": "本地知识库",
-                            "url": r.get("url", ""),
-                            "snippet": r.get("summary", "") or r.get("snippet", ""),
-                            "date": "",
-                            "isLocal": True,
-                            "score": r.get("score", 0)
-                        }
-                        for r in local_results[:5]
-                    ]
-                    self.add_message(state, "search_results", {
-                        "results": local_results_for_ui,
-                        "isIncremental": True,
-                        "searchType": "local"
-                    })
+        # 按查询顺序合并（同一查询网络在前、本地在后），保证分析输入稳定
+        all_results = [r for results in slots for r in results]
 
         if not all_results:
             self.logger.warning(f"No search results for section: {section_title}")
@@ -648,12 +744,14 @@ URL: {url}
             # 提取事实（带去重）
             added_facts = 0
             duplicate_facts = 0
-            for fact in analysis.get("extracted_facts", []):
+            extracted_facts = analysis.get("extracted_facts", [])
+            duplicates = await self._find_duplicate_facts(state, extracted_facts)
+            for fact, is_duplicate in zip(extracted_facts, duplicates):
                 content = fact.get("content", "")
                 source_url = fact.get("source_url", "")
 
                 # 去重检查
-                if self._is_duplicate_fact(content, source_url):
+                if is_duplicate:
                     duplicate_facts += 1
                     continue
 
@@ -872,11 +970,13 @@ URL: {url}
 
             # 提取并添加事实
             added_facts = 0
-            for fact in analysis.get("extracted_facts", []):
+            extracted_facts = analysis.get("extracted_facts", [])
+            duplicates = await self._find_duplicate_facts(state, extracted_facts)
+            for fact, is_duplicate in zip(extracted_facts, duplicates):
                 content = fact.get("content", "")
                 source_url = fact.get("source_url", "")
 
-                if not self._is_duplicate_fact(content, source_url):
+                if not is_duplicate:
                     fact_entry = {
                         "id": f"fact_{uuid.uuid4().hex[:8]}",
                         "content": content,
@@ -941,8 +1041,8 @@ URL: {url}
     ) -> Optional[Dict]:
         """分析深度搜索结果"""
         results_text = []
-        for r in results[:6]:
-            results_text.append(f"标题: {r.get('title', 'N/A')}\n来源: {r.get('site_name', 'N/A')}\n内容: {r.get('summary', '')[:300]}")
+        for r in self._prepare_results(results)[:6]:
+            results_text.append(f"标题: {r.get('title', 'N/A')}\nURL: {r.get('url', '')}\n来源: {self._format_source(r)}\n内容: {r.get('summary', '')[:300]}")
 
         hypotheses_text = ""
         if hypotheses:
@@ -977,8 +1077,6 @@ URL: {url}
             "content": "提取的事实陈述（要具体、可验证）",
             "source_name": "来源名称",
             "source_url": "来源URL",
-            "source_type": "official/academic/news/report",
-            "credibility_score": 0.0-1.0,
             "related_hypothesis": "h_1或null",
             "hypothesis_support": "supports/refutes/neutral"
         }}
@@ -998,11 +1096,11 @@ URL: {url}
             temperature=0.2
         )
 
-        return self.parse_json_response(response)
+        return self._apply_source_credibility(self.parse_json_response(response))
 
     async def _execute_local_search(self, query: str, top_k: int = 10) -> List[Dict]:
         """
-        执行本地知识库搜索 - 使用 Milvus 向量检索
+        执行本地知识库搜索 - 向量检索（VectorStore）
 
         Args:
             query: 搜索查询
@@ -1011,13 +1109,13 @@ URL: {url}
         Returns:
             搜索结果列表
         """
-        if not self.milvus_service or not MILVUS_AVAILABLE:
-            self.logger.warning("Milvus service not available for local search")
+        if not self.vector_store:
+            self.logger.warning("Vector store not available for local search")
             return []
 
         try:
-            # 生成查询向量
-            query_vector = generate_embedding(query)
+            # 生成查询向量（与其他章节的并发查询微批合并）
+            query_vector = await generate_embedding_async(query)
             if not query_vector:
                 self.logger.error("Failed to generate embedding for query")
                 return []
@@ -1025,28 +1123,15 @@ URL: {url}
             self.logger.info(f"Executing local knowledge base search: {query[:50]}...")
 
             # 搜索所有知识库（collection_name = "knowledge_base"）
-            results = self.milvus_service.search(
+            results = await asyncio.to_thread(
+                self.vector_store.search,
                 collection_name="knowledge_base",
                 query_vector=query_vector,
                 top_k=top_k
             )
 
             # 格式化结果为与网络搜索一致的格式
-            formatted_results = []
-            for r in results:
-                formatted_results.append({
-                    'url': f"local://kb/{r.get('kb_id', 'unknown')}/{r.get('doc_id', 'unknown')}",
-                    'title': r.get('filename', 'N/A'),
-                    'summary': r.get('content', '')[:500],
-                    'snippet': r.get('content', '')[:200],
-                    'site_name': f"本地知识库",
-                    'date': '',
-                    'score': r.get('score', 0),
-                    'is_local': True,
-                    'kb_id': r.get('kb_id'),
-                    'doc_id': r.get('doc_id'),
-                    'chunk_index': r.get('chunk_index')
-                })
+            formatted_results = self._format_local_results(results)
 
             self.logger.info(f"Local search returned {len(formatted_results)} results for: {query[:30]}...")
             return formatted_results
@@ -1055,72 +1140,138 @@ URL: {url}
             self.logger.error(f"Local search error for '{query}': {e}")
             return []
 
-    async def _execute_search(self, query: str, count: int = 10) -> List[Dict]:
-        """执行网络搜索 - 使用 Bocha Web Search API"""
-        # 检查缓存
-        cache_key = hashlib.md5(query.encode()).hexdigest()
-        if cache_key in self.search_cache:
-            self.logger.debug(f"Cache hit for query: {query[:30]}...")
-            return self.search_cache[cache_key]
+    async def _execute_local_search_many(self, queries: List[str], top_k: int = 10) -> List[List[Dict]]:
+        """
+        批量执行本地知识库搜索 - 所有查询一次向量化、一次向量检索
+
+        Args:
+            queries: 搜索查询列表
+            top_k: 每个查询返回的结果数量
+
+        Returns:
+            与 queries 一一对应的搜索结果列表
+        """
+        if not queries:
+            return []
+        if not self.vector_store:
+            self.logger.warning("Vector store not available for local search")
+            return [[] for _ in queries]
 
         try:
-            url = "https://api.bocha.cn/v1/web-search"
-            payload = {
-                "query": query,
-                "summary": True,
-                "count": count,
-                "freshness": "noLimit"
-            }
-            headers = {
-                'Authorization': f'Bearer {self.search_api_key}',
-                'Content-Type': 'application/json'
-            }
+            query_vectors = await generate_embedding_async(list(queries))
+            if not query_vectors or not any(query_vectors):
+                self.logger.error("Failed to generate embeddings for queries")
+                return [[] for _ in queries]
 
-            self.logger.info(f"Executing Bocha search: {query[:50]}...")
+            self.logger.info(f"Executing batched local knowledge base search for {len(queries)} queries")
 
-            response = await asyncio.to_thread(
-                requests.post,
-                url,
-                headers=headers,
-                json=payload,
-                timeout=30
+            # 搜索所有知识库（collection_name = "knowledge_base"），向量生成失败的查询返回空结果
+            results = await asyncio.to_thread(
+                self.vector_store.search_many,
+                collection_name="knowledge_base",
+                query_vectors=query_vectors,
+                top_k=top_k
             )
 
-            if response.status_code != 200:
-                self.logger.error(f"Bocha API error: {response.status_code} - {response.text[:200]}")
-                return []
+            return [self._format_local_results(hits) for hits in results]
 
-            data = response.json()
+        except Exception as e:
+            self.logger.error(f"Batched local search error: {e}")
+            return [[] for _ in queries]
 
-            if data.get('code') != 200:
-                self.logger.error(f"Bocha API returned error: {data.get('msg', 'Unknown error')}")
-                return []
+    @staticmethod
+    def _format_local_results(results: List[Dict]) -> List[Dict]:
+        """向量检索结果 -> 与网络搜索一致的格式"""
+        formatted_results = []
+        for r in results:
+            formatted_results.append({
+                'url': f"local://kb/{r.get('kb_id', 'unknown')}/{r.get('doc_id', 'unknown')}",
+                'title': r.get('filename', 'N/A'),
+                'summary': r.get('content', '')[:500],
+                'snippet': r.get('content', '')[:200],
+                'site_name': f"本地知识库",
+                'date': '',
+                'score': r.get('score', 0),
+                'is_local': True,
+                'kb_id': r.get('kb_id'),
+                'doc_id': r.get('doc_id'),
+                'chunk_index': r.get('chunk_index')
+            })
+        return formatted_results
 
-            webpages = data.get('data', {}).get('webPages', {}).get('value', [])
-            self.logger.info(f"Bocha search returned {len(webpages)} results for: {query[:30]}...")
-
-            results = []
-            for item in webpages:
-                if item.get('url') and (item.get('snippet') or item.get('summary')):
-                    results.append({
-                        'url': item.get('url'),
-                        'title': item.get('name', 'N/A'),
-                        'summary': item.get('summary', '') or item.get('snippet', ''),
-                        'snippet': item.get('snippet', ''),
-                        'site_name': item.get('siteName', 'N/A'),
-                        'date': item.get('datePublished', '') or item.get('dateLastCrawled', '')
-                    })
+    def prefetch_section(self, section: Dict) -> None:
+        """
+        投机预取：规划阶段流式解析出章节后立即发起其网络搜索
 
-            # 缓存结果
-            self.search_cache[cache_key] = results
-            return results
+        只预取本轮会被研究的前 MAX_SECTIONS_PER_PASS 个章节，
+        结果写入共享搜索缓存，正式研究时直接命中。
+        """
+        if len(self._prefetched_sections) >= self.MAX_SECTIONS_PER_PASS:
+            return
+        self._prefetched_sections.append(section.get("id", ""))
 
-        except requests.exceptions.Timeout:
-            self.logger.error(f"Bocha search timeout for: {query[:30]}...")
-            return []
-        except Exception as e:
-            self.logger.error(f"Bocha search error for '{query}': {e}")
-            return []
+        for query in section.get("search_queries", []):
+            if not query or not query.strip():
+                continue
+            cache_key = hashlib.md5(query.encode()).hexdigest()
+            if cache_key in self._prefetch_tasks:
+                continue
+            self._prefetch_tasks[cache_key] = asyncio.create_task(self._fetch_web_results(query, self.PREFETCH_COUNT))
+
+    def discard_prefetch(self, outline: List[Dict]) -> int:
+        """
+        最终大纲确定后，丢弃不再需要的投机搜索
+
+        Args:
+            outline: 最终大纲（只保留本轮会被研究的章节的搜索）
+
+        Returns:
+            丢弃的投机搜索数量
+        """
+        pending = [s for s in outline if s.get("status", "pending") == "pending"]
+        keep = {
+            hashlib.md5(q.encode()).hexdigest()
+            for s in pending[:self.MAX_SECTIONS_PER_PASS]
+            for q in s.get("search_queries", []) if q
+        }
+
+        discarded = 0
+        for cache_key, task in list(self._prefetch_tasks.items()):
+            if cache_key in keep:
+                continue
+            task.cancel()
+            del self._prefetch_tasks[cache_key]
+            discarded += 1
+
+        kept = len(self._prefetch_tasks)
+        self._prefetched_sections = []
+        if discarded or kept:
+            self.logger.info(f"Speculative search: kept {kept}, discarded {discarded}")
+        return discarded
+
+    async def _execute_search(self, query: str, count: int = 10) -> List[Dict]:
+        """执行网络搜索（带缓存，优先复用规划阶段的投机搜索）"""
+        # 投机搜索仍在进行中，等待其结果；已完成的结果已写入共享缓存
+        # 投机搜索按 PREFETCH_COUNT 条发起，只有请求条数不超过它时才复用（截取前 count 条）
+        cache_key = hashlib.md5(query.encode()).hexdigest()
+        prefetch = self._prefetch_tasks.pop(cache_key, None) if count <= self.PREFETCH_COUNT else None
+        if prefetch is not None:
+            try:
+                results = await asyncio.shield(prefetch)
+                self.logger.debug(f"Speculative search hit for query: {query[:30]}...")
+                return results[:count]
+            except asyncio.CancelledError:
+                if prefetch.cancelled():
+                    self.logger.debug(f"Speculative search cancelled, searching again: {query[:30]}...")
+                else:
+                    raise
+
+        return await self._fetch_web_results(query, count)
+
+    async def _fetch_web_results(self, query: str, count: int = 10) -> List[Dict]:
+        """执行网络搜索 - 通过共享的搜索提供方（连接池复用、限流）与两级共享缓存"""
+        self.logger.info(f"Executing web search: {query[:50]}...")
+        return await self.search_cache.get_or_fetch(self.search_provider, query, count=count)
 
     async def _analyze_search_results(
         self,
@@ -1133,13 +1284,13 @@ URL: {url}
         if not results:
             return None
 
-        # 格式化搜索结果
+        # 预先评定来源，丢弃低可信度结果后格式化
         formatted_results = []
-        for i, r in enumerate(results[:15]):  # 最多分析15条
+        for i, r in enumerate(self._prepare_results(results)[:15]):  # 最多分析15条
             formatted_results.append(f"""
 [{i+1}] {r.get('title', 'N/A')}
 URL: {r.get('url', '')}
-来源: {r.get('site_name', 'N/A')}
+来源: {self._format_source(r)}
 日期: {r.get('date', 'N/A')}
 摘要: {r.get('summary', '')[:300]}
 """)
@@ -1162,35 +1313,57 @@ URL: {r.get('url', '')}
         )
 
         response = await self.call_llm(
-            system_prompt="你是专业的研究分析师，擅长从搜索结果中提取结构化信息、验证假设并评估来源质量。",
+            system_prompt="你是专业的研究分析师，擅长从搜索结果中提取结构化信息并验证假设。",
             user_prompt=prompt,
             json_mode=True,
             temperature=0.2
         )
 
-        return self.parse_json_response(response)
+        return self._apply_source_credibility(self.parse_json_response(response))
+
+    def _prepare_results(self, results: List[Dict]) -> List[Dict]:
+        """用本地信源表预先评定来源类型与可信度，并丢弃低可信度结果"""
+        credibility = get_source_credibility()
+        return credibility.filter(credibility.annotate(results), get_config().research.min_source_credibility)
+
+    @staticmethod
+    def _format_source(result: Dict) -> str:
+        return f"{result.get('site_name', 'N/A')}（{result.get('source_label', '新闻')}，可信度 {result.get('credibility', 0.5):.2f}）"
+
+    def _apply_source_credibility(self, analysis: Optional[Dict]) -> Optional[Dict]:
+        """按事实的来源 URL 写入 source_type / credibility_score（未收录的域名保留模型给出的值）"""
+        if not analysis:
+            return analysis
+        credibility = get_source_credibility()
+        for fact in analysis.get("extracted_facts", []):
+            profile = credibility.lookup(fact.get("source_url", ""))
+            if profile.known or "credibility_score" not in fact:
+                fact["source_type"] = profile.source_type
+                fact["credibility_score"] = profile.credibility
+            if not fact.get("source_name"):
+                fact["source_name"] = profile.name
+        return analysis
 
     async def deep_read_url(self, url: str, title: str, query: str) -> Optional[Dict]:
         """
         深度阅读网页内容
 
-        TODO: 集成 Headless Browser（如 Playwright）实现真正的网页抓取
-        目前使用简化版本
+        通过共享的网页抓取器获取（域名并发限制、大小上限、磁盘缓存），
+        重复阅读同一 URL 时原始页面与提取后的正文均直接来自本地缓存。
+
+        TODO: 集成 Headless Browser（如 Playwright）处理需要渲染的页面
         """
         try:
-            # 简化版：直接获取网页内容
-            response = await asyncio.to_thread(
-                requests.get,
+            # 提取网页正文（去除 HTML 标签和噪音），提取结果随页面一起缓存
+            page = await get_page_fetcher().fetch(
                 url,
-                timeout=15,
-                headers={'User-Agent': 'Mozilla/5.0'}
+                extractor=extract_text_async,
+                extractor_name="scout"
             )
-
-            if response.status_code != 200:
+            if page is None:
                 return None
 
-            # 提取网页正文（去除 HTML 标签和噪音）
-            content = self._extract_text_from_html(response.text, url)
+            content = page.text
             if not content or len(content) < 100:
                 self.logger.warning(f"Extracted content too short for {url}")
                 return None
@@ -1216,122 +1389,69 @@ URL: {r.get('url', '')}
 
     def _extract_text_from_html(self, html: str, url: str = "", max_length: int = 12000) -> str:
         """
-        从 HTML 中提取纯文本正文
-
-        使用多种策略提取，优先级：
-        1. trafilatura - 专业的网页正文提取库（效果最好）
-        2. BeautifulSoup - 通用 HTML 解析（备选）
-        3. 简单正则 - 最后的备选方案
-
-        Args:
-            html: 原始 HTML 内容
-            url: 网页 URL（用于 trafilatura 优化）
-            max_length: 最大返回长度
+        从 HTML 中提取纯文本正文（同步版本，见 service.html_extractor）
 
-        Returns:
-            提取的纯文本
+        异步场景请使用 extract_text_async，解析在独立进程池中执行，不阻塞事件循环。
         """
-        text = ""
-
-        # 方法 1: 使用 trafilatura（效果最好）
-        if TRAFILATURA_AVAILABLE:
-            try:
-                text = trafilatura.extract(
-                    html,
-                    url=url,
-                    include_comments=False,
-                    include_tables=True,
-                    no_fallback=False,
-                    favor_precision=True
-                )
-                if text and len(text) > 200:
-                    self.logger.debug(f"Trafilatura extracted {len(text)} chars from {url}")
-                    return text[:max_length]
-            except Exception as e:
-                self.logger.warning(f"Trafilatura extraction failed: {e}")
-
-        # 方法 2: 使用 BeautifulSoup
-        if BS4_AVAILABLE:
-            try:
-                soup = BeautifulSoup(html, 'lxml')
-
-                # 移除无用标签
-                for tag in soup(['script', 'style', 'nav', 'header', 'footer',
-                                'aside', 'iframe', 'noscript', 'meta', 'link']):
-                    tag.decompose()
-
-                # 尝试找正文区域
-                main_content = None
-                for selector in ['article', 'main', '.content', '.article',
-                                '#content', '#article', '.post', '.entry']:
-                    main_content = soup.select_one(selector)
-                    if main_content:
-                        break
-
-                if main_content:
-                    text = main_content.get_text(separator='\n', strip=True)
+        return extract_text(html, url, max_length)
+
+    def _get_fact_index(self, state: ResearchState) -> DedupIndex:
+        """获取本次研究的事实去重索引（恢复研究时用已有事实重建）"""
+        session_id = state.get("session_id")
+        if self._fact_index is None or self._fact_index_session != session_id:
+            config = get_config().research
+            embed_fn = None
+            if LOCAL_SEARCH_AVAILABLE and config.fact_dedup_embedding:
+                embed_fn = lambda texts: generate_embedding(texts)
+            self._fact_index = DedupIndex(threshold=config.fact_dedup_threshold, embed_fn=embed_fn)
+            self._fact_sources = {}
+            self._fact_keys = itertools.count()
+            for fact in state.get("facts", []):
+                key = self._fact_index.add(fact.get("content", ""), key=next(self._fact_keys))
+                self._fact_sources[key] = fact.get("source_url", "")
+            self._fact_index_session = session_id
+        return self._fact_index
+
+    def _check_facts(self, index: DedupIndex, facts: List[Dict]) -> List[bool]:
+        """批量去重（同步，在线程中执行）"""
+        contents = [fact.get("content", "") for fact in facts]
+        duplicates = []
+        with self._fact_lock:
+            keys = [next(self._fact_keys) for _ in facts]
+            matches = index.check_many(contents, keys=keys)
+            for fact, content, key, match in zip(facts, contents, keys, matches):
+                source_url = fact.get("source_url", "")
+                if match is None:
+                    # 未重复的事实已登记到索引，记录其来源
+                    self._fact_sources[key] = source_url
+                    duplicates.append(False)
+                elif self._fact_sources.get(match) == source_url:
+                    # 如果是同一个来源，不算重复（可能是更详细的版本），同样登记以便后续比较
+                    index.add(content, key=key)
+                    self._fact_sources[key] = source_url
+                    duplicates.append(False)
                 else:
-                    # 找不到正文区域，提取 body
-                    body = soup.find('body')
-                    if body:
-                        text = body.get_text(separator='\n', strip=True)
-                    else:
-                        text = soup.get_text(separator='\n', strip=True)
+                    self.logger.debug(f"Duplicate fact detected: {content[:50]}...")
+                    duplicates.append(True)
+        return duplicates
 
-                if text and len(text) > 200:
-                    # 清理多余空白
-                    import re
-                    text = re.sub(r'\n{3,}', '\n\n', text)
-                    text = re.sub(r' {2,}', ' ', text)
-                    self.logger.debug(f"BeautifulSoup extracted {len(text)} chars from {url}")
-                    return text[:max_length]
+    async def _find_duplicate_facts(self, state: ResearchState, facts: List[Dict]) -> List[bool]:
+        """
+        检查一批新事实是否与已有事实重复（MinHash LSH + 可选向量确认）
 
-            except Exception as e:
-                self.logger.warning(f"BeautifulSoup extraction failed: {e}")
-
-        # 方法 3: 简单正则（最后的备选）
-        import re
-        # 移除 script 和 style
-        text = re.sub(r'<script[^>]*>.*?</script>', '', html, flags=re.DOTALL | re.IGNORECASE)
-        text = re.sub(r'<style[^>]*>.*?</style>', '', html, flags=re.DOTALL | re.IGNORECASE)
-        # 移除所有 HTML 标签
-        text = re.sub(r'<[^>]+>', ' ', text)
-        # 解码 HTML 实体
-        text = text.replace('&nbsp;', ' ').replace('&lt;', '<').replace('&gt;', '>')
-        text = text.replace('&amp;', '&').replace('&quot;', '"')
-        # 清理空白
-        text = re.sub(r'\s+', ' ', text).strip()
-
-        self.logger.debug(f"Regex extracted {len(text)} chars from {url}")
-        return text[:max_length]
-
-    def _compute_fact_fingerprint(self, content: str) -> str:
-        """计算事实的语义指纹用于去重"""
-        # 简化版：使用内容hash
-        # TODO: 集成向量嵌入进行语义相似度比较
-        import re
-        # 提取数字和关键词作为指纹
-        numbers = re.findall(r'\d+\.?\d*', content)
-        keywords = re.findall(r'[\u4e00-\u9fa5]{2,4}', content)[:5]
-        fingerprint = f"{','.join(numbers[:3])}|{','.join(keywords)}"
-        return hashlib.md5(fingerprint.encode()).hexdigest()[:16]
-
-    def _is_duplicate_fact(self, content: str, source_url: str) -> bool:
-        """检查事实是否重复"""
-        fingerprint = self._compute_fact_fingerprint(content)
-
-        # 检查指纹是否已存在
-        if fingerprint in self.fact_fingerprints:
-            existing_url = self.fact_fingerprints[fingerprint]
-            # 如果是同一个来源，不算重复（可能是更详细的版本）
-            if existing_url == source_url:
-                return False
-            self.logger.debug(f"Duplicate fact detected: {content[:50]}...")
-            return True
-
-        # 保存指纹
-        self.fact_fingerprints[fingerprint] = source_url
-        return False
+        Returns:
+            与 facts 等长的列表，True 表示重复；重复数量计入 run_stats["facts_deduplicated"]
+        """
+        if not facts:
+            return []
+        index = self._get_fact_index(state)
+        # 向量确认需要调用 embedding 接口，放入线程池执行
+        duplicates = await asyncio.to_thread(self._check_facts, index, facts)
+        count = sum(duplicates)
+        if count:
+            run_stats = state.setdefault("run_stats", {})
+            run_stats["facts_deduplicated"] = run_stats.get("facts_deduplicated", 0) + count
+        return duplicates
 
     def _update_knowledge_graph(self, state: ResearchState, entities: List[Dict]) -> None:
         """更新知识图谱"""
@@ -0,0 +1,376 @@
+"""
+DeepResearch V2.0 - SSE 事件紧凑编码
+
+默认的 SSE 流会反复发送完整对象：report_draft 携带整篇报告、chart/charts 携带 base64 图片、
+search_results 重复发送最近 20 条事实。紧凑模式（请求参数 compact=true）下：
+
+1. 合并突发事件 - 短时间窗口内的多个小事件合并为一帧 {"type": "batch", "events": [...]}
+2. 增量文本 - 报告类文本只发送与上一版本的差异：
+   {"patch": {"offset": N, "text": "..."}}，客户端执行 text = prev[:N] + patch.text
+3. 增量列表 - 结果列表只发送新条目，已发送条目以键引用：
+   {"results_ref": ["key1", ...], "results_new": [{"_key": "key3", ...}]}
+4. 二进制外置 - 大于阈值的 image_base64 存入资源库，替换为 image_url（GET /research/assets/{id}）
+5. 可选压缩 - gzip / brotli，每帧 flush，保证流式可见
+
+非紧凑模式的输出格式保持不变。
+"""
+
+import os
+import json
+import time
+import zlib
+import base64
+import asyncio
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from typing import Dict, Any, List, Optional, Tuple, AsyncIterator, AsyncGenerator, Union
+
+try:
+    import brotli
+    BROTLI_AVAILABLE = True
+except ImportError:
+    BROTLI_AVAILABLE = False
+
+try:
+    from core.redis_client import cache
+    REDIS_AVAILABLE = True
+except ImportError:
+    try:
+        from app.core.redis_client import cache
+        REDIS_AVAILABLE = True
+    except ImportError:
+        cache = None
+        REDIS_AVAILABLE = False
+
+logger = logging.getLogger("EventEncoder")
+
+ASSET_URL_PREFIX = "/research/assets/"
+ASSET_KEY_PREFIX = "research:asset:"
+
+# 立即发送、不参与合并的事件类型
+FLUSH_EVENT_TYPES = {
+    "phase", "research_start", "research_complete", "research_cancelled",
+    "error", "queued", "dequeued", "checkpoint_saved",
+}
+
+# 需要增量发送的长文本字段：(事件类型, 字段路径) -> 文本流名称
+TEXT_DIFF_FIELDS = {
+    ("report_draft", ("content", "content")): "report",
+    ("research_complete", ("final_report",)): "report",
+}
+
+# 需要增量发送的列表字段：(事件类型, 字段路径) -> 列表流名称
+LIST_DIFF_FIELDS = {
+    ("search_results", ("content", "results")): "results",
+    ("charts", ("content", "charts")): "charts",
+    ("research_complete", ("references",)): "references",
+}
+
+# 需要外置的二进制字段及其 MIME 类型
+ASSET_FIELDS = {
+    "image_base64": "image/png",
+}
+
+
+# ==================== 资源库 ====================
+
+class AssetStore:
+    """
+    内容寻址的资源库
+
+    本地 LRU（按总字节数淘汰）+ Redis 写穿，多 worker 部署时任一进程都能取到资源。
+    """
+
+    def __init__(self, max_bytes: int = 128 * 1024 * 1024, ttl: int = 3600):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._items: "OrderedDict[str, Tuple[bytes, str, float]]" = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def put_base64(self, data_b64: str, mime: str) -> Optional[str]:
+        """保存 base64 内容，返回资源ID"""
+        try:
+            data = base64.b64decode(data_b64, validate=False)
+        except Exception as e:
+            logger.warning(f"Invalid base64 asset: {e}")
+            return None
+
+        asset_id = hashlib.sha1(data).hexdigest()[:24]
+        with self._lock:
+            if asset_id in self._items:
+                self._items.move_to_end(asset_id)
+                return asset_id
+            self._items[asset_id] = (data, mime, time.time())
+            self._size += len(data)
+            while self._size > self.max_bytes and self._items:
+                _, (old, _, _) = self._items.popitem(last=False)
+                self._size -= len(old)
+
+        if REDIS_AVAILABLE:
+            cache.set(f"{ASSET_KEY_PREFIX}{asset_id}", {"mime": mime, "data": data_b64}, expire=self.ttl)
+        return asset_id
+
+    def get(self, asset_id: str) -> Optional[Tuple[bytes, str]]:
+        """读取资源，返回 (内容, MIME)"""
+        with self._lock:
+            item = self._items.get(asset_id)
+            if item is not None:
+                data, mime, created = item
+                if time.time() - created <= self.ttl:
+                    self._items.move_to_end(asset_id)
+                    return data, mime
+                del self._items[asset_id]
+                self._size -= len(data)
+
+        if REDIS_AVAILABLE:
+            stored = cache.get(f"{ASSET_KEY_PREFIX}{asset_id}")
+            if stored:
+                try:
+                    return base64.b64decode(stored["data"]), stored.get("mime", "application/octet-stream")
+                except Exception as e:
+                    logger.warning(f"Corrupted asset {asset_id}: {e}")
+        return None
+
+
+_asset_store: Optional[AssetStore] = None
+
+
+def get_asset_store() -> AssetStore:
+    """获取资源库单例"""
+    global _asset_store
+    if _asset_store is None:
+        _asset_store = AssetStore()
+    return _asset_store
+
+
+# ==================== 事件编码 ====================
+
+def _get_path(event: Dict[str, Any], path: Tuple[str, ...]) -> Tuple[Optional[Dict], Any]:
+    """按路径取值，返回 (父对象, 值)"""
+    parent = event
+    for key in path[:-1]:
+        parent = parent.get(key) if isinstance(parent, dict) else None
+        if parent is None:
+            return None, None
+    if not isinstance(parent, dict):
+        return None, None
+    return parent, parent.get(path[-1])
+
+
+def _item_key(item: Any) -> str:
+    if isinstance(item, dict):
+        for field_name in ("id", "url", "link", "source_url"):
+            value = item.get(field_name)
+            if value:
+                return str(value)
+    raw = json.dumps(item, ensure_ascii=False, sort_keys=True, default=str)
+    return hashlib.md5(raw.encode("utf-8")).hexdigest()[:16]
+
+
+class EventEncoder:
+    """
+    单个 SSE 连接的紧凑编码器（有状态：记录已发送的文本和列表条目）
+    """
+
+    def __init__(
+        self,
+        coalesce_window: float = 0.05,
+        max_batch: int = 32,
+        asset_threshold: int = 8 * 1024,
+        asset_store: Optional[AssetStore] = None
+    ):
+        self.coalesce_window = coalesce_window
+        self.max_batch = max_batch
+        self.asset_threshold = asset_threshold
+        self.asset_store = asset_store or get_asset_store()
+
+        self._texts: Dict[str, str] = {}
+        self._sent_keys: Dict[str, set] = {}
+        self.stats = {"events": 0, "frames": 0, "raw_bytes": 0, "encoded_bytes": 0, "assets": 0}
+
+    # ---------- 单事件变换 ----------
+
+    def transform(self, event: Dict[str, Any]) -> Dict[str, Any]:
+        """将完整事件变换为紧凑形式（不修改原事件）"""
+        event = json.loads(json.dumps(event, ensure_ascii=False, default=str))
+        event_type = event.get("type", "")
+
+        for (diff_type, path), stream in TEXT_DIFF_FIELDS.items():
+            if diff_type == event_type:
+                self._diff_text(event, path, stream)
+
+        for (diff_type, path), stream in LIST_DIFF_FIELDS.items():
+            if diff_type == event_type:
+                self._diff_list(event, path, stream)
+
+        self._extract_assets(event)
+        return event
+
+    def _diff_text(self, event: Dict[str, Any], path: Tuple[str, ...], stream: str) -> None:
+        parent, text = _get_path(event, path)
+        if parent is None or not isinstance(text, str):
+            return
+
+        previous = self._texts.get(stream, "")
+        offset = 0
+        limit = min(len(previous), len(text))
+        while offset < limit and previous[offset] == text[offset]:
+            offset += 1
+
+        self._texts[stream] = text
+        del parent[path[-1]]
+        parent["patch"] = {"field": path[-1], "offset": offset, "text": text[offset:], "length": len(text)}
+
+    def _diff_list(self, event: Dict[str, Any], path: Tuple[str, ...], stream: str) -> None:
+        parent, items = _get_path(event, path)
+        if parent is None or not isinstance(items, list):
+            return
+
+        sent = self._sent_keys.setdefault(stream, set())
+        refs, new_items = [], []
+        for item in items:
+            key = _item_key(item)
+            refs.append(key)
+            if key not in sent:
+                sent.add(key)
+                if isinstance(item, dict):
+                    item = dict(item, _key=key)
+                    self._extract_assets(item)
+                new_items.append(item)
+
+        name = path[-1]
+        del parent[name]
+        parent[f"{name}_ref"] = refs
+        parent[f"{name}_new"] = new_items
+
+    def _extract_assets(self, node: Any) -> None:
+        """递归查找大体积二进制字段并外置"""
+        if isinstance(node, dict):
+            for field_name, mime in ASSET_FIELDS.items():
+                value = node.get(field_name)
+                if isinstance(value, str) and len(value) >= self.asset_threshold:
+                    asset_id = self.asset_store.put_base64(value, mime)
+                    if asset_id:
+                        del node[field_name]
+                        node[field_name.replace("_base64", "_url")] = f"{ASSET_URL_PREFIX}{asset_id}"
+                        self.stats["assets"] += 1
+            for value in node.values():
+                if isinstance(value, (dict, list)):
+                    self._extract_assets(value)
+        elif isinstance(node, list):
+            for value in node:
+                self._extract_assets(value)
+
+    # ---------- 流式编码 ----------
+
+    def _frame(self, events: List[Dict[str, Any]]) -> str:
+        payload = events[0] if len(events) == 1 else {"type": "batch", "events": events}
+        frame = f"data: {json.dumps(payload, ensure_ascii=False)}\n\n"
+        self.stats["frames"] += 1
+        self.stats["encoded_bytes"] += len(frame.encode("utf-8"))
+        return frame
+
+    async def encode_stream(self, events: AsyncIterator[Dict[str, Any]]) -> AsyncGenerator[str, None]:
+        """
+        将事件流编码为紧凑 SSE 帧
+
+        第一条事件到达后在合并窗口内继续收集，直到窗口结束、
+        达到批大小或遇到需立即发送的事件类型。
+        """
+        queue: asyncio.Queue = asyncio.Queue()
+        end_marker = object()
+
+        async def pump():
+            try:
+                async for event in events:
+                    await queue.put(event)
+            except Exception as e:
+                await queue.put({"type": "error", "content": str(e)})
+            finally:
+                await queue.put(end_marker)
+
+        pump_task = asyncio.create_task(pump())
+        finished = False
+        try:
+            while not finished:
+                item = await queue.get()
+                if item is end_marker:
+                    break
+
+                batch = [self._accept(item)]
+                deadline = time.monotonic() + self.coalesce_window
+                while (
+                    len(batch) < self.max_batch
+                    and item.get("type") not in FLUSH_EVENT_TYPES
+                ):
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    try:
+                        item = await asyncio.wait_for(queue.get(), timeout=remaining)
+                    except asyncio.TimeoutError:
+                        break
+                    if item is end_marker:
+                        finished = True
+                        break
+                    batch.append(self._accept(item))
+
+                yield self._frame(batch)
+        finally:
+            if not pump_task.done():
+                pump_task.cancel()
+            logger.debug(f"Compact stream finished: {self.stats}")
+
+    def _accept(self, event: Dict[str, Any]) -> Dict[str, Any]:
+        self.stats["events"] += 1
+        self.stats["raw_bytes"] += len(json.dumps(event, ensure_ascii=False, default=str).encode("utf-8"))
+        return self.transform(event)
+
+
+# ==================== 压缩 ====================
+
+def negotiate_encoding(accept_encoding: Optional[str]) -> Optional[str]:
+    """根据 Accept-Encoding 选择压缩方式（brotli 优先）"""
+    accepted = {part.split(";")[0].strip().lower() for part in (accept_encoding or "").split(",")}
+    if "br" in accepted and BROTLI_AVAILABLE:
+        return "br"
+    if "gzip" in accepted:
+        return "gzip"
+    return None
+
+
+async def compress_stream(
+    frames: AsyncIterator[Union[str, bytes]],
+    encoding: Optional[str]
+) -> AsyncGenerator[bytes, None]:
+    """
+    对 SSE 帧流进行压缩，每帧后同步 flush 以保证客户端即时可见
+    """
+    if encoding == "br" and BROTLI_AVAILABLE:
+        compressor = brotli.Compressor(mode=brotli.MODE_TEXT, quality=5)
+        async for frame in frames:
+            data = frame.encode("utf-8") if isinstance(frame, str) else frame
+            yield compressor.process(data) + compressor.flush()
+        yield compressor.finish()
+    elif encoding == "gzip":
+        compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+        async for frame in frames:
+            data = frame.encode("utf-8") if isinstance(frame, str) else frame
+            yield compressor.compress(data) + compressor.flush(zlib.Z_SYNC_FLUSH)
+        yield compressor.flush(zlib.Z_FINISH)
+    else:
+        async for frame in frames:
+            yield frame.encode("utf-8") if isinstance(frame, str) else frame
+
+
+# ==================== 日志采样 ====================
+
+SSE_LOG_SAMPLE = max(1, int(os.getenv("SSE_LOG_SAMPLE", "50")))
+
+
+def should_log_event(sequence: int) -> bool:
+    """每 SSE_LOG_SAMPLE 条事件记录一次调试日志"""
+    return sequence % SSE_LOG_SAMPLE == 1 or SSE_LOG_SAMPLE == 1
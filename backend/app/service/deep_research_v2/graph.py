@@ -36,6 +36,7 @@ except ImportError:
 
 from .state import ResearchState, ResearchPhase, create_initial_state
 from .agents import ChiefArchitect, DeepScout, CodeWizard, CriticMaster, LeadWriter, DataAnalyst
+from .event_encoder import should_log_event
 
 # 导入检查点服务
 try:
@@ -127,6 +128,9 @@ class DeepResearchGraph:
             config.agents.writer.model
         )
 
+        # 规划阶段流式输出章节时，由 Scout 投机发起搜索
+        self.architect.speculative_searcher = self.scout
+
         logger.info(f"DeepResearchGraph initialized with models:")
         logger.info(f"  - Architect: {config.agents.architect.model}")
         logger.info(f"  - Scout: {config.agents.scout.model}")
@@ -427,7 +431,8 @@ class DeepResearchGraph:
                     msg = await asyncio.wait_for(message_queue.get(), timeout=0.5)
                     msg_count += 1
                     msg_type = msg.get('type', 'unknown')
-                    logger.info(f"[SSE YIELD] [{agent.name}] #{msg_count}: {msg_type}")
+                    if should_log_event(msg_count):
+                        logger.debug(f"[SSE YIELD] [{agent.name}] #{msg_count}: {msg_type}")
                     yield msg
                 except asyncio.TimeoutError:
                     # 继续等待，不发送心跳（SSE连接由前端保持）
@@ -688,6 +693,7 @@ class DeepResearchGraph:
             logger.info(f"[Graph] ========== 研究完成 ==========")
             logger.info(f"[Graph] 最终统计: facts={len(state.get('facts', []))}, charts={len(state.get('charts', []))}, iterations={state.get('iteration', 0)}")
             logger.info(f"[Graph] 报告长度: {len(state.get('final_report', ''))}")
+            logger.info(f"[Graph] 运行统计: {state.get('run_stats', {})}")
 
             # 打印每个图表的详情
             for i, chart in enumerate(state.get('charts', [])):
@@ -725,7 +731,8 @@ class DeepResearchGraph:
                 "facts_count": len(state.get("facts", [])),
                 "charts_count": len(state.get("charts", [])),
                 "iterations": state.get("iteration", 0),
-                "references": final_ui_refs
+                "references": final_ui_refs,
+                "run_stats": state.get("run_stats", {})
             }
 
         except Exception as e:
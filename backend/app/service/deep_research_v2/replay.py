@@ -0,0 +1,651 @@
+"""
+DeepResearch V2.0 - 录制/回放工具
+
+用于离线、确定性地复现一次完整的研究流程：
+1. 录制模式 - 拦截真实运行中的所有外部调用（LLM、网络搜索、Embedding、Milvus、股票行情），
+   将响应写入 fixture 文件
+2. 回放模式 - 按请求内容匹配 fixture 中的响应并直接返回，不访问任何网络，
+   可按调用类型注入延迟分布，模拟不同的上游耗时
+3. 调用追踪 - 记录每次外部调用的起止时间，供基准测试计算关键路径
+
+使用方式：
+```python
+from service.deep_research_v2.replay import ReplaySession, LatencyModel
+
+# 录制
+with ReplaySession.record("fixtures/ev.json.gz", meta={"query": query}) as session:
+    ...  # 运行 DeepResearchGraph
+
+# 回放（LLM 使用录制时的耗时，搜索耗时服从 200-800ms 均匀分布）
+latency = LatencyModel.parse("llm=recorded;search=uniform:200,800", seed=42)
+with ReplaySession.replay("fixtures/ev.json.gz", latency=latency) as session:
+    ...
+```
+"""
+
+import re
+import gzip
+import json
+import time
+import random
+import asyncio
+import hashlib
+import inspect
+import logging
+import threading
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Dict, Any, List, Optional, Callable, Tuple
+
+logger = logging.getLogger("DeepResearchReplay")
+
+FIXTURE_VERSION = 1
+
+# 调用类型
+KIND_LLM = "llm"
+KIND_SEARCH = "search"
+KIND_EMBEDDING = "embedding"
+KIND_MILVUS = "milvus"
+KIND_STOCK = "stock"
+
+ALL_KINDS = (KIND_LLM, KIND_SEARCH, KIND_EMBEDDING, KIND_MILVUS, KIND_STOCK)
+
+# 回放未命中时的默认返回值（非严格模式）
+_MISS_DEFAULTS: Dict[str, Any] = {
+    KIND_LLM: "{}",
+    KIND_SEARCH: [],
+    KIND_EMBEDDING: None,
+    KIND_MILVUS: [],
+    KIND_STOCK: {"success": False, "error": "replay miss"},
+}
+
+# Prompt 中每次运行都会变化的内容（随机ID、时间戳），计算匹配键前需要抹平
+_VOLATILE_PATTERNS = [
+    (re.compile(r'\b([A-Za-z]+_)[0-9a-f]{6,32}\b'), r'\1*'),
+    (re.compile(r'\d{4}-\d{2}-\d{2}T\d{2}:\d{2}:\d{2}(?:\.\d+)?'), '<ts>'),
+]
+
+
+class ReplayMissError(LookupError):
+    """严格回放模式下 fixture 中找不到匹配的响应"""
+
+
+class ReplayedCallError(RuntimeError):
+    """录制时该调用抛出了异常，回放时原样重现"""
+
+
+def _normalize_text(text: Any) -> Any:
+    """抹平文本中的随机ID和时间戳"""
+    if not isinstance(text, str):
+        return text
+    for pattern, repl in _VOLATILE_PATTERNS:
+        text = pattern.sub(repl, text)
+    return text
+
+
+def _vector_digest(vector: Any) -> str:
+    """向量摘要（四舍五入后哈希，避免浮点噪声）"""
+    if not vector:
+        return ""
+    rounded = ",".join(f"{float(v):.5f}" for v in vector)
+    return hashlib.sha1(rounded.encode()).hexdigest()
+
+
+def _digest(payload: Dict[str, Any]) -> str:
+    raw = json.dumps(payload, ensure_ascii=False, sort_keys=True, default=str)
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+
+# ==================== 延迟模型 ====================
+
+@dataclass
+class LatencySpec:
+    """单个调用类型的延迟分布（毫秒）"""
+    dist: str = "none"  # none / fixed / uniform / normal / lognormal / recorded
+    params: Tuple[float, ...] = ()
+
+    def sample(self, rng: random.Random, recorded_ms: float) -> float:
+        if self.dist == "fixed":
+            return self.params[0]
+        if self.dist == "uniform":
+            return rng.uniform(self.params[0], self.params[1])
+        if self.dist == "normal":
+            return max(0.0, rng.gauss(self.params[0], self.params[1]))
+        if self.dist == "lognormal":
+            return rng.lognormvariate(self.params[0], self.params[1])
+        if self.dist == "recorded":
+            scale = self.params[0] if self.params else 1.0
+            return recorded_ms * scale
+        return 0.0
+
+
+class LatencyModel:
+    """
+    按调用类型注入延迟
+
+    规格字符串示例：``llm=recorded:0.5;search=uniform:200,800;milvus=fixed:15``
+    - fixed:MS
+    - uniform:LO,HI
+    - normal:MEAN,STD
+    - lognormal:MU,SIGMA（参数为 ln(ms) 空间）
+    - recorded[:SCALE]（使用录制时的真实耗时，可按比例缩放）
+    """
+
+    _ARITY = {"none": 0, "fixed": 1, "uniform": 2, "normal": 2, "lognormal": 2}
+
+    def __init__(self, specs: Optional[Dict[str, LatencySpec]] = None, seed: int = 0):
+        self.specs = specs or {}
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+
+    @classmethod
+    def parse(cls, spec: Optional[str], seed: int = 0) -> "LatencyModel":
+        specs: Dict[str, LatencySpec] = {}
+        for part in (spec or "").split(";"):
+            part = part.strip()
+            if not part:
+                continue
+            if "=" not in part:
+                raise ValueError(f"Invalid latency spec '{part}', expected kind=dist:params")
+            kind, dist_spec = part.split("=", 1)
+            kind = kind.strip()
+            if kind != "*" and kind not in ALL_KINDS:
+                raise ValueError(f"Unknown call kind '{kind}', expected one of {ALL_KINDS}")
+            dist, _, raw_params = dist_spec.strip().partition(":")
+            params = tuple(float(p) for p in raw_params.split(",") if p.strip())
+            if dist == "recorded":
+                if len(params) > 1:
+                    raise ValueError("recorded accepts at most one scale parameter")
+            elif dist not in cls._ARITY:
+                raise ValueError(f"Unknown latency distribution '{dist}'")
+            elif len(params) != cls._ARITY[dist]:
+                raise ValueError(f"Distribution '{dist}' expects {cls._ARITY[dist]} parameter(s)")
+            specs[kind] = LatencySpec(dist=dist, params=params)
+        return cls(specs, seed=seed)
+
+    def delay_ms(self, kind: str, recorded_ms: float) -> float:
+        spec = self.specs.get(kind) or self.specs.get("*")
+        if spec is None:
+            return 0.0
+        with self._lock:
+            return spec.sample(self._rng, recorded_ms)
+
+    def describe(self) -> Dict[str, str]:
+        return {
+            kind: f"{spec.dist}:{','.join(str(p) for p in spec.params)}" if spec.params else spec.dist
+            for kind, spec in self.specs.items()
+        }
+
+
+# ==================== 调用追踪 ====================
+
+@dataclass
+class CallSpan:
+    """一次外部调用的时间区间（相对会话开始，秒）"""
+    kind: str
+    start: float
+    end: float
+    replayed: bool = False
+    miss: bool = False
+
+
+@dataclass
+class CallStats:
+    """某一调用类型的汇总统计"""
+    count: int = 0
+    misses: int = 0
+    errors: int = 0
+    total_ms: float = 0.0
+
+
+# ==================== Fixture ====================
+
+@dataclass
+class Fixture:
+    """录制文件：{kind: [{"key", "lane", "response", "duration_ms", "error"}]}"""
+    meta: Dict[str, Any] = field(default_factory=dict)
+    calls: Dict[str, List[Dict[str, Any]]] = field(default_factory=dict)
+
+    @classmethod
+    def load(cls, path: str) -> "Fixture":
+        opener = gzip.open if path.endswith(".gz") else open
+        with opener(path, "rt", encoding="utf-8") as f:
+            data = json.load(f)
+        if data.get("version") != FIXTURE_VERSION:
+            raise ValueError(f"Unsupported fixture version: {data.get('version')}")
+        return cls(meta=data.get("meta", {}), calls=data.get("calls", {}))
+
+    def save(self, path: str) -> None:
+        opener = gzip.open if path.endswith(".gz") else open
+        data = {"version": FIXTURE_VERSION, "meta": self.meta, "calls": self.calls}
+        with opener(path, "wt", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False, default=str)
+
+    def count(self) -> Dict[str, int]:
+        return {kind: len(records) for kind, records in self.calls.items()}
+
+
+class _ReplayIndex:
+    """回放索引：先按精确键匹配，未命中时按通道（lane）顺序取下一条未使用的记录"""
+
+    def __init__(self, fixture: Fixture):
+        self._by_key: Dict[Tuple[str, str], List[int]] = {}
+        self._by_lane: Dict[Tuple[str, str], List[int]] = {}
+        self._records: Dict[str, List[Dict[str, Any]]] = fixture.calls
+        self._used: Dict[str, set] = {kind: set() for kind in fixture.calls}
+        self._lock = threading.Lock()
+
+        for kind, records in fixture.calls.items():
+            for i, record in enumerate(records):
+                self._by_key.setdefault((kind, record.get("key", "")), []).append(i)
+                self._by_lane.setdefault((kind, record.get("lane", "")), []).append(i)
+
+    def take(self, kind: str, key: str, lane: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            used = self._used.setdefault(kind, set())
+            candidates = self._by_key.get((kind, key), [])
+            for i in candidates:
+                if i not in used:
+                    used.add(i)
+                    return self._records[kind][i]
+            # 同一请求被调用的次数多于录制次数：复用最后一条
+            if candidates:
+                return self._records[kind][candidates[-1]]
+            for i in self._by_lane.get((kind, lane), []):
+                if i not in used:
+                    used.add(i)
+                    return self._records[kind][i]
+        return None
+
+
+# ==================== 会话 ====================
+
+@dataclass
+class _PatchTarget:
+    owner: Any
+    attr: str
+    kind: str
+    key_fn: Callable[[Dict[str, Any]], Tuple[Dict[str, Any], str]]
+    replacement: Optional[Callable] = None  # 直接替换（不参与录制/回放）
+    stream_arg: Optional[str] = None  # 流式调用的增量回调参数名，回放时分段回调
+
+
+class ReplaySession:
+    """
+    录制/回放会话
+
+    作为上下文管理器使用，进入时安装拦截器，退出时恢复原始实现；
+    录制模式退出时写入 fixture 文件。
+    """
+
+    MODE_RECORD = "record"
+    MODE_REPLAY = "replay"
+    MODE_TRACE = "trace"  # 只追踪耗时，不录制也不回放
+
+    def __init__(
+        self,
+        mode: str,
+        fixture_path: Optional[str] = None,
+        latency: Optional[LatencyModel] = None,
+        strict: bool = False,
+        meta: Optional[Dict[str, Any]] = None
+    ):
+        self.mode = mode
+        self.fixture_path = fixture_path
+        self.latency = latency or LatencyModel()
+        self.strict = strict
+
+        if mode == self.MODE_REPLAY:
+            self.fixture = Fixture.load(fixture_path)
+            self._index = _ReplayIndex(self.fixture)
+        else:
+            self.fixture = Fixture(meta=dict(meta or {}))
+            self._index = None
+
+        self.spans: List[CallSpan] = []
+        self.stats: Dict[str, CallStats] = {kind: CallStats() for kind in ALL_KINDS}
+        self._lock = threading.Lock()
+        self._originals: List[Tuple[Any, str, Any]] = []
+        self._t0 = time.perf_counter()
+
+    @classmethod
+    def record(cls, fixture_path: str, meta: Optional[Dict[str, Any]] = None) -> "ReplaySession":
+        return cls(cls.MODE_RECORD, fixture_path=fixture_path, meta=meta)
+
+    @classmethod
+    def replay(
+        cls,
+        fixture_path: str,
+        latency: Optional[LatencyModel] = None,
+        strict: bool = False
+    ) -> "ReplaySession":
+        return cls(cls.MODE_REPLAY, fixture_path=fixture_path, latency=latency, strict=strict)
+
+    @classmethod
+    def trace(cls) -> "ReplaySession":
+        return cls(cls.MODE_TRACE)
+
+    @property
+    def meta(self) -> Dict[str, Any]:
+        return self.fixture.meta
+
+    def now(self) -> float:
+        """相对会话开始的时间（秒）"""
+        return time.perf_counter() - self._t0
+
+    # ---------- 上下文管理 ----------
+
+    def __enter__(self) -> "ReplaySession":
+        self.install()
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.uninstall()
+        if self.mode == self.MODE_RECORD and self.fixture_path:
+            self.fixture.meta.setdefault("recorded_at", datetime.now().isoformat())
+            self.fixture.save(self.fixture_path)
+            logger.info(f"Fixture saved to {self.fixture_path}: {self.fixture.count()}")
+
+    def install(self) -> None:
+        self._t0 = time.perf_counter()
+        for target in self._patch_targets():
+            original = getattr(target.owner, target.attr)
+            self._originals.append((target.owner, target.attr, original))
+            if target.replacement is not None:
+                setattr(target.owner, target.attr, target.replacement)
+            else:
+                setattr(target.owner, target.attr, self._wrap(target, original))
+
+    def uninstall(self) -> None:
+        while self._originals:
+            owner, attr, original = self._originals.pop()
+            setattr(owner, attr, original)
+
+    # ---------- 拦截点 ----------
+
+    def _patch_targets(self) -> List[_PatchTarget]:
+        """所有需要拦截的外部调用"""
+        from .agents import base as base_module
+        from .agents import scout as scout_module
+        from . import graph as graph_module
+
+        targets = [
+            _PatchTarget(base_module.BaseAgent, "call_llm", KIND_LLM, _llm_key),
+            _PatchTarget(base_module.BaseAgent, "call_llm_stream", KIND_LLM, _llm_key, stream_arg="on_delta"),
+            _PatchTarget(scout_module.DeepScout, "_fetch_web_results", KIND_SEARCH, _search_key),
+        ]
+
+        if getattr(scout_module, "LOCAL_SEARCH_AVAILABLE", False):
+            targets.append(_PatchTarget(scout_module, "generate_embedding", KIND_EMBEDDING, _embedding_key))
+            targets.append(_PatchTarget(scout_module, "generate_embedding_async", KIND_EMBEDDING, _embedding_key))
+            store_class = _vector_store_class()
+            if store_class is not None:
+                targets.append(_PatchTarget(store_class, "search", KIND_MILVUS, _milvus_key))
+                targets.append(_PatchTarget(store_class, "search_many", KIND_MILVUS, _milvus_many_key))
+                if self.mode == self.MODE_REPLAY and hasattr(store_class, "_connect"):
+                    targets.append(_PatchTarget(
+                        store_class, "_connect", KIND_MILVUS, _milvus_key,
+                        replacement=lambda self: None
+                    ))
+
+        embedding_module = _optional_import("service.embedding_service", "app.service.embedding_service")
+        if embedding_module is not None:
+            targets.append(_PatchTarget(embedding_module, "generate_embedding", KIND_EMBEDDING, _embedding_key))
+            targets.append(_PatchTarget(embedding_module, "generate_embedding_async", KIND_EMBEDDING, _embedding_key))
+
+        stock_module = _optional_import("service.stock_service", "app.service.stock_service")
+        if stock_module is not None:
+            targets.append(_PatchTarget(stock_module.StockService, "get_stock_by_code", KIND_STOCK, _stock_key))
+
+        # 取消标志依赖 Redis，离线运行时始终视为未取消
+        targets.append(_PatchTarget(
+            graph_module, "is_research_cancelled", KIND_STOCK, _stock_key,
+            replacement=lambda session_id: False
+        ))
+        targets.append(_PatchTarget(
+            graph_module, "clear_cancel_flag", KIND_STOCK, _stock_key,
+            replacement=lambda session_id: None
+        ))
+        return targets
+
+    def _wrap(self, target: _PatchTarget, original: Callable) -> Callable:
+        signature = inspect.signature(original)
+        session = self
+
+        def bind(args, kwargs) -> Tuple[str, str, Dict[str, Any]]:
+            bound = signature.bind(*args, **kwargs)
+            bound.apply_defaults()
+            payload, lane = target.key_fn(bound.arguments)
+            return _digest(payload), lane, bound.arguments
+
+        if inspect.iscoroutinefunction(original):
+            async def async_wrapper(*args, **kwargs):
+                key, lane, arguments = bind(args, kwargs)
+                if session.mode == session.MODE_REPLAY:
+                    start = session.now()
+                    record = session._lookup(target.kind, key, lane)
+                    delay = session._delay(target.kind, record)
+                    callback = arguments.get(target.stream_arg) if target.stream_arg else None
+                    if callback and record and isinstance(record.get("response"), str):
+                        # 流式回放：把延迟均摊到各个分段上，保持增量解析的时序
+                        chunks = _split_chunks(record["response"])
+                        for chunk in chunks:
+                            if delay > 0:
+                                await asyncio.sleep(delay / 1000 / len(chunks))
+                            callback(chunk)
+                    elif delay > 0:
+                        await asyncio.sleep(delay / 1000)
+                    return session._finish_replay(target.kind, record, start)
+                start = session.now()
+                try:
+                    response = await original(*args, **kwargs)
+                except Exception as e:
+                    session._finish_live(target.kind, key, lane, start, error=e)
+                    raise
+                session._finish_live(target.kind, key, lane, start, response=response)
+                return response
+            return async_wrapper
+
+        def sync_wrapper(*args, **kwargs):
+            key, lane, _ = bind(args, kwargs)
+            if session.mode == session.MODE_REPLAY:
+                start = session.now()
+                record = session._lookup(target.kind, key, lane)
+                delay = session._delay(target.kind, record)
+                if delay > 0:
+                    time.sleep(delay / 1000)
+                return session._finish_replay(target.kind, record, start)
+            start = session.now()
+            try:
+                response = original(*args, **kwargs)
+            except Exception as e:
+                session._finish_live(target.kind, key, lane, start, error=e)
+                raise
+            session._finish_live(target.kind, key, lane, start, response=response)
+            return response
+        return sync_wrapper
+
+    # ---------- 录制/回放实现 ----------
+
+    def _lookup(self, kind: str, key: str, lane: str) -> Optional[Dict[str, Any]]:
+        record = self._index.take(kind, key, lane)
+        if record is None:
+            with self._lock:
+                self.stats[kind].misses += 1
+            if self.strict:
+                raise ReplayMissError(f"No recorded {kind} response for key {key[:12]} (lane={lane})")
+            logger.warning(f"[Replay] miss: kind={kind}, lane={lane}")
+        return record
+
+    def _delay(self, kind: str, record: Optional[Dict[str, Any]]) -> float:
+        recorded_ms = record.get("duration_ms", 0.0) if record else 0.0
+        return self.latency.delay_ms(kind, recorded_ms)
+
+    def _finish_replay(self, kind: str, record: Optional[Dict[str, Any]], start: float) -> Any:
+        end = self.now()
+        with self._lock:
+            stats = self.stats[kind]
+            stats.count += 1
+            stats.total_ms += (end - start) * 1000
+            self.spans.append(CallSpan(kind, start, end, replayed=True, miss=record is None))
+        if record is None:
+            return _MISS_DEFAULTS[kind]
+        if record.get("error"):
+            with self._lock:
+                self.stats[kind].errors += 1
+            raise ReplayedCallError(record["error"])
+        return record.get("response")
+
+    def _finish_live(
+        self,
+        kind: str,
+        key: str,
+        lane: str,
+        start: float,
+        response: Any = None,
+        error: Optional[Exception] = None
+    ) -> None:
+        end = self.now()
+        duration_ms = (end - start) * 1000
+        with self._lock:
+            stats = self.stats[kind]
+            stats.count += 1
+            stats.total_ms += duration_ms
+            if error is not None:
+                stats.errors += 1
+            self.spans.append(CallSpan(kind, start, end))
+            if self.mode == self.MODE_RECORD:
+                record = {"key": key, "lane": lane, "duration_ms": round(duration_ms, 2)}
+                if error is not None:
+                    record["error"] = str(error)
+                else:
+                    record["response"] = response
+                self.fixture.calls.setdefault(kind, []).append(record)
+
+    def summary(self) -> Dict[str, Any]:
+        """调用统计汇总"""
+        return {
+            kind: {
+                "count": s.count,
+                "misses": s.misses,
+                "errors": s.errors,
+                "total_ms": round(s.total_ms, 1),
+                "avg_ms": round(s.total_ms / s.count, 1) if s.count else 0.0,
+            }
+            for kind, s in self.stats.items()
+            if s.count or s.misses
+        }
+
+
+# ==================== 匹配键 ====================
+
+def _llm_key(args: Dict[str, Any]) -> Tuple[Dict[str, Any], str]:
+    agent = args.get("self")
+    model = getattr(agent, "model", "")
+    name = getattr(agent, "name", "")
+    payload = {
+        "model": model,
+        "system": _normalize_text(args.get("system_prompt")),
+        "user": _normalize_text(args.get("user_prompt")),
+        "json_mode": args.get("json_mode"),
+    }
+    return payload, f"{name}:{model}"
+
+
+def _search_key(args: Dict[str, Any]) -> Tuple[Dict[str, Any], str]:
+    return {"query": args.get("query"), "count": args.get("count")}, "web"
+
+
+def _embedding_key(args: Dict[str, Any]) -> Tuple[Dict[str, Any], str]:
+    return {
+        "text": args.get("text"),
+        "model": args.get("model_name"),
+        "dimensions": args.get("dimensions"),
+    }, "embedding"
+
+
+def _milvus_key(args: Dict[str, Any]) -> Tuple[Dict[str, Any], str]:
+    collection = args.get("collection_name")
+    return {
+        "collection": collection,
+        "vector": _vector_digest(args.get("query_vector")),
+        "top_k": args.get("top_k"),
+        "kb_id": args.get("kb_id"),
+    }, f"milvus:{collection}"
+
+
+def _milvus_many_key(args: Dict[str, Any]) -> Tuple[Dict[str, Any], str]:
+    collection = args.get("collection_name")
+    return {
+        "collection": collection,
+        "vectors": [_vector_digest(v) for v in args.get("query_vectors") or []],
+        "top_k": args.get("top_k"),
+        "kb_id": args.get("kb_id"),
+        "filters": args.get("filters"),
+    }, f"milvus:{collection}"
+
+
+def _stock_key(args: Dict[str, Any]) -> Tuple[Dict[str, Any], str]:
+    return {"code": args.get("stock_code")}, "stock"
+
+
+def _split_chunks(text: str, size: int = 32) -> List[str]:
+    return [text[i:i + size] for i in range(0, len(text), size)] or [""]
+
+
+def _optional_import(*module_names: str):
+    import importlib
+    for name in module_names:
+        try:
+            return importlib.import_module(name)
+        except ImportError:
+            continue
+    return None
+
+
+def _vector_store_class():
+    """DeepScout 使用的向量存储实现类（后端依赖缺失时返回 None）"""
+    module = _optional_import("service.vector_store", "app.service.vector_store")
+    if module is None:
+        return None
+    try:
+        return module.vector_store_class()
+    except ImportError:
+        return None
+
+
+# ==================== 关键路径分析 ====================
+
+# 多种调用重叠时，按此优先级归属（越靠前越可能是瓶颈）
+CRITICAL_PATH_PRIORITY = (KIND_LLM, KIND_SEARCH, KIND_MILVUS, KIND_EMBEDDING, KIND_STOCK)
+
+
+def critical_path_breakdown(
+    spans: List[CallSpan],
+    window_start: float,
+    window_end: float
+) -> Dict[str, float]:
+    """
+    计算时间窗口内的关键路径构成（毫秒）
+
+    对窗口内每个时间片，归属给当时正在进行的最高优先级调用类型；
+    没有任何外部调用进行的时间记为 "orchestration"（本地计算、调度与等待）。
+    """
+    boundaries = {window_start, window_end}
+    clipped = []
+    for span in spans:
+        start, end = max(span.start, window_start), min(span.end, window_end)
+        if end > start:
+            clipped.append((start, end, span.kind))
+            boundaries.update((start, end))
+
+    points = sorted(boundaries)
+    breakdown: Dict[str, float] = {kind: 0.0 for kind in CRITICAL_PATH_PRIORITY}
+    breakdown["orchestration"] = 0.0
+
+    for left, right in zip(points, points[1:]):
+        active = {kind for start, end, kind in clipped if start <= left and end >= right}
+        owner = next((kind for kind in CRITICAL_PATH_PRIORITY if kind in active), "orchestration")
+        breakdown[owner] += (right - left) * 1000
+
+    return {kind: round(ms, 1) for kind, ms in breakdown.items() if ms > 0}
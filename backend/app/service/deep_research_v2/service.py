@@ -13,6 +13,7 @@ from typing import AsyncGenerator, Dict, Any, Optional
 from datetime import datetime
 
 from .graph import DeepResearchGraph
+from .event_encoder import EventEncoder
 
 # 导入配置
 try:
@@ -88,7 +89,8 @@ class DeepResearchV2Service:
         resume: bool = False,
         user_id: Optional[str] = None,
         search_web: bool = True,
-        search_local: bool = False
+        search_local: bool = False,
+        compact: bool = False
     ) -> AsyncGenerator[str, None]:
         """
         执行深度研究（SSE 流式输出）
@@ -101,6 +103,7 @@ class DeepResearchV2Service:
             user_id: 用户ID（用于检查点）
             search_web: 是否启用网络搜索（默认True）
             search_local: 是否启用本地知识库搜索（默认False）
+            compact: 是否使用紧凑编码（合并、增量、图片外置，见 event_encoder）
 
         Yields:
             SSE 格式的事件字符串
@@ -114,26 +117,36 @@ class DeepResearchV2Service:
             logger.info(f"Starting research for session {session_id}: {query[:50]}...")
             logger.info(f"Search modes - web: {search_web}, local: {search_local}")
 
-        try:
-            async for event in self.graph.run(
-                query, session_id,
-                resume=resume,
-                user_id=user_id,
-                search_web=search_web,
-                search_local=search_local
-            ):
+        events = self._run_events(
+            query, session_id,
+            resume=resume,
+            user_id=user_id,
+            search_web=search_web,
+            search_local=search_local
+        )
+
+        if compact:
+            async for frame in EventEncoder().encode_stream(events):
+                yield frame
+        else:
+            async for event in events:
                 # 转换为 SSE 格式
                 yield self._format_sse(event)
 
+        # 发送结束标记
+        yield "data: [DONE]\n\n"
+
+    async def _run_events(self, query: str, session_id: str, **kwargs) -> AsyncGenerator[Dict[str, Any], None]:
+        """执行工作流并产出原始事件字典（异常转换为 error 事件）"""
+        try:
+            async for event in self.graph.run(query, session_id, **kwargs):
+                yield event
         except Exception as e:
             logger.error(f"Research error: {e}")
-            yield self._format_sse({
+            yield {
                 "type": "error",
                 "content": str(e)
-            })
-
-        # 发送结束标记
-        yield "data: [DONE]\n\n"
+            }
 
     def _format_sse(self, event: Dict[str, Any]) -> str:
         """格式化为 SSE 事件"""
@@ -149,11 +149,13 @@ class ResearchState(TypedDict):
     unresolved_issues: int                  # 未解决问题数
     quality_score: float                    # 质量评分
     pending_search_queries: List[str]       # 待执行的补充搜索查询（审核后需要补充的）
+    executed_queries: List[str]             # 已派发的搜索查询（用于近似重复抑制）
 
     # 元数据
     logs: List[Dict[str, Any]]              # 执行日志
     errors: List[str]                       # 错误记录
     messages: List[Dict[str, Any]]          # Agent间消息（用于流式输出）
+    run_stats: Dict[str, Any]               # 运行统计（如被抑制的重复查询数）
 
 
 def create_initial_state(
@@ -197,9 +199,11 @@ def create_initial_state(
         unresolved_issues=0,
         quality_score=0.0,
         pending_search_queries=[],
+        executed_queries=[],
         logs=[],
         errors=[],
-        messages=[]
+        messages=[],
+        run_stats={"queries_suppressed": 0, "facts_deduplicated": 0}
     )
 
 
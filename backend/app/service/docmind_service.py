@@ -10,7 +10,7 @@ from alibabacloud_tea_openapi import models as open_api_models
 from alibabacloud_tea_util import models as util_models
 
 from service.embedding_service import generate_embedding
-from service.milvus_service import get_milvus_service
+from service.vector_store import get_vector_store
 
 
 class DocMindService:
@@ -338,10 +338,9 @@ def process_document_with_docmind(
             }
             documents.append(doc)
 
-        # 7. 插入 Milvus
-        print(f"开始插入 Milvus，集合: {index_name}")
-        milvus = get_milvus_service()
-        milvus.insert_documents(index_name, documents)
+        # 7. 写入向量存储（Milvus 或 embedded）
+        print(f"开始写入向量存储，集合: {index_name}")
+        get_vector_store().insert_documents(index_name, documents)
 
         result["success"] = True
         result["message"] = f"成功处理 {len(documents)} 个切片"
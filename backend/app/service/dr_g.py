@@ -10,19 +10,20 @@ DeepResearch Service - 深度研究服务 (ReAct 版本)
 5. 图文混排输出 - 支持文字、图表、表格混合展示
 """
 
-import requests
 import json
 from openai import OpenAI
 import os
-import time
 import re
 import asyncio
-import hashlib
 from typing import Dict, Any, AsyncGenerator, List, Optional, Tuple
 from urllib.parse import urlparse
 from collections import Counter
 import logging
 
+from .search_provider import get_search_provider, to_bocha_format
+from .search_cache import get_search_cache
+from .dedup_index import DedupIndex, shingle_hashes
+
 # --- Configuration ---
 SEARCH_API_KEY = os.getenv("BOCHA_API_KEY", "Bearer sk-392ef5953eaa4c43be43e6daab4e82a4")
 LLM_API_KEY = os.getenv("DASHSCOPE_API_KEY", "sk-f02db5a079ab41588b1cab09ad2777a2")
@@ -30,64 +31,35 @@ LLM_BASE_URL = os.getenv("DASHSCOPE_BASE_URL", "https://dashscope.aliyuncs.com/c
 
 # 优化配置
 MAX_CONCURRENT_SEARCHES = 3
-SEARCH_CACHE_TTL = 3600
 CONTENT_SIMILARITY_THRESHOLD = 0.8
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
-# --- 搜索缓存 ---
-_search_cache: Dict[str, Tuple[List, float]] = {}
-
-
-def get_query_hash(query: str) -> str:
-    """生成查询的哈希值用于缓存"""
-    return hashlib.md5(query.strip().lower().encode()).hexdigest()
-
-
-def get_cached_search(query: str) -> Optional[List]:
-    """获取缓存的搜索结果"""
-    query_hash = get_query_hash(query)
-    if query_hash in _search_cache:
-        results, timestamp = _search_cache[query_hash]
-        if time.time() - timestamp < SEARCH_CACHE_TTL:
-            logging.info(f"Cache hit for query: {query[:50]}...")
-            return results
-        else:
-            del _search_cache[query_hash]
-    return None
-
-
-def set_cached_search(query: str, results: List):
-    """缓存搜索结果"""
-    query_hash = get_query_hash(query)
-    _search_cache[query_hash] = (results, time.time())
-    current_time = time.time()
-    expired_keys = [k for k, (_, t) in _search_cache.items() if current_time - t > SEARCH_CACHE_TTL]
-    for k in expired_keys:
-        del _search_cache[k]
-
-
 def compute_content_similarity(text1: str, text2: str) -> float:
-    """计算两段文本的相似度"""
-    if not text1 or not text2:
+    """计算两段文本的相似度（字符二元组 Jaccard，对无空格的中文同样有效）"""
+    shingles1 = shingle_hashes(text1)
+    shingles2 = shingle_hashes(text2)
+    if not shingles1 or not shingles2:
         return 0.0
-    words1 = set(text1.lower().split())
-    words2 = set(text2.lower().split())
-    if not words1 or not words2:
-        return 0.0
-    intersection = len(words1 & words2)
-    union = len(words1 | words2)
-    return intersection / union if union > 0 else 0.0
+    return len(shingles1 & shingles2) / len(shingles1 | shingles2)
 
 
 def is_content_duplicate(new_content: str, existing_contents: List[str], threshold: float = CONTENT_SIMILARITY_THRESHOLD) -> bool:
-    """检查内容是否与已有内容重复"""
+    """检查内容是否与已有内容重复（逐条比较，批量场景请使用 DedupIndex）"""
     for existing in existing_contents:
         if compute_content_similarity(new_content, existing) >= threshold:
             return True
     return False
 
 
+def new_content_index(existing_contents: Optional[List[str]] = None) -> DedupIndex:
+    """创建搜索摘要去重索引（LSH 分桶，单次查询与已有内容数量无关）"""
+    index = DedupIndex(threshold=CONTENT_SIMILARITY_THRESHOLD)
+    for content in existing_contents or []:
+        index.add(content)
+    return index
+
+
 def serialize_event(event_data: Dict[str, Any]) -> str:
     """将事件数据序列化为JSON字符串"""
     def json_serializer(obj):
@@ -298,6 +270,7 @@ class ResearchService:
         """经典研究模式 (保持向后兼容)"""
         memory = []
         processed_urls = set()
+        content_index = new_content_index()  # 已收集摘要的近似重复索引
         current_subqueries = []
         all_subqueries_history = set()
         llm_system_prompt = f"你是一位专门的行业的资深研究助理。"
@@ -393,7 +366,6 @@ class ResearchService:
                     search_local=search_local
                 )
 
-                existing_contents = [item['summary'] for item in memory]
                 new_results_count = 0
 
                 for item in search_results_list:
@@ -410,11 +382,11 @@ class ResearchService:
                         if not url or not summary or url in processed_urls:
                             continue
 
-                        if is_content_duplicate(summary, existing_contents):
+                        # 未重复时 check 会同时登记该摘要
+                        if content_index.check(summary) is not None:
                             continue
 
                         processed_urls.add(url)
-                        existing_contents.append(summary)
 
                         memory.append({
                             "subquery": subquery,
@@ -670,33 +642,30 @@ async def parallel_search_all(
 
     async def search_web_with_semaphore(query: str) -> Tuple[str, List, str]:
         async with semaphore:
-            cached = get_cached_search(query)
-            if cached is not None:
-                return (query, cached, 'web')
-            results = await asyncio.to_thread(websearch, query)
-            set_cached_search(query, results)
-            await asyncio.sleep(0.5)
-            return (query, results, 'web')
-
-    async def search_local_with_semaphore(query: str) -> Tuple[str, List, str]:
+            # 共享提供方自带限流，结果走跨进程共享缓存
+            results = await get_search_cache().get_or_fetch(get_search_provider(SEARCH_API_KEY), query, count=5)
+            return (query, [to_bocha_format(r) for r in results], 'web')
+
+    async def search_local_batch(queries: List[str]) -> List[Tuple[str, List, str]]:
+        # 所有子问题一次向量化、一次 Milvus 检索
         async with semaphore:
-            results = await search_local_knowledge(query, kb_name, top_k=3)
-            return (query, results, 'local')
+            results = await search_local_knowledge_many(queries, kb_name, top_k=3)
+            return [(q, r, 'local') for q, r in zip(queries, results)]
 
+    queries = [q for q in subqueries if q]
     tasks = []
-    for q in subqueries:
-        if not q:
-            continue
-        if search_web:
-            tasks.append(search_web_with_semaphore(q))
-        if search_local and kb_name:
-            tasks.append(search_local_with_semaphore(q))
+    if search_web:
+        tasks.extend(search_web_with_semaphore(q) for q in queries)
+    if search_local and kb_name and queries:
+        tasks.append(search_local_batch(queries))
 
     results = await asyncio.gather(*tasks, return_exceptions=True)
 
     for r in results:
         if isinstance(r, Exception):
             logging.error(f"Search error: {r}")
+        elif isinstance(r, list):
+            all_results.extend(r)
         else:
             all_results.append(r)
 
@@ -714,55 +683,48 @@ async def search_local_knowledge(query: str, kb_name: str, top_k: int = 5) -> Li
             top_k=top_k
         )
 
-        formatted_results = []
-        for r in results:
-            formatted_results.append({
-                'url': f"local://{kb_name}/{r.get('document_id', 'unknown')}",
-                'name': r.get('document_name', 'N/A'),
-                'summary': r.get('content_with_weight', ''),
-                'snippet': r.get('content_with_weight', '')[:200] if r.get('content_with_weight') else '',
-                'siteName': f"知识库: {kb_name}",
-                'siteIcon': '',
-                'source': 'local'
-            })
-        return formatted_results
+        return _format_local_results(results, kb_name)
     except Exception as e:
         logging.error(f"Local knowledge search error: {e}")
         return []
 
 
-def websearch(query, count=5):
-    """执行网络搜索"""
-    url = "https://api.bochaai.com/v1/web-search"
-    payload = json.dumps({
-        "query": query,
-        "summary": True,
-        "count": count,
-        "page": 1
-    })
-    headers = {
-        'Authorization': SEARCH_API_KEY,
-        'Content-Type': 'application/json'
-    }
-
+async def search_local_knowledge_many(queries: List[str], kb_name: str, top_k: int = 5) -> List[List[Dict]]:
+    """批量搜索本地知识库（返回与 queries 一一对应的结果列表）"""
     try:
-        response = requests.post(url, headers=headers, data=payload, timeout=25)
-        response.raise_for_status()
-        data = response.json()
+        from service.retrieval_service import retrieve_from_knowledge_base_many
+        results = await asyncio.to_thread(
+            retrieve_from_knowledge_base_many,
+            kb_name=kb_name,
+            questions=queries,
+            top_k=top_k
+        )
+        return [_format_local_results(r, kb_name) for r in results]
     except Exception as e:
-        logging.error(f"Web search error for '{query}': {e}")
-        return []
+        logging.error(f"Local knowledge batch search error: {e}")
+        return [[] for _ in queries]
 
-    webpages_data = data.get('data', {}).get('webPages', {})
-    value_list = webpages_data.get('value')
 
-    if value_list is None or not isinstance(value_list, list):
-        return []
+def _format_local_results(results: List[Dict], kb_name: str) -> List[Dict]:
+    """知识库检索结果 -> 统一的搜索结果格式"""
+    formatted_results = []
+    for r in results:
+        formatted_results.append({
+            'url': f"local://{kb_name}/{r.get('document_id', 'unknown')}",
+            'name': r.get('document_name', 'N/A'),
+            'summary': r.get('content_with_weight', ''),
+            'snippet': r.get('content_with_weight', '')[:200] if r.get('content_with_weight') else '',
+            'siteName': f"知识库: {kb_name}",
+            'siteIcon': '',
+            'source': 'local'
+        })
+    return formatted_results
+
 
-    return [
-        item for item in value_list
-        if item.get('url') and (item.get('snippet') or item.get('summary'))
-    ]
+def websearch(query, count=5):
+    """执行网络搜索（同步，共享连接池）"""
+    results = get_search_cache().get_or_fetch_sync(get_search_provider(SEARCH_API_KEY), query, count=count)
+    return [to_bocha_format(r) for r in results]
 
 
 def qwen_llm(prompt, model="qwen-max", response_format=None, system_message_content="You are a helpful assistant."):
@@ -0,0 +1,509 @@
+"""
+进程内向量存储（embedded 后端）
+
+小型部署与测试不需要完整的 Milvus + etcd + MinIO：每个集合是数据目录下的一个子目录，
+1. 向量矩阵 - vectors.<n>.npy，float32 / float16（VECTOR_STORE_DTYPE），写入前归一化，以内存映射方式打开，
+   容量按倍数增长（扩容时写新文件后切换）
+2. 元数据 - meta.<n>.jsonl，每行一个切片（不含向量）或一条删除记录，只追加
+3. 状态 - state.json，记录维度、行数、当前使用的两个文件与元数据的有效长度，写入后原子替换；
+   重启时元数据截断到该长度，中途崩溃的写入不会留下半条记录
+检索对 kb_id 过滤后的有效行做矩阵乘法求余弦相似度，argpartition 取 top-k。
+删除只打标记，已删除行占比超过 VECTOR_STORE_COMPACT_RATIO 时重写文件。
+
+使用方式：
+```python
+from service.embedded_vector_store import EmbeddedVectorStore
+
+store = EmbeddedVectorStore("/tmp/vector_store", dtype="float16")
+store.insert_documents("knowledge_base", documents)
+hits = store.search("knowledge_base", query_vector, top_k=5, kb_id=["kb_a", "kb_b"])
+```
+"""
+
+import os
+import json
+import shutil
+import logging
+import threading
+from typing import Any, Callable, Dict, List, Optional, Tuple, Union
+
+import numpy as np
+
+try:
+    from config.llm_config import get_config
+except ImportError:
+    from app.config.llm_config import get_config
+
+from .vector_store import RESULT_FIELDS, VectorStore
+
+logger = logging.getLogger("EmbeddedVectorStore")
+
+STATE_FILE = "state.json"
+
+# 单次打分矩阵的最大元素数（行数 × 查询数），超过时按查询分批
+MAX_SCORE_ELEMENTS = 16 * 1024 * 1024
+
+
+def _default_embed(texts: List[str]) -> Optional[List[Optional[List[float]]]]:
+    try:
+        from service.embedding_service import generate_embedding
+    except ImportError:
+        from app.service.embedding_service import generate_embedding
+    return generate_embedding(texts)
+
+
+def _normalize(matrix: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    return matrix / np.maximum(norms, 1e-12)
+
+
+class EmbeddedCollection:
+    """单个集合：内存映射向量矩阵 + 元数据 sidecar"""
+
+    MIN_CAPACITY = 1024
+
+    def __init__(self, path: str, dtype: str = "float32"):
+        self.path = path
+        self.dtype = np.dtype(dtype)
+        self.dim: Optional[int] = None
+        self.count = 0
+        self._generation = 0  # 文件名序号，每次新建文件递增
+        self._vectors_file = ""
+        self._meta_file = "meta.0.jsonl"
+        self._meta_bytes = 0
+        self._matrix: Optional[np.memmap] = None
+        self._rows: List[Optional[Dict[str, Any]]] = []  # 行号 -> 元数据（已删除为 None）
+        self._alive = np.zeros(0, dtype=bool)
+        self._kb_codes = np.zeros(0, dtype=np.int32)  # 行号 -> kb_id 编码
+        self._kb_lookup: Dict[str, int] = {}
+        self._doc_rows: Dict[str, List[int]] = {}
+        self._deleted = 0
+        self._lock = threading.RLock()
+        os.makedirs(path, exist_ok=True)
+        self._load()
+
+    # ---------- 文件 ----------
+
+    def _file(self, name: str) -> str:
+        return os.path.join(self.path, name)
+
+    def _next_name(self, kind: str) -> str:
+        """
+        新文件名（序号先写入 state 再创建文件）
+
+        中途崩溃留下的孤立文件不会在下次被复用；同名文件若已存在也会被覆盖而不是追加
+        """
+        self._generation += 1
+        self._write_state()
+        name = f"{kind}.{self._generation}.{'npy' if kind == 'vectors' else 'jsonl'}"
+        self._remove(name)
+        return name
+
+    def _remove(self, name: str) -> None:
+        if name and os.path.exists(self._file(name)):
+            os.remove(self._file(name))
+
+    def _write_state(self) -> None:
+        state = {
+            "dim": self.dim,
+            "dtype": self.dtype.name,
+            "count": self.count,
+            "generation": self._generation,
+            "vectors_file": self._vectors_file,
+            "meta_file": self._meta_file,
+            "meta_bytes": self._meta_bytes,
+        }
+        tmp = os.path.join(self.path, STATE_FILE + ".tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(state, f)
+        os.replace(tmp, os.path.join(self.path, STATE_FILE))
+
+    def _load(self) -> None:
+        state_path = os.path.join(self.path, STATE_FILE)
+        if not os.path.exists(state_path):
+            return
+        with open(state_path, "r", encoding="utf-8") as f:
+            state = json.load(f)
+        self.dim = state["dim"]
+        self.dtype = np.dtype(state["dtype"])
+        self.count = state["count"]
+        self._generation = state["generation"]
+        self._vectors_file = state["vectors_file"]
+        self._meta_file = state["meta_file"]
+        self._meta_bytes = state["meta_bytes"]
+
+        # 清理崩溃留下的未切换文件
+        for name in os.listdir(self.path):
+            if name.startswith(("vectors.", "meta.")) and name not in (self._vectors_file, self._meta_file):
+                self._remove(name)
+
+        if self._vectors_file and os.path.exists(self._file(self._vectors_file)):
+            self._matrix = np.load(self._file(self._vectors_file), mmap_mode="r+")
+        capacity = len(self._matrix) if self._matrix is not None else 0
+        self._alive = np.zeros(capacity, dtype=bool)
+        self._kb_codes = np.zeros(capacity, dtype=np.int32)
+
+        meta_path = self._file(self._meta_file)
+        if not os.path.exists(meta_path):
+            return
+        # 截断到最后一次完整写入的位置
+        if os.path.getsize(meta_path) > self._meta_bytes:
+            with open(meta_path, "r+b") as f:
+                f.truncate(self._meta_bytes)
+        with open(meta_path, "r", encoding="utf-8") as f:
+            for line in f:
+                record = json.loads(line)
+                if "deleted" in record:
+                    self._mark_deleted(record["deleted"])
+                elif len(self._rows) < self.count:
+                    self._index_row(len(self._rows), record)
+
+    def _index_row(self, row: int, record: Dict[str, Any]) -> None:
+        self._rows.append(record)
+        self._alive[row] = True
+        kb_id = record.get("kb_id") or ""
+        self._kb_codes[row] = self._kb_lookup.setdefault(kb_id, len(self._kb_lookup))
+        self._doc_rows.setdefault(record.get("doc_id") or "", []).append(row)
+
+    def _mark_deleted(self, rows: List[int]) -> None:
+        for row in rows:
+            if row < len(self._rows) and self._rows[row] is not None:
+                self._rows[row] = None
+                self._alive[row] = False
+                self._deleted += 1
+
+    def _write_meta(self, name: str, records: List[Dict[str, Any]], sync: bool = False, mode: str = "ab") -> int:
+        """写入元数据行（默认追加，新建文件时用 wb），返回写入的字节数"""
+        data = "".join(json.dumps(r, ensure_ascii=False) + "\n" for r in records).encode("utf-8")
+        with open(self._file(name), mode) as f:
+            f.write(data)
+            f.flush()
+            if sync:
+                os.fsync(f.fileno())
+        return len(data)
+
+    def _append_meta(self, records: List[Dict[str, Any]], sync: bool = False) -> None:
+        self._meta_bytes += self._write_meta(self._meta_file, records, sync)
+
+    def _open_matrix(self, name: str, capacity: int) -> np.memmap:
+        return np.lib.format.open_memmap(self._file(name), mode="w+", dtype=self.dtype, shape=(capacity, self.dim))
+
+    def _ensure_capacity(self, needed: int) -> None:
+        """容量不足时写入更大的新矩阵文件并切换"""
+        capacity = len(self._matrix) if self._matrix is not None else 0
+        if needed <= capacity:
+            return
+        new_capacity = max(needed, capacity * 2, self.MIN_CAPACITY)
+        name = self._next_name("vectors")
+        matrix = self._open_matrix(name, new_capacity)
+        if self.count:
+            matrix[:self.count] = self._matrix[:self.count]
+        matrix.flush()
+        old_file, self._vectors_file = self._vectors_file, name
+        self._write_state()
+        self._matrix = matrix
+        self._alive = np.concatenate([self._alive, np.zeros(new_capacity - capacity, dtype=bool)])
+        self._kb_codes = np.concatenate([self._kb_codes, np.zeros(new_capacity - capacity, dtype=np.int32)])
+        self._remove(old_file)
+
+    # ---------- 写入 ----------
+
+    def append(self, records: List[Dict[str, Any]], vectors: np.ndarray, sync: bool = False) -> int:
+        """追加切片（vectors 与 records 一一对应）"""
+        if not records:
+            return 0
+        with self._lock:
+            if self.dim is None:
+                self.dim = int(vectors.shape[1])
+            elif vectors.shape[1] != self.dim:
+                raise ValueError(f"Vector dimension {vectors.shape[1]} does not match collection dimension {self.dim}")
+            start = self.count
+            self._ensure_capacity(start + len(records))
+            self._matrix[start:start + len(records)] = _normalize(vectors.astype(np.float32))
+            self._matrix.flush()
+            self._append_meta(records, sync=sync)
+            for offset, record in enumerate(records):
+                self._index_row(start + offset, record)
+            self.count = start + len(records)
+            self._write_state()
+            return len(records)
+
+    def delete_doc(self, doc_id: str, compact_ratio: float = 0.3) -> int:
+        """删除文档的所有切片，返回删除行数"""
+        with self._lock:
+            rows = self._doc_rows.pop(doc_id, [])
+            rows = [row for row in rows if self._rows[row] is not None]
+            if not rows:
+                return 0
+            self._append_meta([{"deleted": rows}])
+            self._mark_deleted(rows)
+            self._write_state()
+            if self._deleted > compact_ratio * self.count:
+                self.compact()
+            return len(rows)
+
+    def compact(self) -> None:
+        """重写文件，去掉已删除的行"""
+        with self._lock:
+            if not self._deleted:
+                return
+            keep = np.flatnonzero(self._alive[:self.count])
+            records = [self._rows[row] for row in keep]
+            # 先写完新文件，state 切换后再替换内存状态（中途失败时旧文件与 state 保持有效）
+            capacity = max(len(keep), self.MIN_CAPACITY)
+            vectors_file = self._next_name("vectors")
+            matrix = self._open_matrix(vectors_file, capacity)
+            for i in range(0, len(keep), 65536):
+                chunk = keep[i:i + 65536]
+                matrix[i:i + len(chunk)] = self._matrix[chunk]
+            matrix.flush()
+            meta_file = self._next_name("meta")
+            meta_bytes = self._write_meta(meta_file, records, sync=True, mode="wb")
+
+            old_files = (self._vectors_file, self._meta_file)
+            self._vectors_file, self._meta_file, self._meta_bytes = vectors_file, meta_file, meta_bytes
+            self.count = len(keep)
+            self._write_state()
+
+            self._matrix = matrix
+            self._rows = []
+            self._alive = np.zeros(capacity, dtype=bool)
+            self._kb_codes = np.zeros(capacity, dtype=np.int32)
+            self._kb_lookup = {}
+            self._doc_rows = {}
+            self._deleted = 0
+            for row, record in enumerate(records):
+                self._index_row(row, record)
+            for name in old_files:
+                self._remove(name)
+            logger.info(f"Compacted {self.path}: {self.count} rows")
+
+    def sync(self) -> None:
+        with self._lock:
+            if self._matrix is not None:
+                self._matrix.flush()
+            if os.path.exists(self._file(self._meta_file)):
+                with open(self._file(self._meta_file), "ab") as f:
+                    os.fsync(f.fileno())
+
+    # ---------- 查询 ----------
+
+    def _snapshot(self, kb_id: Union[str, List[str], None]) -> Tuple[Optional[np.ndarray], np.ndarray, List]:
+        """(向量矩阵, 候选行号, 元数据) 快照，检索在锁外进行"""
+        with self._lock:
+            if self._matrix is None or not self.count:
+                return None, np.zeros(0, dtype=np.int64), self._rows
+            mask = self._alive[:self.count].copy()
+            if kb_id:
+                kb_ids = [kb_id] if isinstance(kb_id, str) else list(kb_id)
+                codes = [self._kb_lookup[k] for k in kb_ids if k in self._kb_lookup]
+                mask &= np.isin(self._kb_codes[:self.count], codes)
+            return self._matrix, np.flatnonzero(mask), self._rows
+
+    def search(self, queries: np.ndarray, top_k: int, kb_id: Union[str, List[str], None] = None) -> List[List[Dict[str, Any]]]:
+        """批量检索，返回每个查询的 top-k 结果"""
+        matrix, candidates, rows = self._snapshot(kb_id)
+        if matrix is None or not len(candidates) or top_k <= 0:
+            return [[] for _ in range(len(queries))]
+        if queries.shape[1] != matrix.shape[1]:
+            raise ValueError(f"Query dimension {queries.shape[1]} does not match collection dimension {matrix.shape[1]}")
+
+        # 候选行连续时直接切片，避免复制整块矩阵
+        if candidates[-1] - candidates[0] + 1 == len(candidates):
+            base = matrix[candidates[0]:candidates[-1] + 1]
+        else:
+            base = matrix[candidates]
+        queries = _normalize(queries.astype(np.float32))
+        k = min(top_k, len(candidates))
+        step = max(1, MAX_SCORE_ELEMENTS // len(candidates))
+
+        results = []
+        for i in range(0, len(queries), step):
+            scores = queries[i:i + step] @ base.T.astype(np.float32, copy=False)
+            if k < len(candidates):
+                top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+            else:
+                top = np.tile(np.arange(len(candidates)), (len(scores), 1))
+            top_scores = np.take_along_axis(scores, top, axis=1)
+            order = np.argsort(-top_scores, axis=1)
+            for positions, values in zip(np.take_along_axis(top, order, axis=1), np.take_along_axis(top_scores, order, axis=1)):
+                hits = []
+                for position, score in zip(positions, values):
+                    record = rows[candidates[position]]
+                    if record is None:  # 快照后被删除
+                        continue
+                    hits.append({**{f: record.get(f) for f in RESULT_FIELDS}, "score": float(score)})
+                results.append(hits)
+        return results
+
+    def query(self, predicate: Callable[[Dict[str, Any]], bool], limit: int) -> List[Dict[str, Any]]:
+        with self._lock:
+            rows = [r for r in self._rows if r is not None and predicate(r)]
+        return [{f: r.get(f) for f in RESULT_FIELDS} for r in rows[:limit]]
+
+    @property
+    def num_entities(self) -> int:
+        with self._lock:
+            return self.count - self._deleted
+
+
+class EmbeddedVectorStore(VectorStore):
+    """进程内 numpy 向量存储（VECTOR_STORE_BACKEND=embedded）"""
+
+    def __init__(
+        self,
+        path: Optional[str] = None,
+        dtype: Optional[str] = None,
+        compact_ratio: Optional[float] = None,
+        embed_fn: Optional[Callable[[List[str]], Optional[List[Optional[List[float]]]]]] = None,
+    ):
+        config = get_config().vector_store
+        self.path = path or config.path
+        self.dtype = dtype or config.dtype
+        self.compact_ratio = config.compact_ratio if compact_ratio is None else compact_ratio
+        self.embed_fn = embed_fn or _default_embed
+        self._collections: Dict[str, EmbeddedCollection] = {}
+        self._lock = threading.Lock()
+        os.makedirs(self.path, exist_ok=True)
+        logger.info(f"Embedded vector store at {self.path} ({self.dtype})")
+
+    def _collection_path(self, collection_name: str) -> str:
+        if not collection_name or os.sep in collection_name or collection_name.startswith("."):
+            raise ValueError(f"Invalid collection name '{collection_name}'")
+        return os.path.join(self.path, collection_name)
+
+    def _get(self, collection_name: str, create: bool = False) -> Optional[EmbeddedCollection]:
+        with self._lock:
+            collection = self._collections.get(collection_name)
+            if collection is None:
+                path = self._collection_path(collection_name)
+                if not create and not os.path.isdir(path):
+                    return None
+                collection = EmbeddedCollection(path, self.dtype)
+                self._collections[collection_name] = collection
+            return collection
+
+    def create_collection(self, collection_name: str) -> EmbeddedCollection:
+        return self._get(collection_name, create=True)
+
+    def insert_documents(self, collection_name: str, documents: List[Dict[str, Any]], flush: bool = False) -> int:
+        """
+        插入文档
+
+        Args:
+            collection_name: 集合名称（不存在时创建）
+            documents: 文档列表（字段同 MilvusService.insert_documents，缺少 vector 时按 content 生成）
+            flush: 插入后是否 fsync 到磁盘
+
+        有文档缺少向量（且生成失败）时不写入任何文档，直接抛出 RuntimeError。
+        """
+        records, vectors = [], []
+        missing = [doc for doc in documents if not doc.get("vector")]
+        generated = self.embed_fn([doc.get("content") or "" for doc in missing]) if missing else []
+        generated = dict(zip(map(id, missing), generated or []))
+        for doc in documents:
+            vector = doc.get("vector") or generated.get(id(doc))
+            if not vector:
+                continue
+            record = {f: doc.get(f) for f in RESULT_FIELDS}
+            record["content"] = (record["content"] or "")[:65535]
+            records.append(record)
+            vectors.append(vector)
+
+        failed = len(documents) - len(records)
+        if failed:
+            raise RuntimeError(f"{failed} of {len(documents)} documents have no vector, nothing inserted into {collection_name}")
+
+        inserted = 0
+        if records:
+            collection = self.create_collection(collection_name)
+            inserted = collection.append(records, np.asarray(vectors, dtype=np.float32), sync=flush)
+        print(f"成功插入 {inserted} 条文档到 {collection_name}")
+        return inserted
+
+    def search(
+        self,
+        collection_name: str,
+        query_vector: List[float],
+        top_k: int = 5,
+        kb_id: Union[str, List[str], None] = None,
+    ) -> List[Dict[str, Any]]:
+        return self._search_many(collection_name, [query_vector], top_k, kb_id)[0]
+
+    def search_many(
+        self,
+        collection_name: str,
+        query_vectors: List[List[float]],
+        top_k: int = 5,
+        kb_id: Union[str, List[str], None] = None,
+    ) -> List[List[Dict[str, Any]]]:
+        return self._search_many(collection_name, query_vectors, top_k, kb_id)
+
+    def _search_many(
+        self,
+        collection_name: str,
+        query_vectors: List[List[float]],
+        top_k: int,
+        kb_id: Union[str, List[str], None],
+    ) -> List[List[Dict[str, Any]]]:
+        """检索实现（search 不经过 search_many，回放录制时两者各记一次）"""
+        collection = self._get(collection_name)
+        if collection is None:
+            print(f"集合 {collection_name} 不存在")
+            return [[] for _ in query_vectors]
+        positions = [i for i, vector in enumerate(query_vectors) if vector]
+        results: List[List[Dict[str, Any]]] = [[] for _ in query_vectors]
+        if positions:
+            queries = np.asarray([query_vectors[i] for i in positions], dtype=np.float32)
+            for i, hits in zip(positions, collection.search(queries, top_k, kb_id)):
+                results[i] = hits
+        return results
+
+    def delete_by_doc_id(self, collection_name: str, doc_id: str) -> bool:
+        try:
+            collection = self._get(collection_name)
+            if collection is not None and collection.delete_doc(doc_id, self.compact_ratio):
+                print(f"已删除文档 {doc_id} 的所有切片")
+            return True
+        except Exception as e:
+            print(f"删除文档失败: {e}")
+            return False
+
+    def delete_collection(self, collection_name: str) -> bool:
+        try:
+            with self._lock:
+                self._collections.pop(collection_name, None)
+                path = self._collection_path(collection_name)
+                if os.path.isdir(path):
+                    shutil.rmtree(path)
+                    print(f"集合 {collection_name} 已删除")
+            return True
+        except Exception as e:
+            print(f"删除集合失败: {e}")
+            return False
+
+    def get_collection_stats(self, collection_name: str) -> Dict[str, Any]:
+        collection = self._get(collection_name)
+        if collection is None:
+            return {"exists": False}
+        return {
+            "exists": True,
+            "name": collection_name,
+            "num_entities": collection.num_entities,
+        }
+
+    def get_chunks_by_filename(self, collection_name: str, filename: str, limit: int = 1000) -> List[Dict[str, Any]]:
+        collection = self._get(collection_name)
+        if collection is None:
+            print(f"集合 {collection_name} 不存在")
+            return []
+        chunks = collection.query(lambda r: r.get("filename") == filename, limit)
+        chunks.sort(key=lambda x: x.get("chunk_index") or 0)
+        return chunks
+
+    def flush(self) -> None:
+        """将所有集合同步到磁盘"""
+        with self._lock:
+            collections = list(self._collections.values())
+        for collection in collections:
+            collection.sync()
@@ -0,0 +1,287 @@
+"""
+向量缓存
+
+重复上传的文档切片、相同的记忆摘要、高频的对话查询都会反复向量化同一段文本。
+这里按内容哈希缓存向量，由 EmbeddingService 在调用接口前透明查询：
+1. 缓存键 - (模型, 维度, sha1(文本))，模型或维度变化时自然失效
+2. 紧凑存储 - 向量以 float16 字节存储（1024 维 2KB，JSON 浮点列表约 20KB）
+3. 两级缓存 - 进程内有界 LRU + Redis（跨 worker 共享）或本地 SQLite 文件
+4. 命中统计 - get_stats() 返回各级命中数与命中率
+
+float16 约有 3 位有效数字，对归一化向量的余弦相似度影响在 1e-3 量级，不影响检索排序。
+
+使用方式：
+```python
+from service.embedding_cache import get_embedding_cache
+
+cache = get_embedding_cache()
+key = cache.make_key("text-embedding-v4", 1024, "储能行业市场规模")
+vectors = cache.get_many([key])  # {key: [0.012, -0.034, ...]}
+```
+"""
+
+import os
+import time
+import sqlite3
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+
+try:
+    from core.redis_client import get_binary_redis_client
+    REDIS_AVAILABLE = True
+except ImportError:
+    try:
+        from app.core.redis_client import get_binary_redis_client
+        REDIS_AVAILABLE = True
+    except ImportError:
+        get_binary_redis_client = None
+        REDIS_AVAILABLE = False
+
+try:
+    from config.llm_config import get_config
+except ImportError:
+    from app.config.llm_config import get_config
+
+logger = logging.getLogger("EmbeddingCache")
+
+CACHE_KEY_PREFIX = "emb:v1:"
+
+
+def pack_vector(vector: Sequence[float]) -> bytes:
+    """向量 -> float16 小端字节"""
+    return np.asarray(vector, dtype="<f2").tobytes()
+
+
+def unpack_vector(data: bytes) -> List[float]:
+    """float16 字节 -> 浮点列表"""
+    return np.frombuffer(data, dtype="<f2").astype(np.float32).tolist()
+
+
+class _RedisStore:
+    """Redis 层（二进制值，MGET / pipeline 批量读写）"""
+
+    def __init__(self, ttl: int):
+        self.ttl = ttl
+        self.client = get_binary_redis_client()
+
+    def get_many(self, keys: List[str]) -> Dict[str, bytes]:
+        values = self.client.mget(keys)
+        return {key: value for key, value in zip(keys, values) if value}
+
+    def put_many(self, items: Dict[str, bytes]) -> None:
+        pipe = self.client.pipeline(transaction=False)
+        for key, value in items.items():
+            pipe.setex(key, self.ttl, value)
+        pipe.execute()
+
+    def describe(self) -> str:
+        return "redis"
+
+
+class _DiskStore:
+    """本地 SQLite 层（单文件，适合未部署 Redis 的单机环境），过期条目在写入时每小时清理一次"""
+
+    PURGE_INTERVAL = 3600
+
+    def __init__(self, cache_dir: str, ttl: int):
+        os.makedirs(cache_dir, exist_ok=True)
+        self.path = os.path.join(cache_dir, "embeddings.sqlite3")
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings (key TEXT PRIMARY KEY, vector BLOB NOT NULL, stored_at REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_embeddings_stored_at ON embeddings (stored_at)")
+        self._conn.commit()
+        self._purged_at = 0.0
+        with self._lock:
+            self._purge_expired()
+
+    def _purge_expired(self) -> int:
+        """删除过期条目（调用方持有 _lock）"""
+        self._purged_at = time.time()
+        deleted = self._conn.execute("DELETE FROM embeddings WHERE stored_at < ?", (self._purged_at - self.ttl,)).rowcount
+        self._conn.commit()
+        if deleted:
+            logger.info(f"Purged {deleted} expired embeddings from {self.path}")
+        return deleted
+
+    def get_many(self, keys: List[str]) -> Dict[str, bytes]:
+        found = {}
+        cutoff = time.time() - self.ttl
+        with self._lock:
+            # SQLite 单条语句的参数个数有上限，分段查询
+            for i in range(0, len(keys), 500):
+                chunk = keys[i:i + 500]
+                rows = self._conn.execute(
+                    f"SELECT key, vector FROM embeddings WHERE stored_at >= ? AND key IN ({','.join('?' * len(chunk))})",
+                    [cutoff, *chunk]
+                ).fetchall()
+                found.update(rows)
+        return found
+
+    def put_many(self, items: Dict[str, bytes]) -> None:
+        now = time.time()
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (key, vector, stored_at) VALUES (?, ?, ?)",
+                [(key, value, now) for key, value in items.items()]
+            )
+            self._conn.commit()
+            if now - self._purged_at >= self.PURGE_INTERVAL:
+                self._purge_expired()
+
+    def describe(self) -> str:
+        return f"disk:{self.path}"
+
+
+class EmbeddingCache:
+    """两级向量缓存"""
+
+    def __init__(
+        self,
+        max_entries: int = 20000,
+        backend: str = "redis",
+        ttl: int = 30 * 24 * 3600,
+        cache_dir: str = "/tmp/embedding_cache"
+    ):
+        """
+        Args:
+            max_entries: 进程内 LRU 容量（1024 维约 2KB/条）
+            backend: 第二级缓存：redis / disk / memory（仅进程内 LRU）
+            ttl: 第二级缓存有效期（秒）
+            cache_dir: disk 后端的 SQLite 文件目录
+        """
+        self.max_entries = max_entries
+        self._local: "OrderedDict[str, bytes]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._store = None
+        self.stats = {"local_hits": 0, "remote_hits": 0, "misses": 0, "stores": 0, "errors": 0}
+
+        if backend == "redis" and not REDIS_AVAILABLE:
+            logger.warning("Redis unavailable, falling back to on-disk embedding cache")
+            backend = "disk"
+        try:
+            if backend == "redis":
+                self._store = _RedisStore(ttl)
+            elif backend == "disk":
+                self._store = _DiskStore(cache_dir, ttl)
+        except Exception as e:
+            logger.warning(f"Embedding cache backend '{backend}' unavailable, using in-process cache only: {e}")
+            self._store = None
+
+    @staticmethod
+    def make_key(model_name: str, dimensions: int, text: str) -> str:
+        digest = hashlib.sha1(text.encode("utf-8")).hexdigest()
+        return f"{CACHE_KEY_PREFIX}{model_name}:{dimensions}:{digest}"
+
+    def _count(self, name: str, n: int = 1) -> None:
+        with self._lock:
+            self.stats[name] += n
+
+    # ---------- 读 ----------
+
+    def get_local(self, keys: List[str]) -> Dict[str, List[float]]:
+        """只查进程内 LRU（无 IO，可在事件循环中直接调用）"""
+        found = {}
+        with self._lock:
+            for key in keys:
+                data = self._local.get(key)
+                if data is not None:
+                    self._local.move_to_end(key)
+                    found[key] = data
+            self.stats["local_hits"] += len(found)
+        return {key: unpack_vector(data) for key, data in found.items()}
+
+    def get_remote(self, keys: List[str]) -> Dict[str, List[float]]:
+        """查第二级缓存（阻塞 IO），命中的条目回填进程内 LRU；未命中计入 misses"""
+        found: Dict[str, bytes] = {}
+        if self._store is not None and keys:
+            try:
+                found = self._store.get_many(keys)
+            except Exception as e:
+                self._count("errors")
+                logger.warning(f"Embedding cache read failed: {e}")
+        with self._lock:
+            self.stats["remote_hits"] += len(found)
+            self.stats["misses"] += len(keys) - len(found)
+        for key, data in found.items():
+            self._store_local(key, data)
+        return {key: unpack_vector(data) for key, data in found.items()}
+
+    def get_many(self, keys: List[str]) -> Dict[str, List[float]]:
+        """依次查两级缓存"""
+        found = self.get_local(keys)
+        missing = [key for key in keys if key not in found]
+        if missing:
+            found.update(self.get_remote(missing))
+        return found
+
+    # ---------- 写 ----------
+
+    def _store_local(self, key: str, data: bytes) -> None:
+        with self._lock:
+            self._local[key] = data
+            self._local.move_to_end(key)
+            while len(self._local) > self.max_entries:
+                self._local.popitem(last=False)
+
+    def put_many(self, items: Dict[str, Sequence[float]], local_only: bool = False) -> None:
+        """写入两级缓存（local_only=True 时只写进程内 LRU）"""
+        packed = {key: pack_vector(vector) for key, vector in items.items() if vector}
+        if not packed:
+            return
+        for key, data in packed.items():
+            self._store_local(key, data)
+        self._count("stores", len(packed))
+        if local_only or self._store is None:
+            return
+        try:
+            self._store.put_many(packed)
+        except Exception as e:
+            self._count("errors")
+            logger.warning(f"Embedding cache write failed: {e}")
+
+    def get_stats(self) -> Dict[str, Any]:
+        """缓存命中统计"""
+        with self._lock:
+            stats = dict(self.stats)
+            local_entries = len(self._local)
+            local_bytes = sum(len(data) for data in self._local.values())
+        hits = stats["local_hits"] + stats["remote_hits"]
+        total = hits + stats["misses"]
+        return {
+            **stats,
+            "local_entries": local_entries,
+            "local_bytes": local_bytes,
+            "backend": self._store.describe() if self._store is not None else "memory",
+            "hit_rate": round(hits / total, 3) if total else 0.0,
+        }
+
+
+_embedding_cache: Optional[EmbeddingCache] = None
+_embedding_cache_lock = threading.Lock()
+
+
+def get_embedding_cache() -> Optional[EmbeddingCache]:
+    """获取向量缓存单例（EMBEDDING_CACHE=off 时返回 None）"""
+    global _embedding_cache
+    config = get_config().embedding
+    if config.cache_backend == "off":
+        return None
+    with _embedding_cache_lock:
+        if _embedding_cache is None:
+            _embedding_cache = EmbeddingCache(
+                max_entries=config.cache_max_entries,
+                backend=config.cache_backend,
+                ttl=config.cache_ttl,
+                cache_dir=config.cache_dir
+            )
+        return _embedding_cache
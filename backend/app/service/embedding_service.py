@@ -1,23 +1,351 @@
-
 """
 Embedding 服务 - 使用阿里 DashScope
 
 功能：
-1. generate_embedding - 使用 text-embedding-v4 生成向量
-2. rerank_similarity - 使用 DashScope Rerank 重排序
+1. EmbeddingService - 异步向量化服务（共享客户端 + 微批合并）
+2. generate_embedding / generate_embedding_async - 同步与异步便捷函数
+3. rerank_similarity - 使用 DashScope Rerank 重排序（见 service/reranker.py）
+
+EmbeddingService：
+1. 共享客户端 - 每组 (api_key, base_url, 模型, 维度) 一个 AsyncOpenAI 客户端，连接复用
+2. 微批合并 - 并发的单条请求先等待几毫秒，凑成接口上限（10 条）的批次再发出
+3. 并行批次 - 最多 max_concurrency 个批次同时在途，而不是逐批串行
+4. 相同文本合并 - 排队或在途的相同文本共享一次结果
+5. 单条失败隔离 - 批次失败后逐条重试，只有真正失败的文本返回 None
+6. 向量缓存 - 调用接口前先查 embedding_cache（进程内 LRU + Redis / 本地文件），成功的结果回写
+
+服务运行在独立的后台事件循环线程中，协程与线程池中的同步调用都提交到同一个批处理器，
+因此 DeepScout 协程、同步路由、asyncio.to_thread 中的调用可以互相凑批。
+
+使用方式：
+```python
+from service.embedding_service import generate_embedding, generate_embedding_async
+
+vector = await generate_embedding_async("储能行业市场规模")
+vectors = generate_embedding(["文本一", "文本二"])
+```
 """
 
 import os
-from typing import List, Optional, Tuple
+import asyncio
+import logging
+import threading
+from typing import Any, Dict, List, Optional, Tuple
 import numpy as np
-from openai import OpenAI
-from llama_index.core.data_structs import Node
-from llama_index.core.schema import NodeWithScore
-from llama_index.postprocessor.dashscope_rerank import DashScopeRerank
+from openai import AsyncOpenAI
 
 from dotenv import load_dotenv
 load_dotenv()
 
+try:
+    from config.llm_config import get_config
+except ImportError:
+    from app.config.llm_config import get_config
+
+try:
+    from service.embedding_cache import EmbeddingCache, get_embedding_cache
+except ImportError:
+    from app.service.embedding_cache import EmbeddingCache, get_embedding_cache
+
+logger = logging.getLogger("EmbeddingService")
+
+DEFAULT_BASE_URL = "https://dashscope.aliyuncs.com/compatible-mode/v1"
+
+
+class _LoopThread:
+    """后台事件循环线程（所有 EmbeddingService 共用）"""
+
+    def __init__(self):
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    def get(self) -> asyncio.AbstractEventLoop:
+        with self._lock:
+            if self._loop is None or self._loop.is_closed():
+                ready = threading.Event()
+                loop = asyncio.new_event_loop()
+
+                def run():
+                    asyncio.set_event_loop(loop)
+                    loop.call_soon(ready.set)
+                    loop.run_forever()
+
+                self._thread = threading.Thread(target=run, name="embedding-loop", daemon=True)
+                self._thread.start()
+                ready.wait()
+                self._loop = loop
+            return self._loop
+
+    def stop(self) -> None:
+        with self._lock:
+            loop, thread = self._loop, self._thread
+            self._loop, self._thread = None, None
+        if loop is None:
+            return
+        loop.call_soon_threadsafe(loop.stop)
+        if thread is not None and thread is not threading.current_thread():
+            thread.join(timeout=5)
+        if not loop.is_running():
+            loop.close()
+
+
+_loop_thread = _LoopThread()
+
+
+class EmbeddingService:
+    """微批合并的异步向量化服务"""
+
+    def __init__(
+        self,
+        api_key: str,
+        base_url: str = DEFAULT_BASE_URL,
+        model_name: str = "text-embedding-v4",
+        dimensions: int = 1024,
+        encoding_format: str = "float",
+        max_batch_size: Optional[int] = None,
+        batch_wait_ms: Optional[float] = None,
+        max_concurrency: Optional[int] = None,
+        timeout: Optional[float] = None,
+        cache: Optional[EmbeddingCache] = None
+    ):
+        """
+        Args:
+            api_key: DashScope API 密钥
+            base_url: OpenAI 兼容接口地址
+            model_name: 模型名称
+            dimensions: 向量维度
+            encoding_format: 编码格式
+            max_batch_size: 单批最大文本数（阿里云限制为 10）
+            batch_wait_ms: 凑批等待时间（毫秒），批次满时立即发出
+            max_concurrency: 同时在途的批次数
+            timeout: 单次请求超时（秒）
+            cache: 向量缓存（仅 float 编码时使用），为 None 时不缓存
+        """
+        config = get_config().embedding
+        self.api_key = api_key
+        self.base_url = base_url
+        self.model_name = model_name
+        self.dimensions = dimensions
+        self.encoding_format = encoding_format
+        self.max_batch_size = max(1, max_batch_size or config.max_batch_size)
+        self.batch_wait = (batch_wait_ms if batch_wait_ms is not None else config.batch_wait_ms) / 1000
+        self.max_concurrency = max(1, max_concurrency or config.max_concurrency)
+        self.timeout = timeout or config.timeout
+        self.cache = cache if encoding_format == "float" else None
+
+        # 以下状态只在后台事件循环中访问
+        self._client: Optional[AsyncOpenAI] = None
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._pending: Dict[str, asyncio.Future] = {}
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self._flush_handle: Optional[asyncio.TimerHandle] = None
+        self._tasks: set = set()
+        self.stats = {"requests": 0, "merged": 0, "batches": 0, "texts": 0, "retried_batches": 0, "failed": 0}
+
+    # ---------- 对外接口 ----------
+
+    async def embed(self, text: str) -> Optional[List[float]]:
+        """向量化单条文本，失败返回 None"""
+        return (await self.embed_many([text]))[0]
+
+    async def embed_many(self, texts: List[str]) -> List[Optional[List[float]]]:
+        """向量化多条文本，返回等长列表（失败的条目为 None）"""
+        if not texts:
+            return []
+        future = asyncio.run_coroutine_threadsafe(self._gather(list(texts)), _loop_thread.get())
+        return await asyncio.wrap_future(future)
+
+    def embed_sync(self, texts: List[str]) -> List[Optional[List[float]]]:
+        """同步版本（供线程池中的同步代码调用，不能在服务自身的事件循环线程中调用）"""
+        if not texts:
+            return []
+        future = asyncio.run_coroutine_threadsafe(self._gather(list(texts)), _loop_thread.get())
+        # 每次请求都受客户端超时约束，这里不再额外设置超时
+        return future.result()
+
+    def get_stats(self) -> Dict[str, Any]:
+        stats = dict(self.stats)
+        stats["avg_batch_size"] = round(stats["texts"] / stats["batches"], 2) if stats["batches"] else 0.0
+        if self.cache is not None:
+            stats["cache"] = self.cache.get_stats()
+        return stats
+
+    # ---------- 批处理器（后台事件循环） ----------
+
+    def _cache_key(self, text: str) -> Optional[str]:
+        if self.cache is None or not isinstance(text, str) or not text.strip():
+            return None
+        return self.cache.make_key(self.model_name, self.dimensions, text)
+
+    async def _gather(self, texts: List[str]) -> List[Optional[List[float]]]:
+        results: List[Optional[List[float]]] = [None] * len(texts)
+        pending = list(range(len(texts)))
+
+        if self.cache is not None:
+            keys = [self._cache_key(text) for text in texts]
+            valid = [key for key in keys if key]
+            cached = self.cache.get_local(valid)
+            missing = list(dict.fromkeys(key for key in valid if key not in cached))
+            if missing:
+                # Redis / 本地文件为阻塞 IO，放入线程池
+                cached.update(await asyncio.to_thread(self.cache.get_remote, missing))
+            pending = []
+            for i, key in enumerate(keys):
+                if key in cached:
+                    results[i] = cached[key]
+                else:
+                    pending.append(i)
+
+        # shield：调用方取消时不影响共享同一结果的其他调用方
+        futures = [asyncio.shield(self._submit(texts[i])) for i in pending]
+        for i, vector in zip(pending, await asyncio.gather(*futures)):
+            results[i] = vector
+        return results
+
+    def _submit(self, text: str) -> asyncio.Future:
+        self.stats["requests"] += 1
+        loop = asyncio.get_running_loop()
+        if not isinstance(text, str) or not text.strip():
+            # 空文本会导致整批请求被接口拒绝，直接返回 None
+            future = loop.create_future()
+            future.set_result(None)
+            self.stats["failed"] += 1
+            return future
+
+        existing = self._pending.get(text) or self._inflight.get(text)
+        if existing is not None:
+            self.stats["merged"] += 1
+            return existing
+
+        future = loop.create_future()
+        self._pending[text] = future
+        if len(self._pending) >= self.max_batch_size:
+            self._flush()
+        elif self._flush_handle is None:
+            self._flush_handle = loop.call_later(self.batch_wait, self._flush)
+        return future
+
+    def _flush(self) -> None:
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        if not self._pending:
+            return
+        items = list(self._pending.items())
+        self._pending.clear()
+        self._inflight.update(items)
+        for i in range(0, len(items), self.max_batch_size):
+            task = asyncio.ensure_future(self._run_batch(items[i:i + self.max_batch_size]))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    def _get_client(self) -> AsyncOpenAI:
+        if self._client is None:
+            self._client = AsyncOpenAI(api_key=self.api_key, base_url=self.base_url, timeout=self.timeout)
+            self._slots = asyncio.Semaphore(self.max_concurrency)
+        return self._client
+
+    async def _request(self, texts: List[str]) -> List[List[float]]:
+        completion = await self._get_client().embeddings.create(
+            model=self.model_name,
+            input=texts,
+            dimensions=self.dimensions,
+            encoding_format=self.encoding_format
+        )
+        data = sorted(completion.data, key=lambda item: item.index)
+        if len(data) != len(texts):
+            raise ValueError(f"expected {len(texts)} embeddings, got {len(data)}")
+        return [item.embedding for item in data]
+
+    async def _run_batch(self, items: List[Tuple[str, asyncio.Future]]) -> None:
+        texts = [text for text, _ in items]
+        vectors: List[Optional[List[float]]] = [None] * len(texts)
+        try:
+            self._get_client()
+            async with self._slots:
+                self.stats["batches"] += 1
+                self.stats["texts"] += len(texts)
+                vectors = await self._embed_isolated(texts)
+        except Exception as e:
+            logger.error(f"Embedding batch failed: {e}")
+        finally:
+            for (text, future), vector in zip(items, vectors):
+                self._inflight.pop(text, None)
+                if vector is None:
+                    self.stats["failed"] += 1
+                if not future.done():
+                    future.set_result(vector)
+
+        if self.cache is not None:
+            fresh = {self._cache_key(text): vector for text, vector in zip(texts, vectors) if vector}
+            if fresh:
+                # 回写不阻塞调用方
+                asyncio.get_running_loop().run_in_executor(None, self.cache.put_many, fresh)
+
+    async def _embed_isolated(self, texts: List[str]) -> List[Optional[List[float]]]:
+        """整批请求；失败时逐条重试，只让真正出错的文本返回 None"""
+        try:
+            return await self._request(texts)
+        except Exception as e:
+            if len(texts) == 1:
+                logger.warning(f"Embedding request failed: {e}")
+                return [None]
+            logger.warning(f"Embedding batch of {len(texts)} failed, retrying items individually: {e}")
+            self.stats["retried_batches"] += 1
+
+        results = await asyncio.gather(*(self._request([text]) for text in texts), return_exceptions=True)
+        vectors: List[Optional[List[float]]] = []
+        for text, result in zip(texts, results):
+            if isinstance(result, Exception):
+                logger.warning(f"Embedding failed for text ({len(text)} chars): {result}")
+                vectors.append(None)
+            else:
+                vectors.append(result[0])
+        return vectors
+
+    async def aclose(self) -> None:
+        if self._client is not None:
+            await self._client.close()
+            self._client = None
+
+
+_services: Dict[Tuple[str, str, str, int, str, int], EmbeddingService] = {}
+_services_lock = threading.Lock()
+
+
+def get_embedding_service(
+    api_key: Optional[str] = None,
+    base_url: Optional[str] = None,
+    model_name: str = "text-embedding-v4",
+    dimensions: int = 1024,
+    encoding_format: str = "float",
+    max_batch_size: Optional[int] = None
+) -> Optional[EmbeddingService]:
+    """获取向量化服务（按 api_key / base_url / 模型 / 维度复用），缺少 API 密钥时返回 None"""
+    api_key = api_key or os.getenv("DASHSCOPE_API_KEY")
+    base_url = base_url or os.getenv("DASHSCOPE_BASE_URL", DEFAULT_BASE_URL)
+    if not api_key:
+        logger.error("缺少 DASHSCOPE_API_KEY 环境变量")
+        return None
+
+    batch_size = max_batch_size or get_config().embedding.max_batch_size
+    key = (api_key, base_url, model_name, dimensions, encoding_format, batch_size)
+    with _services_lock:
+        service = _services.get(key)
+        if service is None:
+            service = EmbeddingService(
+                api_key=api_key,
+                base_url=base_url,
+                model_name=model_name,
+                dimensions=dimensions,
+                encoding_format=encoding_format,
+                max_batch_size=batch_size,
+                cache=get_embedding_cache()
+            )
+            _services[key] = service
+        return service
+
 
 def generate_embedding(
     text: str | List[str],
@@ -26,11 +354,13 @@ def generate_embedding(
     model_name: str = "text-embedding-v4",
     dimensions: int = 1024,
     encoding_format: str = "float",
-    max_batch_size: int = 10
+    max_batch_size: Optional[int] = None
 ) -> Optional[List[float] | List[List[float]]]:
     """
     生成文本的向量嵌入（使用阿里 text-embedding-v4）
 
+    同步调用，与其他线程和协程中的请求一起微批合并。
+
     Args:
         text: 单个文本或文本列表
         api_key: API密钥（默认从环境变量获取）
@@ -38,61 +368,69 @@ def generate_embedding(
         model_name: 模型名称
         dimensions: 向量维度（默认1024）
         encoding_format: 编码格式
-        max_batch_size: 最大批量大小（阿里云限制为10）
+        max_batch_size: 最大批量大小（默认10，阿里云限制为10）
 
     Returns:
-        单个文本时返回向量，文本列表时返回向量列表
+        单个文本时返回向量，文本列表时返回向量列表（失败的条目为 None）
     """
-    api_key = api_key or os.getenv("DASHSCOPE_API_KEY")
-    base_url = base_url or os.getenv("DASHSCOPE_BASE_URL", "https://dashscope.aliyuncs.com/compatible-mode/v1")
-
-    if not api_key:
-        print("错误: 缺少 DASHSCOPE_API_KEY 环境变量")
+    service = get_embedding_service(api_key, base_url, model_name, dimensions, encoding_format, max_batch_size)
+    if service is None or not isinstance(text, (str, list)):
         return None
+    try:
+        if isinstance(text, str):
+            return service.embed_sync([text])[0]
+        return service.embed_sync(text)
+    except Exception as e:
+        logger.error(f"Embedding 请求失败: {e}")
+        return None
+
 
+async def generate_embedding_async(
+    text: str | List[str],
+    api_key: str = None,
+    base_url: str = None,
+    model_name: str = "text-embedding-v4",
+    dimensions: int = 1024,
+    encoding_format: str = "float",
+    max_batch_size: Optional[int] = None
+) -> Optional[List[float] | List[List[float]]]:
+    """generate_embedding 的异步版本（参数与返回值相同），不占用调用方线程"""
+    service = get_embedding_service(api_key, base_url, model_name, dimensions, encoding_format, max_batch_size)
+    if service is None or not isinstance(text, (str, list)):
+        return None
     try:
-        client = OpenAI(api_key=api_key, base_url=base_url)
+        if isinstance(text, str):
+            return await service.embed(text)
+        return await service.embed_many(text)
     except Exception as e:
-        print(f"初始化 OpenAI 客户端失败: {e}")
+        logger.error(f"Embedding 请求失败: {e}")
         return None
 
-    # 单个文本
-    if isinstance(text, str):
-        try:
-            completion = client.embeddings.create(
-                model=model_name,
-                input=text,
-                dimensions=dimensions,
-                encoding_format=encoding_format
-            )
-            return completion.data[0].embedding
-        except Exception as e:
-            print(f"Embedding 请求失败: {e}")
-            return None
 
-    # 文本列表 - 分批处理
-    if isinstance(text, list):
-        all_embeddings = []
+def get_embedding_stats() -> Dict[str, Any]:
+    """各向量化服务的批处理统计与向量缓存命中统计"""
+    with _services_lock:
+        services = list(_services.values())
+    cache = get_embedding_cache()
+    return {
+        "services": {f"{s.model_name}:{s.dimensions}": {k: v for k, v in s.get_stats().items() if k != "cache"} for s in services},
+        "cache": cache.get_stats() if cache is not None else None,
+    }
 
-        for i in range(0, len(text), max_batch_size):
-            batch = text[i:i + max_batch_size]
 
+async def close_embedding_services() -> None:
+    """关闭共享客户端与后台事件循环（应用退出时调用）"""
+    with _services_lock:
+        services = list(_services.values())
+        _services.clear()
+    if services:
+        loop = _loop_thread.get()
+        for service in services:
             try:
-                completion = client.embeddings.create(
-                    model=model_name,
-                    input=batch,
-                    dimensions=dimensions,
-                    encoding_format=encoding_format
-                )
-                batch_embeddings = [item.embedding for item in completion.data]
-                all_embeddings.extend(batch_embeddings)
+                await asyncio.wrap_future(asyncio.run_coroutine_threadsafe(service.aclose(), loop))
             except Exception as e:
-                print(f"Embedding 批量请求失败 (batch {i // max_batch_size + 1}): {e}")
-                all_embeddings.extend([None] * len(batch))
-
-        return all_embeddings
-
-    return None
+                logger.warning(f"Failed to close embedding client: {e}")
+    _loop_thread.stop()
 
 
 def rerank_similarity(
@@ -109,26 +447,13 @@ def rerank_similarity(
         top_n: 返回前N个结果（默认返回全部）
 
     Returns:
-        (scores, None) - 分数数组和占位符
+        (scores, None) - 分数数组（与 texts 顺序一致，取前 top_n 个）和占位符
     """
-    api_key = os.getenv("DASHSCOPE_API_KEY")
-
-    if not api_key:
-        print("错误: 缺少 DASHSCOPE_API_KEY 环境变量")
-        return np.array([]), None
+    try:
+        from service.reranker import get_reranker
+    except ImportError:
+        from app.service.reranker import get_reranker
 
     top_n = top_n or len(texts)
-
-    # 创建节点列表
-    nodes = [NodeWithScore(node=Node(text=text), score=1.0) for text in texts]
-
-    # 初始化 DashScopeRerank
-    dashscope_rerank = DashScopeRerank(top_n=top_n, api_key=api_key)
-
-    # 执行重排序
-    results = dashscope_rerank.postprocess_nodes(nodes, query_str=query)
-
-    # 提取分数
-    scores = np.array([res.score for res in results])
-
-    return scores, None
+    scores = get_reranker().rerank_sync(query, texts)
+    return np.array(scores[:top_n]), None
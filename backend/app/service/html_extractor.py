@@ -0,0 +1,361 @@
+"""
+网页正文提取服务
+
+trafilatura / BeautifulSoup(lxml) 解析大页面是纯 CPU 工作，放在事件循环或线程池中
+都会占用 GIL，拖慢同一 worker 上其他研究任务的 SSE 推送。这里将提取放到独立的进程池：
+1. 固定数量的子进程 - 通过 forkserver 创建（不支持时用 spawn），不从多线程的服务进程直接 fork；
+   解析库只在 forkserver 进程中导入一次，之后的子进程由它 fork 得到
+2. 解析前限长 - 超过 max_html_chars 的 HTML 先截断，再跨进程传输与解析
+3. 单文档超时 - 每个子进程独占一条管道，超时只终止并替换该子进程，该文档退化为正则提取，
+   其他子进程上的文档不受影响
+4. 自动降级 - 子进程不可用时在线程中执行同样的提取逻辑
+
+使用方式：
+```python
+from service.html_extractor import extract_text_async
+
+text = await extract_text_async(html, url)
+```
+"""
+
+import re
+import asyncio
+import logging
+import queue
+import threading
+import multiprocessing
+from typing import Dict, Optional, Set, Tuple
+
+try:
+    import trafilatura
+    TRAFILATURA_AVAILABLE = True
+except ImportError:
+    TRAFILATURA_AVAILABLE = False
+
+try:
+    from bs4 import BeautifulSoup
+    BS4_AVAILABLE = True
+except ImportError:
+    BS4_AVAILABLE = False
+
+try:
+    from config.llm_config import get_config
+except ImportError:
+    from app.config.llm_config import get_config
+
+logger = logging.getLogger("HtmlExtractor")
+
+_MAIN_SELECTORS = ['article', 'main', '.content', '.article', '#content', '#article', '.post', '.entry']
+_NOISE_TAGS = ['script', 'style', 'nav', 'header', 'footer', 'aside', 'iframe', 'noscript', 'meta', 'link']
+_SCRIPT_PATTERN = re.compile(r'<script[^>]*>.*?</script>', re.DOTALL | re.IGNORECASE)
+_STYLE_PATTERN = re.compile(r'<style[^>]*>.*?</style>', re.DOTALL | re.IGNORECASE)
+_TAG_PATTERN = re.compile(r'<[^>]+>')
+
+
+def extract_with_regex(html: str, max_length: int = 12000) -> str:
+    """简单正则提取（最后的备选，也用于超时降级）"""
+    text = _SCRIPT_PATTERN.sub('', html)
+    text = _STYLE_PATTERN.sub('', text)
+    text = _TAG_PATTERN.sub(' ', text)
+    text = text.replace('&nbsp;', ' ').replace('&lt;', '<').replace('&gt;', '>')
+    text = text.replace('&amp;', '&').replace('&quot;', '"')
+    text = re.sub(r'\s+', ' ', text).strip()
+    return text[:max_length]
+
+
+def extract_text(html: str, url: str = "", max_length: int = 12000) -> str:
+    """
+    从 HTML 中提取纯文本正文（同步，可在子进程中执行）
+
+    使用多种策略提取，优先级：
+    1. trafilatura - 专业的网页正文提取库（效果最好）
+    2. BeautifulSoup - 通用 HTML 解析（备选）
+    3. 简单正则 - 最后的备选方案
+
+    Args:
+        html: 原始 HTML 内容
+        url: 网页 URL（用于 trafilatura 优化）
+        max_length: 最大返回长度
+
+    Returns:
+        提取的纯文本
+    """
+    if TRAFILATURA_AVAILABLE:
+        try:
+            text = trafilatura.extract(
+                html,
+                url=url,
+                include_comments=False,
+                include_tables=True,
+                no_fallback=False,
+                favor_precision=True
+            )
+            if text and len(text) > 200:
+                return text[:max_length]
+        except Exception as e:
+            logger.warning(f"Trafilatura extraction failed: {e}")
+
+    if BS4_AVAILABLE:
+        try:
+            soup = BeautifulSoup(html, 'lxml')
+
+            for tag in soup(_NOISE_TAGS):
+                tag.decompose()
+
+            main_content = None
+            for selector in _MAIN_SELECTORS:
+                main_content = soup.select_one(selector)
+                if main_content:
+                    break
+
+            if main_content:
+                text = main_content.get_text(separator='\n', strip=True)
+            else:
+                body = soup.find('body')
+                text = (body or soup).get_text(separator='\n', strip=True)
+
+            if text and len(text) > 200:
+                text = re.sub(r'\n{3,}', '\n\n', text)
+                text = re.sub(r' {2,}', ' ', text)
+                return text[:max_length]
+        except Exception as e:
+            logger.warning(f"BeautifulSoup extraction failed: {e}")
+
+    return extract_with_regex(html, max_length)
+
+
+def _warm_up() -> None:
+    """预热解析库（导入已在模块加载时完成，这里触发一次解析以初始化内部缓存）"""
+    try:
+        extract_text("<html><body><article>" + "预热" * 200 + "</article></body></html>")
+    except Exception:
+        pass
+
+
+def _worker_main(conn) -> None:
+    """子进程主循环：逐个接收 (html, url, max_length) 并返回提取结果，收到 None 或管道关闭时退出"""
+    _warm_up()
+    while True:
+        try:
+            task = conn.recv()
+        except (EOFError, OSError):
+            return
+        if task is None:
+            return
+        try:
+            conn.send(("ok", extract_text(*task)))
+        except Exception as e:
+            conn.send(("error", repr(e)))
+
+
+class _Worker:
+    """单个提取子进程"""
+
+    def __init__(self, context):
+        self.conn, child_conn = context.Pipe()
+        self.process = context.Process(target=_worker_main, args=(child_conn,), daemon=True)
+        self.process.start()
+        child_conn.close()
+
+    def run(self, task: Tuple[str, str, int], timeout: float) -> Tuple[str, str]:
+        """执行一个提取任务；超时抛出 TimeoutError，子进程退出时抛出 EOFError / OSError"""
+        self.conn.send(task)
+        if not self.conn.poll(timeout):
+            raise TimeoutError()
+        return self.conn.recv()
+
+    def kill(self) -> None:
+        self.process.kill()
+        self.process.join(timeout=1)
+        self.conn.close()
+
+    def stop(self) -> None:
+        try:
+            self.conn.send(None)
+        except OSError:
+            pass
+        self.process.join(timeout=1)
+        if self.process.is_alive():
+            self.process.kill()
+        self.conn.close()
+
+
+class HtmlExtractor:
+    """多进程正文提取器"""
+
+    def __init__(self, workers: Optional[int] = None, timeout: Optional[float] = None, max_html_chars: Optional[int] = None):
+        config = get_config().fetch
+        self.workers = workers if workers is not None else config.extract_workers
+        self.timeout = timeout or config.extract_timeout
+        self.max_html_chars = max_html_chars or config.max_html_chars
+        self._context = None
+        self._workers: Set[_Worker] = set()
+        self._idle: "queue.Queue[_Worker]" = queue.Queue()
+        self._started = False
+        self._closed = False
+        self._lock = threading.Lock()
+        # 每个事件循环一个信号量：在途任务数不超过进程数，超时只计算实际解析时间
+        self._slots: Dict[int, asyncio.Semaphore] = {}
+        self.stats = {"documents": 0, "timeouts": 0, "fallbacks": 0, "clipped": 0, "restarts": 0}
+
+    def _count(self, name: str) -> None:
+        with self._lock:
+            self.stats[name] += 1
+
+    @staticmethod
+    def _mp_context():
+        if "forkserver" in multiprocessing.get_all_start_methods():
+            context = multiprocessing.get_context("forkserver")
+            # forkserver 进程单线程、只预先导入本模块，由它 fork 子进程是安全的
+            context.set_forkserver_preload([__name__])
+            return context
+        return multiprocessing.get_context("spawn")
+
+    def _add_worker(self) -> None:
+        worker = _Worker(self._context)
+        with self._lock:
+            if self._closed:
+                closed = True
+            else:
+                closed = False
+                self._workers.add(worker)
+        if closed:
+            worker.stop()
+        else:
+            self._idle.put(worker)
+
+    def _ensure_workers(self) -> bool:
+        """按需创建子进程，不可用时返回 False（在线程中提取）"""
+        if self._started:
+            return not self._closed
+        with self._lock:
+            if self._started or self.workers <= 0 or self._closed:
+                return self._started and not self._closed
+            try:
+                self._context = self._mp_context()
+                for _ in range(self.workers):
+                    worker = _Worker(self._context)
+                    self._workers.add(worker)
+                    self._idle.put(worker)
+            except (OSError, ValueError) as e:
+                logger.warning(f"Extraction workers unavailable, extracting in threads: {e}")
+                self.workers = 0
+                for worker in self._workers:
+                    worker.kill()
+                self._workers.clear()
+                return False
+            self._started = True
+            return True
+
+    def start(self) -> None:
+        """提前创建子进程（应用启动时调用，子进程启动后即预热解析库）"""
+        self._ensure_workers()
+
+    def _replace(self, worker: _Worker) -> None:
+        """终止超时或异常退出的子进程，并在后台补充一个新的"""
+        with self._lock:
+            self._workers.discard(worker)
+            self.stats["restarts"] += 1
+        worker.kill()
+
+        def add():
+            try:
+                self._add_worker()
+            except (OSError, ValueError) as e:
+                logger.warning(f"Failed to restart extraction worker: {e}")
+
+        threading.Thread(target=add, name="html-extractor-restart", daemon=True).start()
+
+    def _run_in_worker(self, html: str, url: str, max_length: int) -> Optional[str]:
+        """在空闲子进程中提取（阻塞，在线程中调用），超时或失败返回 None"""
+        while True:
+            try:
+                worker = self._idle.get(timeout=1)
+                break
+            except queue.Empty:
+                if self._closed:
+                    return None
+        if self._closed:
+            worker.stop()
+            return None
+
+        try:
+            status, value = worker.run((html, url, max_length), self.timeout)
+        except TimeoutError:
+            self._count("timeouts")
+            logger.warning(f"HTML extraction timed out after {self.timeout}s, restarting its worker: {url}")
+            self._replace(worker)
+            return None
+        except (EOFError, OSError) as e:
+            self._count("fallbacks")
+            logger.warning(f"Extraction worker exited ({e!r}), restarting it: {url}")
+            self._replace(worker)
+            return None
+
+        self._idle.put(worker)
+        if status != "ok":
+            self._count("fallbacks")
+            logger.warning(f"HTML extraction failed in worker: {value}")
+            return None
+        return value
+
+    def clip(self, html: str) -> str:
+        """解析前限长"""
+        if len(html) > self.max_html_chars:
+            self._count("clipped")
+            return html[:self.max_html_chars]
+        return html
+
+    async def extract(self, html: str, url: str = "", max_length: int = 12000) -> str:
+        """异步提取正文，不占用事件循环"""
+        if not html:
+            return ""
+        html = self.clip(html)
+        self._count("documents")
+
+        if not self._ensure_workers():
+            return await asyncio.to_thread(extract_text, html, url, max_length)
+
+        loop = asyncio.get_running_loop()
+        slots = self._slots.setdefault(id(loop), asyncio.Semaphore(self.workers))
+        async with slots:
+            text = await asyncio.to_thread(self._run_in_worker, html, url, max_length)
+        if text is not None:
+            return text
+
+        # 降级：正则提取开销小且有界
+        return await asyncio.to_thread(extract_with_regex, html, max_length)
+
+    def shutdown(self) -> None:
+        with self._lock:
+            self._closed = True
+            workers, self._workers = list(self._workers), set()
+        for worker in workers:
+            worker.stop()
+
+
+_html_extractor: Optional[HtmlExtractor] = None
+
+
+def get_html_extractor() -> HtmlExtractor:
+    """获取正文提取器单例"""
+    global _html_extractor
+    if _html_extractor is None:
+        _html_extractor = HtmlExtractor()
+    return _html_extractor
+
+
+async def extract_text_async(html: str, url: str = "", max_length: int = 12000) -> str:
+    """异步提取正文（便捷函数）"""
+    return await get_html_extractor().extract(html, url, max_length)
+
+
+def start_html_extractor() -> None:
+    """预启动提取子进程（应用启动时调用）"""
+    get_html_extractor().start()
+
+
+def shutdown_html_extractor() -> None:
+    """关闭提取子进程（应用退出时调用）"""
+    if _html_extractor is not None:
+        _html_extractor.shutdown()
@@ -0,0 +1,409 @@
+"""
+混合检索（稀疏 BM25 + 稠密向量）
+
+纯向量检索对政策文号、法规名称等精确词（如"安监总局令第XX号"）召回不稳定，这里为集合配一个本地稀疏索引：
+1. 稀疏索引 - 复用 local_search_index 的中文二元组 BM25，按集合各建一份（行 ID -> 标题 / 正文 / 元数据），
+   首次使用时从 Milvus 全量构建（后台线程），本进程写入时经 BulkWriter 回调增量更新；
+   其他进程的写入（如 scripts/load_policy_corpus.py）由定期检查发现：每 HYBRID_SPARSE_REFRESH_SECONDS
+   比较集合行数与索引文档数，不一致时在后台重建新索引，建好后替换（重建期间旧索引继续服务）。
+   注意每篇文档的完整正文都驻留在进程内存中（检索结果直接从索引取正文），内存占用约等于集合正文总量，
+   HYBRID_SPARSE_MAX_CHARS 只限制参与分词的长度
+2. 并行召回 - 稠密检索（向量化 + ANN，主要是网络等待）与稀疏检索（进程内计算）并行执行
+3. 结果融合 - rrf（倒数排名融合，不依赖分数尺度）或 weighted（各路分数 min-max 归一化后加权求和），
+   权重与 RRF 常数由 HYBRID_* 配置，也可在单次查询中指定
+
+使用方式：
+```python
+from service.hybrid_search import get_sparse_index, hybrid_retrieve
+
+sparse = get_sparse_index("policy_documents")
+hits = hybrid_retrieve(
+    dense_fn=lambda limit: [(item["id"], item["score"]) for item in dense_search(query, limit)],
+    sparse_fn=lambda limit: sparse.search(query, limit),
+    top_n=10,
+)
+# hits[0].id, hits[0].score, hits[0].dense_rank, hits[0].sparse_rank
+```
+"""
+
+import time
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+try:
+    from config.llm_config import get_config
+except ImportError:
+    from app.config.llm_config import get_config
+
+try:
+    from service.local_search_index import LocalDocument, LocalSearchIndex
+except ImportError:
+    from app.service.local_search_index import LocalDocument, LocalSearchIndex
+
+logger = logging.getLogger("HybridSearch")
+
+FUSION_METHODS = ("rrf", "weighted")
+
+# 稠密与稀疏两路召回共用的线程池
+_executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix="hybrid-search")
+
+
+# ---------- 融合 ----------
+
+def reciprocal_rank_fusion(
+    rankings: Dict[str, List[Tuple[str, float]]],
+    weights: Dict[str, float],
+    k: int = 60
+) -> List[Tuple[str, float]]:
+    """倒数排名融合：score = Σ weight / (k + rank)，rank 从 1 开始"""
+    fused: Dict[str, float] = {}
+    for source, ranked in rankings.items():
+        weight = weights.get(source, 1.0)
+        for rank, (doc_id, _) in enumerate(ranked, start=1):
+            fused[doc_id] = fused.get(doc_id, 0.0) + weight / (k + rank)
+    return sorted(fused.items(), key=lambda item: -item[1])
+
+
+def weighted_fusion(
+    rankings: Dict[str, List[Tuple[str, float]]],
+    weights: Dict[str, float]
+) -> List[Tuple[str, float]]:
+    """加权分数融合：各路分数 min-max 归一化到 [0, 1] 后加权求和（只有一条结果时记为 1）"""
+    fused: Dict[str, float] = {}
+    for source, ranked in rankings.items():
+        if not ranked:
+            continue
+        weight = weights.get(source, 1.0)
+        scores = [score for _, score in ranked]
+        low, high = min(scores), max(scores)
+        for doc_id, score in ranked:
+            norm = (score - low) / (high - low) if high > low else 1.0
+            fused[doc_id] = fused.get(doc_id, 0.0) + weight * norm
+    return sorted(fused.items(), key=lambda item: -item[1])
+
+
+@dataclass
+class FusedHit:
+    """融合后的一条结果（rank 从 1 开始，未被该路召回时为 None）"""
+    id: str
+    score: float
+    dense_rank: Optional[int] = None
+    dense_score: Optional[float] = None
+    sparse_rank: Optional[int] = None
+    sparse_score: Optional[float] = None
+
+
+def hybrid_retrieve(
+    dense_fn: Callable[[int], List[Tuple[str, float]]],
+    sparse_fn: Optional[Callable[[int], List[Tuple[str, float]]]],
+    top_n: int = 10,
+    fusion: Optional[str] = None,
+    dense_weight: Optional[float] = None,
+    sparse_weight: Optional[float] = None,
+    rrf_k: Optional[int] = None,
+    candidates: Optional[int] = None
+) -> List[FusedHit]:
+    """
+    并行执行两路召回并融合
+
+    Args:
+        dense_fn: 稠密召回，参数为候选数，返回 [(id, score)]（按分数降序）
+        sparse_fn: 稀疏召回，签名同上（None 时只用稠密结果）
+        top_n: 返回数量
+        fusion: rrf / weighted（默认 HYBRID_FUSION）
+        dense_weight / sparse_weight: 两路权重（默认 HYBRID_DENSE_WEIGHT / HYBRID_SPARSE_WEIGHT）
+        rrf_k: RRF 常数（默认 HYBRID_RRF_K）
+        candidates: 每一路召回的候选数（默认 HYBRID_CANDIDATES，至少为 top_n）
+
+    Returns:
+        融合后的结果列表
+    """
+    config = get_config().hybrid
+    fusion = (fusion or config.fusion).lower()
+    if fusion not in FUSION_METHODS:
+        raise ValueError(f"Unsupported fusion method: {fusion}")
+    weights = {
+        "dense": config.dense_weight if dense_weight is None else dense_weight,
+        "sparse": config.sparse_weight if sparse_weight is None else sparse_weight,
+    }
+    limit = max(top_n, candidates or config.candidates)
+
+    # 稀疏检索在线程池中执行，稠密检索在当前线程执行
+    sparse_future = _executor.submit(sparse_fn, limit) if sparse_fn is not None and weights["sparse"] > 0 else None
+    rankings: Dict[str, List[Tuple[str, float]]] = {}
+    if weights["dense"] > 0:
+        rankings["dense"] = dense_fn(limit)
+    if sparse_future is not None:
+        try:
+            rankings["sparse"] = sparse_future.result()
+        except Exception as e:
+            logger.error(f"Sparse retrieval failed, using dense results only: {e}")
+
+    if fusion == "rrf":
+        fused = reciprocal_rank_fusion(rankings, weights, k=rrf_k or config.rrf_k)
+    else:
+        fused = weighted_fusion(rankings, weights)
+
+    positions = {
+        source: {doc_id: (rank, score) for rank, (doc_id, score) in enumerate(ranked, start=1)}
+        for source, ranked in rankings.items()
+    }
+    hits = []
+    for doc_id, score in fused[:top_n]:
+        dense = positions.get("dense", {}).get(doc_id, (None, None))
+        sparse = positions.get("sparse", {}).get(doc_id, (None, None))
+        hits.append(FusedHit(
+            id=doc_id,
+            score=score,
+            dense_rank=dense[0],
+            dense_score=dense[1],
+            sparse_rank=sparse[0],
+            sparse_score=sparse[1],
+        ))
+    return hits
+
+
+# ---------- 稀疏索引 ----------
+
+def milvus_row_batches(collection: Any, output_fields: List[str], batch_size: int = 1000) -> Iterable[List[Dict[str, Any]]]:
+    """按批读取 Milvus 集合中的全部行（query_iterator）"""
+    iterator = collection.query_iterator(batch_size=batch_size, expr="", output_fields=output_fields)
+    try:
+        while True:
+            rows = iterator.next()
+            if not rows:
+                break
+            yield rows
+    finally:
+        iterator.close()
+
+
+class SparseCollectionIndex:
+    """集合旁的 BM25 索引（行 ID -> 标题 / 正文 / 元数据）"""
+
+    STATE_EMPTY = "empty"
+    STATE_BUILDING = "building"
+    STATE_READY = "ready"
+    STATE_FAILED = "failed"
+
+    def __init__(
+        self,
+        collection_name: str,
+        id_field: str = "id",
+        title_field: str = "title",
+        text_field: str = "content",
+        max_doc_chars: Optional[int] = None,
+        min_coverage: Optional[float] = None
+    ):
+        """
+        Args:
+            collection_name: 对应的 Milvus 集合
+            id_field / title_field / text_field: 行 ID、标题（权重加倍）与正文字段
+            max_doc_chars: 每篇文档参与索引的最大字符数（默认 HYBRID_SPARSE_MAX_CHARS）
+            min_coverage: 文档至少包含的查询词比例（默认 HYBRID_SPARSE_MIN_COVERAGE）
+        """
+        config = get_config().hybrid
+        self.collection_name = collection_name
+        self.id_field = id_field
+        self.title_field = title_field
+        self.text_field = text_field
+        self.min_coverage = config.sparse_min_coverage if min_coverage is None else min_coverage
+        self.max_doc_chars = max_doc_chars or config.sparse_max_doc_chars
+        self.refresh_interval = config.sparse_refresh_seconds
+        self.index = LocalSearchIndex(max_doc_chars=self.max_doc_chars)
+        # 行元数据（不含正文与向量，正文保存在索引文档中）
+        self._rows: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+        self._build_thread: Optional[threading.Thread] = None
+        self._ready = threading.Event()
+        self._pending: Optional[List[Dict[str, Any]]] = None  # 构建期间写入的行，换入新索引前补写
+        self._checked_at = 0.0
+        # 上次构建或检查时集合的行数（含无 ID、无词项而未进入索引的行）；只有集合行数变化时才重建
+        self._known_rows: Optional[int] = None
+        self.state = self.STATE_EMPTY
+        self.build_ms = 0.0
+        self.refreshes = 0
+
+    def __len__(self) -> int:
+        return len(self.index)
+
+    # ---------- 写入 ----------
+
+    def add_rows(self, rows: Iterable[Dict[str, Any]]) -> int:
+        """写入行（同一 ID 重复写入会替换旧文档）"""
+        return self._add_to(self.index, self._rows, rows)
+
+    def _add_to(self, index: LocalSearchIndex, row_map: Dict[str, Dict[str, Any]], rows: Iterable[Dict[str, Any]]) -> int:
+        count = 0
+        for row in rows:
+            doc_id = row.get(self.id_field)
+            if not doc_id:
+                continue
+            doc_id = str(doc_id)
+            index.add(LocalDocument(
+                url=doc_id,
+                title=row.get(self.title_field) or "",
+                text=row.get(self.text_field) or "",
+                kind=self.collection_name,
+            ))
+            row_map[doc_id] = {
+                key: value for key, value in row.items() if key not in (self.text_field, "vector")
+            }
+            count += 1
+        return count
+
+    def remove(self, ids: Iterable[str]) -> None:
+        for doc_id in ids:
+            self.index.remove(str(doc_id))
+            self._rows.pop(str(doc_id), None)
+
+    def on_insert(self, rows: List[Dict[str, Any]]) -> None:
+        """BulkWriter 写入回调：写入当前索引；正在构建新索引时同时暂存，换入前补写"""
+        with self._lock:
+            if self._pending is not None:
+                self._pending.extend(rows)
+            if self._known_rows is not None:
+                self._known_rows += len(rows)
+            ready = self.state == self.STATE_READY
+        if ready:
+            self.add_rows(rows)
+
+    # ---------- 构建 ----------
+
+    def build(self, batches: Iterable[List[Dict[str, Any]]]) -> int:
+        """从行批次全量构建新索引，建好后替换当前索引（构建期间 on_insert 写入的行会补写）"""
+        start = time.perf_counter()
+        with self._lock:
+            if self._pending is None:
+                self._pending = []
+        try:
+            index = LocalSearchIndex(max_doc_chars=self.max_doc_chars)
+            row_map: Dict[str, Dict[str, Any]] = {}
+            count = read = 0
+            for rows in batches:
+                read += len(rows)
+                count += self._add_to(index, row_map, rows)
+            with self._lock:
+                self._add_to(index, row_map, self._pending)
+                self.index, self._rows = index, row_map
+                self._known_rows = read
+        finally:
+            with self._lock:
+                self._pending = None
+        self.build_ms = round((time.perf_counter() - start) * 1000, 1)
+        return count
+
+    def ensure_built(self, loader: Callable[[], Iterable[List[Dict[str, Any]]]], wait: bool = False,
+                     timeout: Optional[float] = None, count_fn: Optional[Callable[[], int]] = None) -> bool:
+        """
+        确保索引已构建（首次调用时在后台线程构建）
+
+        Args:
+            loader: 返回行批次的函数（如 lambda: milvus_row_batches(collection, fields)）
+            wait: 是否等待构建完成
+            timeout: 等待超时（秒）
+            count_fn: 返回集合当前行数的函数；提供时每 refresh_interval 秒检查一次，
+                与上次构建或检查时的行数不同（其他进程写入或删除）时在后台重建
+
+        Returns:
+            索引是否可用
+        """
+        with self._lock:
+            if self.state in (self.STATE_EMPTY, self.STATE_FAILED):
+                self.state = self.STATE_BUILDING
+                self._ready.clear()
+                self._pending = []
+                self._start_thread(self._run_build, loader)
+            elif (
+                count_fn is not None and self.refresh_interval > 0 and self.state == self.STATE_READY
+                and self._pending is None and time.monotonic() - self._checked_at >= self.refresh_interval
+            ):
+                self._checked_at = time.monotonic()
+                self._start_thread(self._run_refresh, loader, count_fn)
+        if wait:
+            self._ready.wait(timeout)
+        return self.state == self.STATE_READY
+
+    def _start_thread(self, target: Callable, *args) -> None:
+        self._build_thread = threading.Thread(
+            target=target, args=args, name=f"sparse-index-{self.collection_name}", daemon=True
+        )
+        self._build_thread.start()
+
+    def _run_build(self, loader: Callable[[], Iterable[List[Dict[str, Any]]]]) -> None:
+        try:
+            count = self.build(loader())
+            self.state = self.STATE_READY
+            self._checked_at = time.monotonic()
+            logger.info(f"Sparse index for {self.collection_name} built: {count} rows in {self.build_ms}ms")
+        except Exception as e:
+            self.state = self.STATE_FAILED
+            logger.error(f"Failed to build sparse index for {self.collection_name}: {e}")
+        finally:
+            self._ready.set()
+
+    def _run_refresh(self, loader: Callable[[], Iterable[List[Dict[str, Any]]]], count_fn: Callable[[], int]) -> None:
+        """
+        集合行数变化时重建（失败时保留旧索引）
+
+        与记录的集合行数比较而不是与索引文档数比较：没有 ID 或词项的行不会进入索引，
+        否则每次检查都会重建。
+        """
+        try:
+            rows = count_fn()
+            if rows == self._known_rows:
+                return
+            count = self.build(loader())
+            # 以实际行数为准（构建期间的写入可能同时出现在加载结果与补写行中）
+            with self._lock:
+                self._known_rows = rows
+            self.refreshes += 1
+            logger.info(
+                f"Sparse index for {self.collection_name} refreshed ({rows} rows in collection): "
+                f"{count} rows in {self.build_ms}ms"
+            )
+        except Exception as e:
+            logger.error(f"Failed to refresh sparse index for {self.collection_name}: {e}")
+
+    # ---------- 检索 ----------
+
+    def search(self, query: str, limit: int = 10) -> List[Tuple[str, float]]:
+        """BM25 检索，返回 [(行 ID, 分数)]"""
+        return [(doc.url, score) for doc, score in self.index.search(query, count=limit, min_coverage=self.min_coverage)]
+
+    def ids(self) -> List[str]:
+        return list(self._rows)
+
+    def get_row(self, doc_id: str) -> Optional[Dict[str, Any]]:
+        """行元数据 + 正文"""
+        row = self._rows.get(doc_id)
+        if row is None:
+            return None
+        doc = self.index.get(doc_id)
+        return {**row, self.text_field: doc.text if doc else ""}
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "collection": self.collection_name,
+            "state": self.state,
+            "documents": len(self.index),
+            "build_ms": self.build_ms,
+            "refreshes": self.refreshes,
+            **self.index.get_stats(),
+        }
+
+
+_sparse_indexes: Dict[str, SparseCollectionIndex] = {}
+_sparse_indexes_lock = threading.Lock()
+
+
+def get_sparse_index(collection_name: str, **kwargs) -> SparseCollectionIndex:
+    """获取集合的稀疏索引单例（kwargs 仅在首次创建时生效）"""
+    with _sparse_indexes_lock:
+        index = _sparse_indexes.get(collection_name)
+        if index is None:
+            index = _sparse_indexes[collection_name] = SparseCollectionIndex(collection_name, **kwargs)
+        return index
@@ -0,0 +1,489 @@
+"""
+本地全文检索
+
+行业资讯（IndustryNews）、招投标（BiddingInfo）和深度阅读积累的页面缓存中已有大量
+相关文档，这里在进程内为它们建立倒排索引，作为一个无需网络的搜索提供方：
+1. 中文二元组切分 - CJK 连续片段切成二元组，英文 / 数字按词切分，无需分词词典
+2. BM25 打分 - 词频饱和与文档长度归一化，按查询词覆盖率过滤弱相关结果
+3. 增量更新 - 资讯采集入库、网页抓取完成后即时写入索引；同一 URL 重复写入会替换旧文档
+4. 组合模式 - off（仅网络）/ first（本地结果足够时不调用网络）/ blend（本地结果与网络结果合并）
+
+使用方式：
+```python
+from service.search_provider import get_search_provider
+
+# SEARCH_LOCAL_MODE=first 时返回组合提供方，本地命中足够时不再调用 Bocha
+results = await get_search_provider().search("安责险 市场规模", count=10)
+
+# 直接使用本地提供方（测试与基准测试中不需要网络）
+from service.local_search_index import LocalSearchProvider
+results = await LocalSearchProvider().search("安责险 市场规模")
+```
+"""
+
+import os
+import re
+import json
+import math
+import time
+import asyncio
+import logging
+import threading
+import unicodedata
+from collections import Counter
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+try:
+    from config.llm_config import get_config
+except ImportError:
+    from app.config.llm_config import get_config
+
+from .search_provider import SearchProvider
+
+logger = logging.getLogger("LocalSearch")
+
+_TERM_PATTERN = re.compile(r"[a-z0-9]+(?:\.[0-9]+)?|[一-鿿]+")
+_TITLE_PATTERN = re.compile(r"<title[^>]*>(.*?)</title>", re.IGNORECASE | re.DOTALL)
+
+# Bocha freshness 参数对应的天数
+FRESHNESS_DAYS = {"oneDay": 1, "oneWeek": 7, "oneMonth": 31, "oneYear": 366}
+
+
+def analyze(text: str) -> List[str]:
+    """切分为检索词（保留重复，用于计算词频）"""
+    text = unicodedata.normalize("NFKC", text or "").lower()
+    terms = []
+    for match in _TERM_PATTERN.findall(text):
+        if match[0].isascii():
+            terms.append(match)
+        elif len(match) == 1:
+            terms.append(match)
+        else:
+            terms.extend(match[i:i + 2] for i in range(len(match) - 1))
+    return terms
+
+
+@dataclass
+class LocalDocument:
+    """索引中的一篇文档"""
+    url: str
+    title: str
+    text: str
+    site_name: str = ""
+    date: Optional[datetime] = None
+    kind: str = "news"                  # news / bidding / page
+
+
+class LocalSearchIndex:
+    """内存倒排索引（BM25）"""
+
+    def __init__(self, k1: float = 1.2, b: float = 0.75, max_doc_chars: int = 4000):
+        """
+        Args:
+            k1: BM25 词频饱和参数
+            b: BM25 文档长度归一化参数
+            max_doc_chars: 每篇文档参与索引的最大字符数（标题另计）
+        """
+        self.k1 = k1
+        self.b = b
+        self.max_doc_chars = max_doc_chars
+        self._postings: Dict[str, Dict[int, int]] = {}
+        self._docs: Dict[int, LocalDocument] = {}
+        self._doc_terms: Dict[int, Counter] = {}
+        self._lengths: Dict[int, int] = {}
+        self._url_ids: Dict[str, int] = {}
+        self._total_length = 0
+        self._next_id = 0
+        self._lock = threading.RLock()
+        self._build_lock = threading.Lock()
+        self.built = False
+        self.stats = {"searches": 0, "added": 0, "replaced": 0, "build_ms": 0.0}
+
+    def __len__(self) -> int:
+        return len(self._docs)
+
+    # ---------- 增删 ----------
+
+    def add(self, doc: LocalDocument) -> None:
+        """写入文档；同一 URL 已存在时替换"""
+        if not doc.url:
+            return
+        # 标题权重加倍：标题中的词在两处计数
+        terms = Counter(analyze(f"{doc.title} {doc.title} {doc.text[:self.max_doc_chars]}"))
+        if not terms:
+            return
+        with self._lock:
+            if doc.url in self._url_ids:
+                self._remove_id(self._url_ids[doc.url])
+                self.stats["replaced"] += 1
+            doc_id = self._next_id
+            self._next_id += 1
+            self._docs[doc_id] = doc
+            self._doc_terms[doc_id] = terms
+            self._url_ids[doc.url] = doc_id
+            length = sum(terms.values())
+            self._lengths[doc_id] = length
+            self._total_length += length
+            for term, tf in terms.items():
+                self._postings.setdefault(term, {})[doc_id] = tf
+            self.stats["added"] += 1
+
+    def add_many(self, docs: Iterable[LocalDocument]) -> int:
+        count = 0
+        for doc in docs:
+            self.add(doc)
+            count += 1
+        return count
+
+    def remove(self, url: str) -> None:
+        with self._lock:
+            doc_id = self._url_ids.get(url)
+            if doc_id is not None:
+                self._remove_id(doc_id)
+
+    def get(self, url: str) -> Optional[LocalDocument]:
+        with self._lock:
+            doc_id = self._url_ids.get(url)
+            return self._docs.get(doc_id) if doc_id is not None else None
+
+    def _remove_id(self, doc_id: int) -> None:
+        doc = self._docs.pop(doc_id)
+        self._url_ids.pop(doc.url, None)
+        self._total_length -= self._lengths.pop(doc_id, 0)
+        for term in self._doc_terms.pop(doc_id, {}):
+            postings = self._postings.get(term)
+            if postings is not None:
+                postings.pop(doc_id, None)
+                if not postings:
+                    del self._postings[term]
+
+    # ---------- 检索 ----------
+
+    def search(
+        self,
+        query: str,
+        count: int = 10,
+        freshness: str = "noLimit",
+        min_coverage: float = 0.5
+    ) -> List[Tuple[LocalDocument, float]]:
+        """
+        BM25 检索
+
+        Args:
+            query: 查询文本
+            count: 返回数量
+            freshness: Bocha 风格的时间范围（oneDay / oneWeek / oneMonth / oneYear / noLimit）
+            min_coverage: 文档至少包含的查询词比例，低于该值的结果丢弃
+
+        Returns:
+            [(文档, 分数)]，按分数降序
+        """
+        query_terms = set(analyze(query))
+        if not query_terms:
+            return []
+
+        cutoff = None
+        if freshness in FRESHNESS_DAYS:
+            cutoff = datetime.now() - timedelta(days=FRESHNESS_DAYS[freshness])
+
+        with self._lock:
+            self.stats["searches"] += 1
+            n = len(self._docs)
+            if not n:
+                return []
+            avg_length = self._total_length / n
+            scores: Dict[int, float] = {}
+            matched: Counter = Counter()
+            for term in query_terms:
+                postings = self._postings.get(term)
+                if not postings:
+                    continue
+                idf = math.log(1 + (n - len(postings) + 0.5) / (len(postings) + 0.5))
+                for doc_id, tf in postings.items():
+                    norm = self.k1 * (1 - self.b + self.b * self._lengths[doc_id] / avg_length)
+                    scores[doc_id] = scores.get(doc_id, 0.0) + idf * tf * (self.k1 + 1) / (tf + norm)
+                    matched[doc_id] += 1
+
+            min_matched = max(1, math.ceil(len(query_terms) * min_coverage))
+            ranked = sorted(
+                (doc_id for doc_id in scores if matched[doc_id] >= min_matched),
+                key=lambda doc_id: -scores[doc_id]
+            )
+            results = []
+            for doc_id in ranked:
+                doc = self._docs[doc_id]
+                if cutoff is not None and (doc.date is None or doc.date < cutoff):
+                    continue
+                results.append((doc, scores[doc_id]))
+                if len(results) >= count:
+                    break
+            return results
+
+    # ---------- 数据源 ----------
+
+    def add_news(self, rows: Iterable[Any]) -> int:
+        """写入 IndustryNews 记录"""
+        return self.add_many(
+            LocalDocument(
+                url=row.source_url or "",
+                title=row.title or "",
+                text=row.content or "",
+                site_name=row.source or "",
+                date=row.publish_time or row.collected_at,
+                kind="news"
+            )
+            for row in rows
+        )
+
+    def add_bidding(self, rows: Iterable[Any]) -> int:
+        """写入 BiddingInfo 记录（没有原文链接，使用 bidding://<项目ID> 作为标识）"""
+        return self.add_many(
+            LocalDocument(
+                url=f"bidding://{row.bid_id}",
+                title=row.title or "",
+                text=" ".join(filter(None, [row.notice_type, row.province, row.city, row.content])),
+                site_name=row.source or "",
+                date=row.publish_time or row.collected_at,
+                kind="bidding"
+            )
+            for row in rows
+        )
+
+    def add_page(self, url: str, html: Optional[str], text: Optional[str], fetched_at: Optional[float] = None) -> None:
+        """写入抓取过的网页（标题取自 <title>）"""
+        if not text:
+            return
+        match = _TITLE_PATTERN.search(html[:20000]) if html else None
+        title = re.sub(r"\s+", " ", match.group(1)).strip() if match else ""
+        date = datetime.fromtimestamp(fetched_at) if fetched_at else datetime.now()
+        self.add(LocalDocument(url=url, title=title[:200], text=text, date=date, kind="page"))
+
+    def _load_database(self, lookback_days: int) -> int:
+        try:
+            from core.database import SessionLocal
+            from models.news import IndustryNews, BiddingInfo
+        except ImportError:
+            from app.core.database import SessionLocal
+            from app.models.news import IndustryNews, BiddingInfo
+
+        since = datetime.utcnow() - timedelta(days=lookback_days)
+        db = SessionLocal()
+        try:
+            count = self.add_news(db.query(IndustryNews).filter(IndustryNews.collected_at >= since).yield_per(500))
+            count += self.add_bidding(db.query(BiddingInfo).filter(BiddingInfo.collected_at >= since).yield_per(500))
+            return count
+        finally:
+            db.close()
+
+    def _load_page_cache(self) -> int:
+        try:
+            from service.page_fetcher import get_page_fetcher
+        except ImportError:
+            from app.service.page_fetcher import get_page_fetcher
+
+        cache = get_page_fetcher().cache
+        count = 0
+        for name in os.listdir(cache.meta_dir):
+            if not name.endswith(".json"):
+                continue
+            try:
+                with open(os.path.join(cache.meta_dir, name), "r", encoding="utf-8") as f:
+                    meta = json.load(f)
+            except (OSError, ValueError):
+                continue
+            digests = list((meta.get("text") or {}).values())
+            text = cache.get_blob(digests[0]) if digests else None
+            if not text or not meta.get("url"):
+                continue
+            self.add_page(meta["url"], cache.get_blob(meta.get("raw")), text, meta.get("fetched_at"))
+            count += 1
+        return count
+
+    def build(self, lookback_days: int = 365) -> None:
+        """从数据库与页面缓存全量构建（只执行一次，其余调用等待构建完成）"""
+        with self._build_lock:
+            if self.built:
+                return
+            start = time.monotonic()
+            for name, loader in (("database", lambda: self._load_database(lookback_days)), ("page cache", self._load_page_cache)):
+                try:
+                    count = loader()
+                    logger.info(f"Indexed {count} documents from {name}")
+                except Exception as e:
+                    logger.warning(f"Failed to index {name}: {e}")
+            self.stats["build_ms"] = round((time.monotonic() - start) * 1000, 1)
+            self.built = True
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            kinds = Counter(doc.kind for doc in self._docs.values())
+            return {**self.stats, "documents": len(self._docs), "terms": len(self._postings), "kinds": dict(kinds)}
+
+
+def _best_passage(text: str, query: str, length: int = 300) -> str:
+    """取包含首个查询词的片段作为摘要"""
+    lowered = unicodedata.normalize("NFKC", text).lower()
+    positions = [lowered.find(term) for term in set(analyze(query))]
+    positions = [p for p in positions if p >= 0]
+    start = max(0, min(positions) - 50) if positions else 0
+    return text[start:start + length].strip()
+
+
+class LocalSearchProvider(SearchProvider):
+    """基于本地倒排索引的搜索提供方（无网络请求）"""
+
+    name = "local"
+
+    def __init__(self, index: Optional["LocalSearchIndex"] = None, min_coverage: Optional[float] = None):
+        super().__init__(timeout=0, rate_limit=0, rate_burst=1)
+        self.index = index or get_local_search_index()
+        self.min_coverage = min_coverage if min_coverage is not None else get_config().search.local_min_coverage
+
+    def _to_results(self, query: str, hits: List[Tuple[LocalDocument, float]]) -> List[Dict[str, Any]]:
+        results = []
+        for doc, score in hits:
+            summary = _best_passage(doc.text, query)
+            results.append({
+                "url": doc.url,
+                "title": doc.title or "N/A",
+                "summary": summary,
+                "snippet": summary[:200],
+                "site_name": doc.site_name or "N/A",
+                "site_icon": "",
+                "date": doc.date.isoformat() if doc.date else "",
+                "source": "local",
+                "score": round(score, 3),
+            })
+        return results
+
+    def _search_local(self, query: str, count: int, freshness: str) -> List[Dict[str, Any]]:
+        start = time.monotonic()
+        if not self.index.built:
+            self.index.build(get_config().search.local_lookback_days)
+        hits = self.index.search(query, count=count, freshness=freshness, min_coverage=self.min_coverage)
+        self.stats["requests"] += 1
+        self.stats["total_ms"] += (time.monotonic() - start) * 1000
+        return self._to_results(query, hits)
+
+    async def _search_once(self, query: str, count: int, freshness: str) -> List[Dict[str, Any]]:
+        return await asyncio.to_thread(self._search_local, query, count, freshness)
+
+    def _search_sync_once(self, query: str, count: int, freshness: str) -> List[Dict[str, Any]]:
+        return self._search_local(query, count, freshness)
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {**super().get_stats(), "index": self.index.get_stats()}
+
+
+class HybridSearchProvider(SearchProvider):
+    """
+    本地 + 网络组合提供方
+
+    - first: 本地结果数达到 min_results 时直接返回，不调用网络；否则用网络结果补足
+    - blend: 始终调用网络，本地结果（最多约三分之一）排在前面，按 URL 去重
+    """
+
+    name = "hybrid"
+
+    def __init__(self, local: LocalSearchProvider, remote: SearchProvider, mode: str = "first", min_results: int = 3):
+        super().__init__(timeout=remote.timeout, rate_limit=0, rate_burst=1)
+        self.name = f"{remote.name}+local"
+        self.local = local
+        self.remote = remote
+        self.mode = mode
+        self.min_results = min_results
+        self.stats.update({"local_only": 0, "blended": 0})
+
+    def _combine(self, local: List[Dict[str, Any]], remote: List[Dict[str, Any]], count: int) -> List[Dict[str, Any]]:
+        if self.mode == "blend":
+            local = local[:max(1, count // 3)]
+        combined, seen = [], set()
+        for item in local + remote:
+            if item["url"] not in seen:
+                seen.add(item["url"])
+                combined.append(item)
+        return combined[:count]
+
+    def _local_is_enough(self, local: List[Dict[str, Any]]) -> bool:
+        if self.mode == "first" and len(local) >= self.min_results:
+            self.stats["local_only"] += 1
+            return True
+        self.stats["blended"] += 1
+        return False
+
+    async def _search_once(self, query: str, count: int, freshness: str) -> List[Dict[str, Any]]:
+        local = await self.local.search(query, count, freshness)
+        if self._local_is_enough(local):
+            return local
+        remote = await self.remote.search(query, count, freshness)
+        return self._combine(local, remote, count)
+
+    def _search_sync_once(self, query: str, count: int, freshness: str) -> List[Dict[str, Any]]:
+        local = self.local.search_sync(query, count, freshness)
+        if self._local_is_enough(local):
+            return local
+        remote = self.remote.search_sync(query, count, freshness)
+        return self._combine(local, remote, count)
+
+    async def aclose(self) -> None:
+        await self.remote.aclose()
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "provider": self.name,
+            "mode": self.mode,
+            "local_only": self.stats["local_only"],
+            "blended": self.stats["blended"],
+            "local": self.local.get_stats(),
+            "remote": self.remote.get_stats(),
+        }
+
+
+_local_search_index: Optional[LocalSearchIndex] = None
+_index_lock = threading.Lock()
+
+
+def get_local_search_index() -> LocalSearchIndex:
+    """获取本地检索索引单例（首次检索时构建）"""
+    global _local_search_index
+    with _index_lock:
+        if _local_search_index is None:
+            _local_search_index = LocalSearchIndex()
+            _register_page_listener(_local_search_index)
+        return _local_search_index
+
+
+def _register_page_listener(index: LocalSearchIndex) -> None:
+    """网页抓取并提取正文后写入索引"""
+    try:
+        from service.page_fetcher import add_page_listener
+    except ImportError:
+        from app.service.page_fetcher import add_page_listener
+    add_page_listener(lambda url, html, text: index.add_page(url, html, text) if index.built else None)
+
+
+def index_collected(news: Iterable[Any] = (), bidding: Iterable[Any] = ()) -> None:
+    """资讯 / 招投标入库后增量写入索引（索引尚未构建时跳过，构建时会从数据库全量加载）"""
+    index = get_local_search_index()
+    if not index.built:
+        return
+    try:
+        index.add_news(news)
+        index.add_bidding(bidding)
+    except Exception as e:
+        logger.warning(f"Failed to index collected items: {e}")
+
+
+def start_local_search_index() -> None:
+    """后台线程预构建索引（应用启动时调用，仅在启用本地检索时）"""
+    if get_config().search.local_mode == "off":
+        return
+    index = get_local_search_index()
+    threading.Thread(
+        target=index.build,
+        args=(get_config().search.local_lookback_days,),
+        name="local-search-build",
+        daemon=True
+    ).start()
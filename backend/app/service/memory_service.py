@@ -22,7 +22,9 @@ load_dotenv()
 
 from models.chat import ChatSession, ChatMessage, LongTermMemory
 from service.embedding_service import generate_embedding
-from service.milvus_service import get_milvus_service, MilvusService
+from service.milvus_service import get_milvus_service, get_collection_registry, MilvusService
+from service.milvus_index import resolve_profile
+from service.milvus_partition import collection_options, key_field, key_filter
 
 # 记忆触发阈值
 MEMORY_TOKEN_THRESHOLD = 10000  # 超过此 token 数触发记忆压缩
@@ -49,17 +51,17 @@ class MemoryService:
 
     def _ensure_memory_collection(self):
         """确保记忆集合存在（使用专门的 schema）"""
-        from pymilvus import connections, Collection, CollectionSchema, FieldSchema, DataType, utility
+        from pymilvus import Collection, CollectionSchema, FieldSchema, DataType
 
         collection_name = MEMORY_COLLECTION_NAME
 
-        if utility.has_collection(collection_name):
+        if get_collection_registry().get(collection_name) is not None:
             return
 
         # 定义记忆专用字段
         fields = [
             FieldSchema(name="id", dtype=DataType.VARCHAR, is_primary=True, max_length=64),
-            FieldSchema(name="user_id", dtype=DataType.VARCHAR, max_length=64),
+            key_field("user_id", max_length=64),  # 分区键：按用户裁剪检索范围
             FieldSchema(name="session_id", dtype=DataType.VARCHAR, max_length=64),
             FieldSchema(name="memory_type", dtype=DataType.VARCHAR, max_length=32),  # summary/insight/preference
             FieldSchema(name="content", dtype=DataType.VARCHAR, max_length=65535),
@@ -68,16 +70,13 @@ class MemoryService:
         ]
 
         schema = CollectionSchema(fields=fields, description="Long-term memories")
-        collection = Collection(name=collection_name, schema=schema)
-
-        # 创建索引
-        index_params = {
-            "metric_type": "COSINE",
-            "index_type": "IVF_FLAT",
-            "params": {"nlist": 128},
-        }
-        collection.create_index(field_name="vector", index_params=index_params)
+        collection = Collection(name=collection_name, schema=schema, **collection_options())
+
+        # 创建索引（按 MILVUS_INDEX_PROFILE / MILVUS_INDEX_PROFILES 选择 profile）
+        profile = resolve_profile(collection_name)
+        collection.create_index(field_name="vector", index_params=profile.index_params())
         collection.load()
+        get_collection_registry().register(collection_name, collection, loaded=True)
 
         print(f"记忆集合 {collection_name} 创建成功")
 
@@ -226,69 +225,51 @@ class MemoryService:
         summary_data: Dict[str, Any]
     ) -> List[str]:
         """将记忆内容向量化并存储到 Milvus"""
-        from pymilvus import Collection
-
         milvus_ids = []
         documents_to_insert = []
 
-        # 1. 存储摘要向量
+        # (doc_id, memory_type, content, metadata)
+        entries = []
+
+        # 1. 摘要
         summary = summary_data.get("summary", "")
         if summary:
-            summary_vector = generate_embedding(summary)
-            if summary_vector:
-                doc_id = f"{memory_id}_summary"
-                documents_to_insert.append({
-                    "id": doc_id,
-                    "user_id": user_id,
-                    "session_id": session_id,
-                    "memory_type": "summary",
-                    "content": summary,
-                    "metadata": json.dumps({"memory_id": memory_id}),
-                    "vector": summary_vector
-                })
-                milvus_ids.append(doc_id)
-
-        # 2. 存储关键洞察向量
+            entries.append((f"{memory_id}_summary", "summary", summary, {"memory_id": memory_id}))
+
+        # 2. 关键洞察
         insights = summary_data.get("key_insights", [])
         for i, insight in enumerate(insights):
             if insight:
-                insight_vector = generate_embedding(insight)
-                if insight_vector:
-                    doc_id = f"{memory_id}_insight_{i}"
-                    documents_to_insert.append({
-                        "id": doc_id,
-                        "user_id": user_id,
-                        "session_id": session_id,
-                        "memory_type": "insight",
-                        "content": insight,
-                        "metadata": json.dumps({"memory_id": memory_id, "index": i}),
-                        "vector": insight_vector
-                    })
-                    milvus_ids.append(doc_id)
+                entries.append((f"{memory_id}_insight_{i}", "insight", insight, {"memory_id": memory_id, "index": i}))
 
-        # 3. 存储主题向量
+        # 3. 主题
         topics = summary_data.get("topics", [])
         if topics:
             topics_text = "用户关注的主题: " + ", ".join(topics)
-            topics_vector = generate_embedding(topics_text)
-            if topics_vector:
-                doc_id = f"{memory_id}_topics"
-                documents_to_insert.append({
-                    "id": doc_id,
-                    "user_id": user_id,
-                    "session_id": session_id,
-                    "memory_type": "topics",
-                    "content": topics_text,
-                    "metadata": json.dumps({"memory_id": memory_id, "topics": topics}),
-                    "vector": topics_vector
-                })
-                milvus_ids.append(doc_id)
+            entries.append((f"{memory_id}_topics", "topics", topics_text, {"memory_id": memory_id, "topics": topics}))
+
+        # 一次批量向量化（单条失败只跳过该条）
+        vectors = generate_embedding([content for _, _, content, _ in entries]) if entries else []
+        for (doc_id, memory_type, content, metadata), vector in zip(entries, vectors or []):
+            if not vector:
+                continue
+            documents_to_insert.append({
+                "id": doc_id,
+                "user_id": user_id,
+                "session_id": session_id,
+                "memory_type": memory_type,
+                "content": content,
+                "metadata": json.dumps(metadata),
+                "vector": vector
+            })
+            milvus_ids.append(doc_id)
 
         # 批量插入 Milvus
         if documents_to_insert:
             try:
-                collection = Collection(MEMORY_COLLECTION_NAME)
-                collection.load()
+                collection = get_collection_registry().get(MEMORY_COLLECTION_NAME, load=False)
+                if collection is None:
+                    raise RuntimeError(f"集合 {MEMORY_COLLECTION_NAME} 不存在")
 
                 ids = [doc["id"] for doc in documents_to_insert]
                 user_ids = [doc["user_id"] for doc in documents_to_insert]
@@ -325,9 +306,8 @@ class MemoryService:
         Returns:
             相关记忆列表
         """
-        from pymilvus import Collection, utility
-
-        if not utility.has_collection(MEMORY_COLLECTION_NAME):
+        registry = get_collection_registry()
+        if registry.get(MEMORY_COLLECTION_NAME) is None:
             return []
 
         # 生成查询向量
@@ -336,25 +316,17 @@ class MemoryService:
             return []
 
         try:
-            collection = Collection(MEMORY_COLLECTION_NAME)
-            collection.load()
-
             # 按用户过滤
-            expr = f'user_id == "{user_id}"'
-
-            search_params = {
-                "metric_type": "COSINE",
-                "params": {"nprobe": 10},
-            }
+            expr = key_filter("user_id", user_id)
 
-            results = collection.search(
+            results = registry.run(MEMORY_COLLECTION_NAME, lambda collection: collection.search(
                 data=[query_vector],
                 anns_field="vector",
-                param=search_params,
+                param=registry.search_params(MEMORY_COLLECTION_NAME, top_k),
                 limit=top_k,
                 expr=expr,
                 output_fields=["id", "session_id", "memory_type", "content", "metadata"],
-            )
+            ), default=[])
 
             formatted_results = []
             for hits in results:
@@ -392,8 +364,6 @@ class MemoryService:
         user_id: str
     ) -> bool:
         """删除指定的长期记忆"""
-        from pymilvus import Collection, utility
-
         memory = db.query(LongTermMemory).filter(
             LongTermMemory.id == memory_id,
             LongTermMemory.user_id == user_id
@@ -403,9 +373,9 @@ class MemoryService:
             return False
 
         # 删除 Milvus 中的向量
-        if memory.milvus_ids and utility.has_collection(MEMORY_COLLECTION_NAME):
+        collection = get_collection_registry().get(MEMORY_COLLECTION_NAME, load=False) if memory.milvus_ids else None
+        if collection is not None:
             try:
-                collection = Collection(MEMORY_COLLECTION_NAME)
                 for milvus_id in memory.milvus_ids:
                     expr = f'id == "{milvus_id}"'
                     collection.delete(expr)
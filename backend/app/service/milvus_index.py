@@ -0,0 +1,152 @@
+"""
+Milvus 索引配置（ANN index profiles）
+
+集合原先一律使用 IVF_FLAT（nlist=128）、检索一律 nprobe=10，数据量从几百到几百万都是同一套参数。
+这里把索引类型与参数整理为若干 profile：
+1. flat     - 暴力检索，召回 100%，适合很小的集合或作为基准
+2. ivf_flat - 原有配置（按数据量放大 nlist）
+3. hnsw     - 图索引，召回高、延迟低，内存占用较大（M / efConstruction / ef）
+4. ivf_sq8  - 标量量化，内存约为原始向量的 1/4
+5. ivf_pq   - 乘积量化，内存最小，适合千万级集合
+profile 可按集合单独指定（MILVUS_INDEX_PROFILES），默认 auto 按集合行数选择；
+检索参数由集合上实际存在的索引推导（旧集合仍按 IVF_FLAT 检索），不依赖创建时的配置。
+
+使用方式：
+```python
+from service.milvus_index import resolve_profile, search_params_for_index
+
+profile = resolve_profile("knowledge_base", num_entities=120000)
+collection.create_index(field_name="vector", index_params=profile.index_params(120000))
+param = search_params_for_index("HNSW", {"M": 16, "efConstruction": 200}, top_k=10)
+```
+"""
+
+import json
+import math
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Tuple
+
+try:
+    from config.llm_config import get_config
+except ImportError:
+    from app.config.llm_config import get_config
+
+METRIC_TYPE = "COSINE"
+
+
+@dataclass(frozen=True)
+class IndexProfile:
+    """一组索引类型与构建 / 检索参数"""
+    name: str
+    index_type: str
+    build_params: Dict[str, Any] = field(default_factory=dict)
+    search_params: Dict[str, Any] = field(default_factory=dict)
+    description: str = ""
+
+    def index_params(self, num_entities: int = 0) -> Dict[str, Any]:
+        """create_index 的参数（IVF 类索引的 nlist 按行数放大）"""
+        params = dict(self.build_params)
+        if "nlist" in params:
+            params["nlist"] = ivf_nlist(num_entities, params["nlist"])
+        return {"metric_type": METRIC_TYPE, "index_type": self.index_type, "params": params}
+
+
+INDEX_PROFILES: Dict[str, IndexProfile] = {
+    "flat": IndexProfile("flat", "FLAT", {}, {}, "暴力检索，召回 100%"),
+    "ivf_flat": IndexProfile("ivf_flat", "IVF_FLAT", {"nlist": 128}, {"nprobe": 16}, "倒排 + 原始向量"),
+    "hnsw": IndexProfile("hnsw", "HNSW", {"M": 16, "efConstruction": 200}, {"ef": 64}, "图索引，高召回低延迟"),
+    "ivf_sq8": IndexProfile("ivf_sq8", "IVF_SQ8", {"nlist": 1024}, {"nprobe": 32}, "倒排 + 8bit 标量量化"),
+    "ivf_pq": IndexProfile("ivf_pq", "IVF_PQ", {"nlist": 2048, "m": 64, "nbits": 8}, {"nprobe": 64}, "倒排 + 乘积量化"),
+}
+
+# auto：行数上限 -> profile（新建的空集合按 hnsw 创建，数据增长后用 milvus_index_tool reindex 调整）
+AUTO_PROFILE_THRESHOLDS: List[Tuple[int, str]] = [
+    (2_000_000, "hnsw"),
+    (10_000_000, "ivf_sq8"),
+]
+AUTO_PROFILE_LARGEST = "ivf_pq"
+
+
+def ivf_nlist(num_entities: int, minimum: int = 128) -> int:
+    """IVF 聚类数：约 4·√n，不小于 profile 的默认值，不超过 65536"""
+    if num_entities <= 0:
+        return minimum
+    return int(min(65536, max(minimum, 4 * math.sqrt(num_entities))))
+
+
+def auto_profile_name(num_entities: int) -> str:
+    for limit, name in AUTO_PROFILE_THRESHOLDS:
+        if num_entities < limit:
+            return name
+    return AUTO_PROFILE_LARGEST
+
+
+def get_profile(name: str) -> IndexProfile:
+    try:
+        return INDEX_PROFILES[name.lower()]
+    except KeyError:
+        raise ValueError(f"Unknown index profile '{name}', expected one of: auto, {', '.join(INDEX_PROFILES)}")
+
+
+def resolve_profile(collection_name: str, num_entities: int = 0, name: Optional[str] = None) -> IndexProfile:
+    """
+    确定集合使用的 profile
+
+    优先级：参数 name > MILVUS_INDEX_PROFILES 中该集合的配置 > MILVUS_INDEX_PROFILE；auto 时按行数选择
+    """
+    config = get_config().milvus
+    name = (name or config.index_profiles.get(collection_name) or config.index_profile).lower()
+    if name == "auto":
+        name = auto_profile_name(num_entities)
+    return get_profile(name)
+
+
+def search_params_for_index(
+    index_type: Optional[str],
+    build_params: Optional[Dict[str, Any]] = None,
+    top_k: int = 10,
+    overrides: Optional[Dict[str, Any]] = None
+) -> Dict[str, Any]:
+    """
+    按集合上实际的索引推导检索参数
+
+    Args:
+        index_type: 索引类型（FLAT / IVF_FLAT / IVF_SQ8 / IVF_PQ / HNSW），未知时不带参数
+        build_params: 索引构建参数（nlist 等）
+        top_k: 本次检索的返回数量（HNSW 要求 ef >= top_k）
+        overrides: 显式指定的检索参数（基准测试扫描参数时使用）
+    """
+    config = get_config().milvus
+    index_type = (index_type or "").upper()
+    build_params = build_params or {}
+    params: Dict[str, Any] = {}
+
+    if index_type == "HNSW":
+        params["ef"] = max(config.hnsw_ef or INDEX_PROFILES["hnsw"].search_params["ef"], top_k)
+    elif index_type.startswith("IVF"):
+        nlist = int(build_params.get("nlist", 128))
+        default = next((p.search_params["nprobe"] for p in INDEX_PROFILES.values() if p.index_type == index_type), 16)
+        nprobe = config.ivf_nprobe or max(default, nlist // 64)
+        params["nprobe"] = min(nlist, nprobe)
+
+    if overrides:
+        params.update(overrides)
+        if "ef" in params:
+            params["ef"] = max(int(params["ef"]), top_k)
+    return {"metric_type": METRIC_TYPE, "params": params}
+
+
+def describe_index(collection: Any, field_name: str = "vector") -> Tuple[Optional[str], Dict[str, Any]]:
+    """读取集合上向量字段的索引类型与构建参数（没有索引时返回 (None, {})）"""
+    for index in collection.indexes:
+        if index.field_name != field_name:
+            continue
+        params = dict(index.params or {})
+        # pymilvus 2.3 将构建参数放在 params 中（可能是 JSON 字符串），2.4 起与 index_type 平铺
+        build_params = params.get("params")
+        if build_params is None:
+            build_params = {k: v for k, v in params.items() if k not in ("index_type", "metric_type")}
+        elif isinstance(build_params, str):
+            build_params = json.loads(build_params)
+        return params.get("index_type"), dict(build_params)
+    return None, {}
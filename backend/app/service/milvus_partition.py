@@ -0,0 +1,71 @@
+"""
+Milvus 分区键（partition key）布局
+
+knowledge_base 按 kb_id、long_term_memories 按 user_id 过滤，所有租户的向量在同一集合中，
+ANN 检索要覆盖全部向量后再过滤，租户越多延迟越高、召回越差。
+新建集合时把这两个字段声明为分区键（MILVUS_PARTITION_KEY），Milvus 按键的哈希把数据分到
+MILVUS_NUM_PARTITIONS 个分区中；检索表达式中的 `kb_id == "..."` / `kb_id in [...]` 会被用来裁剪分区，
+只检索相关分区。已有集合用 `python -m scripts.milvus_index_tool migrate-partition-key` 迁移。
+
+使用方式：
+```python
+from service.milvus_partition import key_field, key_filter, collection_options
+
+fields = [..., key_field("kb_id", max_length=128), ...]
+collection = Collection(name, schema=CollectionSchema(fields), **collection_options())
+collection.search(..., expr=key_filter("kb_id", ["kb_a", "kb_b"]))  # kb_id in ["kb_a", "kb_b"]
+```
+"""
+
+from typing import Any, Dict, Iterable, Optional, Union
+
+from pymilvus import DataType, FieldSchema
+
+try:
+    from config.llm_config import get_config
+except ImportError:
+    from app.config.llm_config import get_config
+
+
+def key_field(name: str, max_length: int = 128) -> FieldSchema:
+    """租户字段（MILVUS_PARTITION_KEY 开启时声明为分区键）"""
+    if get_config().milvus.partition_key:
+        return FieldSchema(name=name, dtype=DataType.VARCHAR, max_length=max_length, is_partition_key=True)
+    return FieldSchema(name=name, dtype=DataType.VARCHAR, max_length=max_length)
+
+
+def collection_options() -> Dict[str, Any]:
+    """创建带分区键集合时的额外参数"""
+    config = get_config().milvus
+    return {"num_partitions": config.num_partitions} if config.partition_key else {}
+
+
+def partition_key_field(collection: Any) -> Optional[str]:
+    """集合的分区键字段名（未使用分区键时返回 None）"""
+    for field in collection.schema.fields:
+        if getattr(field, "is_partition_key", False):
+            return field.name
+    return None
+
+
+def _quote(value: str) -> str:
+    escaped = str(value).replace("\\", "\\\\").replace('"', '\\"')
+    return f'"{escaped}"'
+
+
+def key_filter(field: str, values: Union[str, Iterable[str], None]) -> Optional[str]:
+    """
+    租户过滤表达式：单个值为 ==，多个值为 in（两种形式都能用于分区裁剪）
+
+    值中的引号与反斜杠会被转义；values 为空时返回 None
+    """
+    if values is None:
+        return None
+    if isinstance(values, str):
+        return f"{field} == {_quote(values)}" if values else None
+    unique = list(dict.fromkeys(v for v in values if v))
+    if not unique:
+        return None
+    if len(unique) == 1:
+        return f"{field} == {_quote(unique[0])}"
+    return f"{field} in [{', '.join(_quote(v) for v in unique)}]"
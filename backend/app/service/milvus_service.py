@@ -1,7 +1,13 @@
 
 """Milvus 向量存储服务"""
 import os
-from typing import List, Dict, Any, Optional
+import json
+import time
+import array
+import hashlib
+import logging
+import threading
+from typing import Callable, Iterable, List, Dict, Any, Optional, Tuple, TypeVar, Union
 from pymilvus import (
     connections,
     Collection,
@@ -10,15 +16,187 @@ from pymilvus import (
     DataType,
     utility,
 )
+from pymilvus.exceptions import MilvusException
+
+try:
+    from config.llm_config import get_config
+except ImportError:
+    from app.config.llm_config import get_config
+
+try:
+    from service.singleflight import ThreadSingleFlight, make_flight_key
+    from service.milvus_bulk_writer import BulkWriter
+    from service.milvus_index import describe_index, resolve_profile, search_params_for_index
+    from service.milvus_partition import collection_options, key_field, key_filter
+    from service.vector_store import VectorStore
+except ImportError:
+    from app.service.singleflight import ThreadSingleFlight, make_flight_key
+    from app.service.milvus_bulk_writer import BulkWriter
+    from app.service.milvus_index import describe_index, resolve_profile, search_params_for_index
+    from app.service.milvus_partition import collection_options, key_field, key_filter
+    from app.service.vector_store import VectorStore
+
+logger = logging.getLogger("MilvusService")
+
+# 相同向量检索的并发请求只访问一次 Milvus
+_search_flight = ThreadSingleFlight("milvus_search")
+
+T = TypeVar("T")
+
+
+class CollectionRegistry:
+    """
+    集合句柄与加载状态缓存（进程内共享）
+
+    Collection(name) 会请求一次集合描述，has_collection / load 也各是一次 RPC。
+    这里缓存句柄与已加载状态，查询路径上只剩 ANN 检索本身；操作出错时刷新后重试一次。
+    不存在的集合短时间内不再重复查询（create_collection 创建后立即登记）。
+    集合上实际的索引类型也一并缓存，用于推导检索参数（见 service/milvus_index.py）。
+    """
+
+    def __init__(self, alias: str = "default", missing_ttl: float = 10.0):
+        self.alias = alias
+        self.missing_ttl = missing_ttl
+        self._handles: Dict[str, Collection] = {}
+        self._loaded: set = set()
+        self._missing: Dict[str, float] = {}
+        self._indexes: Dict[str, Tuple[Optional[str], Dict[str, Any]]] = {}
+        self._lock = threading.Lock()
+        # 同一集合的元数据请求串行执行，避免并发查询同时触发 load
+        self._collection_locks: Dict[str, threading.Lock] = {}
+        self.stats = {"hits": 0, "lookups": 0, "loads": 0, "refreshes": 0}
+
+    def _cached(self, name: str, load: bool) -> Optional[Collection]:
+        collection = self._handles.get(name)
+        if collection is not None and (not load or name in self._loaded):
+            self.stats["hits"] += 1
+            return collection
+        return None
+
+    def get(self, name: str, load: bool = True) -> Optional[Collection]:
+        """获取集合句柄（load=True 时确保已加载），集合不存在时返回 None"""
+        with self._lock:
+            collection = self._cached(name, load)
+            if collection is not None:
+                return collection
+            missing_at = self._missing.get(name)
+            if name not in self._handles and missing_at and time.monotonic() - missing_at < self.missing_ttl:
+                return None
+            collection_lock = self._collection_locks.setdefault(name, threading.Lock())
+
+        with collection_lock:
+            with self._lock:
+                collection = self._cached(name, load)
+                if collection is not None:
+                    return collection
+                collection = self._handles.get(name)
+
+            if collection is None:
+                self.stats["lookups"] += 1
+                if not utility.has_collection(name, using=self.alias):
+                    with self._lock:
+                        self._missing[name] = time.monotonic()
+                    return None
+                collection = Collection(name, using=self.alias)
+            if load:
+                collection.load()
+                self.stats["loads"] += 1
+
+            with self._lock:
+                self._handles[name] = collection
+                self._missing.pop(name, None)
+                if load:
+                    self._loaded.add(name)
+            return collection
+
+    def register(self, name: str, collection: Collection, loaded: bool = False) -> None:
+        """登记新建的集合"""
+        with self._lock:
+            self._handles[name] = collection
+            self._missing.pop(name, None)
+            if loaded:
+                self._loaded.add(name)
+
+    def invalidate(self, name: Optional[str] = None) -> None:
+        """丢弃缓存的句柄与加载状态（集合被删除、重建或释放后调用），name 为 None 时全部丢弃"""
+        with self._lock:
+            names = [name] if name is not None else list(self._handles) + list(self._missing)
+            for n in names:
+                self._handles.pop(n, None)
+                self._loaded.discard(n)
+                self._missing.pop(n, None)
+                self._indexes.pop(n, None)
+
+    def search_params(self, name: str, top_k: int = 10, field_name: str = "vector") -> Dict[str, Any]:
+        """按集合上实际的向量索引推导检索参数（索引信息缓存到 invalidate 为止）"""
+        with self._lock:
+            index = self._indexes.get(name)
+        if index is None:
+            collection = self.get(name, load=False)
+            index = describe_index(collection, field_name) if collection is not None else (None, {})
+            with self._lock:
+                self._indexes[name] = index
+        return search_params_for_index(index[0], index[1], top_k)
+
+    def run(self, name: str, operation: Callable[[Collection], T], load: bool = True, default: Any = None) -> T:
+        """
+        对集合执行操作；Milvus 报错（集合未加载、被重建等）时刷新句柄后重试一次
+
+        Returns:
+            操作结果；集合不存在时返回 default
+        """
+        for attempt in range(2):
+            collection = self.get(name, load)
+            if collection is None:
+                return default
+            try:
+                return operation(collection)
+            except MilvusException as e:
+                if attempt:
+                    raise
+                logger.warning(f"Milvus operation on {name} failed, refreshing collection handle: {e}")
+                self.stats["refreshes"] += 1
+                self.invalidate(name)
+        return default
+
+    def preload(self, names: Iterable[str]) -> Dict[str, bool]:
+        """预加载集合（应用启动时调用），返回 {集合名: 是否已加载}"""
+        status = {}
+        for name in names:
+            try:
+                status[name] = self.get(name) is not None
+            except Exception as e:
+                logger.warning(f"Failed to preload Milvus collection {name}: {e}")
+                status[name] = False
+        return status
 
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {**self.stats, "collections": sorted(self._handles), "loaded": sorted(self._loaded)}
 
-class MilvusService:
-    """Milvus 向量存储服务"""
+
+_collection_registry = CollectionRegistry()
+
+
+def get_collection_registry() -> CollectionRegistry:
+    """获取集合句柄缓存（MilvusService、MemoryService、PolicySearchService 共用）"""
+    return _collection_registry
+
+
+class MilvusService(VectorStore):
+    """Milvus 向量存储服务（VectorStore 的默认实现）"""
+
+    # search_many 单次请求的最大向量数（Milvus nq 上限为 16384）
+    MAX_SEARCH_BATCH = 256
+
+    # 集合字段顺序（insert 按列提交）
+    FIELDS = ["id", "doc_id", "kb_id", "filename", "content", "chunk_index", "vector"]
 
     def __init__(self):
         self.host = os.getenv("MILVUS_HOST", "localhost")
         self.port = int(os.getenv("MILVUS_PORT", "19530"))
         self.vector_dim = 1024  # text-embedding-v4 维度
+        self.registry = get_collection_registry()
         self._connect()
 
     def _connect(self):
@@ -45,17 +223,15 @@ class MilvusService:
             Collection 对象
         """
         # 检查集合是否存在
-        if utility.has_collection(collection_name):
-            print(f"集合 {collection_name} 已存在")
-            collection = Collection(collection_name)
-            collection.load()
+        collection = self.registry.get(collection_name)
+        if collection is not None:
             return collection
 
         # 定义字段
         fields = [
             FieldSchema(name="id", dtype=DataType.VARCHAR, is_primary=True, max_length=64),
             FieldSchema(name="doc_id", dtype=DataType.VARCHAR, max_length=64),
-            FieldSchema(name="kb_id", dtype=DataType.VARCHAR, max_length=128),
+            key_field("kb_id", max_length=128),  # 分区键：按知识库裁剪检索范围
             FieldSchema(name="filename", dtype=DataType.VARCHAR, max_length=512),
             FieldSchema(name="content", dtype=DataType.VARCHAR, max_length=65535),
             FieldSchema(name="chunk_index", dtype=DataType.INT64),
@@ -63,18 +239,15 @@ class MilvusService:
         ]
 
         schema = CollectionSchema(fields=fields, description=f"Knowledge base: {collection_name}")
-        collection = Collection(name=collection_name, schema=schema)
+        collection = Collection(name=collection_name, schema=schema, **collection_options())
 
-        # 创建索引
-        index_params = {
-            "metric_type": "COSINE",
-            "index_type": "IVF_FLAT",
-            "params": {"nlist": 128},
-        }
-        collection.create_index(field_name="vector", index_params=index_params)
+        # 创建索引（按 MILVUS_INDEX_PROFILE / MILVUS_INDEX_PROFILES 选择 profile）
+        profile = resolve_profile(collection_name)
+        collection.create_index(field_name="vector", index_params=profile.index_params())
 
         # 加载集合到内存
         collection.load()
+        self.registry.register(collection_name, collection, loaded=True)
 
         print(f"集合 {collection_name} 创建成功")
         return collection
@@ -83,9 +256,10 @@ class MilvusService:
         self,
         collection_name: str,
         documents: List[Dict[str, Any]],
+        flush: bool = False,
     ) -> int:
         """
-        插入文档
+        插入文档（按 MILVUS_BULK_INSERT_ROWS / MILVUS_BULK_INSERT_MB 分批）
 
         Args:
             collection_name: 集合名称
@@ -96,36 +270,65 @@ class MilvusService:
                 - filename: 文件名
                 - content: 文本内容
                 - chunk_index: 切片索引
-                - vector: 向量
+                - vector: 向量（缺失时按 content 生成）
+            flush: 插入后是否 flush（新数据无需 flush 即可检索，大批量导入请使用 bulk_writer）
 
         Returns:
             插入的文档数量
+
+        分批 insert 本身不是原子的：任一批失败时按主键删除本次已写入的行后再抛出 RuntimeError，
+        调用方看到的是全部写入或全部未写入（主键与本次文档相同的已有行也会被删除）。
         """
-        collection = self.create_collection(collection_name)
+        writer = self.bulk_writer(collection_name, flush_on_close=flush)
+        try:
+            with writer:
+                for doc in documents:
+                    writer.add({**doc, "content": doc["content"][:65535]})  # 截断过长内容
+        except Exception:
+            self._rollback_insert(collection_name, documents)
+            raise
+
+        stats = writer.get_stats()
+        if stats["failed"]:
+            self._rollback_insert(collection_name, documents)
+            raise RuntimeError(f"{stats['failed']} of {len(documents)} documents failed to insert into {collection_name}")
 
-        # 准备数据
-        ids = [doc["id"] for doc in documents]
-        doc_ids = [doc["doc_id"] for doc in documents]
-        kb_ids = [doc["kb_id"] for doc in documents]
-        filenames = [doc["filename"] for doc in documents]
-        contents = [doc["content"][:65535] for doc in documents]  # 截断过长内容
-        chunk_indices = [doc["chunk_index"] for doc in documents]
-        vectors = [doc["vector"] for doc in documents]
+        print(f"成功插入 {stats['rows']} 条文档到 {collection_name}")
+        return stats["rows"]
 
-        # 插入数据
-        data = [ids, doc_ids, kb_ids, filenames, contents, chunk_indices, vectors]
-        collection.insert(data)
-        collection.flush()
+    def _rollback_insert(self, collection_name: str, documents: List[Dict[str, Any]]) -> None:
+        """按主键删除插入失败时已写入的部分行"""
+        ids = [doc["id"] for doc in documents if doc.get("id")]
+        try:
+            for i in range(0, len(ids), 1000):
+                expr = f"id in {json.dumps(ids[i:i + 1000])}"
+                self.registry.run(collection_name, lambda collection: collection.delete(expr), load=False)
+            logger.warning(f"Rolled back partial insert of {len(ids)} documents into {collection_name}")
+        except Exception as e:
+            logger.error(f"Failed to roll back partial insert into {collection_name}, rows may be left behind: {e}")
+
+    def bulk_writer(self, collection_name: str, **kwargs) -> BulkWriter:
+        """
+        批量写入器（分批 insert、任务结束时 flush 一次、向量化与 insert 并行）
 
-        print(f"成功插入 {len(documents)} 条文档到 {collection_name}")
-        return len(documents)
+        Args:
+            collection_name: 集合名称（不存在时在首次 insert 时创建）
+            **kwargs: 透传给 BulkWriter（max_rows / flush_interval / embed_batch 等）
+        """
+        # 插入不需要集合已加载
+        return BulkWriter(
+            collection_name,
+            fields=self.FIELDS,
+            get_collection=lambda: self.registry.get(collection_name, load=False) or self.create_collection(collection_name),
+            **kwargs
+        )
 
     def search(
         self,
         collection_name: str,
         query_vector: List[float],
         top_k: int = 5,
-        kb_id: Optional[str] = None,
+        kb_id: Union[str, List[str], None] = None,
     ) -> List[Dict[str, Any]]:
         """
         向量搜索
@@ -134,41 +337,110 @@ class MilvusService:
             collection_name: 集合名称
             query_vector: 查询向量
             top_k: 返回结果数量
-            kb_id: 知识库ID（可选，用于过滤）
+            kb_id: 知识库ID 或ID列表（可选，用于过滤；分区键集合只检索对应分区）
 
         Returns:
             搜索结果列表
         """
-        if not utility.has_collection(collection_name):
+        vector_digest = hashlib.sha1(array.array("d", query_vector).tobytes()).hexdigest()
+        key = make_flight_key(self.host, self.port, collection_name, vector_digest, top_k, kb_id)
+        return _search_flight.do(key, lambda: self._search(collection_name, query_vector, top_k, kb_id))
+
+    def _search(
+        self,
+        collection_name: str,
+        query_vector: List[float],
+        top_k: int,
+        kb_id: Union[str, List[str], None],
+    ) -> List[Dict[str, Any]]:
+        """实际执行向量搜索（由 search 合并并发请求后调用）"""
+        results = self._search_batch(collection_name, [query_vector], top_k, self._build_expr(kb_id))
+        if results is None:
             print(f"集合 {collection_name} 不存在")
             return []
+        return results[0]
 
-        collection = Collection(collection_name)
-        collection.load()
-
-        # 构建过滤表达式
-        expr = f'kb_id == "{kb_id}"' if kb_id else None
+    def search_many(
+        self,
+        collection_name: str,
+        query_vectors: List[List[float]],
+        top_k: int = 5,
+        kb_id: Union[str, List[str], None] = None,
+        filters: Optional[str] = None,
+    ) -> List[List[Dict[str, Any]]]:
+        """
+        批量向量搜索：多个查询向量合并为一次 collection.search，结果按查询拆分返回
 
-        # 搜索参数
-        search_params = {
-            "metric_type": "COSINE",
-            "params": {"nprobe": 10},
-        }
+        Args:
+            collection_name: 集合名称
+            query_vectors: 查询向量列表（空向量对应空结果）
+            top_k: 每个查询返回的结果数量
+            kb_id: 知识库ID 或ID列表（可选，用于过滤）
+            filters: 额外的过滤表达式（可选，与 kb_id 条件取交集）
 
-        results = collection.search(
-            data=[query_vector],
+        Returns:
+            与 query_vectors 一一对应的搜索结果列表
+        """
+        # 相同向量只检索一次
+        slots: Dict[bytes, int] = {}
+        unique_vectors = []
+        positions = []
+        for vector in query_vectors:
+            if not vector:
+                positions.append(None)
+                continue
+            digest = array.array("d", vector).tobytes()
+            if digest not in slots:
+                slots[digest] = len(unique_vectors)
+                unique_vectors.append(vector)
+            positions.append(slots[digest])
+
+        if not unique_vectors:
+            return [[] for _ in query_vectors]
+
+        expr = self._build_expr(kb_id, filters)
+        hits_per_vector: List[List[Dict[str, Any]]] = []
+        for i in range(0, len(unique_vectors), self.MAX_SEARCH_BATCH):
+            results = self._search_batch(collection_name, unique_vectors[i:i + self.MAX_SEARCH_BATCH], top_k, expr)
+            if results is None:
+                print(f"集合 {collection_name} 不存在")
+                return [[] for _ in query_vectors]
+            hits_per_vector.extend(results)
+
+        return [list(hits_per_vector[pos]) if pos is not None else [] for pos in positions]
+
+    @staticmethod
+    def _build_expr(kb_id: Union[str, List[str], None] = None, filters: Optional[str] = None) -> Optional[str]:
+        """构建过滤表达式（kb_id 条件在前，分区键集合据此只检索相关分区）"""
+        kb_expr = key_filter("kb_id", kb_id)
+        if kb_expr and filters:
+            return f"{kb_expr} and ({filters})"
+        return kb_expr or filters or None
+
+    def _search_batch(
+        self,
+        collection_name: str,
+        query_vectors: List[List[float]],
+        top_k: int,
+        expr: Optional[str],
+    ) -> Optional[List[List[Dict[str, Any]]]]:
+        """一次 collection.search 检索多个向量，集合不存在时返回 None"""
+        # 检索参数按集合实际的索引推导（放在操作内，刷新句柄重试时重新读取）
+        results = self.registry.run(collection_name, lambda collection: collection.search(
+            data=query_vectors,
             anns_field="vector",
-            param=search_params,
+            param=self.registry.search_params(collection_name, top_k),
             limit=top_k,
             expr=expr,
             output_fields=["id", "doc_id", "kb_id", "filename", "content", "chunk_index"],
-        )
-
-        # 格式化结果
-        formatted_results = []
-        for hits in results:
-            for hit in hits:
-                formatted_results.append({
+        ))
+        if results is None:
+            return None
+
+        # 格式化结果（results 与 query_vectors 一一对应）
+        return [
+            [
+                {
                     "id": hit.entity.get("id"),
                     "doc_id": hit.entity.get("doc_id"),
                     "kb_id": hit.entity.get("kb_id"),
@@ -176,9 +448,11 @@ class MilvusService:
                     "content": hit.entity.get("content"),
                     "chunk_index": hit.entity.get("chunk_index"),
                     "score": hit.score,
-                })
-
-        return formatted_results
+                }
+                for hit in hits
+            ]
+            for hits in results
+        ]
 
     def delete_by_doc_id(self, collection_name: str, doc_id: str) -> bool:
         """
@@ -191,13 +465,10 @@ class MilvusService:
         Returns:
             是否成功
         """
-        if not utility.has_collection(collection_name):
-            return True
-
         try:
-            collection = Collection(collection_name)
             expr = f'doc_id == "{doc_id}"'
-            collection.delete(expr)
+            if self.registry.run(collection_name, lambda collection: collection.delete(expr), load=False) is None:
+                return True
             print(f"已删除文档 {doc_id} 的所有切片")
             return True
         except Exception as e:
@@ -218,6 +489,7 @@ class MilvusService:
             if utility.has_collection(collection_name):
                 utility.drop_collection(collection_name)
                 print(f"集合 {collection_name} 已删除")
+            self.registry.invalidate(collection_name)
             return True
         except Exception as e:
             print(f"删除集合失败: {e}")
@@ -233,10 +505,10 @@ class MilvusService:
         Returns:
             统计信息
         """
-        if not utility.has_collection(collection_name):
+        collection = self.registry.get(collection_name, load=False)
+        if collection is None:
             return {"exists": False}
 
-        collection = Collection(collection_name)
         return {
             "exists": True,
             "name": collection_name,
@@ -260,22 +532,18 @@ class MilvusService:
         Returns:
             切片列表
         """
-        if not utility.has_collection(collection_name):
-            print(f"集合 {collection_name} 不存在")
-            return []
-
         try:
-            collection = Collection(collection_name)
-            collection.load()
-
             # 查询表达式
             expr = f'filename == "{filename}"'
 
-            results = collection.query(
+            results = self.registry.run(collection_name, lambda collection: collection.query(
                 expr=expr,
                 output_fields=["id", "doc_id", "kb_id", "filename", "content", "chunk_index"],
                 limit=limit,
-            )
+            ))
+            if results is None:
+                print(f"集合 {collection_name} 不存在")
+                return []
 
             # 按 chunk_index 排序
             results.sort(key=lambda x: x.get("chunk_index", 0))
@@ -296,3 +564,28 @@ def get_milvus_service() -> MilvusService:
     if _milvus_service is None:
         _milvus_service = MilvusService()
     return _milvus_service
+
+
+def preload_collections(names: Optional[Iterable[str]] = None) -> Dict[str, bool]:
+    """连接 Milvus 并预加载常用集合（应用启动时调用，默认 MILVUS_PRELOAD_COLLECTIONS）"""
+    names = list(names) if names is not None else get_config().milvus.preload_collections
+    if not names:
+        return {}
+    get_milvus_service()
+    status = get_collection_registry().preload(names)
+    logger.info(f"Preloaded Milvus collections: {status}")
+    return status
+
+
+def start_collection_preload() -> None:
+    """后台线程预加载集合（应用启动时调用，Milvus 不可用时不阻塞启动）"""
+    if not get_config().milvus.preload_collections:
+        return
+
+    def run():
+        try:
+            preload_collections()
+        except Exception as e:
+            logger.warning(f"Milvus collection preload failed: {e}")
+
+    threading.Thread(target=run, name="milvus-preload", daemon=True).start()
@@ -11,15 +11,24 @@ import json
 import logging
 from datetime import datetime, timedelta
 from typing import Dict, Any, List, Optional
-import httpx
 from sqlalchemy.orm import Session
 
 from models.news import IndustryNews, BiddingInfo, NewsCollectionTask
 from service.bidding_service import get_bidding_service
+from service.search_provider import get_search_provider
+from service.dedup_index import DedupIndex
+from service.local_search_index import index_collected
+from service.source_credibility import get_source_credibility
 from config.industry_config import get_industry_config, get_all_industries
 
 logger = logging.getLogger(__name__)
 
+# 资讯近似重复检测：转载稿 URL 不同但标题和摘要几乎一致
+NEWS_DUPLICATE_THRESHOLD = 0.7
+# 参与比对的历史资讯范围
+NEWS_DEDUP_LOOKBACK_DAYS = 30
+NEWS_DEDUP_MAX_HISTORY = 2000
+
 
 class NewsCollectionService:
     """资讯采集服务"""
@@ -49,53 +58,36 @@ class NewsCollectionService:
             logger.error("[_bocha_search] Bocha API key not configured")
             return []
 
-        url = "https://api.bochaai.com/v1/web-search"
-        payload = {
-            "query": query,
-            "summary": True,
-            "count": count,
-            "page": 1
-        }
-        headers = {
-            'Authorization': f"Bearer {self.bocha_api_key}",
-            'Content-Type': 'application/json'
-        }
+        # 采集必须走网络搜索，不经过本地检索
+        results = await get_search_provider(self.bocha_api_key, name="bocha").search(query, count=count)
+        results = [
+            {
+                'url': r['url'],
+                'title': r['title'],
+                'summary': r['summary'],
+                'snippet': r['snippet'],
+                'siteName': r['site_name'] if r['site_name'] != 'N/A' else '',
+                'datePublished': r['date'],
+            }
+            for r in results
+        ]
+        logger.info(f"[_bocha_search] 返回 {len(results)} 条有效结果")
+        return results
 
+    def _build_news_index(self, industry_id: Optional[str]) -> DedupIndex:
+        """用近期已入库的资讯构建近似重复索引"""
+        index = DedupIndex(threshold=NEWS_DUPLICATE_THRESHOLD)
         try:
-            async with httpx.AsyncClient(timeout=30.0) as client:
-                logger.info(f"[_bocha_search] 发送请求到 {url}")
-                response = await client.post(url, headers=headers, json=payload)
-                logger.info(f"[_bocha_search] 响应状态码: {response.status_code}")
-                response.raise_for_status()
-                data = response.json()
-                logger.info(f"[_bocha_search] 响应数据键: {data.keys() if isinstance(data, dict) else type(data)}")
-
-                webpages_data = data.get('data', {}).get('webPages', {})
-                value_list = webpages_data.get('value', [])
-                logger.info(f"[_bocha_search] 获取到 {len(value_list) if isinstance(value_list, list) else 0} 条结果")
-
-                if not isinstance(value_list, list):
-                    logger.warning(f"[_bocha_search] value_list 不是列表: {type(value_list)}")
-                    return []
-
-                results = []
-                for item in value_list:
-                    if item.get('url') and (item.get('snippet') or item.get('summary')):
-                        results.append({
-                            'url': item.get('url', ''),
-                            'title': item.get('name', ''),
-                            'summary': item.get('summary', '') or item.get('snippet', ''),
-                            'snippet': item.get('snippet', ''),
-                            'siteName': item.get('siteName', ''),
-                            'datePublished': item.get('datePublished', ''),
-                        })
-
-                logger.info(f"[_bocha_search] 返回 {len(results)} 条有效结果")
-                return results
-
+            since = datetime.utcnow() - timedelta(days=NEWS_DEDUP_LOOKBACK_DAYS)
+            rows = self.db.query(IndustryNews.title, IndustryNews.content).filter(
+                IndustryNews.industry_id == (industry_id or "smart_transportation"),
+                IndustryNews.collected_at >= since
+            ).order_by(IndustryNews.collected_at.desc()).limit(NEWS_DEDUP_MAX_HISTORY).all()
+            for title, content in rows:
+                index.add(f"{title or ''} {content or ''}")
         except Exception as e:
-            logger.error(f"[_bocha_search] Bocha search error for '{query}': {e}", exc_info=True)
-            return []
+            logger.warning(f"[collect_news] 加载历史资讯用于去重失败: {e}")
+        return index
 
     async def collect_news(self, max_items: int = 20, industry_id: Optional[str] = None) -> Dict[str, Any]:
         """
@@ -123,6 +115,8 @@ class NewsCollectionService:
 
         collected = []
         errors = []
+        duplicates = 0
+        news_index = self._build_news_index(industry_id)
 
         try:
             items_per_keyword = max(2, max_items // len(news_keywords))
@@ -158,14 +152,20 @@ class NewsCollectionService:
                         if existing:
                             continue
 
+                        title = item.get('title', '')
+                        content = item.get('summary', '') or item.get('snippet', '')
+
+                        # 检查是否为已有资讯的转载（未重复时同时登记到索引）
+                        if news_index.check(f"{title} {content}") is not None:
+                            duplicates += 1
+                            continue
+
                         # 解析发布时间
                         publish_time = self._parse_datetime(item.get('datePublished', ''))
                         if not publish_time:
                             publish_time = self._extract_date_from_snippet(item.get('snippet', ''))
 
                         # 判断分类
-                        title = item.get('title', '')
-                        content = item.get('summary', '') or item.get('snippet', '')
                         category = self._categorize_news(title, content)
 
                         news = IndustryNews(
@@ -193,6 +193,9 @@ class NewsCollectionService:
                     logger.error(f"Error processing keyword '{keyword}': {e}")
 
             self.db.commit()
+            index_collected(news=collected)
+            if duplicates:
+                logger.info(f"[collect_news] 跳过 {duplicates} 条近似重复资讯")
 
             task.status = "completed"
             task.total_collected = len(collected)
@@ -204,6 +207,7 @@ class NewsCollectionService:
             return {
                 "success": True,
                 "collected": len(collected),
+                "duplicates": duplicates,
                 "errors": errors
             }
 
@@ -364,6 +368,7 @@ class NewsCollectionService:
                     logger.error(f"Error processing bidding keyword '{keyword}': {e}")
 
             self.db.commit()
+            index_collected(bidding=collected)
 
             task.status = "completed"
             task.total_collected = len(collected)
@@ -657,40 +662,10 @@ class NewsCollectionService:
         return "新闻"
 
     def _extract_source_from_link(self, link: str) -> str:
-        """从链接提取来源"""
+        """从链接提取来源（信源表最长域名后缀匹配，未收录时返回注册域名）"""
         if not link:
             return "未知来源"
-
-        try:
-            from urllib.parse import urlparse
-            parsed = urlparse(link)
-            domain = parsed.netloc
-
-            source_map = {
-                "gov.cn": "政府网站",
-                "xinhuanet.com": "新华网",
-                "people.com.cn": "人民网",
-                "mot.gov.cn": "交通运输部",
-                "ndrc.gov.cn": "国家发改委",
-                "miit.gov.cn": "工信部",
-                "163.com": "网易",
-                "sohu.com": "搜狐",
-                "sina.com": "新浪",
-                "qq.com": "腾讯",
-                "baidu.com": "百度",
-            }
-
-            for key, name in source_map.items():
-                if key in domain:
-                    return name
-
-            # 返回主域名
-            parts = domain.split('.')
-            if len(parts) >= 2:
-                return '.'.join(parts[-2:])
-            return domain
-        except:
-            return "未知来源"
+        return get_source_credibility().lookup(link).name
 
     def _extract_department(self, title: str, content: str) -> Optional[str]:
         """提取发布部门"""
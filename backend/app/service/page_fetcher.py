@@ -0,0 +1,430 @@
+"""
+网页抓取服务
+
+供 DeepScout.deep_read_url 等深度阅读场景使用：
+1. 原生异步 - 共享 httpx 连接池（keep-alive，可选 HTTP/2），自动处理 gzip/deflate 压缩
+2. 域名礼貌 - 每个域名独立的并发上限，避免集中抓取同一站点
+3. 大小上限 - 流式下载，超过字节上限即截断
+4. 条件请求 - 缓存过期后携带 ETag / Last-Modified 发起请求，304 时直接复用本地内容
+5. 页面缓存 - 内容寻址的磁盘缓存（原始 HTML 与提取后的正文），重复阅读同一 URL 不再下载
+
+使用方式：
+```python
+from service.page_fetcher import get_page_fetcher
+
+page = await get_page_fetcher().fetch(url, extractor=extract_text)
+if page:
+    print(page.text)
+```
+"""
+
+import os
+import re
+import gzip
+import json
+import time
+import asyncio
+import hashlib
+import logging
+import tempfile
+import threading
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from urllib.parse import urlparse
+
+import httpx
+
+try:
+    import h2  # noqa: F401
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+try:
+    from config.llm_config import get_config, PageFetchConfig
+except ImportError:
+    from app.config.llm_config import get_config, PageFetchConfig
+
+logger = logging.getLogger("PageFetcher")
+
+_META_CHARSET_PATTERN = re.compile(rb"""<meta[^>]+charset=["']?([\w-]+)""", re.IGNORECASE)
+_TEXT_CONTENT_TYPES = ("text/html", "application/xhtml", "text/plain", "application/xml", "text/xml")
+
+
+@dataclass
+class FetchResult:
+    """抓取结果"""
+    url: str
+    html: str
+    text: Optional[str] = None          # 提取后的正文（传入 extractor 时）
+    status: int = 200
+    from_cache: bool = False            # 缓存新鲜期内直接返回
+    revalidated: bool = False           # 条件请求返回 304，复用本地内容
+    truncated: bool = False             # 超过字节上限被截断
+
+
+class PageCache:
+    """
+    内容寻址的页面磁盘缓存
+
+    目录结构：
+        meta/<sha256(url)>.json   - URL 元数据（ETag、Last-Modified、抓取时间、内容哈希）
+        blobs/<sha256(内容)>.gz   - gzip 压缩的原始 HTML / 提取正文，相同内容只存一份
+
+    TTL 只决定何时重新验证，文件的清理由 prune 完成：写入时每 prune_interval 秒在后台线程执行一次
+    """
+
+    def __init__(self, root: str, ttl: int, max_bytes: int = 0, prune_interval: int = 3600):
+        self.root = root
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.prune_interval = prune_interval
+        self.meta_dir = os.path.join(root, "meta")
+        self.blob_dir = os.path.join(root, "blobs")
+        os.makedirs(self.meta_dir, exist_ok=True)
+        os.makedirs(self.blob_dir, exist_ok=True)
+        self._pruned_at = 0.0
+        self._pruning = False
+        self._prune_lock = threading.Lock()
+
+    @staticmethod
+    def _digest(data: bytes) -> str:
+        return hashlib.sha256(data).hexdigest()
+
+    def _meta_path(self, url: str) -> str:
+        return os.path.join(self.meta_dir, self._digest(url.encode("utf-8")) + ".json")
+
+    def _blob_path(self, digest: str) -> str:
+        return os.path.join(self.blob_dir, digest + ".gz")
+
+    @staticmethod
+    def _atomic_write(path: str, data: bytes) -> None:
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp, path)
+        except Exception:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            raise
+
+    def get_meta(self, url: str) -> Optional[Dict]:
+        try:
+            with open(self._meta_path(url), "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def put_meta(self, url: str, meta: Dict) -> None:
+        self._atomic_write(self._meta_path(url), json.dumps(meta, ensure_ascii=False).encode("utf-8"))
+        self.maybe_prune()
+
+    def is_fresh(self, meta: Dict) -> bool:
+        return time.time() - meta.get("fetched_at", 0) < self.ttl
+
+    def put_blob(self, text: str) -> str:
+        data = text.encode("utf-8")
+        digest = self._digest(data)
+        path = self._blob_path(digest)
+        if os.path.exists(path):
+            os.utime(path)
+        else:
+            self._atomic_write(path, gzip.compress(data, compresslevel=6))
+        return digest
+
+    def get_blob(self, digest: Optional[str]) -> Optional[str]:
+        if not digest:
+            return None
+        try:
+            with open(self._blob_path(digest), "rb") as f:
+                return gzip.decompress(f.read()).decode("utf-8")
+        except (OSError, ValueError):
+            return None
+
+    def touch(self, meta: Dict) -> None:
+        """条件请求命中后刷新引用内容的修改时间，避免被清理"""
+        for digest in [meta.get("raw")] + list(meta.get("text", {}).values()):
+            if digest and os.path.exists(self._blob_path(digest)):
+                os.utime(self._blob_path(digest))
+
+    def prune(self, max_age: Optional[int] = None, max_bytes: Optional[int] = None) -> int:
+        """
+        清理缓存，返回删除的文件数
+
+        1. 超过 max_age（默认 3 倍 TTL）未使用的元数据与内容
+        2. 剩余总大小超过 max_bytes（默认 PAGE_CACHE_MAX_MB）时，从最久未使用的文件开始删除到上限的 90%
+        """
+        cutoff = time.time() - (max_age or self.ttl * 3)
+        max_bytes = self.max_bytes if max_bytes is None else max_bytes
+        removed = 0
+        remaining: List[Tuple[float, int, str]] = []
+        for directory in (self.meta_dir, self.blob_dir):
+            for name in os.listdir(directory):
+                path = os.path.join(directory, name)
+                try:
+                    stat = os.stat(path)
+                    if stat.st_mtime < cutoff:
+                        os.remove(path)
+                        removed += 1
+                    else:
+                        remaining.append((stat.st_mtime, stat.st_size, path))
+                except OSError:
+                    continue
+
+        total = sum(size for _, size, _ in remaining)
+        if max_bytes and total > max_bytes:
+            target = max_bytes * 0.9
+            for _, size, path in sorted(remaining):
+                if total <= target:
+                    break
+                try:
+                    os.remove(path)
+                    removed += 1
+                    total -= size
+                except OSError:
+                    continue
+        return removed
+
+    def maybe_prune(self) -> None:
+        """距上次清理超过 prune_interval 时在后台线程清理（不阻塞写入）"""
+        if self.prune_interval <= 0:
+            return
+        with self._prune_lock:
+            if self._pruning or time.time() - self._pruned_at < self.prune_interval:
+                return
+            self._pruning = True
+            self._pruned_at = time.time()
+        threading.Thread(target=self._run_prune, name="page-cache-prune", daemon=True).start()
+
+    def _run_prune(self) -> None:
+        try:
+            removed = self.prune()
+            if removed:
+                logger.info(f"Pruned {removed} page cache files under {self.root}")
+        except Exception as e:
+            logger.warning(f"Page cache prune failed: {e}")
+        finally:
+            with self._prune_lock:
+                self._pruning = False
+
+
+# 新页面提取出正文后的回调 (url, html, text)，如本地全文检索的增量索引
+_page_listeners: List[Callable[[str, str, str], None]] = []
+
+
+def add_page_listener(listener: Callable[[str, str, str], None]) -> None:
+    """注册新页面回调"""
+    _page_listeners.append(listener)
+
+
+def _notify_page(url: str, html: str, text: str) -> None:
+    for listener in list(_page_listeners):
+        try:
+            listener(url, html, text)
+        except Exception as e:
+            logger.warning(f"Page listener failed for {url}: {e}")
+
+
+class PageFetcher:
+    """带域名并发限制与磁盘缓存的异步网页抓取器"""
+
+    def __init__(self, config: Optional[PageFetchConfig] = None):
+        self.config = config or get_config().fetch
+        self.cache = PageCache(
+            self.config.cache_dir,
+            self.config.cache_ttl,
+            max_bytes=self.config.cache_max_mb * 1024 * 1024,
+            prune_interval=self.config.cache_prune_interval
+        )
+        self.limits = httpx.Limits(
+            max_connections=self.config.max_connections,
+            max_keepalive_connections=self.config.max_connections,
+            keepalive_expiry=60
+        )
+        self._client: Optional[httpx.AsyncClient] = None
+        self._client_loop: Optional[asyncio.AbstractEventLoop] = None
+        # (事件循环 id, 域名) -> 信号量
+        self._host_semaphores: Dict[Tuple[int, str], asyncio.Semaphore] = {}
+        self._lock = threading.Lock()
+        self.stats = {"fetches": 0, "cache_hits": 0, "revalidated": 0, "errors": 0, "truncated": 0, "bytes": 0}
+
+    def _get_client(self) -> httpx.AsyncClient:
+        loop = asyncio.get_running_loop()
+        if self._client is None or self._client_loop is not loop or self._client.is_closed:
+            self._client = httpx.AsyncClient(
+                http2=HTTP2_AVAILABLE,
+                limits=self.limits,
+                timeout=httpx.Timeout(self.config.timeout, connect=5.0),
+                headers={"User-Agent": self.config.user_agent, "Accept-Encoding": "gzip, deflate"},
+                follow_redirects=True,
+                max_redirects=5
+            )
+            self._client_loop = loop
+        return self._client
+
+    def _host_semaphore(self, url: str) -> asyncio.Semaphore:
+        key = (id(asyncio.get_running_loop()), urlparse(url).netloc.lower())
+        with self._lock:
+            semaphore = self._host_semaphores.get(key)
+            if semaphore is None:
+                semaphore = asyncio.Semaphore(self.config.per_host_concurrency)
+                self._host_semaphores[key] = semaphore
+            return semaphore
+
+    @staticmethod
+    def _decode(body: bytes, response: httpx.Response) -> str:
+        """按 Content-Type 声明、<meta charset> 的顺序确定编码（中文站点常见 GBK）"""
+        encoding = response.charset_encoding
+        if not encoding:
+            match = _META_CHARSET_PATTERN.search(body[:4096])
+            encoding = match.group(1).decode("ascii") if match else "utf-8"
+        try:
+            return body.decode(encoding, errors="replace")
+        except LookupError:
+            return body.decode("utf-8", errors="replace")
+
+    async def _extract(
+        self,
+        url: str,
+        html: str,
+        meta: Dict,
+        extractor: Optional[Callable[[str, str], Any]],
+        extractor_name: str
+    ) -> Optional[str]:
+        """提取正文，结果按提取器名称缓存"""
+        if extractor is None:
+            return None
+        cached = self.cache.get_blob(meta.get("text", {}).get(extractor_name))
+        if cached is not None:
+            return cached
+        if asyncio.iscoroutinefunction(extractor):
+            text = await extractor(html, url)
+        else:
+            text = await asyncio.to_thread(extractor, html, url)
+        if text:
+            meta.setdefault("text", {})[extractor_name] = await asyncio.to_thread(self.cache.put_blob, text)
+            await asyncio.to_thread(self.cache.put_meta, url, meta)
+            if _page_listeners:
+                await asyncio.to_thread(_notify_page, url, html, text)
+        return text
+
+    async def fetch(
+        self,
+        url: str,
+        extractor: Optional[Callable[[str, str], Any]] = None,
+        extractor_name: str = "default"
+    ) -> Optional[FetchResult]:
+        """
+        抓取网页（优先使用本地缓存）
+
+        Args:
+            url: 网页地址
+            extractor: 正文提取函数 (html, url) -> text；同步函数在线程池中执行，也可传入协程函数
+            extractor_name: 提取器名称，不同提取器的结果分别缓存
+
+        Returns:
+            FetchResult；非 http(s) 地址、非 200、非文本内容或请求失败时返回 None
+        """
+        if urlparse(url).scheme not in ("http", "https"):
+            return None
+        meta = await asyncio.to_thread(self.cache.get_meta, url)
+        cached_html = None
+        if meta is not None:
+            cached_html = await asyncio.to_thread(self.cache.get_blob, meta.get("raw"))
+            if cached_html is not None and self.cache.is_fresh(meta):
+                self.stats["cache_hits"] += 1
+                text = await self._extract(url, cached_html, meta, extractor, extractor_name)
+                return FetchResult(url=url, html=cached_html, text=text, from_cache=True, truncated=meta.get("truncated", False))
+
+        # 只有缓存内容仍可读时才发条件请求（内容可能已被清理，此时 304 无法使用）
+        headers = {}
+        if cached_html is not None:
+            if meta.get("etag"):
+                headers["If-None-Match"] = meta["etag"]
+            if meta.get("last_modified"):
+                headers["If-Modified-Since"] = meta["last_modified"]
+
+        try:
+            async with self._host_semaphore(url):
+                self.stats["fetches"] += 1
+                async with self._get_client().stream("GET", url, headers=headers) as response:
+                    if response.status_code == 304 and cached_html is not None:
+                        self.stats["revalidated"] += 1
+                        meta["fetched_at"] = time.time()
+                        await asyncio.to_thread(self.cache.put_meta, url, meta)
+                        await asyncio.to_thread(self.cache.touch, meta)
+                        text = await self._extract(url, cached_html, meta, extractor, extractor_name)
+                        return FetchResult(url=url, html=cached_html, text=text, status=304, revalidated=True)
+
+                    if response.status_code != 200:
+                        logger.debug(f"Fetch {url} returned {response.status_code}")
+                        return None
+
+                    content_type = response.headers.get("content-type", "text/html").lower()
+                    if not any(t in content_type for t in _TEXT_CONTENT_TYPES):
+                        logger.debug(f"Skip non-text content {content_type}: {url}")
+                        return None
+
+                    # 流式读取（已自动解压），超过上限即截断
+                    chunks, size, truncated = [], 0, False
+                    async for chunk in response.aiter_bytes():
+                        remaining = self.config.max_bytes - size
+                        if len(chunk) >= remaining:
+                            chunks.append(chunk[:remaining])
+                            size += remaining
+                            truncated = True
+                            break
+                        chunks.append(chunk)
+                        size += len(chunk)
+
+                    html = self._decode(b"".join(chunks), response)
+                    etag = response.headers.get("etag")
+                    last_modified = response.headers.get("last-modified")
+        except httpx.HTTPError as e:
+            self.stats["errors"] += 1
+            logger.warning(f"Fetch error for {url}: {e}")
+            return None
+
+        self.stats["bytes"] += size
+        if truncated:
+            self.stats["truncated"] += 1
+            logger.info(f"Page truncated at {self.config.max_bytes} bytes: {url}")
+
+        meta = {
+            "url": url,
+            "etag": etag,
+            "last_modified": last_modified,
+            "fetched_at": time.time(),
+            "truncated": truncated,
+            "raw": await asyncio.to_thread(self.cache.put_blob, html),
+            "text": {}
+        }
+        await asyncio.to_thread(self.cache.put_meta, url, meta)
+        text = await self._extract(url, html, meta, extractor, extractor_name)
+        return FetchResult(url=url, html=html, text=text, truncated=truncated)
+
+    async def aclose(self) -> None:
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    def get_stats(self) -> Dict:
+        return dict(self.stats)
+
+
+_page_fetcher: Optional[PageFetcher] = None
+
+
+def get_page_fetcher() -> PageFetcher:
+    """获取网页抓取器单例"""
+    global _page_fetcher
+    if _page_fetcher is None:
+        _page_fetcher = PageFetcher()
+    return _page_fetcher
+
+
+async def close_page_fetcher() -> None:
+    """关闭抓取器连接池（应用退出时调用）"""
+    if _page_fetcher is not None:
+        await _page_fetcher.aclose()
@@ -1,6 +1,7 @@
 
 """基于 Milvus 的政策文档搜索服务"""
 import os
+import time
 from typing import List, Dict, Any, Optional
 from pymilvus import (
     connections,
@@ -11,17 +12,27 @@ from pymilvus import (
     utility,
 )
 from service.embedding_service import generate_embedding
+from service.milvus_service import get_collection_registry
+from service.milvus_index import resolve_profile
+from service.milvus_bulk_writer import BulkWriter
+from service.hybrid_search import get_sparse_index, hybrid_retrieve, milvus_row_batches
 
 
 class PolicySearchService:
     """政策文档搜索服务类 - 基于 Milvus"""
 
+    # 集合字段顺序（insert 按列提交）
+    FIELDS = ["id", "title", "website", "entry_url", "detail_url", "date", "content", "vector"]
+    OUTPUT_FIELDS = FIELDS[:-1]
+
     def __init__(self, collection_name: str = "policy_documents"):
         """初始化 Milvus 连接"""
         self.host = os.getenv("MILVUS_HOST", "localhost")
         self.port = int(os.getenv("MILVUS_PORT", "19530"))
         self.collection_name = collection_name
         self.vector_dim = 1024
+        # 集合旁的 BM25 索引（首次检索时从 Milvus 构建，写入时增量更新）
+        self.sparse_index = get_sparse_index(collection_name)
         self._connect()
 
     def _connect(self):
@@ -39,9 +50,8 @@ class PolicySearchService:
     def _ensure_collection(self) -> Optional[Collection]:
         """确保集合存在"""
         try:
-            if utility.has_collection(self.collection_name):
-                collection = Collection(self.collection_name)
-                collection.load()
+            collection = get_collection_registry().get(self.collection_name)
+            if collection is not None:
                 return collection
 
             # 创建集合
@@ -59,14 +69,11 @@ class PolicySearchService:
             schema = CollectionSchema(fields=fields, description="Policy documents")
             collection = Collection(name=self.collection_name, schema=schema)
 
-            # 创建索引
-            index_params = {
-                "metric_type": "COSINE",
-                "index_type": "IVF_FLAT",
-                "params": {"nlist": 128},
-            }
-            collection.create_index(field_name="vector", index_params=index_params)
+            # 创建索引（按 MILVUS_INDEX_PROFILE / MILVUS_INDEX_PROFILES 选择 profile）
+            profile = resolve_profile(self.collection_name)
+            collection.create_index(field_name="vector", index_params=profile.index_params())
             collection.load()
+            get_collection_registry().register(self.collection_name, collection, loaded=True)
 
             print(f"集合 {self.collection_name} 创建成功")
             return collection
@@ -100,13 +107,13 @@ class PolicySearchService:
     def get_index_info(self) -> Dict[str, Any]:
         """获取索引信息"""
         try:
-            if not utility.has_collection(self.collection_name):
+            collection = get_collection_registry().get(self.collection_name, load=False)
+            if collection is None:
                 return {
                     "success": False,
                     "message": f"集合 '{self.collection_name}' 不存在"
                 }
 
-            collection = Collection(self.collection_name)
             return {
                 "success": True,
                 "index_name": self.collection_name,
@@ -141,7 +148,7 @@ class PolicySearchService:
 
             results = collection.query(
                 expr=f'id == "{doc_id}"',
-                output_fields=["id", "title", "website", "entry_url", "detail_url", "date", "content"]
+                output_fields=self.OUTPUT_FIELDS
             )
 
             if results:
@@ -160,79 +167,184 @@ class PolicySearchService:
                 "message": f"获取文档出错: {str(e)}"
             }
 
-    def hybrid_search(self, query: str, top_n: int = 3) -> Dict[str, Any]:
-        """向量搜索（Milvus 不支持关键词搜索，使用纯向量搜索）"""
-        return self.vector_search(query, top_n)
-
-    def keyword_search(self, query: str, top_n: int = 10) -> Dict[str, Any]:
-        """关键词搜索（Milvus 不直接支持，降级为向量搜索）"""
-        return self.vector_search(query, top_n)
-
-    def vector_search(self, query: str, top_n: int = 10) -> Dict[str, Any]:
-        """向量搜索"""
+    def hybrid_search(
+        self,
+        query: str,
+        top_n: int = 3,
+        fusion: Optional[str] = None,
+        dense_weight: Optional[float] = None,
+        sparse_weight: Optional[float] = None,
+    ) -> Dict[str, Any]:
+        """
+        混合检索：BM25 与向量检索并行召回，按 RRF 或加权分数融合
+
+        Args:
+            query: 查询文本
+            top_n: 返回数量
+            fusion: rrf / weighted（默认 HYBRID_FUSION）
+            dense_weight / sparse_weight: 两路权重（默认 HYBRID_DENSE_WEIGHT / HYBRID_SPARSE_WEIGHT）
+        """
+        start = time.perf_counter()
         try:
-            collection = self._ensure_collection()
-            if not collection:
-                return {"success": False, "message": "集合不存在或为空"}
+            # 稀疏索引尚未构建完成时先用纯向量结果
+            sparse_ready = self.build_sparse_index()
+            dense_items: Dict[str, Dict[str, Any]] = {}
+
+            def dense_fn(limit: int):
+                items = self._dense_search(query, limit)
+                dense_items.update((item["id"], item) for item in items)
+                return [(item["id"], item["score"]) for item in items]
+
+            hits = hybrid_retrieve(
+                dense_fn,
+                (lambda limit: self.sparse_index.search(query, limit)) if sparse_ready else None,
+                top_n=top_n,
+                fusion=fusion,
+                dense_weight=dense_weight,
+                sparse_weight=sparse_weight,
+            )
 
-            # 生成查询向量
-            query_vectors = generate_embedding([query])
-            if not query_vectors:
-                return {
-                    "success": False,
-                    "message": "无法生成查询向量"
-                }
+            search_results = []
+            for hit in hits:
+                item = dense_items.get(hit.id)
+                if item is None:
+                    row = self.sparse_index.get_row(hit.id)
+                    if row is None:
+                        continue
+                    item = self._format_result(row, hit.sparse_score)
+                search_results.append({
+                    **item,
+                    "score": hit.score,
+                    "dense_rank": hit.dense_rank,
+                    "sparse_rank": hit.sparse_rank,
+                })
 
-            query_vector = query_vectors[0]
+            return {
+                "success": True,
+                "query": query,
+                "method": "hybrid" if sparse_ready else "vector",
+                "sparse_index": self.sparse_index.state,
+                "total": len(search_results),
+                "results": search_results,
+                "took_ms": round((time.perf_counter() - start) * 1000, 1),
+            }
 
-            # 搜索参数
-            search_params = {
-                "metric_type": "COSINE",
-                "params": {"nprobe": 10},
+        except Exception as e:
+            import traceback
+            traceback.print_exc()
+            get_collection_registry().invalidate(self.collection_name)
+            return {
+                "success": False,
+                "message": f"搜索出错: {str(e)}"
             }
 
-            results = collection.search(
-                data=[query_vector],
-                anns_field="vector",
-                param=search_params,
-                limit=top_n,
-                output_fields=["id", "title", "website", "entry_url", "detail_url", "date", "content"],
-            )
+    def keyword_search(self, query: str, top_n: int = 10) -> Dict[str, Any]:
+        """关键词搜索（集合旁的 BM25 索引，首次调用时等待索引构建完成）"""
+        start = time.perf_counter()
+        if not self.build_sparse_index(wait=True):
+            return {
+                "success": False,
+                "message": f"关键词索引不可用（{self.sparse_index.state}）"
+            }
 
-            # 格式化结果
-            search_results = []
-            for hits in results:
-                for hit in hits:
-                    content = hit.entity.get("content", "")
-                    item = {
-                        "id": hit.entity.get("id"),
-                        "title": hit.entity.get("title", ""),
-                        "website": hit.entity.get("website", ""),
-                        "entry_url": hit.entity.get("entry_url", ""),
-                        "detail_url": hit.entity.get("detail_url", ""),
-                        "date": hit.entity.get("date", ""),
-                        "content": content,
-                        "content_preview": content[:300] + "..." if len(content) > 300 else content,
-                        "score": hit.score,
-                    }
-                    search_results.append(item)
+        search_results = []
+        for doc_id, score in self.sparse_index.search(query, top_n):
+            row = self.sparse_index.get_row(doc_id)
+            if row is not None:
+                search_results.append(self._format_result(row, score))
+
+        return {
+            "success": True,
+            "query": query,
+            "method": "keyword",
+            "total": len(search_results),
+            "results": search_results,
+            "took_ms": round((time.perf_counter() - start) * 1000, 1),
+        }
 
+    def vector_search(self, query: str, top_n: int = 10) -> Dict[str, Any]:
+        """向量搜索"""
+        start = time.perf_counter()
+        try:
+            search_results = self._dense_search(query, top_n)
             return {
                 "success": True,
                 "query": query,
                 "method": "vector",
                 "total": len(search_results),
                 "results": search_results,
+                "took_ms": round((time.perf_counter() - start) * 1000, 1),
             }
 
         except Exception as e:
             import traceback
             traceback.print_exc()
+            # 集合可能已被重建或释放，下次查询重新获取句柄
+            get_collection_registry().invalidate(self.collection_name)
             return {
                 "success": False,
                 "message": f"搜索出错: {str(e)}"
             }
 
+    def _dense_search(self, query: str, limit: int) -> List[Dict[str, Any]]:
+        """向量检索（集合不存在或向量生成失败时抛出异常）"""
+        collection = self._ensure_collection()
+        if not collection:
+            raise RuntimeError("集合不存在或为空")
+
+        # 生成查询向量
+        query_vectors = generate_embedding([query])
+        if not query_vectors or not query_vectors[0]:
+            raise RuntimeError("无法生成查询向量")
+
+        results = collection.search(
+            data=[query_vectors[0]],
+            anns_field="vector",
+            param=get_collection_registry().search_params(self.collection_name, limit),
+            limit=limit,
+            output_fields=self.OUTPUT_FIELDS,
+        )
+
+        # 格式化结果
+        return [
+            self._format_result({field: hit.entity.get(field) for field in self.OUTPUT_FIELDS}, hit.score)
+            for hits in results
+            for hit in hits
+        ]
+
+    @staticmethod
+    def _format_result(row: Dict[str, Any], score: Optional[float]) -> Dict[str, Any]:
+        content = row.get("content") or ""
+        return {
+            "id": row.get("id"),
+            "title": row.get("title") or "",
+            "website": row.get("website") or "",
+            "entry_url": row.get("entry_url") or "",
+            "detail_url": row.get("detail_url") or "",
+            "date": row.get("date") or "",
+            "content": content,
+            "content_preview": content[:300] + "..." if len(content) > 300 else content,
+            "score": score,
+        }
+
+    def build_sparse_index(self, wait: bool = False) -> bool:
+        """构建集合旁的关键词索引（首次调用时在后台构建），返回索引是否可用"""
+        return self.sparse_index.ensure_built(self._sparse_rows, wait=wait, count_fn=self._row_count)
+
+    def _row_count(self) -> int:
+        """集合当前行数（count(*)，不含已删除行），用于发现其他进程的写入"""
+        result = get_collection_registry().run(self.collection_name, lambda collection: collection.query(
+            expr="", output_fields=["count(*)"]
+        ))
+        return int(result[0]["count(*)"]) if result else 0
+
+    def _sparse_rows(self):
+        """稀疏索引的数据源：按批读取集合中的全部行"""
+        collection = get_collection_registry().get(self.collection_name, load=False)
+        if collection is None:
+            return iter(())
+        return milvus_row_batches(collection, self.OUTPUT_FIELDS)
+
     def search(self, query: str, method: str = "hybrid", top_n: int = 10) -> Dict[str, Any]:
         """统一搜索接口"""
         if method == "hybrid":
@@ -247,41 +359,63 @@ class PolicySearchService:
                 "message": f"不支持的搜索方法: {method}"
             }
 
-    def insert_document(self, doc: Dict[str, Any]) -> bool:
-        """插入单个文档"""
+    @staticmethod
+    def policy_row(doc: Dict[str, Any]) -> Dict[str, Any]:
+        """政策文档 -> 集合行（按字段长度截断）"""
+        row = {
+            "id": doc.get("id", ""),
+            "title": doc.get("title", "")[:1024],
+            "website": doc.get("website", "")[:256],
+            "entry_url": doc.get("entry_url", "")[:1024],
+            "detail_url": doc.get("detail_url", "")[:1024],
+            "date": doc.get("date", "")[:64],
+            "content": doc.get("content", "")[:65535],
+        }
+        if doc.get("vector"):
+            row["vector"] = doc["vector"]
+        return row
+
+    def bulk_writer(self, **kwargs) -> BulkWriter:
+        """
+        批量写入器：行按批次 insert，向量化与 insert 并行，任务结束时 flush 一次
+
+        政策行的主键由 detail_url 等稳定生成，默认按主键 upsert，重复导入不会产生重复行。
+
+        Args:
+            **kwargs: 透传给 BulkWriter（max_rows / flush_interval / embed_batch / upsert 等）
+        """
+        kwargs.setdefault("upsert", True)
+        return BulkWriter(
+            self.collection_name,
+            fields=self.FIELDS,
+            get_collection=self._ensure_collection,
+            on_insert=self.sparse_index.on_insert,
+            **kwargs
+        )
+
+    def insert_documents(self, docs: List[Dict[str, Any]], **kwargs) -> Dict[str, Any]:
+        """
+        批量插入文档
+
+        Returns:
+            写入统计（rows / failed / rows_per_sec 等）
+        """
+        writer = self.bulk_writer(**kwargs)
+        with writer:
+            for doc in docs:
+                writer.add(self.policy_row(doc))
+        return writer.get_stats()
+
+    def insert_document(self, doc: Dict[str, Any], flush: bool = False) -> bool:
+        """插入单个文档（新数据无需 flush 即可检索，批量导入请使用 insert_documents / bulk_writer）"""
         try:
-            collection = self._ensure_collection()
-            if not collection:
-                return False
-
-            # 生成向量
-            content = doc.get("content", "")
-            vectors = generate_embedding([content])
-            if not vectors:
-                print("生成向量失败")
-                return False
-
-            # 插入数据
-            data = [
-                [doc.get("id", "")],
-                [doc.get("title", "")[:1024]],
-                [doc.get("website", "")[:256]],
-                [doc.get("entry_url", "")[:1024]],
-                [doc.get("detail_url", "")[:1024]],
-                [doc.get("date", "")[:64]],
-                [content[:65535]],
-                [vectors[0]],
-            ]
-
-            collection.insert(data)
-            collection.flush()
-            return True
+            stats = self.insert_documents([doc], flush_on_close=flush)
+            return stats["rows"] == 1
 
         except Exception as e:
             print(f"插入文档失败: {e}")
             return False
 
-
 if __name__ == "__main__":
     service = PolicySearchService()
     print(service.check_connection())
@@ -0,0 +1,238 @@
+"""
+搜索查询归一化与近似重复抑制
+
+规划师和审核员生成的搜索查询经常只在空白、标点、词序或近义表达上不同，
+例如 "2024年安责险市场规模" 与 "安责险 市场规模 2024"。每条查询都意味着一次
+搜索调用和一次 LLM 分析，因此在派发前合并：
+1. 中文分词 - 优先使用 jieba，未安装时退化为 CJK 二元组切分
+2. 停用词过滤 - 去掉虚词和"分析/情况"等泛化词
+3. 词集相似度 - Jaccard 相似度超过阈值即视为重复
+4. 向量距离 - 词集相似度处于临界区间的查询，再用 embedding 余弦相似度判断（可选）
+5. 数字守卫 - 所含数字（年份、数值）不同的查询从不合并，如 "2023年..." 与 "2024年..."
+
+使用方式：
+```python
+from service.query_normalizer import QueryDeduplicator
+
+dedup = QueryDeduplicator()
+kept, suppressed = dedup.filter(["2024年安责险市场规模", "安责险 市场规模 2024"])
+# kept == ["2024年安责险市场规模"], suppressed == [("安责险 市场规模 2024", "2024年安责险市场规模")]
+```
+"""
+
+import re
+import math
+import logging
+import unicodedata
+from typing import Callable, Dict, FrozenSet, Iterable, List, Optional, Sequence, Tuple
+
+from .dedup_index import extract_numbers
+
+try:
+    import jieba
+    jieba.setLogLevel(logging.WARNING)
+    JIEBA_AVAILABLE = True
+except ImportError:
+    JIEBA_AVAILABLE = False
+
+logger = logging.getLogger("QueryNormalizer")
+
+STOPWORDS = frozenset({
+    # 虚词
+    "的", "了", "和", "与", "及", "以及", "或", "或者", "是", "在", "对", "于", "等", "之", "其",
+    "及其", "关于", "有关", "相关", "方面",
+    # 疑问与泛化词
+    "哪些", "什么", "如何", "怎么", "怎样", "为什么", "多少", "情况", "分析", "研究", "介绍",
+    "概况", "现状", "数据", "报告", "详细", "主要",
+    # 英文
+    "the", "a", "an", "of", "and", "or", "in", "on", "for", "to", "with", "about", "what", "how",
+})
+
+_PUNCT_PATTERN = re.compile(r"[^\w一-鿿]+")
+_YEAR_SUFFIX_PATTERN = re.compile(r"(\d{4})\s*年")
+_TOKEN_PATTERN = re.compile(r"[a-z0-9]+(?:\.[0-9]+)?|[一-鿿]+")
+
+# 二元组退化方案中需要在切分前移除的停用词（多字词优先）
+_CJK_STOPWORDS = sorted((w for w in STOPWORDS if re.match(r"[一-鿿]", w)), key=len, reverse=True)
+
+
+def normalize_text(query: str) -> str:
+    """全角转半角、小写、"2024年" → "2024"、标点转空白"""
+    text = unicodedata.normalize("NFKC", query or "").lower()
+    text = _YEAR_SUFFIX_PATTERN.sub(r" \1 ", text)
+    text = _PUNCT_PATTERN.sub(" ", text)
+    return " ".join(text.split())
+
+
+def _bigrams(run: str) -> List[str]:
+    if len(run) <= 2:
+        return [run]
+    return [run[i:i + 2] for i in range(len(run) - 1)]
+
+
+def tokenize(query: str) -> FrozenSet[str]:
+    """中文感知的分词，返回去停用词后的词集"""
+    text = normalize_text(query)
+    if not text:
+        return frozenset()
+
+    if JIEBA_AVAILABLE:
+        tokens = (t.strip() for t in jieba.lcut(text))
+        return frozenset(t for t in tokens if t and t not in STOPWORDS)
+
+    tokens = set()
+    for match in _TOKEN_PATTERN.findall(text):
+        if match[0].isascii():
+            if match not in STOPWORDS:
+                tokens.add(match)
+            continue
+        for word in _CJK_STOPWORDS:
+            match = match.replace(word, " ")
+        for run in match.split():
+            tokens.update(_bigrams(run))
+    return frozenset(tokens)
+
+
+def canonical_form(query: str) -> str:
+    """与词序无关的规范形式（可用作缓存键）"""
+    return " ".join(sorted(tokenize(query)))
+
+
+def jaccard(a: FrozenSet[str], b: FrozenSet[str]) -> float:
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+def cosine(a: Sequence[float], b: Sequence[float]) -> float:
+    dot = sum(x * y for x, y in zip(a, b))
+    norm = math.sqrt(sum(x * x for x in a)) * math.sqrt(sum(y * y for y in b))
+    return dot / norm if norm else 0.0
+
+
+class QueryDeduplicator:
+    """
+    单次研究范围内的查询去重器
+
+    已派发的查询会被记住，后续查询与其比较。
+    """
+
+    def __init__(
+        self,
+        token_threshold: float = 0.8,
+        embedding_threshold: float = 0.92,
+        borderline_threshold: float = 0.4,
+        embed_fn: Optional[Callable[[List[str]], Optional[List[Optional[List[float]]]]]] = None
+    ):
+        """
+        Args:
+            token_threshold: 词集 Jaccard 相似度阈值，达到即判为重复
+            embedding_threshold: 向量余弦相似度阈值
+            borderline_threshold: 词集相似度达到该值但未达 token_threshold 时才计算向量
+            embed_fn: 批量向量化函数（如 generate_embedding），为 None 时只做词集比较
+        """
+        self.token_threshold = token_threshold
+        self.embedding_threshold = embedding_threshold
+        self.borderline_threshold = borderline_threshold
+        self.embed_fn = embed_fn
+        # (查询, 词集, 数字集)
+        self._seen: List[Tuple[str, FrozenSet[str], FrozenSet[str]]] = []
+        self._seen_queries: set = set()
+        self._vectors: Dict[str, Optional[List[float]]] = {}
+
+    def seed(self, queries: Iterable[str]) -> None:
+        """登记已派发的查询（不做检查）"""
+        for query in queries:
+            self._remember(query)
+
+    def _remember(self, query: str) -> None:
+        if query and query not in self._seen_queries:
+            self._seen_queries.add(query)
+            self._seen.append((query, tokenize(query), extract_numbers(query)))
+
+    def _best_lexical(
+        self,
+        tokens: FrozenSet[str],
+        numbers: FrozenSet[str],
+        pool: List[Tuple[str, FrozenSet[str], FrozenSet[str]]]
+    ) -> Tuple[Optional[str], float]:
+        best, best_score = None, 0.0
+        for query, other, other_numbers in pool:
+            # 数字守卫：年份或数值不同的查询检索的是不同数据
+            if numbers != other_numbers:
+                continue
+            score = jaccard(tokens, other)
+            if score > best_score:
+                best, best_score = query, score
+        return best, best_score
+
+    def _embed(self, texts: List[str]) -> None:
+        missing = [t for t in dict.fromkeys(texts) if t not in self._vectors]
+        if not missing or self.embed_fn is None:
+            return
+        try:
+            vectors = self.embed_fn(missing) or []
+        except Exception as e:
+            logger.warning(f"Query embedding failed, falling back to lexical dedup: {e}")
+            vectors = []
+        for i, text in enumerate(missing):
+            self._vectors[text] = vectors[i] if i < len(vectors) else None
+
+    def filter(self, queries: List[str]) -> Tuple[List[str], List[Tuple[str, str]]]:
+        """
+        过滤重复查询，保留的查询会被登记为已派发
+
+        Args:
+            queries: 待派发的查询（按优先级排序）
+
+        Returns:
+            (保留的查询, [(被抑制的查询, 与之重复的查询), ...])
+        """
+        kept: List[str] = []
+        suppressed: List[Tuple[str, str]] = []
+        borderline: List[Tuple[str, FrozenSet[str], FrozenSet[str]]] = []
+
+        # 第一轮：词集相似度
+        for query in queries:
+            if not query or not query.strip():
+                continue
+            tokens = tokenize(query)
+            numbers = extract_numbers(query)
+            match, score = self._best_lexical(tokens, numbers, self._seen)
+            if query in self._seen_queries or (match is not None and score >= self.token_threshold):
+                suppressed.append((query, match or query))
+                continue
+            if self.embed_fn is not None and score >= self.borderline_threshold:
+                borderline.append((query, tokens, numbers))
+            kept.append(query)
+            self._remember(query)
+
+        if not borderline:
+            return kept, suppressed
+
+        # 第二轮：临界查询只与先于它派发、且词集有一定重叠的查询做向量比较（一次批量向量化）
+        pairs: Dict[str, List[str]] = {}
+        for query, tokens, numbers in borderline:
+            earlier = self._seen[:[q for q, _, _ in self._seen].index(query)]
+            pairs[query] = [
+                q for q, t, n in earlier
+                if n == numbers and jaccard(tokens, t) >= self.borderline_threshold
+            ]
+        self._embed([q for q, others in pairs.items() if others] + [o for others in pairs.values() for o in others])
+
+        for query, others in pairs.items():
+            vector = self._vectors.get(query)
+            if vector is None:
+                continue
+            for other in others:
+                if other not in self._seen_queries:
+                    continue
+                other_vector = self._vectors.get(other)
+                if other_vector is not None and cosine(vector, other_vector) >= self.embedding_threshold:
+                    kept.remove(query)
+                    suppressed.append((query, other))
+                    self._seen = [entry for entry in self._seen if entry[0] != query]
+                    self._seen_queries.discard(query)
+                    break
+
+        return kept, suppressed
@@ -0,0 +1,359 @@
+"""
+重排序服务
+
+知识库问答、对话检索原先每次请求都新建 DashScopeRerank 与 NodeWithScore 对象，
+同步调用阻塞事件循环，没有超时也没有缓存。这里统一封装：
+1. 连接复用 - 进程级共享的 httpx 连接池，直接调用 DashScope text-rerank 接口
+2. 分数缓存 - 按 (模型, 查询, 文档哈希) 缓存相关度分数，重复的问题与切片不再请求
+3. 延迟预算 - 远程重排超过 RERANK_BUDGET_MS 时自动改用本地打分，超时的请求在后台
+   继续完成并写入缓存
+4. 本地打分 - 候选集内的 BM25（中文二元组，归一化到 0~1），或 embedding 余弦相似度
+5. 分数与输入顺序一致 - 返回值第 i 个分数对应第 i 个文档
+
+使用方式：
+```python
+from service.reranker import get_reranker
+
+scores = await get_reranker().rerank("储能电站安全标准", [doc["content"] for doc in docs])
+ranked = sorted(zip(docs, scores), key=lambda item: -item[1])
+```
+"""
+
+import os
+import math
+import time
+import asyncio
+import hashlib
+import logging
+import threading
+from collections import Counter, OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+import httpx
+import numpy as np
+
+try:
+    from config.llm_config import get_config, RerankConfig
+except ImportError:
+    from app.config.llm_config import get_config, RerankConfig
+
+from .local_search_index import analyze
+
+logger = logging.getLogger("Reranker")
+
+
+def lexical_scores(query: str, texts: List[str], k1: float = 1.2, b: float = 0.75) -> List[float]:
+    """
+    候选集内的 BM25 分数，归一化到 0~1（平均长度的文档各查询词出现一次约为 1）
+
+    只在候选文档之间计算 IDF，用于远程重排不可用时的排序兜底。
+    """
+    query_terms = set(analyze(query))
+    if not texts or not query_terms:
+        return [0.0] * len(texts)
+
+    docs = [Counter(analyze(text)) for text in texts]
+    lengths = [sum(doc.values()) for doc in docs]
+    avg_length = (sum(lengths) / len(lengths)) or 1.0
+    n = len(docs)
+
+    idf = {}
+    for term in query_terms:
+        df = sum(1 for doc in docs if term in doc)
+        idf[term] = math.log(1 + (n - df + 0.5) / (df + 0.5))
+    upper = sum(idf.values()) or 1.0
+
+    scores = []
+    for doc, length in zip(docs, lengths):
+        norm = k1 * (1 - b + b * length / avg_length)
+        score = 0.0
+        for term in query_terms:
+            tf = doc.get(term, 0)
+            if tf:
+                score += idf[term] * tf * (k1 + 1) / (tf + norm)
+        scores.append(min(1.0, score / upper))
+    return scores
+
+
+def cosine_scores(query_vector: Optional[List[float]], vectors: List[Optional[List[float]]]) -> Optional[List[float]]:
+    """查询向量与各文档向量的余弦相似度，任一向量缺失时返回 None"""
+    if query_vector is None or not vectors or any(v is None for v in vectors):
+        return None
+    q = np.asarray(query_vector, dtype=np.float32)
+    m = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(m, axis=1) * (np.linalg.norm(q) or 1.0)
+    norms[norms == 0] = 1.0
+    return ((m @ q) / norms).tolist()
+
+
+class Reranker:
+    """DashScope 重排序客户端（共享连接池 + 分数缓存 + 本地兜底）"""
+
+    def __init__(self, api_key: str, config: Optional[RerankConfig] = None):
+        config = config or get_config().rerank
+        self.model = config.model
+        self.api_url = config.api_url
+        self.budget = config.budget_ms / 1000
+        self.timeout = config.timeout
+        self.fallback = config.fallback
+        self.max_documents = config.max_documents
+        self.cache_max_entries = config.cache_max_entries
+        self.headers = {"Authorization": f"Bearer {api_key}", "Content-Type": "application/json"} if api_key else {}
+
+        self._cache: "OrderedDict[Tuple[str, str], float]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._background: set = set()
+
+        # 异步客户端与事件循环绑定，事件循环变化时重建
+        self._client: Optional[httpx.AsyncClient] = None
+        self._client_loop: Optional[asyncio.AbstractEventLoop] = None
+        self._sync_client: Optional[httpx.Client] = None
+        self._sync_lock = threading.Lock()
+
+        self.stats = {
+            "requests": 0, "documents": 0, "cache_hits": 0, "remote_calls": 0,
+            "timeouts": 0, "errors": 0, "fallbacks": 0, "remote_ms": 0.0,
+        }
+
+    # ---------- 缓存 ----------
+
+    def _cache_keys(self, query: str, texts: List[str]) -> List[Tuple[str, str]]:
+        query_hash = hashlib.sha1(f"{self.model}\x1f{query}".encode("utf-8")).hexdigest()
+        return [(query_hash, hashlib.sha1(text.encode("utf-8")).hexdigest()) for text in texts]
+
+    def _cached(self, keys: List[Tuple[str, str]]) -> Dict[int, float]:
+        found = {}
+        with self._lock:
+            for i, key in enumerate(keys):
+                score = self._cache.get(key)
+                if score is not None:
+                    self._cache.move_to_end(key)
+                    found[i] = score
+        self.stats["cache_hits"] += len(found)
+        return found
+
+    def _store(self, keys: List[Tuple[str, str]], scores: Dict[int, float]) -> None:
+        with self._lock:
+            for i, score in scores.items():
+                self._cache[keys[i]] = score
+                self._cache.move_to_end(keys[i])
+            while len(self._cache) > self.cache_max_entries:
+                self._cache.popitem(last=False)
+
+    # ---------- 远程重排 ----------
+
+    def _payload(self, query: str, texts: List[str]) -> Dict[str, Any]:
+        return {
+            "model": self.model,
+            "input": {"query": query, "documents": texts},
+            "parameters": {"return_documents": False, "top_n": len(texts)},
+        }
+
+    def _parse(self, data: Dict[str, Any], offset: int) -> Dict[int, float]:
+        results = (data.get("output") or {}).get("results") or []
+        return {offset + item["index"]: float(item["relevance_score"]) for item in results}
+
+    def _get_client(self) -> httpx.AsyncClient:
+        loop = asyncio.get_running_loop()
+        if self._client is None or self._client_loop is not loop or self._client.is_closed:
+            self._client = httpx.AsyncClient(timeout=httpx.Timeout(self.timeout, connect=5.0), headers=self.headers)
+            self._client_loop = loop
+        return self._client
+
+    def _get_sync_client(self) -> httpx.Client:
+        with self._sync_lock:
+            if self._sync_client is None:
+                self._sync_client = httpx.Client(timeout=httpx.Timeout(self.timeout, connect=5.0), headers=self.headers)
+            return self._sync_client
+
+    async def _remote(self, query: str, texts: List[str]) -> Dict[int, float]:
+        """按接口上限分批并发请求，返回 {下标: 分数}"""
+        start = time.monotonic()
+        client = self._get_client()
+
+        async def call(offset: int) -> Dict[int, float]:
+            response = await client.post(self.api_url, json=self._payload(query, texts[offset:offset + self.max_documents]))
+            response.raise_for_status()
+            return self._parse(response.json(), offset)
+
+        self.stats["remote_calls"] += 1
+        parts = await asyncio.gather(*(call(i) for i in range(0, len(texts), self.max_documents)))
+        self.stats["remote_ms"] += (time.monotonic() - start) * 1000
+        return {i: score for part in parts for i, score in part.items()}
+
+    def _remote_sync(self, query: str, texts: List[str], timeout: float) -> Dict[int, float]:
+        start = time.monotonic()
+        client = self._get_sync_client()
+        scores: Dict[int, float] = {}
+        self.stats["remote_calls"] += 1
+        for offset in range(0, len(texts), self.max_documents):
+            remaining = timeout - (time.monotonic() - start)
+            if remaining <= 0:
+                raise httpx.TimeoutException("rerank budget exhausted")
+            response = client.post(
+                self.api_url,
+                json=self._payload(query, texts[offset:offset + self.max_documents]),
+                timeout=remaining
+            )
+            response.raise_for_status()
+            scores.update(self._parse(response.json(), offset))
+        self.stats["remote_ms"] += (time.monotonic() - start) * 1000
+        return scores
+
+    # ---------- 本地打分 ----------
+
+    async def _fallback_scores(self, query: str, texts: List[str]) -> List[float]:
+        self.stats["fallbacks"] += 1
+        if self.fallback == "embedding":
+            try:
+                from .embedding_service import generate_embedding_async
+                vectors = await generate_embedding_async([query] + texts)
+                scores = cosine_scores(vectors[0], vectors[1:]) if vectors else None
+                if scores is not None:
+                    return scores
+            except Exception as e:
+                logger.warning(f"Embedding fallback failed, using lexical scores: {e}")
+        return lexical_scores(query, texts)
+
+    def _fallback_scores_sync(self, query: str, texts: List[str]) -> List[float]:
+        self.stats["fallbacks"] += 1
+        if self.fallback == "embedding":
+            try:
+                from .embedding_service import generate_embedding
+                vectors = generate_embedding([query] + texts)
+                scores = cosine_scores(vectors[0], vectors[1:]) if vectors else None
+                if scores is not None:
+                    return scores
+            except Exception as e:
+                logger.warning(f"Embedding fallback failed, using lexical scores: {e}")
+        return lexical_scores(query, texts)
+
+    # ---------- 对外接口 ----------
+
+    async def rerank(self, query: str, texts: List[str], budget_ms: Optional[float] = None) -> List[float]:
+        """
+        计算各文档与查询的相关度
+
+        Args:
+            query: 查询文本
+            texts: 候选文档
+            budget_ms: 远程重排的延迟预算（毫秒），默认 RERANK_BUDGET_MS
+
+        Returns:
+            与 texts 等长的分数列表（远程分数与本地分数不混用：未能全部取得远程分数时整体改用本地打分）
+        """
+        if not texts:
+            return []
+        self.stats["requests"] += 1
+        self.stats["documents"] += len(texts)
+        keys = self._cache_keys(query, texts)
+        scores = self._cached(keys)
+        missing = [i for i in range(len(texts)) if i not in scores]
+        if not missing:
+            return [scores[i] for i in range(len(texts))]
+        if not self.headers:
+            return await self._fallback_scores(query, texts)
+
+        budget = self.budget if budget_ms is None else budget_ms / 1000
+        missing_texts = [texts[i] for i in missing]
+        task = asyncio.ensure_future(self._remote(query, missing_texts))
+        try:
+            # shield：超出预算后请求在后台继续，完成后写入缓存
+            remote = await asyncio.wait_for(asyncio.shield(task), timeout=budget)
+        except asyncio.TimeoutError:
+            self.stats["timeouts"] += 1
+            logger.warning(f"Rerank exceeded {budget * 1000:.0f}ms budget, using local scores")
+            self._background.add(task)
+            task.add_done_callback(lambda t: self._finish_background(t, keys, missing))
+            return await self._fallback_scores(query, texts)
+        except Exception as e:
+            self.stats["errors"] += 1
+            logger.warning(f"Rerank request failed, using local scores: {e}")
+            return await self._fallback_scores(query, texts)
+
+        remote_scores = {missing[j]: score for j, score in remote.items()}
+        self._store(keys, remote_scores)
+        scores.update(remote_scores)
+        if len(scores) < len(texts):
+            return await self._fallback_scores(query, texts)
+        return [scores[i] for i in range(len(texts))]
+
+    def _finish_background(self, task: asyncio.Future, keys: List[Tuple[str, str]], missing: List[int]) -> None:
+        self._background.discard(task)
+        if task.cancelled() or task.exception() is not None:
+            return
+        self._store(keys, {missing[j]: score for j, score in task.result().items()})
+
+    def rerank_sync(self, query: str, texts: List[str], budget_ms: Optional[float] = None) -> List[float]:
+        """同步版本（供同步代码路径使用），延迟预算作为请求超时"""
+        if not texts:
+            return []
+        self.stats["requests"] += 1
+        self.stats["documents"] += len(texts)
+        keys = self._cache_keys(query, texts)
+        scores = self._cached(keys)
+        missing = [i for i in range(len(texts)) if i not in scores]
+        if not missing:
+            return [scores[i] for i in range(len(texts))]
+        if not self.headers:
+            return self._fallback_scores_sync(query, texts)
+
+        budget = self.budget if budget_ms is None else budget_ms / 1000
+        try:
+            remote = self._remote_sync(query, [texts[i] for i in missing], budget)
+        except httpx.TimeoutException:
+            self.stats["timeouts"] += 1
+            logger.warning(f"Rerank exceeded {budget * 1000:.0f}ms budget, using local scores")
+            return self._fallback_scores_sync(query, texts)
+        except Exception as e:
+            self.stats["errors"] += 1
+            logger.warning(f"Rerank request failed, using local scores: {e}")
+            return self._fallback_scores_sync(query, texts)
+
+        remote_scores = {missing[j]: score for j, score in remote.items()}
+        self._store(keys, remote_scores)
+        scores.update(remote_scores)
+        if len(scores) < len(texts):
+            return self._fallback_scores_sync(query, texts)
+        return [scores[i] for i in range(len(texts))]
+
+    async def aclose(self) -> None:
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+        with self._sync_lock:
+            if self._sync_client is not None:
+                self._sync_client.close()
+                self._sync_client = None
+
+    def get_stats(self) -> Dict[str, Any]:
+        remote_calls = self.stats["remote_calls"]
+        return {
+            **self.stats,
+            "model": self.model,
+            "cache_entries": len(self._cache),
+            "avg_remote_ms": round(self.stats["remote_ms"] / remote_calls, 1) if remote_calls else 0.0,
+            "cache_hit_rate": round(self.stats["cache_hits"] / self.stats["documents"], 3) if self.stats["documents"] else 0.0,
+        }
+
+
+_reranker: Optional[Reranker] = None
+_reranker_lock = threading.Lock()
+
+
+def get_reranker() -> Reranker:
+    """获取重排序服务单例（缺少 DASHSCOPE_API_KEY 时只使用本地打分）"""
+    global _reranker
+    with _reranker_lock:
+        if _reranker is None:
+            _reranker = Reranker(os.getenv("DASHSCOPE_API_KEY", ""))
+        return _reranker
+
+
+async def close_reranker() -> None:
+    """关闭连接池（应用退出时调用）"""
+    global _reranker
+    with _reranker_lock:
+        reranker, _reranker = _reranker, None
+    if reranker is not None:
+        await reranker.aclose()
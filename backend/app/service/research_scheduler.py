@@ -0,0 +1,331 @@
+"""
+研究任务调度器
+
+为 /research/stream 提供准入控制与公平排队：
+1. 全局并发上限 + 单用户并发上限
+2. 加权公平排队（WFQ）：按虚拟完成时间出队，重度用户不会饿死其他用户
+3. 排队期间通过 SSE 推送 queued 事件（排队位置、预估等待时间）
+4. 排队积压超过上限时直接拒绝（HTTP 429），排队超时自动放弃
+5. 调度指标（运行数、排队数、等待时长分位数等）
+
+本调度器为进程内实现，多 worker 部署时每个进程各自限流。
+"""
+
+import math
+import time
+import uuid
+import asyncio
+import logging
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Dict, Any, Optional, List, AsyncGenerator
+
+try:
+    from config.llm_config import get_config, SchedulerConfig
+except ImportError:
+    from app.config.llm_config import get_config, SchedulerConfig
+
+logger = logging.getLogger("ResearchScheduler")
+
+
+class SchedulerRejected(Exception):
+    """任务被拒绝（排队已满或排队超时）"""
+
+    def __init__(self, reason: str, retry_after: int = 30):
+        super().__init__(reason)
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+@dataclass
+class ResearchTicket:
+    """一个研究任务的调度凭证"""
+    ticket_id: str
+    user_key: str
+    session_id: Optional[str]
+    weight: float
+    virtual_finish: float
+    enqueued_at: float = field(default_factory=time.monotonic)
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    cancelled: bool = False
+    granted: asyncio.Event = field(default_factory=asyncio.Event)
+
+    @property
+    def is_running(self) -> bool:
+        return self.started_at is not None and self.finished_at is None
+
+
+class ResearchScheduler:
+    """
+    加权公平排队调度器
+
+    每个用户维护一个虚拟完成时间 F(u)。新任务的标签为
+    max(V, F(u)) + 1 / weight(u)，其中 V 为全局虚拟时间（最近出队任务的起始标签）。
+    出队时按标签从小到大选择第一个未超出单用户并发的任务。
+    """
+
+    def __init__(self, config: Optional[SchedulerConfig] = None):
+        self.config = config or get_config().scheduler
+        self._waiting: List[ResearchTicket] = []
+        self._running: Dict[str, ResearchTicket] = {}
+        self._user_running: Dict[str, int] = {}
+        self._user_finish: Dict[str, float] = {}
+        self._virtual_time = 0.0
+
+        # 指标
+        self._avg_job_seconds = self.config.estimated_job_seconds
+        self._wait_samples: deque = deque(maxlen=200)
+        self._counters = {
+            "admitted": 0,
+            "rejected": 0,
+            "started": 0,
+            "completed": 0,
+            "cancelled": 0,
+            "timed_out": 0,
+            "reaped": 0,
+        }
+
+    # ==================== 准入 ====================
+
+    def get_weight(self, user_key: str) -> float:
+        weight = self.config.user_weights.get(user_key, 1.0)
+        return weight if weight > 0 else 1.0
+
+    def admit(self, user_key: str, session_id: Optional[str] = None) -> ResearchTicket:
+        """
+        申请执行一个研究任务
+
+        有空闲容量时立即授予；否则进入排队。
+        排队积压超过上限时抛出 SchedulerRejected。
+        """
+        self.reap_stale()
+        user_waiting = sum(1 for t in self._waiting if t.user_key == user_key)
+        if len(self._waiting) >= self.config.max_queue_size:
+            self._counters["rejected"] += 1
+            raise SchedulerRejected("研究任务排队已满，请稍后再试", retry_after=self._retry_after())
+        if user_waiting >= self.config.max_queue_per_user:
+            self._counters["rejected"] += 1
+            raise SchedulerRejected("您排队中的研究任务过多，请等待当前任务完成", retry_after=self._retry_after())
+
+        weight = self.get_weight(user_key)
+        start_tag = max(self._virtual_time, self._user_finish.get(user_key, 0.0))
+        finish_tag = start_tag + 1.0 / weight
+        self._user_finish[user_key] = finish_tag
+
+        ticket = ResearchTicket(
+            ticket_id=uuid.uuid4().hex[:12],
+            user_key=user_key,
+            session_id=session_id,
+            weight=weight,
+            virtual_finish=finish_tag
+        )
+        self._waiting.append(ticket)
+        self._waiting.sort(key=lambda t: (t.virtual_finish, t.enqueued_at))
+        self._counters["admitted"] += 1
+        self._dispatch()
+
+        logger.info(
+            f"Admitted research ticket {ticket.ticket_id} for {user_key} "
+            f"(running={len(self._running)}, waiting={len(self._waiting)})"
+        )
+        return ticket
+
+    async def wait_for_slot(self, ticket: ResearchTicket) -> AsyncGenerator[Dict[str, Any], None]:
+        """
+        等待执行槽位
+
+        排队期间周期性产出 queued 事件；获得槽位后结束。
+        排队超时或被取消时抛出 SchedulerRejected。
+        """
+        deadline = ticket.enqueued_at + self.config.queue_timeout
+
+        while not ticket.granted.is_set():
+            if ticket.cancelled:
+                raise SchedulerRejected("研究任务已取消")
+
+            position = self.get_position(ticket)
+            yield {
+                "type": "queued",
+                "position": position,
+                "queue_length": len(self._waiting),
+                "estimated_wait_seconds": self.estimate_wait(position),
+                "content": f"当前排队第 {position} 位，请稍候..."
+            }
+
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                self._remove_waiting(ticket)
+                self._counters["timed_out"] += 1
+                raise SchedulerRejected("排队超时，请稍后再试", retry_after=self._retry_after())
+
+            try:
+                await asyncio.wait_for(
+                    ticket.granted.wait(),
+                    timeout=min(self.config.queue_heartbeat, remaining)
+                )
+            except asyncio.TimeoutError:
+                continue
+
+        if ticket.cancelled:
+            raise SchedulerRejected("研究任务已取消")
+
+        if ticket.started_at - ticket.enqueued_at > 0.5:
+            yield {
+                "type": "dequeued",
+                "waited_seconds": round(ticket.started_at - ticket.enqueued_at, 1),
+                "content": "排队结束，开始研究"
+            }
+
+    def release(self, ticket: ResearchTicket) -> None:
+        """任务结束（正常、异常或客户端断开）时释放槽位"""
+        if ticket.ticket_id in self._running:
+            ticket.finished_at = time.monotonic()
+            del self._running[ticket.ticket_id]
+            self._user_running[ticket.user_key] = max(0, self._user_running.get(ticket.user_key, 1) - 1)
+            self._counters["completed"] += 1
+
+            duration = ticket.finished_at - ticket.started_at
+            # 指数滑动平均更新预估耗时
+            self._avg_job_seconds = 0.8 * self._avg_job_seconds + 0.2 * duration
+        elif self._remove_waiting(ticket):
+            self._counters["cancelled"] += 1
+
+        self._dispatch()
+
+    def reap_stale(self) -> int:
+        """
+        回收泄漏的凭证：运行超过 max_run_seconds 的任务、超过排队超时仍未被取走的排队任务
+
+        正常情况下凭证由响应流的 finally 或回收回调释放，这里只兜底处理未释放的情况。
+        """
+        now = time.monotonic()
+        reaped = 0
+        for ticket in list(self._running.values()):
+            if now - ticket.started_at > self.config.max_run_seconds:
+                logger.warning(f"Reaping research ticket {ticket.ticket_id} of {ticket.user_key} after {now - ticket.started_at:.0f}s")
+                # 不计入完成数与平均耗时
+                ticket.finished_at = now
+                del self._running[ticket.ticket_id]
+                self._user_running[ticket.user_key] = max(0, self._user_running.get(ticket.user_key, 1) - 1)
+                reaped += 1
+        for ticket in list(self._waiting):
+            if now - ticket.enqueued_at > self.config.queue_timeout + self.config.queue_heartbeat:
+                ticket.cancelled = True
+                self._remove_waiting(ticket)
+                ticket.granted.set()
+                reaped += 1
+        if reaped:
+            self._counters["reaped"] += reaped
+            self._dispatch()
+        return reaped
+
+    def cancel_session(self, session_id: str) -> bool:
+        """取消某个会话的排队中任务（运行中的任务由取消标志处理）"""
+        for ticket in list(self._waiting):
+            if ticket.session_id == session_id:
+                ticket.cancelled = True
+                self._remove_waiting(ticket)
+                self._counters["cancelled"] += 1
+                ticket.granted.set()
+                return True
+        return False
+
+    # ==================== 调度 ====================
+
+    def _dispatch(self) -> None:
+        """按虚拟完成时间顺序授予空闲槽位"""
+        while len(self._running) < self.config.max_concurrent:
+            ticket = next(
+                (t for t in self._waiting
+                 if self._user_running.get(t.user_key, 0) < self.config.max_concurrent_per_user),
+                None
+            )
+            if ticket is None:
+                break
+
+            self._waiting.remove(ticket)
+            self._virtual_time = max(self._virtual_time, ticket.virtual_finish - 1.0 / ticket.weight)
+            ticket.started_at = time.monotonic()
+            self._running[ticket.ticket_id] = ticket
+            self._user_running[ticket.user_key] = self._user_running.get(ticket.user_key, 0) + 1
+            self._wait_samples.append(ticket.started_at - ticket.enqueued_at)
+            self._counters["started"] += 1
+            ticket.granted.set()
+
+        # 清理空闲用户的虚拟时间，避免字典无限增长
+        active_users = {t.user_key for t in self._waiting} | {t.user_key for t in self._running.values()}
+        for user_key in list(self._user_finish):
+            if user_key not in active_users and self._user_finish[user_key] <= self._virtual_time:
+                del self._user_finish[user_key]
+
+    def _remove_waiting(self, ticket: ResearchTicket) -> bool:
+        if ticket in self._waiting:
+            self._waiting.remove(ticket)
+            return True
+        return False
+
+    # ==================== 预估与指标 ====================
+
+    def get_position(self, ticket: ResearchTicket) -> int:
+        """排队位置（从 1 开始）"""
+        try:
+            return self._waiting.index(ticket) + 1
+        except ValueError:
+            return 0
+
+    def estimate_wait(self, position: int) -> int:
+        """按平均任务耗时和全局并发估算等待秒数"""
+        if position <= 0:
+            return 0
+        rounds = math.ceil(position / max(1, self.config.max_concurrent))
+        return int(rounds * self._avg_job_seconds)
+
+    def _retry_after(self) -> int:
+        return max(5, self.estimate_wait(len(self._waiting) + 1))
+
+    def get_stats(self) -> Dict[str, Any]:
+        """调度指标"""
+        self.reap_stale()
+        waits = sorted(self._wait_samples)
+        now = time.monotonic()
+
+        def percentile(p: float) -> float:
+            if not waits:
+                return 0.0
+            return round(waits[min(len(waits) - 1, int(len(waits) * p))], 2)
+
+        per_user: Dict[str, Dict[str, int]] = {}
+        for t in self._running.values():
+            per_user.setdefault(t.user_key, {"running": 0, "waiting": 0})["running"] += 1
+        for t in self._waiting:
+            per_user.setdefault(t.user_key, {"running": 0, "waiting": 0})["waiting"] += 1
+
+        return {
+            "running": len(self._running),
+            "waiting": len(self._waiting),
+            "max_concurrent": self.config.max_concurrent,
+            "max_concurrent_per_user": self.config.max_concurrent_per_user,
+            "max_queue_size": self.config.max_queue_size,
+            "avg_job_seconds": round(self._avg_job_seconds, 1),
+            "wait_seconds": {
+                "p50": percentile(0.5),
+                "p95": percentile(0.95),
+                "max": round(waits[-1], 2) if waits else 0.0,
+            },
+            "oldest_waiting_seconds": round(now - self._waiting[0].enqueued_at, 1) if self._waiting else 0.0,
+            "counters": dict(self._counters),
+            "users": per_user,
+        }
+
+
+# 单例
+_research_scheduler: Optional[ResearchScheduler] = None
+
+
+def get_research_scheduler() -> ResearchScheduler:
+    """获取研究任务调度器单例"""
+    global _research_scheduler
+    if _research_scheduler is None:
+        _research_scheduler = ResearchScheduler()
+    return _research_scheduler
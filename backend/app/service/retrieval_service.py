@@ -1,14 +1,15 @@
 
 """
-知识库检索服务 - 基于 Milvus
+知识库检索服务 - 基于向量存储（Milvus 或 embedded，见 service/vector_store.py）
 
 功能：
 1. retrieve_content - 从指定集合检索内容
 2. retrieve_from_knowledge_base - 从知识库检索内容
+3. retrieve_content_many / retrieve_from_knowledge_base_many - 多个问题一次向量化、一次检索
 """
 
 from typing import List, Dict, Any, Optional
-from service.milvus_service import get_milvus_service
+from service.vector_store import get_vector_store
 from service.embedding_service import generate_embedding
 
 
@@ -40,8 +41,8 @@ def retrieve_content(
         query_vector = query_vectors[0]
 
         # 2. 执行向量搜索
-        milvus = get_milvus_service()
-        results = milvus.search(
+        store = get_vector_store()
+        results = store.search(
             collection_name=indexNames,
             query_vector=query_vector,
             top_k=top_k,
@@ -49,18 +50,7 @@ def retrieve_content(
         )
 
         # 3. 格式化结果
-        extracted_data = []
-        for i, result in enumerate(results, start=1):
-            message = {
-                "id": i,
-                "document_id": result.get("doc_id", "N/A"),
-                "document_name": result.get("filename", "N/A"),
-                "content_with_weight": result.get("content", ""),
-                "score": result.get("score", 0),
-            }
-            extracted_data.append(message)
-
-        return extracted_data
+        return _format_results(results)
 
     except Exception as e:
         print(f"检索错误: {str(e)}")
@@ -69,6 +59,72 @@ def retrieve_content(
         return []
 
 
+def retrieve_content_many(
+    indexNames: str,
+    questions: List[str],
+    top_k: int = 5,
+    kb_id: Optional[str] = None,
+) -> List[List[Dict[str, Any]]]:
+    """
+    批量检索：所有问题一次向量化、一次向量检索
+
+    Args:
+        indexNames: 集合名称（知识库索引）
+        questions: 查询问题列表
+        top_k: 每个问题返回的结果数量
+        kb_id: 知识库ID（可选过滤）
+
+    Returns:
+        与 questions 一一对应的检索结果列表
+    """
+    if not questions:
+        return []
+    try:
+        # 1. 批量生成查询向量
+        query_vectors = generate_embedding(questions)
+        if not query_vectors or len(query_vectors) != len(questions):
+            print("生成查询向量失败")
+            return [[] for _ in questions]
+
+        # 2. 批量向量搜索
+        store = get_vector_store()
+        results = store.search_many(
+            collection_name=indexNames,
+            query_vectors=query_vectors,
+            top_k=top_k,
+            kb_id=kb_id,
+        )
+
+        # 3. 格式化结果
+        return [_format_results(hits) for hits in results]
+
+    except Exception as e:
+        print(f"批量检索错误: {str(e)}")
+        import traceback
+        traceback.print_exc()
+        return [[] for _ in questions]
+
+
+def _format_results(results: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """向量检索结果 -> 统一的检索结果格式"""
+    extracted_data = []
+    for i, result in enumerate(results, start=1):
+        message = {
+            "id": i,
+            "document_id": result.get("doc_id", "N/A"),
+            "document_name": result.get("filename", "N/A"),
+            "content_with_weight": result.get("content", ""),
+            "score": result.get("score", 0),
+        }
+        extracted_data.append(message)
+    return extracted_data
+
+
+def _kb_collection_name(kb_name: str) -> str:
+    """将知识库名称转换为集合名称"""
+    return f"kb_{kb_name}".lower().replace(" ", "_")
+
+
 def retrieve_from_knowledge_base(
     kb_name: str,
     question: str,
@@ -85,6 +141,23 @@ def retrieve_from_knowledge_base(
     Returns:
         检索结果列表
     """
-    # 将知识库名称转换为集合名称
-    collection_name = f"kb_{kb_name}".lower().replace(" ", "_")
-    return retrieve_content(collection_name, question, top_k)
+    return retrieve_content(_kb_collection_name(kb_name), question, top_k)
+
+
+def retrieve_from_knowledge_base_many(
+    kb_name: str,
+    questions: List[str],
+    top_k: int = 5,
+) -> List[List[Dict[str, Any]]]:
+    """
+    从知识库批量检索内容
+
+    Args:
+        kb_name: 知识库名称
+        questions: 查询问题列表
+        top_k: 每个问题返回的结果数量
+
+    Returns:
+        与 questions 一一对应的检索结果列表
+    """
+    return retrieve_content_many(_kb_collection_name(kb_name), questions, top_k)
@@ -0,0 +1,322 @@
+"""
+搜索结果缓存
+
+两级缓存，所有搜索调用方（DeepScout、ResearchService、ToolExecutor）共享：
+1. 进程内有界 LRU - 命中无网络开销
+2. Redis - 跨请求、跨 uvicorn worker 共享
+
+缓存键由 归一化查询 + 提供方 + 条数 + 时效参数 组成。
+TTL 随查询类型变化（实时行情 / 新闻动态 / 常青知识），过期后在容忍窗口内
+先返回旧结果并在后台刷新（stale-while-revalidate）。
+"""
+
+import re
+import time
+import json
+import asyncio
+import hashlib
+import logging
+import threading
+import unicodedata
+from collections import OrderedDict
+from datetime import datetime
+from typing import Dict, Any, List, Optional, Tuple
+
+try:
+    from core.redis_client import cache
+    REDIS_AVAILABLE = True
+except ImportError:
+    try:
+        from app.core.redis_client import cache
+        REDIS_AVAILABLE = True
+    except ImportError:
+        cache = None
+        REDIS_AVAILABLE = False
+
+try:
+    from config.llm_config import get_config
+except ImportError:
+    from app.config.llm_config import get_config
+
+from .search_provider import SearchProvider, get_search_provider
+
+logger = logging.getLogger("SearchCache")
+
+CACHE_KEY_PREFIX = "search:v1:"
+
+# 查询类型 -> (新鲜期秒数, 过期后仍可返回旧结果的秒数)
+TTL_POLICY: Dict[str, Tuple[int, int]] = {
+    "realtime": (5 * 60, 30 * 60),
+    "news": (60 * 60, 6 * 3600),
+    "evergreen": (24 * 3600, 7 * 24 * 3600),
+}
+
+_REALTIME_PATTERN = re.compile(r"实时|股价|行情|今日|今天|刚刚|盘中|汇率|realtime|stock price", re.IGNORECASE)
+_NEWS_PATTERN = re.compile(
+    r"最新|新闻|动态|快讯|近期|最近|本周|本月|发布会|公告|通知|热点|latest|news|recent|this week",
+    re.IGNORECASE
+)
+_YEAR_PATTERN = re.compile(r"(20\d{2})\s*年?")
+
+
+def normalize_query(query: str) -> str:
+    """归一化查询：全角转半角、小写、合并空白"""
+    query = unicodedata.normalize("NFKC", query or "")
+    return " ".join(query.lower().split())
+
+
+def classify_query(query: str, freshness: str = "noLimit") -> str:
+    """判断查询的时效类型"""
+    if freshness and freshness != "noLimit":
+        return "news"
+    if _REALTIME_PATTERN.search(query):
+        return "realtime"
+    if _NEWS_PATTERN.search(query):
+        return "news"
+    # 涉及当年及以后的查询，结果变化较快
+    current_year = datetime.now().year
+    if any(int(y) >= current_year for y in _YEAR_PATTERN.findall(query)):
+        return "news"
+    return "evergreen"
+
+
+class SearchCache:
+    """两级搜索结果缓存"""
+
+    def __init__(self, max_entries: int = 2048, use_redis: bool = True):
+        self.max_entries = max_entries
+        self.use_redis = use_redis and REDIS_AVAILABLE
+        self._local: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._refreshing: set = set()
+        # 持有后台刷新任务的引用，避免任务被垃圾回收
+        self._refresh_tasks: set = set()
+        self.stats = {
+            "local_hits": 0,
+            "redis_hits": 0,
+            "misses": 0,
+            "stale_served": 0,
+            "refreshes": 0,
+            "stores": 0,
+        }
+
+    # ---------- 键与策略 ----------
+
+    @staticmethod
+    def make_key(provider_name: str, query: str, count: int, freshness: str) -> str:
+        raw = json.dumps([provider_name, normalize_query(query), count, freshness], ensure_ascii=False)
+        return CACHE_KEY_PREFIX + hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+    # ---------- 读写 ----------
+    # Redis 客户端是同步的：异步路径通过 asyncio.to_thread 访问，避免阻塞事件循环
+
+    def _count(self, name: str) -> None:
+        with self._lock:
+            self.stats[name] += 1
+
+    def _lookup_local(self, key: str) -> Optional[Dict[str, Any]]:
+        """进程内缓存查找，已超出容忍窗口的条目直接淘汰（不计为命中）"""
+        with self._lock:
+            entry = self._local.get(key)
+            if entry is None:
+                return None
+            if self._age_state(entry) == "expired":
+                del self._local[key]
+                return None
+            self._local.move_to_end(key)
+            self.stats["local_hits"] += 1
+            return entry
+
+    def _accept_redis(self, key: str, entry: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+        if not entry or self._age_state(entry) == "expired":
+            return None
+        self._count("redis_hits")
+        self._store_local(key, entry)
+        return entry
+
+    def _lookup(self, key: str) -> Optional[Dict[str, Any]]:
+        entry = self._lookup_local(key)
+        if entry is None and self.use_redis:
+            entry = self._accept_redis(key, cache.get(key))
+        return entry
+
+    async def _lookup_async(self, key: str) -> Optional[Dict[str, Any]]:
+        entry = self._lookup_local(key)
+        if entry is None and self.use_redis:
+            entry = self._accept_redis(key, await asyncio.to_thread(cache.get, key))
+        return entry
+
+    def _store_local(self, key: str, entry: Dict[str, Any]) -> None:
+        with self._lock:
+            self._local[key] = entry
+            self._local.move_to_end(key)
+            while len(self._local) > self.max_entries:
+                self._local.popitem(last=False)
+
+    def _make_entry(self, query: str, freshness: str, results: List[Dict]) -> Optional[Dict[str, Any]]:
+        # 空结果多为上游错误，不缓存
+        if not results:
+            return None
+        kind = classify_query(query, freshness)
+        fresh_ttl, stale_ttl = TTL_POLICY[kind]
+        return {"results": results, "fetched_at": time.time(), "ttl": fresh_ttl, "stale_ttl": stale_ttl, "kind": kind}
+
+    def _store(self, key: str, query: str, freshness: str, results: List[Dict]) -> None:
+        entry = self._make_entry(query, freshness, results)
+        if entry is None:
+            return
+        self._store_local(key, entry)
+        if self.use_redis:
+            cache.set(key, entry, expire=entry["ttl"] + entry["stale_ttl"])
+        self._count("stores")
+
+    async def _store_async(self, key: str, query: str, freshness: str, results: List[Dict]) -> None:
+        entry = self._make_entry(query, freshness, results)
+        if entry is None:
+            return
+        self._store_local(key, entry)
+        if self.use_redis:
+            await asyncio.to_thread(cache.set, key, entry, entry["ttl"] + entry["stale_ttl"])
+        self._count("stores")
+
+    @staticmethod
+    def _age_state(entry: Dict[str, Any]) -> str:
+        age = time.time() - entry.get("fetched_at", 0)
+        if age < entry.get("ttl", 0):
+            return "fresh"
+        if age < entry.get("ttl", 0) + entry.get("stale_ttl", 0):
+            return "stale"
+        return "expired"
+
+    # ---------- 对外接口 ----------
+
+    async def get_or_fetch(
+        self,
+        provider: SearchProvider,
+        query: str,
+        count: int = 10,
+        freshness: str = "noLimit"
+    ) -> List[Dict]:
+        """异步：命中直接返回；过期但在容忍窗口内则返回旧结果并后台刷新"""
+        key = self.make_key(provider.name, query, count, freshness)
+        entry = await self._lookup_async(key)
+
+        if entry is not None:
+            if self._age_state(entry) == "stale":
+                self._count("stale_served")
+                self._schedule_refresh(key, provider, query, count, freshness)
+            return entry["results"]
+
+        self._count("misses")
+        results = await provider.search(query, count=count, freshness=freshness)
+        await self._store_async(key, query, freshness, results)
+        return results
+
+    def get_or_fetch_sync(
+        self,
+        provider: SearchProvider,
+        query: str,
+        count: int = 10,
+        freshness: str = "noLimit"
+    ) -> List[Dict]:
+        """同步版本，后台刷新在守护线程中进行"""
+        key = self.make_key(provider.name, query, count, freshness)
+        entry = self._lookup(key)
+
+        if entry is not None:
+            if self._age_state(entry) == "stale":
+                self._count("stale_served")
+                if self._claim_refresh(key):
+                    threading.Thread(
+                        target=self._refresh_sync, args=(key, provider, query, count, freshness), daemon=True
+                    ).start()
+            return entry["results"]
+
+        self._count("misses")
+        results = provider.search_sync(query, count=count, freshness=freshness)
+        self._store(key, query, freshness, results)
+        return results
+
+    # ---------- 后台刷新 ----------
+
+    def _claim_refresh(self, key: str) -> bool:
+        with self._lock:
+            if key in self._refreshing:
+                return False
+            self._refreshing.add(key)
+            return True
+
+    def _release_refresh(self, key: str) -> None:
+        with self._lock:
+            self._refreshing.discard(key)
+
+    def _schedule_refresh(self, key: str, provider: SearchProvider, query: str, count: int, freshness: str) -> None:
+        if not self._claim_refresh(key):
+            return
+
+        async def refresh():
+            try:
+                results = await provider.search(query, count=count, freshness=freshness)
+                await self._store_async(key, query, freshness, results)
+                self._count("refreshes")
+            except Exception as e:
+                logger.warning(f"Background refresh failed for '{query[:30]}': {e}")
+            finally:
+                self._release_refresh(key)
+
+        task = asyncio.create_task(refresh())
+        self._refresh_tasks.add(task)
+        task.add_done_callback(self._refresh_tasks.discard)
+
+    def _refresh_sync(self, key: str, provider: SearchProvider, query: str, count: int, freshness: str) -> None:
+        try:
+            results = provider.search_sync(query, count=count, freshness=freshness)
+            self._store(key, query, freshness, results)
+            self._count("refreshes")
+        except Exception as e:
+            logger.warning(f"Background refresh failed for '{query[:30]}': {e}")
+        finally:
+            self._release_refresh(key)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """缓存命中统计"""
+        hits = self.stats["local_hits"] + self.stats["redis_hits"]
+        total = hits + self.stats["misses"]
+        return {
+            **self.stats,
+            "local_entries": len(self._local),
+            "redis_enabled": self.use_redis,
+            "hit_rate": round(hits / total, 3) if total else 0.0,
+        }
+
+
+_search_cache: Optional[SearchCache] = None
+
+
+def get_search_cache() -> SearchCache:
+    """获取搜索缓存单例"""
+    global _search_cache
+    if _search_cache is None:
+        config = get_config().search
+        _search_cache = SearchCache(max_entries=config.cache_max_entries, use_redis=config.cache_redis)
+    return _search_cache
+
+
+async def cached_search(
+    query: str,
+    count: int = 10,
+    freshness: str = "noLimit",
+    provider: Optional[SearchProvider] = None
+) -> List[Dict]:
+    """带缓存的异步搜索（便捷函数）"""
+    return await get_search_cache().get_or_fetch(provider or get_search_provider(), query, count, freshness)
+
+
+def cached_search_sync(
+    query: str,
+    count: int = 10,
+    freshness: str = "noLimit",
+    provider: Optional[SearchProvider] = None
+) -> List[Dict]:
+    """带缓存的同步搜索（便捷函数）"""
+    return get_search_cache().get_or_fetch_sync(provider or get_search_provider(), query, count, freshness)
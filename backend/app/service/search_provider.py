@@ -0,0 +1,372 @@
+"""
+网络搜索服务提供方
+
+统一封装 Bocha Web Search 调用，供 DeepScout、ResearchService(dr_g)、ToolExecutor、
+NewsCollectionService 共用：
+1. 连接复用 - 进程级共享的 httpx 连接池（keep-alive，可选 HTTP/2），避免每次查询重新握手
+2. 结果归一化 - 统一字段：url / title / summary / snippet / site_name / site_icon / date / source
+3. 超时与限流 - 每个提供方独立的超时与令牌桶限流，429/5xx 自动退避重试一次
+4. 原生异步 - 异步调用不再经过线程池；同步调用使用共享的同步连接池
+5. 请求合并 - 相同的并发查询只向上游发起一次（single-flight）
+
+使用方式：
+```python
+from service.search_provider import get_search_provider
+
+provider = get_search_provider()
+results = await provider.search("新能源汽车 市场规模", count=10)
+```
+"""
+
+import time
+import random
+import asyncio
+import logging
+import threading
+from abc import ABC, abstractmethod
+from typing import Dict, Any, List, Optional
+
+import httpx
+
+try:
+    import h2  # noqa: F401
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+try:
+    from config.llm_config import get_config, SearchConfig
+except ImportError:
+    from app.config.llm_config import get_config, SearchConfig
+
+from .singleflight import SingleFlight, ThreadSingleFlight, make_flight_key
+
+logger = logging.getLogger("SearchProvider")
+
+
+class TokenBucket:
+    """令牌桶限流器（线程安全，同时支持异步与同步等待）"""
+
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.capacity = max(1, burst)
+        self._tokens = float(self.capacity)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _reserve(self) -> float:
+        """预留一个令牌，返回需要等待的秒数"""
+        if self.rate <= 0:
+            return 0.0
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= 1
+            if self._tokens >= 0:
+                return 0.0
+            return -self._tokens / self.rate
+
+    async def acquire(self) -> None:
+        wait = self._reserve()
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+    def acquire_sync(self) -> None:
+        wait = self._reserve()
+        if wait > 0:
+            time.sleep(wait)
+
+
+class SearchProvider(ABC):
+    """
+    搜索提供方基类
+
+    子类实现 _search_once / _search_sync_once（单次查询），基类负责请求合并与统计。
+    """
+
+    name = "base"
+
+    def __init__(self, timeout: float = 20.0, rate_limit: float = 10.0, rate_burst: int = 20):
+        self.timeout = timeout
+        self.limiter = TokenBucket(rate_limit, rate_burst)
+        self.stats = {"requests": 0, "errors": 0, "retries": 0, "total_ms": 0.0}
+        self._flight = SingleFlight(f"search:{self.name}")
+        self._thread_flight = ThreadSingleFlight(f"search_sync:{self.name}")
+
+    async def search(self, query: str, count: int = 10, freshness: str = "noLimit") -> List[Dict[str, Any]]:
+        """异步搜索，失败时返回空列表；相同的并发查询共享一次上游调用"""
+        if not query or not query.strip():
+            return []
+        key = make_flight_key(query.strip(), count, freshness)
+        return await self._flight.do(key, lambda: self._search_once(query, count, freshness))
+
+    def search_sync(self, query: str, count: int = 10, freshness: str = "noLimit") -> List[Dict[str, Any]]:
+        """同步搜索（供同步代码路径使用），失败时返回空列表；相同的并发查询共享一次上游调用"""
+        if not query or not query.strip():
+            return []
+        key = make_flight_key(query.strip(), count, freshness)
+        return self._thread_flight.do(key, lambda: self._search_sync_once(query, count, freshness))
+
+    @abstractmethod
+    async def _search_once(self, query: str, count: int, freshness: str) -> List[Dict[str, Any]]:
+        """执行一次异步查询，失败时返回空列表"""
+
+    @abstractmethod
+    def _search_sync_once(self, query: str, count: int, freshness: str) -> List[Dict[str, Any]]:
+        """执行一次同步查询，失败时返回空列表"""
+
+    async def aclose(self) -> None:
+        pass
+
+    def get_stats(self) -> Dict[str, Any]:
+        requests_count = self.stats["requests"]
+        return {
+            "provider": self.name,
+            **self.stats,
+            "avg_ms": round(self.stats["total_ms"] / requests_count, 1) if requests_count else 0.0,
+            "coalesced": self._flight.stats["shared"] + self._thread_flight.stats["shared"],
+        }
+
+
+class HttpSearchProvider(SearchProvider):
+    """
+    HTTP 搜索接口基类
+
+    子类实现 _request / _request_sync 和 _parse，基类负责限流、429/5xx 退避重试与耗时统计。
+    """
+
+    RETRY_STATUS = {429, 500, 502, 503, 504}
+
+    async def _search_once(self, query: str, count: int, freshness: str) -> List[Dict[str, Any]]:
+        start = time.monotonic()
+        for attempt in range(2):
+            await self.limiter.acquire()
+            try:
+                response = await self._request(query, count, freshness)
+                if response.status_code in self.RETRY_STATUS and attempt == 0:
+                    self.stats["retries"] += 1
+                    await asyncio.sleep(0.5 + random.random())
+                    continue
+                return self._finish(query, response, start)
+            except httpx.TimeoutException:
+                logger.error(f"[{self.name}] search timeout for: {query[:30]}...")
+                break
+            except Exception as e:
+                logger.error(f"[{self.name}] search error for '{query}': {e}")
+                break
+
+        self.stats["errors"] += 1
+        return []
+
+    def _search_sync_once(self, query: str, count: int, freshness: str) -> List[Dict[str, Any]]:
+        start = time.monotonic()
+        for attempt in range(2):
+            self.limiter.acquire_sync()
+            try:
+                response = self._request_sync(query, count, freshness)
+                if response.status_code in self.RETRY_STATUS and attempt == 0:
+                    self.stats["retries"] += 1
+                    time.sleep(0.5 + random.random())
+                    continue
+                return self._finish(query, response, start)
+            except httpx.TimeoutException:
+                logger.error(f"[{self.name}] search timeout for: {query[:30]}...")
+                break
+            except Exception as e:
+                logger.error(f"[{self.name}] search error for '{query}': {e}")
+                break
+
+        self.stats["errors"] += 1
+        return []
+
+    def _finish(self, query: str, response: httpx.Response, start: float) -> List[Dict[str, Any]]:
+        self.stats["requests"] += 1
+        self.stats["total_ms"] += (time.monotonic() - start) * 1000
+
+        if response.status_code != 200:
+            self.stats["errors"] += 1
+            logger.error(f"[{self.name}] API error: {response.status_code} - {response.text[:200]}")
+            return []
+
+        results = self._parse(response.json())
+        logger.info(f"[{self.name}] search returned {len(results)} results for: {query[:30]}...")
+        return results
+
+    @abstractmethod
+    async def _request(self, query: str, count: int, freshness: str) -> httpx.Response:
+        """发起一次异步 HTTP 请求"""
+
+    @abstractmethod
+    def _request_sync(self, query: str, count: int, freshness: str) -> httpx.Response:
+        """发起一次同步 HTTP 请求"""
+
+    @abstractmethod
+    def _parse(self, data: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """响应 JSON -> 归一化结果列表"""
+
+
+class BochaSearchProvider(HttpSearchProvider):
+    """Bocha Web Search"""
+
+    name = "bocha"
+
+    def __init__(self, api_key: str, config: Optional[SearchConfig] = None):
+        config = config or get_config().search
+        super().__init__(timeout=config.timeout, rate_limit=config.rate_limit, rate_burst=config.rate_burst)
+        self.api_url = config.bocha_api_url
+        self.http2 = config.http2 and HTTP2_AVAILABLE
+        self.limits = httpx.Limits(
+            max_connections=config.max_connections,
+            max_keepalive_connections=config.max_connections,
+            keepalive_expiry=60
+        )
+        # 兼容带或不带 "Bearer " 前缀的密钥
+        self.headers = {
+            "Authorization": api_key if api_key.startswith("Bearer ") else f"Bearer {api_key}",
+            "Content-Type": "application/json"
+        }
+
+        # 异步客户端与事件循环绑定，事件循环变化时重建
+        self._client: Optional[httpx.AsyncClient] = None
+        self._client_loop: Optional[asyncio.AbstractEventLoop] = None
+        self._sync_client: Optional[httpx.Client] = None
+        self._sync_lock = threading.Lock()
+
+    def _get_client(self) -> httpx.AsyncClient:
+        loop = asyncio.get_running_loop()
+        if self._client is None or self._client_loop is not loop or self._client.is_closed:
+            self._client = httpx.AsyncClient(
+                http2=self.http2,
+                limits=self.limits,
+                timeout=httpx.Timeout(self.timeout, connect=5.0),
+                headers=self.headers
+            )
+            self._client_loop = loop
+        return self._client
+
+    def _get_sync_client(self) -> httpx.Client:
+        with self._sync_lock:
+            if self._sync_client is None:
+                self._sync_client = httpx.Client(
+                    http2=self.http2,
+                    limits=self.limits,
+                    timeout=httpx.Timeout(self.timeout, connect=5.0),
+                    headers=self.headers
+                )
+            return self._sync_client
+
+    def _payload(self, query: str, count: int, freshness: str) -> Dict[str, Any]:
+        return {
+            "query": query,
+            "summary": True,
+            "count": count,
+            "freshness": freshness,
+            "page": 1
+        }
+
+    async def _request(self, query: str, count: int, freshness: str) -> httpx.Response:
+        return await self._get_client().post(self.api_url, json=self._payload(query, count, freshness))
+
+    def _request_sync(self, query: str, count: int, freshness: str) -> httpx.Response:
+        return self._get_sync_client().post(self.api_url, json=self._payload(query, count, freshness))
+
+    def _parse(self, data: Dict[str, Any]) -> List[Dict[str, Any]]:
+        if data.get("code") not in (None, 200):
+            logger.error(f"[bocha] API returned error: {data.get('msg', 'Unknown error')}")
+            return []
+
+        value_list = (data.get("data") or {}).get("webPages", {}).get("value", [])
+        if not isinstance(value_list, list):
+            return []
+
+        results = []
+        for item in value_list:
+            if item.get("url") and (item.get("snippet") or item.get("summary")):
+                results.append({
+                    "url": item.get("url"),
+                    "title": item.get("name", "N/A"),
+                    "summary": item.get("summary", "") or item.get("snippet", ""),
+                    "snippet": item.get("snippet", ""),
+                    "site_name": item.get("siteName", "N/A"),
+                    "site_icon": item.get("siteIcon", ""),
+                    "date": item.get("datePublished", "") or item.get("dateLastCrawled", ""),
+                    "source": "web"
+                })
+        return results
+
+    async def aclose(self) -> None:
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+        with self._sync_lock:
+            if self._sync_client is not None:
+                self._sync_client.close()
+                self._sync_client = None
+
+
+def to_bocha_format(result: Dict[str, Any]) -> Dict[str, Any]:
+    """将归一化结果转换为 Bocha 原始字段格式（name / siteName / siteIcon / datePublished）"""
+    return {
+        "url": result.get("url", ""),
+        "name": result.get("title", "N/A"),
+        "summary": result.get("summary", ""),
+        "snippet": result.get("snippet", ""),
+        "siteName": result.get("site_name", "N/A"),
+        "siteIcon": result.get("site_icon", ""),
+        "datePublished": result.get("date", ""),
+        "source": result.get("source", "web"),
+    }
+
+
+# 每个 (提供方, 密钥) 一个实例，进程内共享连接池
+_providers: Dict[tuple, SearchProvider] = {}
+_providers_lock = threading.Lock()
+
+
+def get_search_provider(api_key: Optional[str] = None, name: Optional[str] = None) -> SearchProvider:
+    """
+    获取共享的搜索提供方实例
+
+    未指定 name 时使用配置的提供方，并按 SEARCH_LOCAL_MODE 组合本地检索（first / blend）；
+    显式指定 name（如资讯采集必须走网络时传 "bocha"）则返回该提供方本身。
+    """
+    config = get_config()
+    local_mode = config.search.local_mode if name is None else "off"
+    name = name or config.search.provider
+    api_key = api_key or config.search_api_key
+
+    key = (name, api_key, local_mode)
+    with _providers_lock:
+        provider = _providers.get(key)
+        if provider is None:
+            provider = _create_provider(name, api_key or "", local_mode, config.search)
+            _providers[key] = provider
+        return provider
+
+
+def _create_provider(name: str, api_key: str, local_mode: str, config: SearchConfig) -> SearchProvider:
+    from .local_search_index import LocalSearchProvider, HybridSearchProvider
+
+    if name == "local":
+        return LocalSearchProvider()
+    if name != "bocha":
+        logger.warning(f"Unknown search provider '{name}', falling back to bocha")
+    provider = BochaSearchProvider(api_key)
+    if local_mode in ("first", "blend"):
+        provider = HybridSearchProvider(LocalSearchProvider(), provider, mode=local_mode, min_results=config.local_min_results)
+    elif local_mode != "off":
+        logger.warning(f"Unknown SEARCH_LOCAL_MODE '{local_mode}', local search disabled")
+    return provider
+
+
+async def close_search_providers() -> None:
+    """关闭所有提供方的连接池（应用退出时调用）"""
+    with _providers_lock:
+        providers = list(_providers.values())
+        _providers.clear()
+    for provider in providers:
+        try:
+            await provider.aclose()
+        except Exception as e:
+            logger.warning(f"Failed to close search provider: {e}")
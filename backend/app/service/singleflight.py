@@ -0,0 +1,135 @@
+"""
+Single-flight 请求合并
+
+同一时刻对同一资源的多个相同请求（同一搜索查询、同一段文本的向量化、同一向量检索）
+只向上游发起一次调用，其余调用方等待并共享该结果。调用结束后立即释放，不做缓存
+（缓存由 search_cache 等模块负责）。
+
+提供两种实现：
+- SingleFlight       - 异步版本，用于协程（搜索提供方）
+- ThreadSingleFlight - 线程版本，用于同步函数（MilvusService.search、search_sync，
+                       通常经由 asyncio.to_thread 在线程池中并发调用）
+
+使用方式：
+```python
+_flight = SingleFlight("search")
+
+async def search(query):
+    return await _flight.do(query, lambda: _search_upstream(query))
+```
+"""
+
+import asyncio
+import hashlib
+import logging
+import threading
+from typing import Any, Awaitable, Callable, Dict, Hashable, Tuple
+
+logger = logging.getLogger("SingleFlight")
+
+
+def make_flight_key(*parts: Any) -> str:
+    """由任意可 repr 的参数生成合并键"""
+    raw = "\x1f".join(repr(p) for p in parts)
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+
+class SingleFlight:
+    """异步 single-flight：同一事件循环内相同 key 的并发调用共享一次执行"""
+
+    def __init__(self, name: str = "default"):
+        self.name = name
+        # (事件循环 id, key) -> 正在执行的任务
+        self._inflight: Dict[Tuple[int, Hashable], asyncio.Task] = {}
+        self.stats = {"calls": 0, "executions": 0, "shared": 0}
+
+    async def do(self, key: Hashable, factory: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        执行或加入一次调用
+
+        Args:
+            key: 合并键
+            factory: 无参函数，返回真正执行上游调用的协程
+
+        Returns:
+            上游调用结果（所有等待方共享同一对象）
+        """
+        self.stats["calls"] += 1
+        flight_key = (id(asyncio.get_running_loop()), key)
+
+        task = self._inflight.get(flight_key)
+        if task is not None:
+            self.stats["shared"] += 1
+            # shield：某个等待方被取消时不影响其他等待方
+            return await asyncio.shield(task)
+
+        self.stats["executions"] += 1
+        task = asyncio.ensure_future(factory())
+        self._inflight[flight_key] = task
+        task.add_done_callback(lambda _: self._inflight.pop(flight_key, None))
+        return await asyncio.shield(task)
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {"name": self.name, **self.stats, "inflight": len(self._inflight)}
+
+
+class _Call:
+    __slots__ = ("event", "result", "error")
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class ThreadSingleFlight:
+    """线程 single-flight：多个线程中相同 key 的并发调用共享一次执行"""
+
+    def __init__(self, name: str = "default"):
+        self.name = name
+        self._lock = threading.Lock()
+        self._inflight: Dict[Hashable, _Call] = {}
+        self.stats = {"calls": 0, "executions": 0, "shared": 0}
+
+    def do(self, key: Hashable, fn: Callable[[], Any]) -> Any:
+        """
+        执行或加入一次调用
+
+        Args:
+            key: 合并键
+            fn: 无参函数，执行真正的上游调用
+
+        Returns:
+            上游调用结果；上游抛出的异常会传递给所有等待方
+        """
+        with self._lock:
+            self.stats["calls"] += 1
+            call = self._inflight.get(key)
+            if call is not None:
+                self.stats["shared"] += 1
+                leader = False
+            else:
+                self.stats["executions"] += 1
+                call = _Call()
+                self._inflight[key] = call
+                leader = True
+
+        if not leader:
+            call.event.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn()
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+            call.event.set()
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {"name": self.name, **self.stats, "inflight": len(self._inflight)}
@@ -0,0 +1,269 @@
+"""
+信源可信度索引
+
+搜索结果的来源类型与可信度原先由 LLM 在分析每批结果时逐条判断，这里改为本地预先评定：
+1. 域名后缀树 - 按主机名标签从右向左匹配，取最长匹配（mp.weixin.qq.com 优先于 qq.com）
+2. 内置信源表 - 政府（gov.cn）、高校与科研院所（edu.cn / ac.cn）、交易所与信息披露平台、
+   央媒与财经媒体、门户网站、自媒体平台
+3. 可扩展 - SOURCE_CREDIBILITY_FILE 指向的 JSON 文件可新增或覆盖条目
+4. 提前过滤 - 低于 MIN_SOURCE_CREDIBILITY 的结果在调用 LLM 之前丢弃
+
+使用方式：
+```python
+from service.source_credibility import get_source_credibility
+
+credibility = get_source_credibility()
+profile = credibility.lookup("https://www.stats.gov.cn/sj/zxfb/202401/t20240117.html")
+# profile.name == "国家统计局", profile.source_type == "official", profile.credibility == 1.0
+```
+"""
+
+import json
+import logging
+import threading
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import urlparse
+
+try:
+    from config.llm_config import get_config
+except ImportError:
+    from app.config.llm_config import get_config
+
+logger = logging.getLogger("SourceCredibility")
+
+SOURCE_TYPE_LABELS = {
+    "official": "官方",
+    "academic": "学术",
+    "report": "行业报告",
+    "news": "新闻",
+    "self_media": "自媒体",
+}
+
+
+@dataclass(frozen=True)
+class SourceProfile:
+    """信源画像"""
+    name: str
+    source_type: str = "news"
+    credibility: float = 0.5
+    known: bool = True
+
+    @property
+    def label(self) -> str:
+        return SOURCE_TYPE_LABELS.get(self.source_type, self.source_type)
+
+
+# 域名后缀 -> (名称, 类型, 可信度)
+DEFAULT_SOURCES: Dict[str, Tuple[str, str, float]] = {
+    # 政府与监管机构
+    "gov.cn": ("政府网站", "official", 0.95),
+    "gov": ("政府网站", "official", 0.95),
+    "stats.gov.cn": ("国家统计局", "official", 1.0),
+    "mot.gov.cn": ("交通运输部", "official", 0.95),
+    "ndrc.gov.cn": ("国家发改委", "official", 0.95),
+    "miit.gov.cn": ("工信部", "official", 0.95),
+    "mem.gov.cn": ("应急管理部", "official", 0.95),
+    "pbc.gov.cn": ("中国人民银行", "official", 0.95),
+    "csrc.gov.cn": ("证监会", "official", 0.95),
+    "nfra.gov.cn": ("金融监管总局", "official", 0.95),
+    "cbirc.gov.cn": ("银保监会", "official", 0.95),
+    # 交易所与信息披露
+    "sse.com.cn": ("上海证券交易所", "official", 0.95),
+    "szse.cn": ("深圳证券交易所", "official", 0.95),
+    "bse.cn": ("北京证券交易所", "official", 0.95),
+    "hkex.com.hk": ("香港交易所", "official", 0.95),
+    "cninfo.com.cn": ("巨潮资讯", "official", 0.9),
+    # 国际组织
+    "worldbank.org": ("世界银行", "official", 0.9),
+    "imf.org": ("国际货币基金组织", "official", 0.9),
+    "oecd.org": ("经合组织", "official", 0.9),
+    # 学术与科研
+    "edu.cn": ("高校", "academic", 0.85),
+    "edu": ("高校", "academic", 0.85),
+    "ac.cn": ("科研院所", "academic", 0.85),
+    "cnki.net": ("中国知网", "academic", 0.85),
+    "wanfangdata.com.cn": ("万方数据", "academic", 0.85),
+    "drc.gov.cn": ("国务院发展研究中心", "academic", 0.9),
+    # 央媒与权威财经媒体
+    "xinhuanet.com": ("新华网", "news", 0.85),
+    "news.cn": ("新华网", "news", 0.85),
+    "people.com.cn": ("人民网", "news", 0.85),
+    "cctv.com": ("央视网", "news", 0.85),
+    "chinadaily.com.cn": ("中国日报", "news", 0.8),
+    "gmw.cn": ("光明网", "news", 0.8),
+    "ce.cn": ("中国经济网", "news", 0.8),
+    "chinanews.com.cn": ("中国新闻网", "news", 0.8),
+    "caixin.com": ("财新", "news", 0.8),
+    "yicai.com": ("第一财经", "news", 0.75),
+    "21jingji.com": ("21世纪经济报道", "news", 0.75),
+    "stcn.com": ("证券时报", "news", 0.75),
+    "cs.com.cn": ("中国证券报", "news", 0.75),
+    "cnstock.com": ("上海证券报", "news", 0.75),
+    "thepaper.cn": ("澎湃新闻", "news", 0.75),
+    "jiemian.com": ("界面新闻", "news", 0.7),
+    # 行业报告与数据
+    "iresearch.cn": ("艾瑞咨询", "report", 0.75),
+    "199it.com": ("199IT", "report", 0.6),
+    "eastmoney.com": ("东方财富", "news", 0.6),
+    # 门户网站
+    "163.com": ("网易", "news", 0.55),
+    "sohu.com": ("搜狐", "news", 0.55),
+    "sina.com": ("新浪", "news", 0.55),
+    "sina.com.cn": ("新浪", "news", 0.55),
+    "qq.com": ("腾讯", "news", 0.55),
+    "baidu.com": ("百度", "news", 0.5),
+    # 自媒体与社区
+    "mp.weixin.qq.com": ("微信公众号", "self_media", 0.35),
+    "baijiahao.baidu.com": ("百家号", "self_media", 0.35),
+    "toutiao.com": ("今日头条", "self_media", 0.35),
+    "zhihu.com": ("知乎", "self_media", 0.4),
+    "xueqiu.com": ("雪球", "self_media", 0.4),
+    "weibo.com": ("微博", "self_media", 0.3),
+    "bilibili.com": ("哔哩哔哩", "self_media", 0.3),
+    "csdn.net": ("CSDN", "self_media", 0.4),
+}
+
+# 非网页来源（按 URL scheme）
+SCHEME_SOURCES: Dict[str, Tuple[str, str, float]] = {
+    "local": ("本地知识库", "report", 0.8),
+    "bidding": ("招投标公告", "official", 0.85),
+}
+
+# 二级域名为以下标签时，注册域名取三级（如 example.com.cn）
+_SECOND_LEVEL_LABELS = {"com", "net", "org", "gov", "edu", "ac"}
+
+
+class SourceCredibilityIndex:
+    """域名后缀树"""
+
+    def __init__(
+        self,
+        sources: Optional[Dict[str, Tuple[str, str, float]]] = None,
+        default_type: str = "news",
+        default_credibility: float = 0.5
+    ):
+        self._root: Dict[str, Any] = {}
+        self.default_type = default_type
+        self.default_credibility = default_credibility
+        self._lock = threading.Lock()
+        for suffix, (name, source_type, credibility) in (sources if sources is not None else DEFAULT_SOURCES).items():
+            self.add(suffix, name, source_type, credibility)
+
+    def __len__(self) -> int:
+        count, stack = 0, [self._root]
+        while stack:
+            node = stack.pop()
+            for label, child in node.items():
+                if label is None:
+                    count += 1
+                else:
+                    stack.append(child)
+        return count
+
+    def add(self, suffix: str, name: str, source_type: str = "news", credibility: float = 0.5) -> None:
+        """新增或覆盖域名后缀条目"""
+        labels = suffix.lower().strip(".").split(".")
+        profile = SourceProfile(name=name, source_type=source_type, credibility=max(0.0, min(1.0, float(credibility))))
+        with self._lock:
+            node = self._root
+            for label in reversed(labels):
+                node = node.setdefault(label, {})
+            node[None] = profile
+
+    def load_file(self, path: str) -> int:
+        """
+        从 JSON 文件加载条目，格式：
+        {"example.com": {"name": "示例", "type": "report", "credibility": 0.8}}
+        """
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        for suffix, item in data.items():
+            self.add(suffix, item.get("name", suffix), item.get("type", self.default_type), item.get("credibility", self.default_credibility))
+        return len(data)
+
+    @staticmethod
+    def _hostname(url_or_host: str) -> str:
+        if "://" in url_or_host:
+            return (urlparse(url_or_host).hostname or "").lower()
+        return url_or_host.split("/")[0].split(":")[0].lower()
+
+    @staticmethod
+    def registered_domain(host: str) -> str:
+        """注册域名（example.com / example.com.cn）"""
+        labels = host.split(".")
+        if len(labels) >= 3 and labels[-2] in _SECOND_LEVEL_LABELS:
+            return ".".join(labels[-3:])
+        return ".".join(labels[-2:])
+
+    def find(self, url_or_host: str) -> Optional[SourceProfile]:
+        """最长后缀匹配，未收录时返回 None"""
+        if not url_or_host:
+            return None
+        scheme = url_or_host.split("://", 1)[0].lower() if "://" in url_or_host else ""
+        if scheme in SCHEME_SOURCES:
+            name, source_type, credibility = SCHEME_SOURCES[scheme]
+            return SourceProfile(name, source_type, credibility)
+
+        host = self._hostname(url_or_host)
+        node, match = self._root, None
+        for label in reversed(host.split(".")):
+            node = node.get(label)
+            if node is None:
+                break
+            match = node.get(None, match)
+        return match
+
+    def lookup(self, url_or_host: str) -> SourceProfile:
+        """查询信源画像，未收录的域名返回默认画像（名称为注册域名）"""
+        profile = self.find(url_or_host)
+        if profile is not None:
+            return profile
+        host = self._hostname(url_or_host or "")
+        return SourceProfile(
+            name=self.registered_domain(host) if host else "未知来源",
+            source_type=self.default_type,
+            credibility=self.default_credibility,
+            known=False
+        )
+
+    def annotate(self, results: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """返回带 source_type / credibility / source_label 的结果副本（搜索结果可能来自共享缓存，不原地修改）"""
+        annotated = []
+        for result in results:
+            profile = self.lookup(result.get("url", ""))
+            item = {**result, "source_type": profile.source_type, "credibility": profile.credibility, "source_label": profile.label}
+            if not item.get("site_name") or item.get("site_name") == "N/A":
+                item["site_name"] = profile.name
+            annotated.append(item)
+        return annotated
+
+    def filter(self, results: List[Dict[str, Any]], min_credibility: float, keep_at_least: int = 2) -> List[Dict[str, Any]]:
+        """丢弃可信度低于阈值的结果；全部低于阈值时保留可信度最高的 keep_at_least 条"""
+        if min_credibility <= 0 or not results:
+            return results
+        kept = [r for r in results if r.get("credibility", self.lookup(r.get("url", "")).credibility) >= min_credibility]
+        if kept:
+            return kept
+        ranked = sorted(results, key=lambda r: -r.get("credibility", 0.0))
+        return ranked[:keep_at_least]
+
+
+_source_credibility: Optional[SourceCredibilityIndex] = None
+_source_credibility_lock = threading.Lock()
+
+
+def get_source_credibility() -> SourceCredibilityIndex:
+    """获取信源可信度索引单例（内置信源表 + SOURCE_CREDIBILITY_FILE）"""
+    global _source_credibility
+    with _source_credibility_lock:
+        if _source_credibility is None:
+            index = SourceCredibilityIndex()
+            path = get_config().research.source_credibility_file
+            if path:
+                try:
+                    logger.info(f"Loaded {index.load_file(path)} source credibility entries from {path}")
+                except (OSError, ValueError, AttributeError) as e:
+                    logger.warning(f"Failed to load source credibility file {path}: {e}")
+            _source_credibility = index
+        return _source_credibility
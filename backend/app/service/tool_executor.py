@@ -10,55 +10,19 @@ Tool Executor - 工具执行器
 5. Chart Generator - 图表配置生成
 """
 
-import json
 import logging
 import asyncio
-import hashlib
-import time
 import re
 from typing import Dict, Any, List, Optional, Callable, Tuple
 from collections import Counter
-import requests
 from openai import OpenAI
 
 from .react_controller import ReActContext, ToolType, Tool
+from .search_provider import get_search_provider
+from .search_cache import get_search_cache
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
-# --- 缓存配置 ---
-SEARCH_CACHE_TTL = 3600  # 搜索缓存过期时间(秒)
-_search_cache: Dict[str, Tuple[List, float]] = {}
-
-
-def get_query_hash(query: str) -> str:
-    """生成查询的哈希值用于缓存"""
-    return hashlib.md5(query.strip().lower().encode()).hexdigest()
-
-
-def get_cached_search(query: str) -> Optional[List]:
-    """获取缓存的搜索结果"""
-    query_hash = get_query_hash(query)
-    if query_hash in _search_cache:
-        results, timestamp = _search_cache[query_hash]
-        if time.time() - timestamp < SEARCH_CACHE_TTL:
-            logging.info(f"Cache hit for query: {query[:50]}...")
-            return results
-        else:
-            del _search_cache[query_hash]
-    return None
-
-
-def set_cached_search(query: str, results: List):
-    """缓存搜索结果"""
-    query_hash = get_query_hash(query)
-    _search_cache[query_hash] = (results, time.time())
-    # 清理过期缓存
-    current_time = time.time()
-    expired_keys = [k for k, (_, t) in _search_cache.items() if current_time - t > SEARCH_CACHE_TTL]
-    for k in expired_keys:
-        del _search_cache[k]
-
-
 class ToolExecutor:
     """
     工具执行器 - 统一管理和执行各类工具
@@ -104,6 +68,11 @@ class ToolExecutor:
             ToolType.FINISH.value: self.execute_finish,
         }
 
+        # 同一轮事件循环中并发的知识库搜索：(kb_name, top_k) -> [(query, future)]
+        self._knowledge_batches: Dict[Tuple[str, int], List[Tuple[str, asyncio.Future]]] = {}
+        # 持有批量搜索任务的引用，避免任务在完成前被垃圾回收
+        self._batch_tasks: set = set()
+
     def get_handler(self, tool_name: str) -> Optional[Callable]:
         """获取工具处理器"""
         return self.handlers.get(tool_name)
@@ -151,64 +120,23 @@ class ToolExecutor:
                 return []
             logging.info(f"Using fallback query: {query}")
 
-        # 检查缓存
-        cached = get_cached_search(query)
-        if cached is not None:
-            return cached
-
-        # 执行搜索
-        results = await asyncio.to_thread(self._websearch_sync, query, count)
-
-        # 缓存结果
-        set_cached_search(query, results)
+        # 执行搜索（共享连接池，原生异步，结果走跨进程共享缓存）
+        results = await get_search_cache().get_or_fetch(get_search_provider(self.search_api_key), query, count=count)
+        results = [
+            {
+                'url': r['url'],
+                'name': r['title'],
+                'summary': r['summary'],
+                'snippet': r['snippet'],
+                'siteName': r['site_name'],
+                'siteIcon': r['site_icon'],
+                'source': 'web'
+            }
+            for r in results
+        ]
 
         return results
 
-    def _websearch_sync(self, query: str, count: int = 5) -> List[Dict]:
-        """同步执行网络搜索"""
-        url = "https://api.bochaai.com/v1/web-search"
-        payload = json.dumps({
-            "query": query,
-            "summary": True,
-            "count": count,
-            "page": 1
-        })
-        headers = {
-            'Authorization': self.search_api_key,
-            'Content-Type': 'application/json'
-        }
-
-        try:
-            response = requests.post(url, headers=headers, data=payload, timeout=25)
-            response.raise_for_status()
-            data = response.json()
-
-            webpages_data = data.get('data', {}).get('webPages', {})
-            value_list = webpages_data.get('value', [])
-
-            if not isinstance(value_list, list):
-                return []
-
-            # 过滤和格式化结果
-            results = []
-            for item in value_list:
-                if item.get('url') and (item.get('snippet') or item.get('summary')):
-                    results.append({
-                        'url': item.get('url'),
-                        'name': item.get('name', 'N/A'),
-                        'summary': item.get('summary', '') or item.get('snippet', ''),
-                        'snippet': item.get('snippet', ''),
-                        'siteName': item.get('siteName', 'N/A'),
-                        'siteIcon': item.get('siteIcon', ''),
-                        'source': 'web'
-                    })
-
-            return results
-
-        except Exception as e:
-            logging.error(f"Web search error for '{query}': {e}")
-            return []
-
     # ========== Knowledge Search ==========
     async def execute_knowledge_search(self, params: Dict[str, Any], context: ReActContext) -> List[Dict]:
         """
@@ -229,13 +157,7 @@ class ToolExecutor:
             return []
 
         try:
-            from service.retrieval_service import retrieve_from_knowledge_base
-            results = await asyncio.to_thread(
-                retrieve_from_knowledge_base,
-                kb_name=kb_name,
-                question=query,
-                top_k=top_k
-            )
+            results = await self._batched_knowledge_search(kb_name, query, top_k)
 
             # 转换为统一格式
             formatted_results = []
@@ -256,6 +178,50 @@ class ToolExecutor:
             logging.error(f"Knowledge search error: {e}")
             return []
 
+    def _batched_knowledge_search(self, kb_name: str, query: str, top_k: int) -> asyncio.Future:
+        """
+        合并同一轮事件循环中并发发起的知识库搜索（如 ReAct 并行子查询），
+        一次向量化、一次 Milvus 检索后按查询分发结果
+        """
+        loop = asyncio.get_running_loop()
+        key = (kb_name, top_k)
+        batch = self._knowledge_batches.get(key)
+        if batch is None:
+            batch = self._knowledge_batches[key] = []
+            # 本轮已调度的并发查询都入队后再执行
+            loop.call_soon(self._start_knowledge_batch, loop, key)
+        future = loop.create_future()
+        batch.append((query, future))
+        return future
+
+    def _start_knowledge_batch(self, loop: asyncio.AbstractEventLoop, key: Tuple[str, int]) -> None:
+        task = loop.create_task(self._flush_knowledge_batch(key))
+        self._batch_tasks.add(task)
+        task.add_done_callback(self._batch_tasks.discard)
+
+    async def _flush_knowledge_batch(self, key: Tuple[str, int]) -> None:
+        """执行一批合并后的知识库搜索"""
+        batch = self._knowledge_batches.pop(key, [])
+        if not batch:
+            return
+        kb_name, top_k = key
+        try:
+            from service.retrieval_service import retrieve_from_knowledge_base_many
+            results = await asyncio.to_thread(
+                retrieve_from_knowledge_base_many,
+                kb_name=kb_name,
+                questions=[query for query, _ in batch],
+                top_k=top_k
+            )
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        for (_, future), result in zip(batch, results):
+            if not future.done():
+                future.set_result(result)
+
     # ========== Text2SQL ==========
     async def execute_text2sql(self, params: Dict[str, Any], context: ReActContext) -> Dict[str, Any]:
         """
@@ -0,0 +1,118 @@
+"""
+知识库向量存储接口
+
+知识库切片的写入与检索（DocMind 入库、检索服务、DeepScout 本地搜索、切片查看）统一通过 VectorStore：
+1. MilvusService - Milvus 集群（默认）
+2. EmbeddedVectorStore - 进程内 numpy 存储（内存映射矩阵 + 元数据 sidecar，暴力 top-k），
+   适合小型知识库与测试，无需 Milvus + etcd + MinIO
+
+VECTOR_STORE_BACKEND 选择后端，get_vector_store() 返回进程内共享的实例。
+
+使用方式：
+```python
+from service.vector_store import get_vector_store
+
+store = get_vector_store()
+store.insert_documents("knowledge_base", documents)
+hits = store.search("knowledge_base", query_vector, top_k=5, kb_id="kb_policy")
+```
+"""
+
+import threading
+from abc import ABC, abstractmethod
+from typing import Any, Dict, List, Optional, Type, Union
+
+try:
+    from config.llm_config import get_config
+except ImportError:
+    from app.config.llm_config import get_config
+
+# 检索结果中返回的字段（不含向量）
+RESULT_FIELDS = ["id", "doc_id", "kb_id", "filename", "content", "chunk_index"]
+
+
+class VectorStore(ABC):
+    """
+    知识库向量存储
+
+    文档字段：id / doc_id / kb_id / filename / content / chunk_index / vector，
+    检索结果为上述字段（不含 vector）加 score（余弦相似度）。
+    """
+
+    @abstractmethod
+    def create_collection(self, collection_name: str) -> Any:
+        """创建集合（已存在时直接返回），返回值为后端的集合句柄"""
+
+    @abstractmethod
+    def insert_documents(self, collection_name: str, documents: List[Dict[str, Any]], flush: bool = False) -> int:
+        """插入文档（缺少 vector 时按 content 生成），返回插入数量；有文档写入失败时撤销本次写入并抛出 RuntimeError"""
+
+    @abstractmethod
+    def search(
+        self,
+        collection_name: str,
+        query_vector: List[float],
+        top_k: int = 5,
+        kb_id: Union[str, List[str], None] = None,
+    ) -> List[Dict[str, Any]]:
+        """向量搜索，集合不存在时返回空列表"""
+
+    @abstractmethod
+    def search_many(
+        self,
+        collection_name: str,
+        query_vectors: List[List[float]],
+        top_k: int = 5,
+        kb_id: Union[str, List[str], None] = None,
+    ) -> List[List[Dict[str, Any]]]:
+        """批量向量搜索，结果与 query_vectors 一一对应（空向量对应空结果）"""
+
+    @abstractmethod
+    def delete_by_doc_id(self, collection_name: str, doc_id: str) -> bool:
+        """删除文档的所有切片"""
+
+    @abstractmethod
+    def delete_collection(self, collection_name: str) -> bool:
+        """删除集合"""
+
+    @abstractmethod
+    def get_collection_stats(self, collection_name: str) -> Dict[str, Any]:
+        """集合统计信息：exists / name / num_entities"""
+
+    @abstractmethod
+    def get_chunks_by_filename(self, collection_name: str, filename: str, limit: int = 1000) -> List[Dict[str, Any]]:
+        """按文件名获取切片（按 chunk_index 排序）"""
+
+
+_embedded_store: Optional[VectorStore] = None
+_embedded_lock = threading.Lock()
+
+
+def _backend(backend: Optional[str]) -> str:
+    backend = (backend or get_config().vector_store.backend).lower()
+    if backend not in ("milvus", "embedded"):
+        raise ValueError(f"Unknown VECTOR_STORE_BACKEND '{backend}', expected milvus or embedded")
+    return backend
+
+
+def vector_store_class(backend: Optional[str] = None) -> Type[VectorStore]:
+    """配置的后端实现类（不创建实例、不建立连接）"""
+    if _backend(backend) == "embedded":
+        from .embedded_vector_store import EmbeddedVectorStore
+        return EmbeddedVectorStore
+    from .milvus_service import MilvusService
+    return MilvusService
+
+
+def get_vector_store(backend: Optional[str] = None) -> VectorStore:
+    """获取知识库向量存储单例（VECTOR_STORE_BACKEND）"""
+    global _embedded_store
+    if _backend(backend) == "milvus":
+        from .milvus_service import get_milvus_service
+        return get_milvus_service()
+    if _embedded_store is None:
+        with _embedded_lock:
+            if _embedded_store is None:
+                from .embedded_vector_store import EmbeddedVectorStore
+                _embedded_store = EmbeddedVectorStore()
+    return _embedded_store